@@ -7,8 +7,8 @@ Modular structure with organized blueprints
 import os
 import logging
 from datetime import datetime
+import click
 from flask import Flask, jsonify
-from flask_migrate import Migrate, upgrade
 from flask_login import LoginManager
 from sqlalchemy import text
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -18,10 +18,26 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize extensions
-migrate = Migrate()
+# Initialize extensions (Flask-Migrate is created by init_migrate)
+migrate = None
 login_manager = LoginManager()
 
+
+def init_migrate(app, db):
+    """
+    Register Flask-Migrate for the `flask db` commands
+
+    Alembic is a large import, so web workers only load it when running
+    under the flask CLI or when migrations are applied at startup.
+    """
+    global migrate
+    if click.get_current_context(silent=True) is None and app.config.get('ENV') != 'production':
+        return
+    from flask_migrate import Migrate
+    if migrate is None:
+        migrate = Migrate()
+    migrate.init_app(app, db)
+
 def create_app(config_name=None):
     """
     Flask application factory
@@ -49,10 +65,35 @@ def create_app(config_name=None):
     # Initialize extensions
     from database import db
     if app.config.get('SQLALCHEMY_DATABASE_URI'):
+        # Per-dialect pool sizing, driver options and SQLite pragmas
+        from app.engine import configure_engine, init_read_routing, install_engine_events
+        configure_engine(app)
         db.init_app(app)
-        migrate.init_app(app, db)
+        with app.app_context():
+            for engine in db.engines.values():
+                install_engine_events(engine)
+        # GET requests of the reporting blueprints read from REPORTING_DATABASE_URL when set
+        init_read_routing(app)
+        init_migrate(app, db)
+        # Register incremental maintenance of the entity analytics cube and review queue keys
+        import services.entity_cube  # noqa: F401
+        import services.review_queue  # noqa: F401
+        # Reject writes to bank transactions of closed accounting periods
+        import services.period_close  # noqa: F401
+        # Prerender closed-period report snapshots in the background (REPORT_SNAPSHOT_INTERVAL);
+        # a preloaded gunicorn master leaves this to the workers (app.warmup.warm_worker), and
+        # REPORT_SNAPSHOT_LOCK_FILE keeps the rendering to one process either way
+        if not app.config.get('TESTING') and not app.config.get('GUNICORN_PRELOAD'):
+            from services.report_snapshots import start_snapshot_worker
+            start_snapshot_worker(app)
+        # Per-request query count, DB time and slowest statements
+        from app.profiling import init_profiling
+        init_profiling(app)
     else:
         logger.warning('No SQLALCHEMY_DATABASE_URI configured; skipping database initialization')
+    # Request latency histograms and the /metrics endpoint
+    from app.metrics import init_metrics
+    init_metrics(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     # Optional hardening
@@ -119,11 +160,16 @@ def create_app(config_name=None):
     except Exception as e:
         logger.warning(f"Could not create upload folder: {e}")
 
+    # A misconfigured file storage backend stops the app here instead of failing every upload
+    from utils.file_store import get_content_store
+    get_content_store(app)
+
     # Initialize database tables
     with app.app_context():
         if app.config.get('SQLALCHEMY_DATABASE_URI'):
             try:
                 if app.config.get('ENV') == 'production':
+                    from flask_migrate import upgrade
                     upgrade()
                     logger.info("Database migrations applied")
                 else:
@@ -226,6 +272,12 @@ try:
     from models.purchase_order import PurchaseOrder
     from models.bank_transaction import BankTransaction
     from models.payroll import PayrollEntry
+    from models.entity_cube import EntityCubeState, EntityMonthlyTotal
+    from models.merchant_alias import MerchantAlias
+    from models.classification_rule_set import ClassificationRuleSet
+    from models.report_snapshot import ReportSnapshot
+    from models.period_close import ClosedPeriod, PeriodTotal
+    from models.receipt_ocr import ReceiptOcrResult
     logger.info("Models imported successfully")
 except ImportError as e:
     logger.warning(f"Could not import some models: {e}")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Database engine profiles for AciTech Cash Flow Management System
+
+Builds SQLALCHEMY_ENGINE_OPTIONS per dialect before the engine is created:
+- mssql+pyodbc (Azure SQL): pool sized to the gunicorn workers/threads,
+  pool_recycle under the Azure gateway idle timeout, fast_executemany for
+  bulk inserts (imports, classification writes)
+- mssql+pymssql: same pool, no fast_executemany (the driver has none)
+- sqlite files (dev): WAL journal and synchronous=NORMAL pragmas
+- sqlite in-memory (tests): left to Flask-SQLAlchemy (StaticPool)
+
+Every pooled checkout is timed into acidtech_db_checkout_seconds and slow
+waits (DB_SLOW_CHECKOUT_MS) are logged with the pool status.
+
+With REPORTING_DATABASE_URL set (the 'reporting' bind), GET requests to the
+READ_REPLICA_BLUEPRINTS read through it (services.read_routing).
+"""
+
+import logging
+import time
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from services.metrics import DB_CHECKOUT_SECONDS
+from services.read_routing import REPORTING_BIND, replica_available
+
+logger = logging.getLogger(__name__)
+
+# Azure SQL closes connections idle for 30 minutes at the gateway
+AZURE_SQL_RECYCLE = 1200
+DEFAULT_RECYCLE = 1800
+# Connections kept for threads outside requests (report snapshot worker)
+BACKGROUND_CONNECTIONS = 1
+
+_slow_checkout_seconds = 0.1
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited"""
+
+    # Log under SQLAlchemy's pool logger (echo_pool / sqlalchemy.pool levels), not app.engine
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            waited = time.perf_counter() - started
+            DB_CHECKOUT_SECONDS.observe(waited, dialect=self._dialect.name)
+            if waited >= _slow_checkout_seconds:
+                logger.warning(f"Waited {waited * 1000:.0f} ms for a DB connection ({self.status()})")
+
+
+def is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
+def pool_sizing(workers: int, threads: int, max_connections: int = None):
+    """
+    Per-process pool_size and max_overflow for a gunicorn deployment
+
+    Each worker process gets its own pool: one connection per request thread
+    plus the background threads, with the same again as burst overflow. When
+    ``max_connections`` (the database tier limit) is set, overflow and then
+    the pool are shrunk so workers * (pool_size + max_overflow) stays within it.
+
+    Returns:
+        Tuple (pool_size, max_overflow)
+    """
+    pool_size = max(1, threads) + BACKGROUND_CONNECTIONS
+    max_overflow = max(1, threads)
+    if max_connections:
+        per_worker = max(1, max_connections // max(1, workers))
+        max_overflow = max(0, min(max_overflow, per_worker - pool_size))
+        pool_size = max(1, min(pool_size, per_worker))
+    return pool_size, max_overflow
+
+
+def engine_profile(uri: str, workers: int = 1, threads: int = 1, max_connections: int = None) -> dict:
+    """
+    Engine options for a database URI
+
+    Args:
+        uri: SQLAlchemy database URI
+        workers: gunicorn worker processes
+        threads: threads per worker
+        max_connections: connection limit of the database tier (optional)
+
+    Returns:
+        Dict of create_engine keyword arguments
+    """
+    url = make_url(uri)
+    backend, driver = url.get_backend_name(), url.get_driver_name()
+    options = {'pool_pre_ping': True}
+
+    if is_memory_sqlite(url):
+        return options
+
+    pool_size, max_overflow = pool_sizing(workers, threads, max_connections)
+    options.update(poolclass=TimedQueuePool, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=30)
+
+    if backend == 'mssql':
+        options['pool_recycle'] = AZURE_SQL_RECYCLE
+        if driver == 'pyodbc':
+            options['fast_executemany'] = True
+    elif backend == 'sqlite':
+        # Writers wait on the lock instead of failing with "database is locked"
+        options['connect_args'] = {'timeout': 15}
+    else:
+        options['pool_recycle'] = DEFAULT_RECYCLE
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def configure_engine(app) -> None:
+    """
+    Fill SQLALCHEMY_ENGINE_OPTIONS from the dialect profile (call before db.init_app)
+
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS and the DB_POOL_* settings
+    take precedence over the profile.
+
+    Args:
+        app: Flask application
+    """
+    global _slow_checkout_seconds
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri or not app.config.get('DB_ENGINE_PROFILE', True):
+        return
+
+    options = engine_profile(uri, app.config.get('WEB_CONCURRENCY', 1), app.config.get('GUNICORN_THREADS', 1),
+                             app.config.get('DB_MAX_CONNECTIONS'))
+    if 'pool_size' in options:
+        overrides = {'pool_size': 'DB_POOL_SIZE', 'max_overflow': 'DB_MAX_OVERFLOW',
+                     'pool_recycle': 'DB_POOL_RECYCLE', 'pool_timeout': 'DB_POOL_TIMEOUT'}
+        for option, setting in overrides.items():
+            if app.config.get(setting) is not None:
+                options[option] = app.config[setting]
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    _slow_checkout_seconds = app.config.get('DB_SLOW_CHECKOUT_MS', 100) / 1000
+
+    url = make_url(uri)
+    pool = {key: options[key] for key in ('pool_size', 'max_overflow', 'pool_recycle') if key in options}
+    logger.info(f"DB engine profile: {url.get_backend_name()}+{url.get_driver_name()} {pool}"
+                f"{' fast_executemany' if options.get('fast_executemany') else ''}")
+    if url.get_backend_name() == 'mssql' and url.get_driver_name() == 'pymssql':
+        logger.info('pymssql has no fast_executemany; use mssql+pyodbc for faster bulk inserts')
+
+
+def install_engine_events(engine) -> None:
+    """
+    Connection-level settings that are not engine options (call after db.init_app)
+
+    Args:
+        engine: SQLAlchemy engine
+    """
+    if engine.dialect.name == 'sqlite' and not is_memory_sqlite(engine.url):
+        event.listen(engine, 'connect', _sqlite_pragmas)
+
+
+def _route_reporting_reads():
+    g.reporting_reads = False
+    if request.method not in ('GET', 'HEAD') or request.blueprint not in current_app.config['READ_REPLICA_BLUEPRINTS']:
+        return
+    from database import db
+    engine = db.engines.get(REPORTING_BIND)
+    g.reporting_reads = replica_available(engine, current_app.config.get('READ_REPLICA_HEALTH_INTERVAL', 30))
+
+
+def init_read_routing(app) -> None:
+    """
+    Route GET requests of the reporting blueprints to the 'reporting' bind
+
+    Args:
+        app: Flask application
+    """
+    if not app.config.get('SQLALCHEMY_BINDS', {}).get(REPORTING_BIND):
+        return
+    app.config.setdefault('READ_REPLICA_BLUEPRINTS', ('reports', 'cash_flow'))
+    app.before_request(_route_reporting_reads)
+    logger.info(f"Reporting reads routed to the '{REPORTING_BIND}' bind for {app.config['READ_REPLICA_BLUEPRINTS']}")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Metrics endpoint for AciTech Cash Flow Management System
+
+Times every request into the latency histogram of services.metrics
+(labelled with the blueprint endpoint), samples the DB connection pool on
+scrape and serves everything at /metrics in the Prometheus text format.
+
+Settings:
+- METRICS_ENABLED: request timing and /metrics (on by default)
+- METRICS_TOKEN: when set, /metrics requires "Authorization: Bearer <token>"
+- METRICS_MULTIPROC_DIR: shared directory so a scrape of any gunicorn
+  worker reports the totals of all workers
+"""
+
+import hmac
+import logging
+import os
+import time
+
+from flask import Response, abort, current_app, g, has_app_context, request
+
+from services.metrics import REQUEST_LATENCY, REQUESTS, MultiprocessStore, register_collector, render
+
+logger = logging.getLogger(__name__)
+
+EXPOSITION_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _pool_collector():
+    """Connection pool usage of this worker's engine"""
+    if not has_app_context() or not current_app.config.get('SQLALCHEMY_DATABASE_URI'):
+        return
+    from database import db
+    pool = db.engine.pool
+    worker = {'pid': str(os.getpid())}
+    samples = (
+        ('acidtech_db_pool_size', 'Configured pool size', 'size'),
+        ('acidtech_db_pool_checked_out', 'Connections currently checked out', 'checkedout'),
+        ('acidtech_db_pool_checked_in', 'Idle connections in the pool', 'checkedin'),
+        ('acidtech_db_pool_overflow', 'Connections open beyond pool_size', 'overflow'),
+    )
+    for name, documentation, method in samples:
+        # SQLite static/singleton pools do not implement every counter
+        if callable(getattr(pool, method, None)):
+            yield name, 'gauge', documentation, [(worker, getattr(pool, method)())]
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or '<unmatched>'
+    if endpoint != 'metrics':
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+
+    store = current_app.extensions.get('acidtech_metrics_store')
+    if store is not None:
+        store.flush()
+    return response
+
+
+def init_metrics(app) -> None:
+    """
+    Install request timing and the /metrics endpoint on an app
+
+    Args:
+        app: Flask application
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    directory = app.config.get('METRICS_MULTIPROC_DIR')
+    if directory:
+        app.extensions['acidtech_metrics_store'] = MultiprocessStore(
+            directory, app.config.get('METRICS_FLUSH_INTERVAL', 10.0)
+        )
+
+    register_collector(_pool_collector)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+
+    @app.route('/metrics')
+    def metrics():
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+        store = current_app.extensions.get('acidtech_metrics_store')
+        values = store.collect_all() if store is not None else None
+        return Response(render(values), mimetype=EXPOSITION_MIMETYPE)
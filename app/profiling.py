@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Request-level SQL profiling for AciTech Cash Flow Management System
+
+Hooks the SQLAlchemy before/after_cursor_execute events of every engine and
+records, per request, the number of statements, the total time spent in
+the database and the slowest statements. The profile is surfaced as:
+
+- X-DB-Query-Count / X-DB-Time-Ms / Server-Timing response headers
+  (SQL_PROFILE_HEADERS, on in development)
+- /debug/perf, a per-endpoint summary of this worker's requests
+  (SQL_PROFILE_DEBUG_PAGE, on in development)
+- one JSON log line per request on the acidtech.performance logger
+  (SQL_PROFILE_LOG, on in production)
+
+Endpoints can declare a budget with @query_budget(max_queries, max_db_ms).
+Exceeding it logs a warning, or raises QueryBudgetExceeded when
+SQL_QUERY_BUDGET_STRICT is set (testing), so query regressions fail tests.
+
+Outside requests, profile_queries() profiles any block of code.
+"""
+
+import heapq
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, g, has_app_context, jsonify, render_template_string, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+perf_logger = logging.getLogger('acidtech.performance')
+
+DEFAULT_SLOWEST = 5
+STATEMENT_PREVIEW = 500     # Characters of SQL kept per slow statement
+_START_KEY = 'sql_profile_start'
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when an endpoint runs more queries (or DB time) than its budget"""
+
+
+class QueryProfile:
+    """
+    Query count, DB time and slowest statements of one request (or profiled block)
+    """
+
+    __slots__ = ('query_count', 'db_time', 'started', '_slowest', '_keep', '_sequence')
+
+    def __init__(self, keep_slowest: int = DEFAULT_SLOWEST):
+        self.query_count = 0
+        self.db_time = 0.0          # Seconds
+        self.started = time.perf_counter()
+        self._slowest: List[Tuple[float, int, str]] = []   # Min-heap of (seconds, sequence, sql)
+        self._keep = keep_slowest
+        self._sequence = 0
+
+    def record(self, statement: str, duration: float) -> None:
+        self.query_count += 1
+        self.db_time += duration
+        if self._keep <= 0:
+            return
+        self._sequence += 1
+        entry = (duration, self._sequence, statement[:STATEMENT_PREVIEW])
+        if len(self._slowest) < self._keep:
+            heapq.heappush(self._slowest, entry)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def db_ms(self) -> float:
+        return round(self.db_time * 1000, 2)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def slowest(self) -> List[Dict]:
+        """Slowest statements, slowest first"""
+        return [{'ms': round(duration * 1000, 2), 'sql': sql}
+                for duration, _, sql in sorted(self._slowest, reverse=True)]
+
+    def to_dict(self) -> Dict:
+        return {
+            'queries': self.query_count,
+            'db_ms': self.db_ms,
+            'elapsed_ms': self.elapsed_ms,
+            'slowest': self.slowest()
+        }
+
+
+def current_profile() -> Optional[QueryProfile]:
+    """Profile collecting the current request's statements, if any"""
+    return g.get('sql_profile') if has_app_context() else None
+
+
+@contextmanager
+def profile_queries(keep_slowest: int = DEFAULT_SLOWEST):
+    """
+    Profile the statements run inside the block (requires an app context)
+
+    Usage:
+        with profile_queries() as profile:
+            calculator.get_dashboard_summary()
+        print(profile.query_count, profile.db_ms)
+    """
+    previous = g.get('sql_profile')
+    profile = QueryProfile(keep_slowest)
+    g.sql_profile = profile
+    try:
+        yield profile
+    finally:
+        g.sql_profile = previous
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    profile = current_profile()
+    if profile is not None:
+        profile.record(statement, duration)
+
+
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+def install_listeners() -> None:
+    """Attach the cursor timing hooks to every engine (idempotent)"""
+    global _listeners_installed
+    with _listeners_lock:
+        if _listeners_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+
+def query_budget(max_queries: int, max_db_ms: Optional[float] = None):
+    """
+    Declare the most queries (and optionally DB milliseconds) a view may use
+
+    Place it under the route decorator:
+
+        @cash_flow_bp.route('/api/dashboard/summary')
+        @query_budget(40)
+        def api_dashboard_summary(): ...
+    """
+    def decorator(view):
+        view.sql_query_budget = (max_queries, max_db_ms)
+        return view
+    return decorator
+
+
+def _budget_for(endpoint: Optional[str]) -> Optional[Tuple[int, Optional[float]]]:
+    view = current_app.view_functions.get(endpoint) if endpoint else None
+    return getattr(view, 'sql_query_budget', None)
+
+
+class EndpointStats:
+    """
+    Per-endpoint request profiles of this worker (feeds /debug/perf)
+    """
+
+    def __init__(self, keep_slowest: int = 20):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict] = {}
+        self._slowest: List[Tuple[float, int, str, str]] = []
+        self._keep = keep_slowest
+        self._sequence = 0
+
+    def record(self, endpoint: str, profile: QueryProfile, elapsed_ms: float) -> None:
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'max_db_ms': 0.0, 'elapsed_ms': 0.0
+            })
+            stats['requests'] += 1
+            stats['queries'] += profile.query_count
+            stats['max_queries'] = max(stats['max_queries'], profile.query_count)
+            stats['db_ms'] += profile.db_ms
+            stats['max_db_ms'] = max(stats['max_db_ms'], profile.db_ms)
+            stats['elapsed_ms'] += elapsed_ms
+
+            for statement in profile.slowest():
+                self._sequence += 1
+                entry = (statement['ms'], self._sequence, endpoint, statement['sql'])
+                if len(self._slowest) < self._keep:
+                    heapq.heappush(self._slowest, entry)
+                elif entry[0] > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+    def snapshot(self) -> Dict:
+        """Endpoints sorted by total DB time, plus the slowest statements seen"""
+        with self._lock:
+            endpoints = []
+            for endpoint, stats in self._endpoints.items():
+                requests = stats['requests']
+                endpoints.append({
+                    'endpoint': endpoint,
+                    'requests': requests,
+                    'avg_queries': round(stats['queries'] / requests, 1),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_ms': round(stats['db_ms'] / requests, 2),
+                    'max_db_ms': round(stats['max_db_ms'], 2),
+                    'total_db_ms': round(stats['db_ms'], 2),
+                    'avg_elapsed_ms': round(stats['elapsed_ms'] / requests, 2)
+                })
+            slowest = [{'ms': ms, 'endpoint': endpoint, 'sql': sql}
+                       for ms, _, endpoint, sql in sorted(self._slowest, reverse=True)]
+        endpoints.sort(key=lambda item: item['total_db_ms'], reverse=True)
+        return {'endpoints': endpoints, 'slowest': slowest}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self._slowest.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+PERF_PAGE = """<!doctype html>
+<html><head><title>SQL profile</title>
+<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}
+td,th{border:1px solid #ddd;padding:4px 8px;text-align:right}td.l,th.l{text-align:left}
+code{white-space:pre-wrap}</style></head>
+<body>
+<h1>SQL profile (this worker)</h1>
+<table>
+<tr><th class="l">Endpoint</th><th>Requests</th><th>Avg queries</th><th>Max queries</th>
+<th>Avg DB ms</th><th>Max DB ms</th><th>Total DB ms</th><th>Avg request ms</th></tr>
+{% for e in endpoints %}
+<tr><td class="l">{{ e.endpoint }}</td><td>{{ e.requests }}</td><td>{{ e.avg_queries }}</td>
+<td>{{ e.max_queries }}</td><td>{{ e.avg_db_ms }}</td><td>{{ e.max_db_ms }}</td>
+<td>{{ e.total_db_ms }}</td><td>{{ e.avg_elapsed_ms }}</td></tr>
+{% endfor %}
+</table>
+<h2>Slowest statements</h2>
+<table>
+<tr><th>ms</th><th class="l">Endpoint</th><th class="l">SQL</th></tr>
+{% for s in slowest %}
+<tr><td>{{ s.ms }}</td><td class="l">{{ s.endpoint }}</td><td class="l"><code>{{ s.sql }}</code></td></tr>
+{% endfor %}
+</table>
+</body></html>"""
+
+
+def _start_request_profile():
+    if current_app.config.get('SQL_PROFILING', True):
+        g.sql_profile = QueryProfile(current_app.config.get('SQL_PROFILE_SLOWEST', DEFAULT_SLOWEST))
+
+
+def _finish_request_profile(response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+
+    config = current_app.config
+    endpoint = request.endpoint or '<unmatched>'
+    elapsed_ms = profile.elapsed_ms
+    if endpoint != 'debug_perf':
+        endpoint_stats.record(endpoint, profile, elapsed_ms)
+
+    if config.get('SQL_PROFILE_HEADERS'):
+        response.headers['X-DB-Query-Count'] = str(profile.query_count)
+        response.headers['X-DB-Time-Ms'] = f'{profile.db_ms:.2f}'
+        response.headers['Server-Timing'] = f'db;dur={profile.db_ms:.2f};desc="{profile.query_count} queries"'
+
+    if config.get('SQL_PROFILE_LOG'):
+        perf_logger.info(json.dumps({
+            'event': 'request_profile',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'queries': profile.query_count,
+            'db_ms': profile.db_ms,
+            'elapsed_ms': elapsed_ms,
+            'slowest': profile.slowest()[:3]
+        }, default=str))
+
+    budget = _budget_for(request.endpoint)
+    if budget is not None:
+        max_queries, max_db_ms = budget
+        over = []
+        if profile.query_count > max_queries:
+            over.append(f'{profile.query_count} queries (budget {max_queries})')
+        if max_db_ms is not None and profile.db_ms > max_db_ms:
+            over.append(f'{profile.db_ms}ms in the database (budget {max_db_ms}ms)')
+        if over:
+            message = f"{endpoint} exceeded its query budget: {', '.join(over)}"
+            if config.get('SQL_QUERY_BUDGET_STRICT'):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    return response
+
+
+def init_profiling(app) -> None:
+    """
+    Install the SQL profiling hooks on an app
+
+    Args:
+        app: Flask application
+    """
+    if not app.config.get('SQL_PROFILING', True):
+        return
+    install_listeners()
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+
+    if app.config.get('SQL_PROFILE_DEBUG_PAGE'):
+        @app.route('/debug/perf')
+        def debug_perf():
+            data = endpoint_stats.snapshot()
+            if request.args.get('format') == 'json':
+                return jsonify(data)
+            return render_template_string(PERF_PAGE, **data)
+
+        logger.info('SQL profile page available at /debug/perf')
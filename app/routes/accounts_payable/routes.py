@@ -1,11 +1,11 @@
-from flask import render_template, request, flash, redirect, url_for, current_app
+from flask import render_template, request, flash, redirect, url_for, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
 from models.transaction import Transaction
+from services.receipt_ocr import queue_receipt
+from utils.file_store import get_content_store, stored_file_response
+from services.ap_ar_summary import get_ap_ar_kpis
 from database import db
-import os
 
 from . import accounts_payable_bp
 
@@ -37,34 +37,15 @@ def index():
             'next_num': None
         })()
 
-    current_year = date.today().year
-    total_outstanding = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.type == 'payable',
-        Transaction.status == 'pending'
-    ).scalar() or 0
-
-    total_ytd = db.session.query(func.sum(Transaction.amount)).filter(
-        Transaction.type == 'payable',
-        func.extract('year', Transaction.due_date) == current_year
-    ).scalar() or 0
-
-    paid_count = db.session.query(func.count(Transaction.id)).filter(
-        Transaction.type == 'payable',
-        Transaction.status == 'paid',
-        func.extract('year', Transaction.due_date) == current_year
-    ).scalar() or 0
-
-    total_count = db.session.query(func.count(Transaction.id)).filter(
-        Transaction.type == 'payable',
-        func.extract('year', Transaction.due_date) == current_year
-    ).scalar() or 0
+    kpis = get_ap_ar_kpis()['payable']
+    total_outstanding = kpis['total_outstanding']
+    total_ytd = kpis['total_ytd']
+    paid_count = kpis['paid_count']
+    total_count = kpis['year_count']
 
     payment_accuracy = (paid_count / total_count * 100) if total_count else 0
 
-    pending_bills = db.session.query(func.count(Transaction.id)).filter(
-        Transaction.type == 'payable',
-        Transaction.status == 'pending'
-    ).scalar() or 0
+    pending_bills = kpis['pending_count']
 
     ap = {
         'total_outstanding': total_outstanding,
@@ -91,13 +72,13 @@ def create():
         
         # Handle file upload
         receipt_path = None
+        stored = None
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename != '':
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                receipt_path = filename
+                # Content-addressed: same-named files never overwrite each other, duplicates are stored once
+                stored = get_content_store().save_upload(file)
+                receipt_path = stored.key
         
         transaction = Transaction(
             type='payable',
@@ -113,6 +94,10 @@ def create():
         db.session.add(transaction)
         db.session.commit()
         
+        # OCR runs in the background; extracted fields fill in whatever was left empty
+        if stored:
+            queue_receipt(transaction.id, stored.path, stored.content_hash)
+        
         flash('Payable transaction created successfully', 'success')
         return redirect(url_for('accounts_payable.index'))
     
@@ -148,16 +133,40 @@ def edit(id):
         transaction.updated_at = datetime.utcnow()
         
         # Handle file upload
+        stored = None
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename != '':
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                transaction.receipt_path = filename
+                stored = get_content_store().save_upload(file)
+                transaction.receipt_path = stored.key
         
         db.session.commit()
+        if stored:
+            queue_receipt(transaction.id, stored.path, stored.content_hash)
         flash('Transaction updated successfully', 'success')
         return redirect(url_for('accounts_payable.index'))
     
-    return render_template('accounts_payable/edit.html', transaction=transaction)
\ No newline at end of file
+    return render_template('accounts_payable/edit.html', transaction=transaction)
+
+@accounts_payable_bp.route('/<int:id>/receipt')
+@login_required
+def receipt(id):
+    """Receipt file of the transaction, from whichever storage backend holds it"""
+    transaction = Transaction.query.get_or_404(id)
+    if transaction.type != 'payable' or not transaction.receipt_path:
+        return redirect(url_for('accounts_payable.index'))
+    return stored_file_response(transaction.receipt_path)
+
+@accounts_payable_bp.route('/<int:id>/receipt-ocr')
+@login_required
+def receipt_ocr(id):
+    """OCR status and extracted fields of the transaction's receipt (polled after upload)"""
+    from models.receipt_ocr import ReceiptOcrResult
+
+    transaction = Transaction.query.get_or_404(id)
+    result = None
+    if transaction.receipt_hash:
+        result = ReceiptOcrResult.query.filter_by(content_hash=transaction.receipt_hash).first()
+    if result is None:
+        return jsonify({'success': False, 'error': 'No receipt queued for OCR'}), 404
+    return jsonify({'success': True, 'receipt': result.to_dict()})
@@ -8,11 +8,16 @@ Date: 2025-08-08
 """
 
 from flask import jsonify, request, render_template
+from flask_login import login_required
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
 from services.cash_flow_calculator import CashFlowCalculator
+from services.credit_card_cycles import statement_summary
+from services.report_export import build_export, export_response
+from services.report_snapshots import get_snapshot_store, is_closed
 from models.bank_transaction import BankTransaction
 from database import db
+from app.profiling import query_budget
 
 from . import cash_flow_bp
 
@@ -20,6 +25,7 @@ from . import cash_flow_bp
 calculator = CashFlowCalculator()
 
 @cash_flow_bp.route('/api/dashboard/summary')
+@query_budget(30)   # Cold path: a closed month in range or its first (rendering) snapshot view
 def api_dashboard_summary():
     """
     Get comprehensive dashboard summary with real classified data
@@ -63,8 +69,12 @@ def api_dashboard_summary():
                     'error': 'Invalid end_date format. Use YYYY-MM-DD'
                 }), 400
         
-        # Get dashboard summary
-        summary = calculator.get_dashboard_summary(start_date, end_date)
+        # Closed months are served from their prerendered snapshot plus the live, all-time sections
+        if start_date and end_date and is_closed(start_date, end_date):
+            summary = dict(get_snapshot_store().get_or_render('dashboard-summary', start_date, end_date))
+            summary.update(calculator.get_live_summary(start_date, end_date))
+        else:
+            summary = calculator.get_dashboard_summary(start_date, end_date)
         
         return jsonify({
             'success': True,
@@ -78,6 +88,7 @@ def api_dashboard_summary():
         }), 500
 
 @cash_flow_bp.route('/api/dashboard/account/<account_name>')
+@query_budget(5)
 def api_account_summary(account_name):
     """
     Get detailed summary for a specific account
@@ -133,6 +144,7 @@ def api_account_summary(account_name):
         }), 500
 
 @cash_flow_bp.route('/api/dashboard/transfers')
+@query_budget(5)
 def api_transfer_reconciliation():
     """
     Get transfer reconciliation status
@@ -166,11 +178,12 @@ def api_transfer_reconciliation():
         }), 500
 
 @cash_flow_bp.route('/api/dashboard/credit-card')
+@query_budget(5)
 def api_credit_card_summary():
     """
     Get Capital One credit card summary
     
-    GET /cash-flow/api/dashboard/credit-card
+    GET /cash-flow/api/dashboard/credit-card?start_date=2025-01-01&end_date=2025-12-31
     
     Returns:
     {
@@ -179,13 +192,38 @@ def api_credit_card_summary():
             "total_purchases": 25000,
             "total_payments": 20000,
             "current_cycle": {...},
+            "cycles": [...],
             "receipts": {...}
         }
     }
     """
     
     try:
-        cc_summary = calculator.get_credit_card_summary()
+        start_date_str = request.args.get('start_date')
+        end_date_str = request.args.get('end_date')
+        
+        start_date = None
+        end_date = None
+        
+        if start_date_str:
+            try:
+                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid start_date format. Use YYYY-MM-DD'
+                }), 400
+        
+        if end_date_str:
+            try:
+                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid end_date format. Use YYYY-MM-DD'
+                }), 400
+        
+        cc_summary = calculator.get_credit_card_summary(start_date, end_date)
         
         return jsonify({
             'success': True,
@@ -198,7 +236,48 @@ def api_credit_card_summary():
             'error': f'Failed to get credit card summary: {str(e)}'
         }), 500
 
+@cash_flow_bp.route('/api/dashboard/credit-card/statements')
+def api_credit_card_statements():
+    """
+    Per-cycle credit card statement summary
+    
+    GET /cash-flow/api/dashboard/credit-card/statements?start_date=2025-01-01&account=Capital One
+    
+    Returns:
+    {
+        "success": true,
+        "data": [
+            {"cycle_cut_date": "2025-08-11", "due_date": "2025-09-05", "purchases": 4200,
+             "payments": 3800, "receipts_pending": 6, ...}
+        ]
+    }
+    """
+    
+    try:
+        start_date_str = request.args.get('start_date')
+        end_date_str = request.args.get('end_date')
+        
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
+        
+        return jsonify({
+            'success': True,
+            'data': statement_summary(request.args.get('account'), start_date, end_date)
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid date: {str(e)}'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to get credit card statements: {str(e)}'
+        }), 500
+
 @cash_flow_bp.route('/api/dashboard/tax-summary')
+@query_budget(10)   # Cold path: first view of a closed month renders and stores its snapshot
 def api_tax_summary():
     """
     Get tax deductible expenses summary
@@ -230,7 +309,10 @@ def api_tax_summary():
         if end_date_str:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
         
-        tax_summary = calculator.get_tax_summary(start_date, end_date)
+        if start_date and end_date and is_closed(start_date, end_date):
+            tax_summary = get_snapshot_store().get_or_render('tax-summary', start_date, end_date)
+        else:
+            tax_summary = calculator.get_tax_summary(start_date, end_date)
         
         return jsonify({
             'success': True,
@@ -243,7 +325,36 @@ def api_tax_summary():
             'error': f'Failed to get tax summary: {str(e)}'
         }), 500
 
+@cash_flow_bp.route('/api/dashboard/tax-summary/export')
+@login_required
+def api_tax_summary_export():
+    """
+    Download the tax-deductible transactions behind the tax summary
+    
+    GET /cash-flow/api/dashboard/tax-summary/export?format=xlsx&start_date=2025-01-01&end_date=2025-12-31
+    
+    Returns:
+        Streaming CSV (default) or XLSX attachment
+    """
+    
+    try:
+        filename, headers, rows = build_export('tax-deductible', request.args)
+        return export_response(filename, headers, rows, request.args.get('format', 'csv'),
+                               sheet_title='Tax Deductible')
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export tax summary: {str(e)}'
+        }), 500
+
 @cash_flow_bp.route('/api/dashboard/kpis')
+@query_budget(30)
 def api_quick_kpis():
     """
     Get quick KPIs for dashboard widgets
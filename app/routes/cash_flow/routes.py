@@ -1,5 +1,5 @@
 from flask import render_template, request, jsonify, redirect, url_for, flash
-from flask_login import login_required
+from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
 from models.transaction import Transaction
 from models.bank_transaction import BankTransaction
@@ -11,6 +11,12 @@ from . import cash_flow_bp
 
 # Import classification service
 from services.transaction_classifier import CashFlowClassifier
+from services.entity_cube import EntityCube, SOURCE_BANK
+from services.review_queue import ReviewQueue
+from services.rule_engine import get_rule_engine
+from services.period_close import close_period, reopen_period
+from services.receipt_matcher import match_receipts
+from models.period_close import ClosedPeriod
 
 # Account mappings for the four main accounts
 ACCOUNT_MAPPINGS = {
@@ -343,18 +349,14 @@ def _get_account_summary_from_database(account_name, year):
     months_with_data = [m for m in monthly_data.values() if m['amount'] > 0]
     average_monthly = total_amount / max(1, len(months_with_data))
     
-    # Top entities (group by merchant/description keywords)
-    entity_totals = {}
-    for t in transactions:
-        if float(t.amount) > 0:  # Only positive amounts for revenue
-            desc = t.description[:30].strip()
-            if desc in entity_totals:
-                entity_totals[desc] += float(t.amount)
-            else:
-                entity_totals[desc] = float(t.amount)
-    
-    # Get top 5 entities
-    top_entities = sorted(entity_totals.items(), key=lambda x: x[1], reverse=True)[:5]
+    # Top entities (inflows per merchant) served from the entity analytics cube
+    top_entities = [
+        (entity['entity'], entity['total_amount'])
+        for entity in EntityCube().top_n(
+            5, SOURCE_BANK, account=account_name, flow='IN',
+            start_month=date(year, 1, 1), end_month=date(year, 12, 1)
+        )
+    ]
     
     # Recent transactions (last 10)
     recent_transactions = []
@@ -721,6 +723,371 @@ def classify_single_transaction(transaction_id):
             'error': f'Failed to classify transaction: {str(e)}'
         }), 500
 
+@cash_flow_bp.route('/api/classification/review-queue', methods=['GET'])
+@login_required
+def get_review_queue():
+    """
+    Review queue ranked by expected impact ((1 - confidence) * |amount|)
+    
+    GET /cash-flow/api/classification/review-queue?limit=50&clusters=20&account=Capital One
+    
+    Response:
+    {
+        "success": true,
+        "transactions": [{"id": 12, "review_priority": 968.81, "signature": "...", ...}],
+        "clusters": [{"signature": "ACH CREDIT PAYMNT OVINTIV CCD", "transaction_count": 20, "impact": ...}]
+    }
+    """
+    
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        cluster_limit = min(request.args.get('clusters', 20, type=int), 200)
+        account = request.args.get('account')
+        
+        review_queue = ReviewQueue()
+        transactions = [{
+            'id': t.id,
+            'account': t.account_name,
+            'date': t.transaction_date.isoformat(),
+            'description': t.description,
+            'amount': float(t.amount),
+            'confidence': float(t.classification_confidence) if t.classification_confidence is not None else None,
+            'review_priority': float(t.review_priority),
+            'signature': t.description_signature
+        } for t in review_queue.ranked(limit=limit, account_name=account)]
+        
+        return jsonify({
+            'success': True,
+            'transactions': transactions,
+            'clusters': review_queue.clusters(limit=cluster_limit)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to load review queue: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/classification/review-queue/apply', methods=['POST'])
+@login_required
+def apply_review_decision():
+    """
+    Apply one manual classification to a cluster or a list of transactions
+    
+    POST /cash-flow/api/classification/review-queue/apply
+    
+    Request JSON:
+    {
+        "signature": "ACH CREDIT PAYMNT OVINTIV CCD",   # and/or
+        "transaction_ids": [12, 15],
+        "classification": {
+            "business_category": "REVENUE",
+            "gl_account_code": "4000",
+            "merchant_name": "Ovintiv"
+        }
+    }
+    
+    Response:
+    {
+        "success": true,
+        "updated": 20
+    }
+    """
+    
+    try:
+        data = request.get_json() or {}
+        signature = data.get('signature')
+        transaction_ids = data.get('transaction_ids') or []
+        
+        if not signature and not transaction_ids:
+            return jsonify({
+                'success': False,
+                'error': 'Provide a signature or transaction_ids'
+            }), 400
+        
+        result = ReviewQueue().apply_decision(
+            data.get('classification') or {},
+            transaction_ids=transaction_ids,
+            signature=signature
+        )
+        
+        return jsonify({
+            'success': True,
+            'updated': result['updated'],
+            'transaction_ids': result['transaction_ids']
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to apply review decision: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/classification/rules', methods=['GET'])
+@login_required
+def get_classification_rules():
+    """
+    Active classification rule set
+    
+    GET /cash-flow/api/classification/rules
+    
+    Response:
+    {
+        "success": true,
+        "version": 3,
+        "name": "AcidTech default rules",
+        "accounts": [...],
+        "rules": [...]
+    }
+    """
+    
+    try:
+        rule_set = get_rule_engine().active()
+        return jsonify({
+            'success': True,
+            'version': rule_set.version,
+            'name': rule_set.name,
+            'accounts': rule_set.accounts,
+            'rules': rule_set.rules,
+            'unknown_account': rule_set.unknown_account
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to load classification rules: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/classification/rules', methods=['POST'])
+@login_required
+def save_classification_rules():
+    """
+    Store and activate a new rule set version (or only report its impact)
+    
+    POST /cash-flow/api/classification/rules
+    
+    Admin only: a new rule set reclassifies every user's transactions.
+    
+    Request JSON:
+    {
+        "definition": {...} or "<json/yaml text>",
+        "format": "json",             # Optional: "json" or "yaml"
+        "notes": "Split fuel purchases",
+        "dry_run": true,              # Optional: report changes without saving
+        "apply": true                 # Optional: reclassify the affected transactions
+    }
+    
+    Response:
+    {
+        "success": true,
+        "version": 4,                 # or "dry_run": {"rows_changed": 12, "by_rule": {...}}
+        "reclassification": {"candidates": 40, "reclassified": 12, "total_transactions": 7128}
+    }
+    """
+    
+    if not getattr(current_user, 'is_admin', False):
+        return jsonify({
+            'success': False,
+            'error': 'Only administrators can change classification rules'
+        }), 403
+    
+    try:
+        data = request.get_json() or {}
+        definition = data.get('definition')
+        rule_format = data.get('format', 'json')
+        
+        if not definition:
+            return jsonify({
+                'success': False,
+                'error': 'definition is required'
+            }), 400
+        
+        engine = get_rule_engine()
+        if data.get('dry_run'):
+            return jsonify({
+                'success': True,
+                'dry_run': engine.dry_run(definition, rule_format)
+            })
+        
+        previous_version = engine.active().version
+        rule_set = engine.save_rule_set(
+            definition,
+            format=rule_format,
+            created_by=current_user.id,
+            notes=data.get('notes')
+        )
+        
+        response = {
+            'success': True,
+            'version': rule_set.version,
+            'name': rule_set.name
+        }
+        if data.get('apply'):
+            response['reclassification'] = CashFlowClassifier().reclassify_for_rule_change(previous_version)
+        
+        return jsonify(response)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to save classification rules: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/periods', methods=['GET'])
+@login_required
+def list_closed_periods():
+    """
+    List closed accounting periods
+    
+    GET /cash-flow/api/periods
+    """
+    
+    try:
+        periods = ClosedPeriod.query.order_by(ClosedPeriod.period_start.desc()).all()
+        return jsonify({
+            'success': True,
+            'periods': [{
+                'period': period.period_start.strftime('%Y-%m'),
+                'period_start': period.period_start.isoformat(),
+                'period_end': period.period_end.isoformat(),
+                'transaction_count': period.transaction_count,
+                'unclassified_count': period.unclassified_count,
+                'notes': period.notes,
+                'closed_at': period.closed_at.isoformat() if period.closed_at else None,
+                'closed_by': period.closed_by
+            } for period in periods]
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to load closed periods: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/periods/close', methods=['POST'])
+@login_required
+def close_accounting_period():
+    """
+    Close a finished month: freeze its totals and make its bank transactions read-only
+    
+    POST /cash-flow/api/periods/close
+    
+    Request JSON:
+    {
+        "year": 2026,
+        "month": 9,
+        "notes": "September reconciled"   # Optional
+    }
+    """
+    
+    try:
+        data = request.get_json() or {}
+        if not data.get('year') or not data.get('month'):
+            raise ValueError('year and month are required')
+        
+        period = close_period(int(data['year']), int(data['month']),
+                              closed_by=current_user.id, notes=data.get('notes'))
+        return jsonify({
+            'success': True,
+            'period': period.period_start.strftime('%Y-%m'),
+            'transaction_count': period.transaction_count,
+            'unclassified_count': period.unclassified_count
+        })
+    
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to close period: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/periods/reopen', methods=['POST'])
+@login_required
+def reopen_accounting_period():
+    """
+    Reopen a closed month so its bank transactions can be edited again
+    
+    POST /cash-flow/api/periods/reopen
+    
+    Request JSON: {"year": 2026, "month": 9}
+    """
+    
+    try:
+        data = request.get_json() or {}
+        if not data.get('year') or not data.get('month'):
+            raise ValueError('year and month are required')
+        
+        return jsonify({
+            'success': True,
+            'reopened': reopen_period(int(data['year']), int(data['month']))
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to reopen period: {str(e)}'
+        }), 500
+
+@cash_flow_bp.route('/api/receipts/match', methods=['POST'])
+@login_required
+def match_uploaded_receipts():
+    """
+    Match the OCR'd receipts not linked yet to purchases awaiting a receipt
+    
+    POST /cash-flow/api/receipts/match
+    
+    Request JSON (optional):
+    {
+        "dry_run": true     # Report the matches without marking purchases RECEIVED
+    }
+    
+    Response:
+    {
+        "success": true,
+        "receipts": 120,
+        "matched": 97,
+        "ambiguous": 3,
+        "unmatched": 20,
+        "matches": [{"content_hash": "...", "bank_transaction_id": 812, "score": 0.93}]
+    }
+    """
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        result = match_receipts(dry_run=bool(data.get('dry_run')))
+        return jsonify({'success': True, **result})
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to match receipts: {str(e)}'
+        }), 500
+
 @cash_flow_bp.route('/classification-dashboard')
 @login_required
 def classification_dashboard():
@@ -737,20 +1104,23 @@ def classification_dashboard():
     # Get classification status
     summary = BankTransaction.get_classification_summary()
     
-    # Get unclassified transactions for the table
-    unclassified_transactions = BankTransaction.get_unclassified_transactions(limit=50)
+    # Review queue: highest expected impact first, plus look-alike clusters
+    review_queue = ReviewQueue()
+    unclassified_transactions = review_queue.ranked(limit=50)
     
     # Format for template
     unclassified_list = []
     for t in unclassified_transactions:
         unclassified_list.append({
             'id': t.id,
-            'account': t.account_name,
-            'date': t.transaction_date,
+            'account_name': t.account_name,
+            'transaction_date': t.transaction_date,
             'description': t.description,
             'amount': t.amount,
             'status': t.classification_status,
-            'needs_review': t.needs_review
+            'needs_review': t.needs_review,
+            'review_priority': t.review_priority,
+            'description_signature': t.description_signature
         })
     
     # Get account breakdown
@@ -772,5 +1142,6 @@ def classification_dashboard():
     return render_template('cash_flow/classification_dashboard.html',
                          summary=summary,
                          unclassified_transactions=unclassified_list,
+                         review_clusters=review_queue.clusters(limit=20),
                          account_stats=account_stats,
                          account_mappings=ACCOUNT_MAPPINGS)
\ No newline at end of file
@@ -1,9 +1,12 @@
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, Response
 from flask_login import login_required
 from datetime import datetime, date, timedelta
 from models.transaction import Transaction
 from models.purchase_order import PurchaseOrder
 from database import db
+from services.entity_cube import EntityCube, FLOW_NET, SOURCE_LEDGER
+from services.report_export import XLSX_MIMETYPE, build_export, export_response
+from services.report_snapshots import get_snapshot_store, is_closed, month_period
 import json
 
 from . import reports_bp
@@ -158,15 +161,118 @@ def ai_insights():
 @reports_bp.route('/vendor-analysis')
 @login_required
 def vendor_analysis():
+    period = request.args.get('period', '365')
+    days = int(period) if period.isdigit() else 365
+    today = date.today()
+
+    vendors = []
+    overdue_by_vendor = {}
     try:
-        from models.views import VApOpen
+        vendors = EntityCube().top_n_between(
+            50, SOURCE_LEDGER, today - timedelta(days=days), today,
+            account='payable', flow=FLOW_NET
+        )
+
         from sqlalchemy import func
-        vendor_spending = db.session.query(
-            VApOpen.vendor_customer,
-            func.sum(VApOpen.amount).label('total_amount'),
-            func.count(VApOpen.id).label('transaction_count')
-        ).group_by(VApOpen.vendor_customer).order_by(func.sum(VApOpen.amount).desc()).all()
+        overdue_by_vendor = dict(db.session.query(
+            Transaction.vendor_customer,
+            func.count(Transaction.id)
+        ).filter(
+            Transaction.type == 'payable',
+            Transaction.status == 'pending',
+            Transaction.due_date < today
+        ).group_by(Transaction.vendor_customer).all())
     except Exception:
-        vendor_spending = []
+        vendors = []
+
+    vendor_rows = []
+    for vendor in vendors:
+        overdue_count = overdue_by_vendor.get(vendor['entity'], 0)
+        vendor_rows.append({
+            'name': vendor['entity'],
+            'transaction_count': vendor['transaction_count'],
+            'total_amount': vendor['total_amount'],
+            'avg_transaction': vendor['avg_amount'],
+            'last_payment': vendor['last_date'],
+            'overdue_count': overdue_count
+        })
+
+    total_spent = sum(v['total_amount'] for v in vendor_rows)
+    vendor_stats = {
+        'total_vendors': len(vendor_rows),
+        'total_spent': total_spent,
+        'avg_per_vendor': total_spent / len(vendor_rows) if vendor_rows else 0,
+        'overdue_count': sum(v['overdue_count'] for v in vendor_rows)
+    }
+    vendor_chart_data = {
+        'names': [v['name'] for v in vendor_rows[:10]],
+        'amounts': [v['total_amount'] for v in vendor_rows[:10]]
+    }
+
+    return render_template('reports/vendor_analysis.html',
+                         vendor_analysis=vendor_rows,
+                         vendor_stats=vendor_stats,
+                         vendor_chart_data=vendor_chart_data,
+                         period=str(days))
 
-    return render_template('reports/vendor_analysis.html', vendor_spending=vendor_spending)
\ No newline at end of file
+@reports_bp.route('/export/<report>')
+@login_required
+def export(report):
+    """
+    Stream a report as CSV or XLSX
+    
+    GET /reports/export/account?account=Revenue 4717&year=2025&format=xlsx
+    GET /reports/export/payables?status=pending
+    GET /reports/export/receivables
+    GET /reports/export/aging?type=payable
+    GET /reports/export/vendor-analysis?period=365
+    GET /reports/export/tax-deductible?start_date=2025-01-01&end_date=2025-12-31
+    """
+    try:
+        filename, headers, rows = build_export(report, request.args)
+        return export_response(filename, headers, rows, request.args.get('format', 'csv'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+def _closed_month(period):
+    """Parse a YYYY-MM period that has been closed (services.period_close)"""
+    parsed = datetime.strptime(period, '%Y-%m')
+    start, end = month_period(parsed.year, parsed.month)
+    if not is_closed(start, end):
+        raise ValueError(f'Period {period} has not been closed')
+    return start, end
+
+@reports_bp.route('/api/snapshots/<report>/<period>')
+@login_required
+def snapshot(report, period):
+    """
+    Month-end report for a closed month, served from its snapshot
+    
+    GET /reports/api/snapshots/tax-summary/2025-07
+    (reports: dashboard-summary, tax-summary, aging-payable, aging-receivable, vendor-analysis)
+    """
+    try:
+        start, end = _closed_month(period)
+        return jsonify({
+            'success': True,
+            'period': {'start_date': start.isoformat(), 'end_date': end.isoformat()},
+            'data': get_snapshot_store().get_or_render(report, start, end)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@reports_bp.route('/snapshots/<report>/<period>.xlsx')
+@login_required
+def snapshot_xlsx(report, period):
+    """Stored workbook of a closed month's report snapshot"""
+    try:
+        start, end = _closed_month(period)
+        store = get_snapshot_store()
+        store.get_or_render(report, start, end)
+        workbook = store.xlsx(report, start, end)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if workbook is None:
+        return jsonify({'success': False, 'error': f'{report} has no workbook'}), 404
+    return Response(workbook, mimetype=XLSX_MIMETYPE,
+                    headers={'Content-Disposition': f'attachment; filename="{report}-{period}.xlsx"'})
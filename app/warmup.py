@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Preforked worker warm-up for AciTech Cash Flow Management System
+
+With gunicorn preload_app (gunicorn.conf.py) the app is created once in the
+master. prepare_for_fork() then builds the read-only state every worker
+needs (compiled rule set and regexes, merchant dictionary, ML model,
+compiled Jinja templates, URL map) and freezes it out of the garbage
+collector, so the pages stay copy-on-write shared by all forked workers.
+
+warm_worker() runs in each worker right after the fork: it drops inherited
+DB connections, starts the per-worker background threads (threads do not
+survive a fork; the report snapshot thread renders in one worker only),
+re-queues receipt OCR jobs a previous worker left unfinished and
+replays WARMUP_URLS through the app so the first real request after a
+deploy sees steady-state latency.
+"""
+
+import gc
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _step(name, func):
+    """Run one warm-up step; a failure is logged and never blocks boot"""
+    started = time.perf_counter()
+    try:
+        func()
+        logger.info(f"Warm-up {name}: {(time.perf_counter() - started) * 1000:.0f} ms")
+    except Exception as e:
+        logger.warning(f"Warm-up {name} failed: {e}")
+
+
+def _pooled_engines(db):
+    """Engines whose connections must not cross a fork (an in-memory SQLite DB lives in its connection)"""
+    from app.engine import is_memory_sqlite
+    return [engine for engine in db.engines.values() if not is_memory_sqlite(engine.url)]
+
+
+def _compile_templates(app):
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e:
+            logger.debug(f"Template {name} not precompiled: {e}")
+
+
+def _load_classifier():
+    from services.transaction_classifier import CashFlowClassifier
+    classifier = CashFlowClassifier()   # Rule engine, merchant normalizer and ML model singletons
+    classifier.rule_engine.active()
+    classifier.merchant_normalizer.reload()
+
+
+def prepare_for_fork(app) -> None:
+    """
+    Build shared read-only state in the gunicorn master (preload_app) before forking
+
+    Args:
+        app: Flask application
+    """
+    from database import db
+
+    with app.app_context():
+        _step('url map', app.url_map.update)
+        _step('templates', lambda: _compile_templates(app))
+        if app.config.get('SQLALCHEMY_DATABASE_URI'):
+            _step('classifier', _load_classifier)
+            # Workers must open their own connections
+            for engine in _pooled_engines(db):
+                engine.dispose()
+
+    # Long-lived objects move to the permanent generation: collections in the
+    # workers no longer touch (and copy) their pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Shared state ready for fork ({gc.get_freeze_count()} objects frozen)")
+
+
+def warm_worker(app) -> None:
+    """
+    Per-worker warm-up after fork: fresh pools, background threads, synthetic requests
+
+    Args:
+        app: Flask application
+    """
+    from app.profiling import endpoint_stats
+    from database import db
+    from services import metrics
+
+    if app.config.get('SQLALCHEMY_DATABASE_URI'):
+        with app.app_context():
+            for engine in _pooled_engines(db):
+                # Connections inherited from the master belong to it; never close them from here
+                engine.dispose(close=False)
+        if not app.config.get('TESTING'):
+            # Started in every worker so one can take over when another exits, but only the
+            # worker holding REPORT_SNAPSHOT_LOCK_FILE renders (N workers would race on the same rows)
+            from services.report_snapshots import start_snapshot_worker
+            app.extensions['report_snapshot_worker'] = start_snapshot_worker(app)
+            # Claims receipts left QUEUED, or RUNNING past their lease by a dead worker's OCR pool
+            from services.receipt_ocr import resume_receipt_ocr
+            _step('resume receipt OCR', lambda: resume_receipt_ocr(app))
+
+    client = app.test_client()
+    for url in app.config.get('WARMUP_URLS', ()):
+        def request_url(url=url):
+            status = client.get(url, headers={'X-Warmup': '1'}).status_code
+            if status >= 500:
+                raise RuntimeError(f'status {status}')
+        _step(f'GET {url}', request_url)
+
+    # Synthetic requests must not show up in /metrics or /debug/perf
+    metrics.reset()
+    endpoint_stats.clear()
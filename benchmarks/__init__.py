@@ -0,0 +1,9 @@
+"""
+Performance benchmarks for AciTech Cash Flow Management System
+
+- data_generator: synthetic multi-year bank and AP/AR data seeded from the
+  Revenue 4717 export
+- run_benchmarks: times calculators, services and endpoints against the
+  generated data, writes a JSON baseline and compares runs
+- startup_profile: cold create_app() time and -X importtime breakdown
+"""
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Generator for the AcidTech Benchmarks
+
+Produces realistic multi-year BankTransactions across the four accounts
+plus AP/AR ledger rows:
+
+- Revenue 4717 reuses the descriptions, merchants and amounts of
+  "Acid Tech Revenue-4717-Carga1.csv" (amounts jittered log-normally)
+- Bill Pay 5285, Payroll 4079 and Capital One use description templates
+  matching what their bank exports look like
+- A share of the rows (classified_share) is stored already classified,
+  with the fields the classifier produces for its template, so reports
+  have data and the classification benchmark still has work left
+- Credit card cycle dates are computed with the vectorized cycle rules
+
+Rows are written with executemany inserts in chunks, and the entity cube
+is rebuilt once at the end, so 1M rows load in minutes.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import csv
+import io
+import os
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.transaction import Transaction
+from services.credit_card_cycles import cycle_dates, get_cycle_config
+from services.review_queue import description_signature
+
+SEED_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'Acid Tech Revenue-4717-Carga1.csv')
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+CHUNK_ROWS = 5000
+
+# Share of bank rows per account
+ACCOUNT_MIX = (
+    ('Revenue 4717', 'CHECKING', 0.35),
+    ('Bill Pay 5285', 'CHECKING', 0.25),
+    ('Payroll 4079', 'CHECKING', 0.10),
+    ('Capital One', 'CREDIT_CARD', 0.30),
+)
+
+# (description, typical amount, merchant) per non-revenue account
+TEMPLATES = {
+    'Bill Pay 5285': [
+        ('Transfer from DDA : Transfer CH x4717 to CH x5285', 150000.00, 'Internal Transfer'),
+        ('ACH Debit : HALLIBURTON ENERGY  ACH PMT', -48250.00, 'Halliburton'),
+        ('ACH Debit : BAKER HUGHES CO    ACH PMT', -31500.00, 'Baker Hughes'),
+        ('ACH Debit : SUNBELT RENTALS    ACH PMT', -6450.00, 'Sunbelt Rentals'),
+        ('ACH Debit : UNITED RENTALS     ACH PMT', -5120.00, 'United Rentals'),
+        ('ACH Debit : NAPA AUTO PARTS    ACH PMT', -1840.00, 'NAPA Auto Parts'),
+        ('ACH Debit : CINTAS CORP        ACH PMT', -640.00, 'Cintas'),
+        ('ACH Debit : AT&T PAYMENT       ACH PMT', -980.00, 'AT&T'),
+        ('ACH Debit : TXU ENERGY         ACH PMT', -1320.00, 'TXU Energy'),
+        ('ACH Debit : STATE FARM INS     ACH PMT', -4200.00, 'State Farm'),
+        ('ACH Debit : CAPITAL ONE        ONLINE PMT', -18500.00, 'Capital One'),
+        ('Service Charge : Monthly Maintenance Fee', -45.00, 'Bank Fee'),
+        ('Wire Transfer Fee : Outgoing Wire', -30.00, 'Bank Fee'),
+    ],
+    'Payroll 4079': [
+        ('Transfer from DDA : Transfer CH x4717 to CH x4079', 90000.00, 'Internal Transfer'),
+        ('ACH Debit : ADP PAYROLL FEES   ADP FEES', -380.00, 'ADP'),
+        ('ACH Debit : ADP WAGE PAY       WAGE PAY', -42500.00, 'ADP'),
+        ('ACH Debit : ADP TAX            ADP TAX', -13800.00, 'ADP'),
+        ('ACH Debit : IRS USATAXPYMT     TAX PMT', -9650.00, 'IRS'),
+        ('ACH Debit : TEXAS WORKFORCE    TWC TAX', -720.00, 'Texas Workforce Commission'),
+        ('ACH Debit : BCBS OF TEXAS      PREMIUM', -6100.00, 'Blue Cross Blue Shield'),
+    ],
+    'Capital One': [
+        ('SHELL OIL 57444 MIDLAND TX', -142.35, 'Shell'),
+        ('EXXONMOBIL 4471 ODESSA TX', -118.60, 'ExxonMobil'),
+        ('CHEVRON 0203 PECOS TX', -131.20, 'Chevron'),
+        ('LOVES TRAVEL STOP #612', -156.80, "Love's Travel Stop"),
+        ('THE HOME DEPOT #6584', -412.75, 'The Home Depot'),
+        ('LOWES #01234', -268.40, "Lowe's"),
+        ('AMAZON MKTPLACE PMTS AMZN.COM/BILL', -86.99, 'Amazon'),
+        ('NORTHERN TOOL + EQUIP', -329.00, 'Northern Tool'),
+        ('GRAINGER 921 ODESSA', -512.10, 'Grainger'),
+        ('WHATABURGER #775', -38.45, 'Whataburger'),
+        ('OLIVE GARDEN 1432', -96.30, 'Olive Garden'),
+        ('LA QUINTA INN MIDLAND', -189.00, 'La Quinta'),
+        ('SOUTHWEST AIRLINES 5262', -312.40, 'Southwest Airlines'),
+        ('MICROSOFT*365 BUSINESS', -66.00, 'Microsoft'),
+        ('CAPITAL ONE ONLINE PYMT - THANK YOU', 18500.00, 'Capital One'),
+    ],
+}
+
+AP_VENDORS = ('Halliburton', 'Baker Hughes', 'Sunbelt Rentals', 'United Rentals', 'NAPA Auto Parts', 'Cintas',
+              'Grainger', 'Northern Tool', 'Permian Water Services', 'Basin Trucking LLC', 'Dixie Electric',
+              'Pioneer Wireline')
+NET_TERMS = ((15, 'NET15'), (30, 'NET30'), (45, 'NET45'))
+CLASSIFICATION_FIELDS = (
+    'category', 'accounting_class', 'transaction_subtype', 'business_category', 'gl_account_code',
+    'is_internal_transfer', 'source_account', 'target_account', 'transfer_reference', 'is_credit_card_transaction',
+    'is_credit_card_payment', 'merchant_name', 'merchant_category', 'is_tax_deductible', 'tax_category',
+    'requires_receipt', 'receipt_status', 'is_classified', 'classification_confidence', 'classification_method',
+    'needs_review', 'rule_set_version', 'classification_rule_id'
+)
+
+
+CARD_FIELDS = ('credit_card_cycle_date', 'credit_card_due_date')
+
+
+def _row_defaults() -> Dict:
+    """Column defaults of the optional bank fields (executemany needs every row to carry the same keys)"""
+    defaults = {}
+    for field in CLASSIFICATION_FIELDS + CARD_FIELDS:
+        default = BankTransaction.__table__.c[field].default
+        defaults[field] = default.arg if default is not None and default.is_scalar else None
+    return defaults
+
+
+def parse_amount(raw: str) -> float:
+    """Amount from the bank export ("1,234.50", "-150,000.00" or "(12.00)")"""
+    raw = raw.replace(',', '').replace('$', '').strip()
+    if raw.startswith('(') and raw.endswith(')'):
+        return -float(raw[1:-1])
+    return float(raw)
+
+
+def load_revenue_templates(csv_path: str = SEED_CSV) -> List[Tuple[str, float, str]]:
+    """(description, amount, merchant) rows of the Revenue 4717 export"""
+    templates = []
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            row = {(k or '').strip(): (v or '').strip() for k, v in row.items()}
+            try:
+                amount = parse_amount(row['AMOUNT'])
+            except (KeyError, ValueError):
+                continue
+            if amount and row.get('DESCRIPTION'):
+                templates.append((row['DESCRIPTION'], amount, row.get('MERCHANT') or None))
+    return templates
+
+
+def _template_classifications(templates: Dict[str, List[Tuple[str, float, str]]]) -> Dict[Tuple[str, int], Dict]:
+    """Classifier output per (account, template index), computed once per template"""
+    from services.transaction_classifier import CashFlowClassifier
+
+    classifier = CashFlowClassifier()
+    classified = {}
+    with redirect_stdout(io.StringIO()):
+        for account, rows in templates.items():
+            for index, (description, amount, merchant) in enumerate(rows):
+                transient = BankTransaction(
+                    account_name=account, account_type='CHECKING', transaction_date=date.today(),
+                    description=description, amount=amount, transaction_type='CREDIT' if amount > 0 else 'DEBIT',
+                    merchant_name=merchant
+                )
+                updates = classifier.classify_transaction(transient)['classification_updates']
+                classified[(account, index)] = {field: updates[field] for field in CLASSIFICATION_FIELDS
+                                                if field in updates}
+    return classified
+
+
+def _bank_rows(rng: np.random.Generator, account: str, account_type: str, count: int,
+               templates: List[Tuple[str, float, str]], classifications: Dict[Tuple[str, int], Dict],
+               start: date, days: int, classified_share: float, batch_id: str) -> Iterator[Dict]:
+    picks = rng.integers(0, len(templates), count)
+    base = np.array([templates[i][1] for i in picks])
+    amounts = np.round(base * rng.lognormal(0.0, 0.25, count), 2)
+    offsets = rng.integers(0, days, count)
+    dates = np.datetime64(start) + offsets.astype('timedelta64[D]')
+    classified = rng.random(count) < classified_share
+
+    cycles = None
+    if account_type == 'CREDIT_CARD':
+        cycles = cycle_dates(dates, get_cycle_config(account))
+
+    defaults = _row_defaults()
+    for i in range(count):
+        description, _, merchant = templates[picks[i]]
+        amount = float(amounts[i]) or 0.01
+        row = dict(defaults)
+        row.update({
+            'account_name': account,
+            'account_type': account_type,
+            'transaction_date': dates[i].astype(date),
+            'description': description,
+            'amount': amount,
+            'transaction_type': 'CREDIT' if amount > 0 else 'DEBIT',
+            'merchant_name': merchant,
+            'description_signature': description_signature(description),
+            'import_batch_id': batch_id
+        })
+        if classified[i]:
+            row.update(classifications.get((account, int(picks[i])), {}))
+            row['needs_review'] = False
+        if cycles is not None:
+            row['is_credit_card_transaction'] = True
+            row['credit_card_cycle_date'] = cycles['cycle_cut_date'][i].astype(date)
+            row['credit_card_due_date'] = cycles['due_date'][i].astype(date)
+        yield row
+
+
+def _ledger_rows(rng: np.random.Generator, count: int, customers: List[str], start: date, days: int,
+                 user_id: int) -> Iterator[Dict]:
+    today = date.today()
+    for i in range(count):
+        receivable = i % 2 == 0
+        issue_date = start + timedelta(days=int(rng.integers(0, days)))
+        net_days, net_terms = NET_TERMS[int(rng.integers(0, len(NET_TERMS)))]
+        due_date = issue_date + timedelta(days=net_days)
+        if due_date < today - timedelta(days=30) and rng.random() < 0.9:
+            status = 'paid'
+        else:
+            status = 'overdue' if due_date < today else 'pending'
+        names = customers if receivable else AP_VENDORS
+        vendor = names[int(rng.integers(0, len(names)))]
+        amount = round(float(rng.lognormal(8.5 if receivable else 7.5, 0.9)), 2)
+        yield {
+            'type': 'receivable' if receivable else 'payable',
+            'vendor_customer': vendor,
+            'amount': amount,
+            'issue_date': issue_date,
+            'due_date': due_date,
+            'net_terms': net_terms,
+            'status': status,
+            'paid_date': due_date if status == 'paid' else None,
+            'paid_amount': amount if status == 'paid' else None,
+            'invoice_number': f"{'INV' if receivable else 'BILL'}-{i + 1:07d}",
+            'description': f'Synthetic {"invoice" if receivable else "bill"} {i + 1}',
+            'created_by': user_id
+        }
+
+
+def _insert_chunks(model, rows: Iterator[Dict], chunk_rows: int = CHUNK_ROWS) -> int:
+    table = model.__table__
+    total = 0
+    chunk: List[Dict] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            db.session.execute(insert(table), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(table), chunk)
+        total += len(chunk)
+    db.session.commit()
+    return total
+
+
+def generate(bank_rows: int, years: int = 3, seed: int = 4717, classified_share: float = 0.8,
+             ledger_ratio: float = 0.05, user_id: Optional[int] = None, csv_path: str = SEED_CSV) -> Dict:
+    """
+    Write synthetic bank transactions and AP/AR entries (commits)
+
+    Args:
+        bank_rows: Number of BankTransactions across the four accounts
+        years: History length ending yesterday
+        seed: Random seed (same seed and size give the same data)
+        classified_share: Share of bank rows stored already classified
+        ledger_ratio: AP/AR rows per bank row
+        user_id: created_by for the ledger rows
+        csv_path: Revenue 4717 export used as the revenue templates
+
+    Returns:
+        Dict with row counts, date range and elapsed seconds
+    """
+    from services.entity_cube import EntityCube
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=365 * years)
+    days = (end - start).days + 1
+
+    templates = dict(TEMPLATES)
+    templates['Revenue 4717'] = load_revenue_templates(csv_path)
+    classifications = _template_classifications(templates)
+    customers = sorted({merchant for _, amount, merchant in templates['Revenue 4717'] if merchant and amount > 0})
+
+    batch_id = f'bench-{seed}-{bank_rows}'
+    counts = {}
+    remaining = bank_rows
+    for index, (account, account_type, share) in enumerate(ACCOUNT_MIX):
+        count = remaining if index == len(ACCOUNT_MIX) - 1 else int(bank_rows * share)
+        remaining -= count
+        counts[account] = _insert_chunks(BankTransaction, _bank_rows(
+            rng, account, account_type, count, templates[account], classifications, start, days,
+            classified_share, batch_id
+        ))
+
+    ledger = _insert_chunks(Transaction, _ledger_rows(
+        rng, max(int(bank_rows * ledger_ratio), 2), customers or ['Synthetic Customer'], start, days,
+        user_id or 1
+    ))
+    EntityCube().rebuild()
+
+    return {
+        'bank_transactions': counts,
+        'ledger_entries': ledger,
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'seed': seed,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Receipt Extraction Evaluation for AcidTech Cash Flow Application
+Runs services.receipt_extraction over a labelled receipt set and reports,
+per field, how often the chosen value is right and how well the confidence
+separates right from wrong answers
+
+The default set is tests/fixtures/receipts: one .txt (OCR output) per
+receipt plus expected.json mapping file name -> expected fields (null when
+the receipt has no such field). Image receipts can be added next to their
+labels; they go through Tesseract.
+
+Usage:
+    python benchmarks/receipt_extraction_eval.py [--dir tests/fixtures/receipts] [--workers 4]
+        [--threshold 0.5] [--min-accuracy 0.9] [--json]
+
+--min-accuracy exits with status 1 when any field scores below it.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.receipt_extraction import FIELDS, extract_directory  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures', 'receipts')
+
+
+def _matches(field, actual, expected):
+    if expected is None or actual is None:
+        return actual is None and expected is None
+    if field == 'amount':
+        return abs(float(actual) - float(expected)) < 0.005
+    return str(actual).strip().lower() == str(expected).strip().lower()
+
+
+def evaluate(directory=FIXTURES, workers=None, threshold=0.5):
+    """
+    Score the extractor against directory/expected.json
+
+    Args:
+        directory: Folder with the receipts and expected.json
+        workers: Process pool size for extract_directory (1 runs inline)
+        threshold: Confidence at which a value would be written back
+
+    Returns:
+        Dict with per-field accuracy, accepted (confidence >= threshold)
+        count and precision, the misses and the elapsed time
+    """
+    with open(os.path.join(directory, 'expected.json')) as f:
+        expected = json.load(f)
+
+    started = time.perf_counter()
+    results = {result['file']: result for result in extract_directory(directory, workers=workers)}
+    elapsed = time.perf_counter() - started
+
+    fields = {}
+    misses = []
+    for field in FIELDS:
+        correct = accepted = accepted_correct = 0
+        for name, labels in expected.items():
+            result = results.get(name) or {}
+            actual = result.get(field)
+            confidence = (result.get('confidence') or {}).get(field, 0.0)
+            ok = _matches(field, actual, labels.get(field))
+            correct += ok
+            if actual is not None and confidence >= threshold:
+                accepted += 1
+                accepted_correct += ok
+            if not ok:
+                misses.append({'file': name, 'field': field, 'expected': labels.get(field),
+                               'actual': actual, 'confidence': confidence})
+        fields[field] = {
+            'accuracy': round(correct / len(expected), 3) if expected else 0.0,
+            'accepted': accepted,
+            'precision': round(accepted_correct / accepted, 3) if accepted else None,
+        }
+
+    return {'receipts': len(expected), 'seconds': round(elapsed, 3), 'threshold': threshold,
+            'fields': fields, 'misses': misses}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate receipt field extraction on labelled receipts')
+    parser.add_argument('--dir', default=FIXTURES, help='Receipts folder with expected.json')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (1 = inline)')
+    parser.add_argument('--threshold', type=float, default=0.5, help='Write-back confidence threshold')
+    parser.add_argument('--min-accuracy', type=float, default=None, help='Fail below this per-field accuracy')
+    parser.add_argument('--json', action='store_true', help='Print the raw report')
+    args = parser.parse_args(argv)
+
+    report = evaluate(args.dir, args.workers, args.threshold)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['receipts']} receipts in {report['seconds'] * 1000:.0f} ms "
+              f"(write-back threshold {report['threshold']})")
+        print(f"{'field':<16}{'accuracy':>10}{'accepted':>10}{'precision':>11}")
+        for field, stats in report['fields'].items():
+            precision = '-' if stats['precision'] is None else f"{stats['precision']:.3f}"
+            print(f"{field:<16}{stats['accuracy']:>10.3f}{stats['accepted']:>10}{precision:>11}")
+        for miss in report['misses']:
+            print(f"  miss {miss['file']} {miss['field']}: expected {miss['expected']!r}, "
+                  f"got {miss['actual']!r} ({miss['confidence']:.2f})")
+
+    if args.min_accuracy is not None and any(
+            stats['accuracy'] < args.min_accuracy for stats in report['fields'].values()):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for AcidTech Cash Flow Application
+Times cold app startup, CashFlowCalculator methods, reporting services,
+classification and the dashboard/report/classification endpoints against
+synthetic data, and writes a JSON baseline that later runs are compared with
+
+Usage:
+    python benchmarks/run_benchmarks.py run --size 10k [--output baseline.json] [--compare baseline.json]
+    python benchmarks/run_benchmarks.py run --database sqlite:///instance/app.db
+    python benchmarks/run_benchmarks.py compare baseline.json current.json [--threshold 0.2]
+
+The generated database is kept in benchmarks/results/bench-<size>.db and
+reused by later runs (--regenerate rebuilds it). compare exits with
+status 1 when a benchmark regressed.
+
+--database never changes the database it is given: a SQLite file is
+copied and the copy is benchmarked; other databases are refused unless
+--allow-writes accepts the side effects of the endpoints (snapshot and
+cube maintenance). Requests log in as an existing user, and the
+classification benchmark (which commits) only runs on a copy.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime
+
+# Add the project root to Python path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_THRESHOLD = 0.20    # Flag runs more than 20% slower than the baseline
+MIN_DELTA_MS = 2.0          # Ignore slowdowns smaller than this (timer noise)
+
+ACCOUNTS = ('Revenue 4717', 'Bill Pay 5285', 'Payroll 4079', 'Capital One')
+
+ENDPOINTS = [
+    '/cash-flow/api/dashboard/summary',
+    '/cash-flow/api/dashboard/kpis',
+    '/cash-flow/api/dashboard/transfers',
+    '/cash-flow/api/dashboard/credit-card',
+    '/cash-flow/api/dashboard/credit-card/statements',
+    '/cash-flow/api/dashboard/tax-summary',
+    '/cash-flow/api/dashboard/tax-summary/export?format=csv',
+    '/cash-flow/api/summary',
+    '/cash-flow/api/chart-data',
+    '/cash-flow/api/monthly-chart?year={year}',
+    '/cash-flow/api/classification/status',
+    '/cash-flow/api/classification/review-queue',
+    '/cash-flow/api/classification/rules',
+    '/cash-flow/account/Revenue 4717?year={year}',
+    '/reports/api/cash-flow-chart',
+    '/reports/aging?type=payable',
+    '/reports/aging?type=receivable',
+    '/reports/vendor-analysis',
+    '/reports/export/payables?format=csv',
+    '/reports/export/receivables?format=csv',
+    '/reports/export/aging?type=receivable&format=csv',
+    '/reports/export/vendor-analysis?format=csv',
+    '/reports/export/tax-deductible?format=csv',
+    '/reports/export/account?account=Revenue 4717&format=csv',
+] + [f'/cash-flow/api/dashboard/account/{account}' for account in ACCOUNTS]
+
+
+def _service_benchmarks(start, end):
+    """(name, callable) pairs run inside the app context"""
+    from services.ap_ar_summary import get_ap_ar_kpis
+    from services.cash_flow_calculator import CashFlowCalculator
+    from services.credit_card_cycles import statement_summary
+    from services.entity_cube import EntityCube, SOURCE_BANK, SOURCE_LEDGER
+    from services.review_queue import ReviewQueue
+
+    calculator = CashFlowCalculator()
+    benchmarks = [
+        ('calculator.get_dashboard_summary', lambda: calculator.get_dashboard_summary()),
+        ('calculator.get_dashboard_summary[all]', lambda: calculator.get_dashboard_summary(start, end)),
+        ('calculator.get_transfer_reconciliation', calculator.get_transfer_reconciliation),
+        ('calculator.get_credit_card_summary', lambda: calculator.get_credit_card_summary()),
+        ('calculator.get_tax_summary[all]', lambda: calculator.get_tax_summary(start, end)),
+        ('credit_card_cycles.statement_summary', lambda: statement_summary()),
+        ('ap_ar_summary.get_ap_ar_kpis', lambda: get_ap_ar_kpis()),
+        ('entity_cube.top_n[bank]', lambda: EntityCube().top_n(25, SOURCE_BANK)),
+        ('entity_cube.top_n[payable]', lambda: EntityCube().top_n(25, SOURCE_LEDGER, account='payable')),
+        ('review_queue.ranked', lambda: ReviewQueue().ranked(50)),
+        ('review_queue.clusters', lambda: ReviewQueue().clusters(20)),
+    ]
+    for account in ACCOUNTS:
+        benchmarks.append((f'calculator.get_account_summary[{account}][all]',
+                           lambda account=account: calculator.get_account_summary(account, start, end)))
+    return benchmarks
+
+
+def _time(func, repeat):
+    """Median/min/max milliseconds and query count of ``repeat`` calls (after one warm-up)"""
+    from app.profiling import profile_queries
+
+    func()
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with profile_queries(keep_slowest=0) as profile:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = profile.query_count
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': queries
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _create_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ['REPORT_SNAPSHOT_INTERVAL'] = '0'
+
+    import logging
+    from app import create_app
+
+    app = create_app('development')
+    # Pages failing to render are recorded with their status instead of aborting the run
+    app.config.update(SQL_QUERY_BUDGET_STRICT=False, SQL_PROFILE_LOG=False, PROPAGATE_EXCEPTIONS=False)
+    logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+def _existing_user():
+    """Login for requests against a real database: an existing user, nothing is created"""
+    from models.user import User
+
+    user = User.query.order_by(User.id).first()
+    if user is None:
+        raise SystemExit('❌ The database has no user to run the endpoints as')
+    return user
+
+
+def _benchmark_copy(database_url):
+    """
+    Copy of a SQLite database file under RESULTS_DIR, so a run never writes to the original
+
+    Returns:
+        (URL of the copy, path of the copy), or (None, None) for other databases
+    """
+    from sqlalchemy.engine import make_url
+
+    url = make_url(database_url)
+    if url.get_backend_name() != 'sqlite':
+        return None, None
+    if not url.database or url.database == ':memory:' or not os.path.exists(url.database):
+        raise SystemExit(f'❌ SQLite database file not found: {url.database}')
+    copy_path = os.path.join(RESULTS_DIR, f'copy-{os.getpid()}-{os.path.basename(url.database)}')
+    # The backup API includes pages still in the WAL; the original is opened read-only
+    source = sqlite3.connect(f'file:{os.path.abspath(url.database)}?mode=ro', uri=True)
+    target = sqlite3.connect(copy_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return f'sqlite:///{copy_path}', copy_path
+
+
+def _ensure_user():
+    from database import db
+    from models.user import User
+
+    user = User.query.filter_by(username='benchmark').first()
+    if user is None:
+        user = User(username='benchmark', email='benchmark@acidtech.com', first_name='Bench', last_name='Mark')
+        user.set_password('benchmark-password-1')
+        db.session.add(user)
+        db.session.commit()
+    return user
+
+
+def _describe_database():
+    """Date range and row counts of an existing database"""
+    from sqlalchemy import func
+    from database import db
+    from models.bank_transaction import BankTransaction
+    from models.transaction import Transaction
+
+    first, last, count = db.session.query(
+        func.min(BankTransaction.transaction_date), func.max(BankTransaction.transaction_date),
+        func.count(BankTransaction.id)
+    ).one()
+    if not count:
+        raise SystemExit('❌ The database has no bank transactions to benchmark')
+    return {
+        'bank_transactions': count,
+        'ledger_entries': db.session.query(func.count(Transaction.id)).scalar(),
+        'start_date': first.isoformat(),
+        'end_date': last.isoformat()
+    }
+
+
+def run(args):
+    from benchmarks.data_generator import SIZES
+
+    rows = SIZES.get(args.size.lower()) or int(args.size)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    db_path = os.path.join(RESULTS_DIR, f'bench-{args.size.lower()}.db')
+    meta_path = f'{db_path}.json'
+    if args.regenerate:
+        for path in (db_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    database_url, copy_path = f'sqlite:///{db_path}', None
+    if args.database:
+        database_url, copy_path = _benchmark_copy(args.database)
+        if database_url is None:
+            if not args.allow_writes:
+                raise SystemExit('❌ --database only copies SQLite files; benchmarking another database '
+                                 'writes to it (snapshots, cube), pass --allow-writes to accept that')
+            database_url = args.database
+        print(f"🗄️  Benchmarking {'a copy of ' if copy_path else ''}{args.database}")
+
+    try:
+        return _run(args, rows, database_url, meta_path, live=bool(args.database) and copy_path is None)
+    finally:
+        if copy_path and os.path.exists(copy_path):
+            os.remove(copy_path)
+
+
+def _run(args, rows, database_url, meta_path, live):
+    from benchmarks.data_generator import generate
+
+    app = _create_app(database_url)
+    with app.app_context():
+        from database import db
+        user = _existing_user() if args.database else _ensure_user()
+
+        if args.database:
+            dataset = _describe_database()
+        elif os.path.exists(meta_path):
+            with open(meta_path) as f:
+                dataset = json.load(f)
+        else:
+            print(f"🏗️  Generating {rows:,} bank transactions (seed {args.seed})...")
+            dataset = generate(rows, years=args.years, seed=args.seed, user_id=user.id)
+            with open(meta_path, 'w') as f:
+                json.dump(dataset, f, indent=2)
+            print(f"✅ Data generated in {dataset['seconds']}s")
+
+        start = date.fromisoformat(dataset['start_date'])
+        end = date.fromisoformat(dataset['end_date'])
+        results = {}
+
+        print("⏱️  Startup")
+        from benchmarks.startup_profile import measure
+        results['startup.create_app[cold]'] = {'median_ms': round(measure('testing', args.repeat), 2), 'queries': 0}
+        print(f"   {'create_app() in a fresh interpreter':60} {results['startup.create_app[cold]']['median_ms']:>10.1f} ms")
+
+        print("⏱️  Services")
+        for name, func in _service_benchmarks(start, end):
+            results[name] = _time(func, args.repeat)
+            db.session.rollback()
+            print(f"   {name:60} {results[name]['median_ms']:>10.1f} ms  {results[name]['queries']:>4} queries")
+
+        print("⏱️  Endpoints")
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        for template in ENDPOINTS:
+            url = template.format(year=end.year)
+            status = {}
+
+            def request_url():
+                response = client.get(url)
+                response.get_data()     # Drain streamed exports
+                status['code'] = response.status_code
+                status['queries'] = int(response.headers.get('X-DB-Query-Count', 0))
+
+            # The request replaces the block profile with its own; its count comes back in a header
+            results[f'GET {template}'] = dict(_time(request_url, args.repeat), status=status['code'],
+                                              queries=status['queries'])
+            entry = results[f'GET {template}']
+            print(f"   {template:60} {entry['median_ms']:>10.1f} ms  {entry['queries']:>4} queries  [{entry['status']}]")
+
+        print("⏱️  Classification")
+        if live:
+            # force_reclassify commits: it would overwrite the real classifications
+            print("   skipped on a live database")
+        else:
+            from services.transaction_classifier import CashFlowClassifier
+            classifier = CashFlowClassifier()
+            with redirect_stdout(io.StringIO()):
+                entry = _time(lambda: classifier.classify_all_transactions(limit=args.classify_rows,
+                                                                           force_reclassify=True),
+                              max(1, args.repeat // 2))
+            entry['rows_per_sec'] = round(args.classify_rows / (entry['median_ms'] / 1000), 1) if entry['median_ms'] else None
+            results[f'classifier.classify_all_transactions[{args.classify_rows}]'] = entry
+            print(f"   {args.classify_rows} transactions: {entry['median_ms']:.1f} ms ({entry['rows_per_sec']} rows/s)")
+
+    report = {
+        'meta': {
+            'size': args.size,
+            'dataset': dataset,
+            'repeat': args.repeat,
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database_url.split('://')[0],
+            'created_at': datetime.utcnow().isoformat()
+        },
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'benchmark-{args.size.lower()}-{datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            return print_comparison(compare(json.load(f), report, args.threshold))
+    return 0
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta_ms=MIN_DELTA_MS):
+    """
+    Benchmarks slower than the baseline by more than ``threshold`` (ratio)
+    and ``min_delta_ms``, or running more queries
+
+    Returns:
+        Dict with regressions, improvements, missing and new benchmark names
+    """
+    before, after = baseline['results'], current['results']
+    report = {'regressions': [], 'improvements': [], 'missing': sorted(set(before) - set(after)),
+              'new': sorted(set(after) - set(before))}
+
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name], after[name]
+        if old.get('status', 200) != 200 or new.get('status', 200) != 200:
+            continue
+        delta = new['median_ms'] - old['median_ms']
+        ratio = new['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        entry = {'name': name, 'baseline_ms': old['median_ms'], 'current_ms': new['median_ms'],
+                 'change': round(ratio - 1, 3), 'baseline_queries': old['queries'], 'current_queries': new['queries']}
+        if (ratio > 1 + threshold and delta > min_delta_ms) or new['queries'] > old['queries']:
+            report['regressions'].append(entry)
+        elif ratio < 1 - threshold and -delta > min_delta_ms:
+            report['improvements'].append(entry)
+    return report
+
+
+def print_comparison(report):
+    for entry in report['regressions']:
+        print(f"❌ {entry['name']}: {entry['baseline_ms']:.1f} → {entry['current_ms']:.1f} ms "
+              f"({entry['change']:+.0%}), queries {entry['baseline_queries']} → {entry['current_queries']}")
+    for entry in report['improvements']:
+        print(f"✅ {entry['name']}: {entry['baseline_ms']:.1f} → {entry['current_ms']:.1f} ms ({entry['change']:+.0%})")
+    for name in report['missing']:
+        print(f"⚠️  Missing from this run: {name}")
+    print(f"📊 {len(report['regressions'])} regressions, {len(report['improvements'])} improvements")
+    return 1 if report['regressions'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AcidTech performance benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Generate data (once) and time every benchmark')
+    run_parser.add_argument('--size', default='10k', help='10k, 100k, 1m or a row count')
+    run_parser.add_argument('--years', type=int, default=3)
+    run_parser.add_argument('--seed', type=int, default=4717)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--classify-rows', type=int, default=2000)
+    run_parser.add_argument('--database', help='Benchmark an existing database URL instead of generating one '
+                                               '(SQLite files are copied first)')
+    run_parser.add_argument('--allow-writes', action='store_true',
+                            help='Allow --database to point at a non-SQLite database the endpoints may write to')
+    run_parser.add_argument('--regenerate', action='store_true')
+    run_parser.add_argument('--output')
+    run_parser.add_argument('--compare', help='Baseline JSON to compare the new results with')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return print_comparison(compare(baseline, current, args.threshold))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Startup Profile for AcidTech Cash Flow Application
+Measures a cold create_app() in a fresh interpreter (what every gunicorn
+worker boot and Azure App Service restart pays) and breaks the import time
+down by module using ``python -X importtime``
+
+Usage:
+    python benchmarks/startup_profile.py [--config testing] [--top 25] [--repeat 5] [--strict]
+
+--strict exits with status 1 when one of the DEFERRED modules (OCR, Azure
+SDK, pandas, NumPy, openpyxl, alembic) is loaded at startup again.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that must only load on first use
+DEFERRED = ('numpy', 'pandas', 'openpyxl', 'alembic', 'azure', 'pytesseract', 'PIL')
+
+_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from app import create_app
+create_app({config!r})
+print(json.dumps({{'create_app_ms': (time.perf_counter() - started) * 1000, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def _parse_importtime(stderr):
+    """(name, self_us, cumulative_us, depth) for every 'import time:' line"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def cold_start(config='testing', importtime=False):
+    """
+    One create_app() in a fresh interpreter
+
+    Returns:
+        Dict with create_app_ms, import_ms, loaded DEFERRED modules and
+        (with importtime) the per-module import entries
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', _SNIPPET.format(root=ROOT, config=config)]
+    # config.py reads the production settings at import time
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'startup-profile')
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    completed = subprocess.run(command, capture_output=True, text=True, env=env, cwd=ROOT)
+    if completed.returncode != 0:
+        raise RuntimeError(f'create_app({config!r}) failed:\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    modules = result.pop('modules')
+    result['deferred_loaded'] = sorted({name.split('.')[0] for name in modules} & set(DEFERRED))
+    if importtime:
+        entries = _parse_importtime(completed.stderr)
+        result['import_ms'] = sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000
+        result['imports'] = entries
+    return result
+
+
+def measure(config='testing', repeat=5):
+    """Median cold create_app() time over ``repeat`` fresh interpreters (ms)"""
+    return statistics.median(cold_start(config)['create_app_ms'] for _ in range(repeat))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold start profile of create_app()')
+    parser.add_argument('--config', default='testing')
+    parser.add_argument('--top', type=int, default=25, help='Slowest top-level imports to list')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Write the profile to this file')
+    parser.add_argument('--strict', action='store_true', help='Fail when a deferred module loads at startup')
+    args = parser.parse_args(argv)
+
+    profile = cold_start(args.config, importtime=True)
+    profile['create_app_median_ms'] = measure(args.config, args.repeat)
+
+    print(f"🚀 create_app('{args.config}'): {profile['create_app_median_ms']:.0f} ms median of {args.repeat} "
+          f"cold starts ({profile['import_ms']:.0f} ms in imports)")
+    print(f"📦 Slowest top-level imports (cumulative):")
+    top_level = sorted((entry for entry in profile['imports'] if entry[3] == 0), key=lambda entry: -entry[2])
+    for name, _, cumulative, _ in top_level[:args.top]:
+        print(f"   {name:50} {cumulative / 1000:>8.1f} ms")
+
+    if profile['deferred_loaded']:
+        print(f"⚠️  Loaded at startup but should be deferred: {', '.join(profile['deferred_loaded'])}")
+    else:
+        print(f"✅ None of {', '.join(DEFERRED)} loaded at startup")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(profile, f, indent=2)
+        print(f"💾 Profile written to {args.json}")
+    return 1 if args.strict and profile['deferred_loaded'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
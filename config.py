@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -24,12 +25,88 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
 
+    # Perfil de engine por dialecto (app/engine.py): pool según workers/threads de gunicorn,
+    # fast_executemany con pyodbc y WAL en SQLite. Los DB_POOL_* sobreescriben el perfil.
+    DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'true').lower() == 'true'
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '1'))
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS')) if os.getenv('DB_MAX_CONNECTIONS') else None
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE')) if os.getenv('DB_POOL_SIZE') else None
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW')) if os.getenv('DB_MAX_OVERFLOW') else None
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE')) if os.getenv('DB_POOL_RECYCLE') else None
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT')) if os.getenv('DB_POOL_TIMEOUT') else None
+    # Loguear checkouts del pool que esperan más que esto (ms)
+    DB_SLOW_CHECKOUT_MS = float(os.getenv('DB_SLOW_CHECKOUT_MS', '100'))
+
+    # Réplica de solo lectura para reportes (bind 'reporting'); sin ella todo lee de la primaria
+    REPORTING_DATABASE_URL = os.getenv('REPORTING_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'reporting': REPORTING_DATABASE_URL} if REPORTING_DATABASE_URL else {}
+    READ_REPLICA_BLUEPRINTS = ('reports', 'cash_flow')
+    READ_REPLICA_HEALTH_INTERVAL = float(os.getenv('READ_REPLICA_HEALTH_INTERVAL', '30'))
+
     UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
+    # Almacen de archivos por contenido (utils/file_store.py): 'local' (UPLOAD_FOLDER) o 'azure'
+    FILE_STORAGE_BACKEND = os.getenv('FILE_STORAGE_BACKEND', 'local')
+    AZURE_STORAGE_CONTAINER = os.getenv('AZURE_STORAGE_CONTAINER', 'uploads')
+    # Tamaño máximo de las copias locales de archivos remotos (.staging/cache, se recorta por LRU)
+    FILE_CACHE_MAX_BYTES = int(os.getenv('FILE_CACHE_MAX_MB', '512')) * 1024 * 1024
+    # Transferencias a Blob Storage: bloques de 4 MB, bloques en paralelo por archivo e hilos por lote
+    AZURE_STORAGE_BLOCK_SIZE = int(os.getenv('AZURE_STORAGE_BLOCK_SIZE', str(4 * 1024 * 1024)))
+    AZURE_STORAGE_MAX_CONCURRENCY = int(os.getenv('AZURE_STORAGE_MAX_CONCURRENCY', '4'))
+    AZURE_STORAGE_TRANSFER_WORKERS = int(os.getenv('AZURE_STORAGE_TRANSFER_WORKERS', '8'))
+    AZURE_STORAGE_PAGE_SIZE = int(os.getenv('AZURE_STORAGE_PAGE_SIZE', '1000'))
+    # Carpeta local que reemplaza a Azure en desarrollo (sin AZURE_STORAGE_CONNECTION_STRING)
+    AZURE_STORAGE_LOCAL_ROOT = os.getenv('AZURE_STORAGE_LOCAL_ROOT')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
 
     # Monitoreo / flags
     SHOW_DB_WARNING = os.getenv('SHOW_DB_WARNING', 'false').lower() == 'true'
 
+    # Clasificador ML local (entrenado con clasificaciones manuales)
+    ML_MODEL_DIR = os.getenv('ML_MODEL_DIR', os.path.join(basedir, 'instance', 'ml_classifier'))
+    ML_CONFIDENCE_THRESHOLD = float(os.getenv('ML_CONFIDENCE_THRESHOLD', '0.80'))
+
+    # Snapshots de reportes de periodos cerrados (segundos entre corridas; 0 desactiva el worker)
+    REPORT_SNAPSHOT_INTERVAL = int(os.getenv('REPORT_SNAPSHOT_INTERVAL', '0'))
+    REPORT_SNAPSHOT_MONTHS = int(os.getenv('REPORT_SNAPSHOT_MONTHS', '12'))
+    # Lock que deja el worker de snapshots en un solo proceso del host (los demás esperan su turno)
+    REPORT_SNAPSHOT_LOCK_FILE = os.getenv('REPORT_SNAPSHOT_LOCK_FILE',
+                                          os.path.join(tempfile.gettempdir(), 'acidtech-report-snapshots.lock'))
+
+    # gunicorn.conf.py con preload_app: el master precarga estado compartido y cada worker
+    # arranca sus hilos y se calienta con estas URLs tras el fork (app/warmup.py)
+    GUNICORN_PRELOAD = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+    WARMUP_URLS = tuple(url for url in os.getenv(
+        'WARMUP_URLS', '/health,/cash-flow/api/dashboard/summary,/cash-flow/api/dashboard/kpis'
+    ).split(',') if url)
+
+    # Perfilado SQL por request (app/profiling.py): headers en dev, página /debug/perf y log JSON en prod
+    SQL_PROFILING = os.getenv('SQL_PROFILING', 'true').lower() == 'true'
+    SQL_PROFILE_HEADERS = False
+    SQL_PROFILE_DEBUG_PAGE = False
+    SQL_PROFILE_LOG = os.getenv('SQL_PROFILE_LOG', 'false').lower() == 'true'
+    SQL_PROFILE_SLOWEST = int(os.getenv('SQL_PROFILE_SLOWEST', '5'))
+    # Exceder el presupuesto de queries de un endpoint lanza QueryBudgetExceeded (tests) en vez de loguear
+    SQL_QUERY_BUDGET_STRICT = False
+
+    # Métricas en formato Prometheus en /metrics (token opcional; directorio compartido entre workers de gunicorn)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '10'))
+
+    # OCR de recibos subidos en AP/AR (services/receipt_ocr.py): pool de procesos acotado
+    OCR_ENABLED = os.getenv('OCR_ENABLED', 'true').lower() == 'true'
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', '2'))
+    OCR_MAX_IMAGE_SIDE = int(os.getenv('OCR_MAX_IMAGE_SIDE', '2000'))
+    # Confianza minima (0..1) para guardar un campo extraido (services/receipt_extraction.py)
+    OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', '0.5'))
+    # Segundos tras los que otro worker puede retomar un trabajo RUNNING (su worker murio)
+    OCR_CLAIM_TIMEOUT = float(os.getenv('OCR_CLAIM_TIMEOUT', '600'))
+    # Emparejamiento recibo -> compra con tarjeta/Bill Pay (services/receipt_matcher.py)
+    RECEIPT_MATCH_WINDOW_DAYS = int(os.getenv('RECEIPT_MATCH_WINDOW_DAYS', '3'))
+    RECEIPT_MATCH_MIN_SCORE = float(os.getenv('RECEIPT_MATCH_MIN_SCORE', '0.5'))
+
     TEMP_UPLOAD_PATH = os.getenv('TEMP_UPLOAD_PATH', '/tmp' if os.name != 'nt' else os.path.join(basedir, 'temp'))
 
     # Azure
@@ -53,6 +130,8 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    SQL_PROFILE_HEADERS = True
+    SQL_PROFILE_DEBUG_PAGE = True
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     SQLALCHEMY_DATABASE_URI = _database_uri or ('sqlite:///' + os.path.join(basedir, 'app.db'))
     SESSION_COOKIE_SECURE = False
@@ -63,13 +142,17 @@ class TestingConfig(Config):
     TESTING = True
     SECRET_KEY = 'testing-secret'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_BINDS = {}
     WTF_CSRF_ENABLED = False
     SESSION_COOKIE_SECURE = False
     REMEMBER_COOKIE_SECURE = False
+    SQL_PROFILE_HEADERS = True
+    SQL_QUERY_BUDGET_STRICT = True
 
 
 class ProductionConfig(Config):
     DEBUG = False
+    SQL_PROFILE_LOG = os.getenv('SQL_PROFILE_LOG', 'true').lower() == 'true'
 
     # En producción, ambos son obligatorios
     SECRET_KEY = os.environ['SECRET_KEY']
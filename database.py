@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 
-# Initialize SQLAlchemy
-db = SQLAlchemy()
+from services.read_routing import RoutingSession
+
+# Initialize SQLAlchemy (reporting reads can be routed to a read-only bind)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def init_app(app):
     """Initialize database with Flask app"""
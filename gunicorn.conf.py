@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Gunicorn configuration for AciTech Cash Flow Management System
+
+preload_app creates the Flask app once in the master; when_ready builds the
+shared read-only state before any worker is forked (copy-on-write) and
+post_fork warms each worker up before it accepts traffic (app/warmup.py).
+
+Environment:
+- PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS, GUNICORN_TIMEOUT
+- GUNICORN_PRELOAD=false to load the app in every worker instead
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '600'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+wsgi_app = 'wsgi:app'
+
+# create_app() reads this to leave background threads to the workers
+os.environ['GUNICORN_PRELOAD'] = 'true' if preload_app else 'false'
+
+
+def when_ready(server):
+    if preload_app:
+        from app.warmup import prepare_for_fork
+        from wsgi import app
+        prepare_for_fork(app)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.warmup import warm_worker
+        from wsgi import app
+        warm_worker(app)
@@ -0,0 +1,27 @@
+-- ===================================================================
+-- MIGRATION: DECLARATIVE CLASSIFICATION RULE SETS
+-- Date: 2026-10-19
+-- Purpose: Versioned JSON/YAML rule sets compiled by
+--          services/rule_engine.py into the classifier decision table
+-- Impact: New table only; the built-in default rules apply until a
+--         rule set is saved
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS classification_rule_sets (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL UNIQUE,        -- Monotonic rule set version
+    name VARCHAR(100) NOT NULL,
+    format VARCHAR(10) NOT NULL DEFAULT 'json',  -- "json" or "yaml"
+    definition TEXT NOT NULL,               -- Rule set document as authored
+    is_active BOOLEAN DEFAULT 0,
+    notes TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    created_by INTEGER REFERENCES user(id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_classification_rule_sets_is_active
+ON classification_rule_sets(is_active);
+
+COMMIT;
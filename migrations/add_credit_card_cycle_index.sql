@@ -0,0 +1,14 @@
+-- ===================================================================
+-- MIGRATION: CREDIT CARD CYCLE INDEX
+-- Date: 2026-10-19
+-- Purpose: Let the credit card summary aggregate a bounded window of
+--          statement cycles with one index range scan
+-- Impact: Adds one composite index to bank_transactions
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE INDEX IF NOT EXISTS idx_bank_transactions_card_cycle
+ON bank_transactions(is_credit_card_transaction, credit_card_cycle_date);
+
+COMMIT;
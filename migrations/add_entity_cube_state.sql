@@ -0,0 +1,23 @@
+-- ===================================================================
+-- MIGRATION: ENTITY CUBE STATE
+-- Date: 2026-10-19
+-- Purpose: Shared staleness marker for the entity analytics cube, so
+--          every worker knows when the cells cannot be trusted
+--          (services/entity_cube.py falls back to the source rows)
+-- Impact: New single-row table, created stale; run
+--         python rebuild_entity_cube.py after applying (deploy step)
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS entity_cube_state (
+    id INTEGER PRIMARY KEY,               -- Always 1
+    generation INTEGER NOT NULL DEFAULT 0,        -- Bumped by writes the cube could not follow
+    built_generation INTEGER NOT NULL DEFAULT 0,  -- Generation the cells were last rebuilt at
+    built_at DATETIME
+);
+
+-- Existing cells predate the marker: stale until rebuild_entity_cube.py runs
+INSERT INTO entity_cube_state (id, generation, built_generation) VALUES (1, 1, 0);
+
+COMMIT;
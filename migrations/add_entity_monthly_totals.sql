@@ -0,0 +1,30 @@
+-- ===================================================================
+-- MIGRATION: ENTITY ANALYTICS CUBE
+-- Date: 2026-10-19
+-- Purpose: Precomputed per-entity monthly totals for top-N vendor,
+--          customer and merchant analytics (services/entity_cube.py)
+-- Impact: New table only; populated by rebuild_entity_cube.py (deploy step)
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS entity_monthly_totals (
+    id INTEGER PRIMARY KEY,
+    source VARCHAR(20) NOT NULL,          -- "BANK" or "LEDGER"
+    account VARCHAR(100) NOT NULL,        -- Bank account name or ledger type
+    entity VARCHAR(200) NOT NULL,         -- Merchant / vendor / customer
+    month DATE NOT NULL,                  -- First day of the month
+    flow VARCHAR(3) NOT NULL,             -- "IN" / "OUT"
+    total_amount NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    min_amount NUMERIC(15, 2),
+    max_amount NUMERIC(15, 2),
+    last_date DATE,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_entity_monthly_totals_cell UNIQUE (source, account, entity, month, flow)
+);
+
+CREATE INDEX IF NOT EXISTS idx_entity_monthly_totals_account_month
+ON entity_monthly_totals(source, account, month);
+
+COMMIT;
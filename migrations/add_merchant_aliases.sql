@@ -0,0 +1,24 @@
+-- ===================================================================
+-- MIGRATION: MERCHANT ALIAS DICTIONARY
+-- Date: 2026-10-19
+-- Purpose: Normalized bank descriptor -> canonical merchant name
+--          lookup used by services/merchant_normalizer.py
+-- Impact: New table only; seed with seed_merchant_aliases.py
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS merchant_aliases (
+    id INTEGER PRIMARY KEY,
+    alias_key VARCHAR(200) NOT NULL UNIQUE,   -- Normalized descriptor
+    canonical_name VARCHAR(200) NOT NULL,     -- Clean merchant name
+    source VARCHAR(20) DEFAULT 'IMPORTED',    -- "IMPORTED", "MANUAL"
+    occurrences INTEGER DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_merchant_aliases_canonical_name
+ON merchant_aliases(canonical_name);
+
+COMMIT;
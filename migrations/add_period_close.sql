@@ -0,0 +1,35 @@
+-- ===================================================================
+-- MIGRATION: PERIOD CLOSE
+-- Date: 2026-10-19
+-- Purpose: Closed accounting months and their frozen per-account /
+--          per-category totals (services/period_close.py)
+-- Impact: New tables only; no changes to existing data
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS closed_periods (
+    id INTEGER PRIMARY KEY,
+    period_start DATE NOT NULL UNIQUE,
+    period_end DATE NOT NULL,
+    transaction_count INTEGER DEFAULT 0,
+    unclassified_count INTEGER DEFAULT 0,
+    notes TEXT,
+    closed_at DATETIME,
+    closed_by INTEGER REFERENCES user(id)
+);
+
+CREATE TABLE IF NOT EXISTS period_totals (
+    id INTEGER PRIMARY KEY,
+    period_start DATE NOT NULL,
+    account_name VARCHAR(100) NOT NULL,
+    business_category VARCHAR(100),
+    inflow NUMERIC(15, 2) DEFAULT 0,
+    outflow NUMERIC(15, 2) DEFAULT 0,
+    transaction_count INTEGER DEFAULT 0,
+    CONSTRAINT uq_period_totals_cell UNIQUE (period_start, account_name, business_category)
+);
+
+CREATE INDEX IF NOT EXISTS ix_period_totals_period_start ON period_totals (period_start);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- ===================================================================
+-- MIGRATION: RECEIPT MATCHING
+-- Date: 2026-10-19
+-- Purpose: Link OCR'd receipts to the purchases they document
+--          (services/receipt_matcher.py)
+-- Impact: Two nullable columns and one index on receipt_ocr_results
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+ALTER TABLE receipt_ocr_results ADD COLUMN bank_transaction_id INTEGER REFERENCES bank_transactions(id);
+ALTER TABLE receipt_ocr_results ADD COLUMN match_score FLOAT;
+
+CREATE INDEX IF NOT EXISTS ix_receipt_ocr_results_bank_transaction_id
+ON receipt_ocr_results(bank_transaction_id);
+
+COMMIT;
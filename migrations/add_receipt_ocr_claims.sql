@@ -0,0 +1,14 @@
+-- ===================================================================
+-- MIGRATION: RECEIPT OCR CLAIMS
+-- Date: 2026-10-19
+-- Purpose: Let exactly one worker run each queued OCR job
+--          (services/receipt_ocr.py claims rows before dispatching)
+-- Impact: Two nullable columns on receipt_ocr_results
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+ALTER TABLE receipt_ocr_results ADD COLUMN claimed_by VARCHAR(100);
+ALTER TABLE receipt_ocr_results ADD COLUMN claimed_at TIMESTAMP;
+
+COMMIT;
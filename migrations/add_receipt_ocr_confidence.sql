@@ -0,0 +1,13 @@
+-- ===================================================================
+-- MIGRATION: RECEIPT OCR CONFIDENCE
+-- Date: 2026-10-19
+-- Purpose: Store the extraction confidence of OCR results
+--          (services/receipt_extraction.py)
+-- Impact: One nullable column on receipt_ocr_results
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+ALTER TABLE receipt_ocr_results ADD COLUMN confidence FLOAT;
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- ===================================================================
+-- MIGRATION: RECEIPT OCR RESULTS
+-- Date: 2026-10-19
+-- Purpose: Cache OCR output by receipt content hash and link AP/AR
+--          transactions to it (services/receipt_ocr.py)
+-- Impact: New table plus one indexed column on transaction
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS receipt_ocr_results (
+    id INTEGER PRIMARY KEY,
+    content_hash VARCHAR(64) NOT NULL UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'QUEUED',
+    file_path VARCHAR(500),
+    text TEXT,
+    invoice_number VARCHAR(50),
+    amount NUMERIC(15, 2),
+    receipt_date DATE,
+    vendor VARCHAR(200),
+    error TEXT,
+    ocr_seconds FLOAT,
+    created_at DATETIME,
+    processed_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_receipt_ocr_results_content_hash
+ON receipt_ocr_results(content_hash);
+
+ALTER TABLE "transaction" ADD COLUMN receipt_hash VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS ix_transaction_receipt_hash
+ON "transaction"(receipt_hash);
+
+COMMIT;
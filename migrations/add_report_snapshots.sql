@@ -0,0 +1,24 @@
+-- ===================================================================
+-- MIGRATION: REPORT SNAPSHOTS
+-- Date: 2026-10-19
+-- Purpose: Store prerendered month-end reports for closed periods
+--          (services/report_snapshots.py)
+-- Impact: New table only; no changes to existing data
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS report_snapshots (
+    id INTEGER PRIMARY KEY,
+    report VARCHAR(50) NOT NULL,
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    payload TEXT NOT NULL,
+    xlsx BLOB,
+    render_seconds FLOAT,
+    created_at DATETIME,
+    CONSTRAINT uq_report_snapshots_period UNIQUE (report, period_start, period_end)
+);
+
+COMMIT;
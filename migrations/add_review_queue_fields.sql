@@ -0,0 +1,28 @@
+-- ===================================================================
+-- MIGRATION: CLASSIFICATION REVIEW QUEUE
+-- Date: 2026-10-19
+-- Purpose: Rank the review queue by (1 - confidence) * |amount| and
+--          cluster it by description signature (services/review_queue.py)
+-- Impact: Adds two indexed columns to bank_transactions
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+ALTER TABLE bank_transactions ADD COLUMN review_priority NUMERIC(15, 2);
+ALTER TABLE bank_transactions ADD COLUMN description_signature VARCHAR(100);
+
+CREATE INDEX IF NOT EXISTS ix_bank_transactions_review_priority
+ON bank_transactions(review_priority);
+
+CREATE INDEX IF NOT EXISTS ix_bank_transactions_description_signature
+ON bank_transactions(description_signature);
+
+-- Priority for rows already awaiting review; NULL keeps a row out of the queue
+UPDATE bank_transactions
+SET review_priority = ROUND((1 - COALESCE(classification_confidence, 0)) * ABS(amount), 2)
+WHERE is_classified = 0 OR is_classified IS NULL OR needs_review = 1;
+
+COMMIT;
+
+-- description_signature is computed in Python; populate it after migrating with:
+--   ReviewQueue().backfill()
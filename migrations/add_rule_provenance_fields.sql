@@ -0,0 +1,24 @@
+-- ===================================================================
+-- MIGRATION: CLASSIFICATION RULE PROVENANCE
+-- Date: 2026-10-19
+-- Purpose: Record the rule set version and rule id each transaction was
+--          classified with, so a rule change only reclassifies the rows
+--          it can affect (RuleEngine.reclassification_filter)
+-- Impact: Adds two indexed columns to bank_transactions
+-- ===================================================================
+
+BEGIN TRANSACTION;
+
+ALTER TABLE bank_transactions ADD COLUMN rule_set_version INTEGER;
+ALTER TABLE bank_transactions ADD COLUMN classification_rule_id VARCHAR(100);
+
+CREATE INDEX IF NOT EXISTS ix_bank_transactions_rule_set_version
+ON bank_transactions(rule_set_version);
+
+CREATE INDEX IF NOT EXISTS ix_bank_transactions_classification_rule_id
+ON bank_transactions(classification_rule_id);
+
+COMMIT;
+
+-- Existing rows keep a NULL rule_set_version and are re-evaluated by the
+-- first rule change (or a full classify_all_transactions(force_reclassify=True)).
@@ -6,6 +6,12 @@ from .bank_transaction import BankTransaction
 from .payroll import PayrollEntry
 from .views import VCashflowDaily, VApOpen, VArOpen, VPoSummary
 from .inventory import InventoryItem
+from .entity_cube import EntityCubeState, EntityMonthlyTotal
+from .merchant_alias import MerchantAlias
+from .classification_rule_set import ClassificationRuleSet
+from .report_snapshot import ReportSnapshot
+from .period_close import ClosedPeriod, PeriodTotal
+from .receipt_ocr import ReceiptOcrResult
 
 __all__ = [
     'User',
@@ -18,4 +24,12 @@ __all__ = [
     'VApOpen',
     'VArOpen',
     'VPoSummary',
+    'EntityMonthlyTotal',
+    'EntityCubeState',
+    'MerchantAlias',
+    'ClassificationRuleSet',
+    'ReportSnapshot',
+    'ClosedPeriod',
+    'PeriodTotal',
+    'ReceiptOcrResult',
 ]
\ No newline at end of file
@@ -7,6 +7,10 @@ class BankTransaction(db.Model):
     These are completed transactions that already happened (not projections)
     """
     __tablename__ = 'bank_transactions'
+    __table_args__ = (
+        # Credit card summary: one range scan per card history window (CashFlowCalculator.get_credit_card_summary)
+        db.Index('idx_bank_transactions_card_cycle', 'is_credit_card_transaction', 'credit_card_cycle_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -63,6 +67,14 @@ class BankTransaction(db.Model):
     needs_review = db.Column(db.Boolean, default=False)
     review_notes = db.Column(db.Text)
     
+    # Review Queue (maintained by services.review_queue)
+    review_priority = db.Column(db.Numeric(15, 2), index=True)    # (1 - confidence) * |amount|; NULL when not awaiting review
+    description_signature = db.Column(db.String(100), index=True)  # Cluster key for look-alike descriptions
+    
+    # Rule Provenance (maintained by services.transaction_classifier)
+    rule_set_version = db.Column(db.Integer, index=True)           # classification_rule_sets.version used (0 = built-in default)
+    classification_rule_id = db.Column(db.String(100), index=True)  # Rule that matched; NULL when none did
+    
     # Enhanced Reconciliation
     is_reconciled = db.Column(db.Boolean, default=False)
     reconciliation_date = db.Column(db.Date)
@@ -118,41 +130,12 @@ class BankTransaction(db.Model):
             return "CLASSIFIED"
     
     def get_credit_card_cycle_info(self):
-        """Get credit card cycle information for Capital One (cuts on 11th)"""
+        """Get credit card cycle information (Capital One cuts on 11th, see services.credit_card_cycles)"""
         if not self.is_capital_one:
             return None
-            
-        from datetime import date, timedelta
         
-        # Capital One cuts on 11th of each month
-        current_date = self.transaction_date
-        
-        # Determine cycle cut date for this transaction
-        if current_date.day >= 11:
-            # This month's cycle
-            cycle_cut = date(current_date.year, current_date.month, 11)
-            # Next cycle cut
-            if current_date.month == 12:
-                next_cycle = date(current_date.year + 1, 1, 11)
-            else:
-                next_cycle = date(current_date.year, current_date.month + 1, 11)
-        else:
-            # Previous month's cycle
-            if current_date.month == 1:
-                cycle_cut = date(current_date.year - 1, 12, 11)
-            else:
-                cycle_cut = date(current_date.year, current_date.month - 1, 11)
-            next_cycle = date(current_date.year, current_date.month, 11)
-        
-        # Due date is typically ~25 days after cycle cut
-        due_date = cycle_cut + timedelta(days=25)
-        
-        return {
-            'cycle_cut_date': cycle_cut,
-            'due_date': due_date,
-            'next_cycle_cut': next_cycle,
-            'days_until_due': (due_date - current_date).days if due_date > current_date else 0
-        }
+        from services.credit_card_cycles import cycle_info, get_cycle_config
+        return cycle_info(self.transaction_date, get_cycle_config(self.account_name))
     
     def auto_classify_by_rules(self):
         """Auto-classify transaction based on business rules"""
@@ -265,10 +248,10 @@ class BankTransaction(db.Model):
     
     @classmethod
     def get_unclassified_transactions(cls, limit=None):
-        """Get transactions that need classification"""
+        """Get transactions that need classification, highest review priority first"""
         query = cls.query.filter(
-            (cls.is_classified == False) | (cls.needs_review == True)
-        ).order_by(cls.transaction_date.desc())
+            cls.review_priority != None
+        ).order_by(cls.review_priority.desc())
         
         if limit:
             query = query.limit(limit)
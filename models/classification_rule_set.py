@@ -0,0 +1,23 @@
+from datetime import datetime
+from database import db
+
+class ClassificationRuleSet(db.Model):
+    """
+    Versioned classification rule sets - declarative rules compiled by services.rule_engine
+    Only one version is active at a time; older versions are kept for audit and rollback
+    """
+    __tablename__ = 'classification_rule_sets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, unique=True)  # Monotonic, referenced by BankTransaction.rule_set_version
+    name = db.Column(db.String(100), nullable=False)
+    format = db.Column(db.String(10), nullable=False, default='json')  # "json" or "yaml"
+    definition = db.Column(db.Text, nullable=False)  # Rule set document as authored
+    is_active = db.Column(db.Boolean, default=False, index=True)
+    notes = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    def __repr__(self):
+        return f'<ClassificationRuleSet v{self.version} {self.name}{" (active)" if self.is_active else ""}>'
@@ -0,0 +1,59 @@
+from datetime import datetime
+from sqlalchemy import DDL, event
+from database import db
+
+class EntityMonthlyTotal(db.Model):
+    """
+    Entity analytics cube - precomputed totals per (entity, account, month, flow)
+    Maintained incrementally by services.entity_cube from Transaction and BankTransaction
+    """
+    __tablename__ = 'entity_monthly_totals'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Cube key
+    source = db.Column(db.String(20), nullable=False)    # "BANK" (BankTransaction) or "LEDGER" (AR/AP Transaction)
+    account = db.Column(db.String(100), nullable=False)  # Bank account name or ledger type ("payable", "receivable")
+    entity = db.Column(db.String(200), nullable=False)   # Merchant / vendor / customer name
+    month = db.Column(db.Date, nullable=False)           # First day of the month
+    flow = db.Column(db.String(3), nullable=False)       # "IN" for positive amounts, "OUT" for negative
+
+    # Measures (amounts are stored as magnitudes, direction lives in flow)
+    total_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    min_amount = db.Column(db.Numeric(15, 2))
+    max_amount = db.Column(db.Numeric(15, 2))
+    last_date = db.Column(db.Date)                       # Most recent transaction in the cell
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('source', 'account', 'entity', 'month', 'flow', name='uq_entity_monthly_totals_cell'),
+        db.Index('idx_entity_monthly_totals_account_month', 'source', 'account', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<EntityMonthlyTotal {self.account} {self.entity} {self.month}: ${self.total_amount}>'
+
+    @property
+    def avg_amount(self):
+        """Average transaction amount in the cell"""
+        return self.total_amount / self.transaction_count if self.transaction_count else 0
+
+
+class EntityCubeState(db.Model):
+    """
+    Single row telling every worker whether the entity cube can be trusted
+    The cube is current while built_generation == generation; writes the cube could not follow bump generation
+    """
+    __tablename__ = 'entity_cube_state'
+
+    id = db.Column(db.Integer, primary_key=True)                 # Always 1
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    built_generation = db.Column(db.Integer, nullable=False, default=0)
+    built_at = db.Column(db.DateTime)
+
+
+# A freshly created schema has an empty cube over empty tables, which is current
+event.listen(EntityCubeState.__table__, 'after_create',
+             DDL('INSERT INTO entity_cube_state (id, generation, built_generation) VALUES (1, 0, 0)'))
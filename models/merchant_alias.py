@@ -0,0 +1,22 @@
+from datetime import datetime
+from database import db
+
+class MerchantAlias(db.Model):
+    """
+    Merchant alias dictionary - maps a normalized bank descriptor to its canonical merchant name
+    Used by services.merchant_normalizer to resolve BankTransaction.merchant_name
+    """
+    __tablename__ = 'merchant_aliases'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    alias_key = db.Column(db.String(200), nullable=False, unique=True)  # Normalized descriptor, e.g. "NORTHERN CO LL"
+    canonical_name = db.Column(db.String(200), nullable=False, index=True)  # Clean merchant name, e.g. "Northern & Co LLC"
+    source = db.Column(db.String(20), default='IMPORTED')  # "IMPORTED", "MANUAL"
+    occurrences = db.Column(db.Integer, default=0)  # Rows that backed this alias when it was imported
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MerchantAlias {self.alias_key} -> {self.canonical_name}>'
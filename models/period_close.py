@@ -0,0 +1,43 @@
+from datetime import datetime
+from database import db
+
+class ClosedPeriod(db.Model):
+    """
+    Closed accounting months - bank transactions dated in a closed month are read-only
+    Closing freezes the month's aggregates into PeriodTotal (see services.period_close)
+    """
+    __tablename__ = 'closed_periods'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.Date, nullable=False, unique=True)  # First day of the month
+    period_end = db.Column(db.Date, nullable=False)                 # Last day of the month
+    transaction_count = db.Column(db.Integer, default=0)            # Classified rows frozen at close
+    unclassified_count = db.Column(db.Integer, default=0)           # Rows left out of the frozen totals
+    notes = db.Column(db.Text)
+
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    def __repr__(self):
+        return f'<ClosedPeriod {self.period_start:%Y-%m}>'
+
+
+class PeriodTotal(db.Model):
+    """
+    Frozen per-account/per-category totals of classified bank transactions for a closed month
+    """
+    __tablename__ = 'period_totals'
+    __table_args__ = (
+        db.UniqueConstraint('period_start', 'account_name', 'business_category', name='uq_period_totals_cell'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.Date, nullable=False, index=True)  # ClosedPeriod.period_start
+    account_name = db.Column(db.String(100), nullable=False)
+    business_category = db.Column(db.String(100))                  # NULL for classified rows without a category
+    inflow = db.Column(db.Numeric(15, 2), default=0)               # Sum of positive amounts
+    outflow = db.Column(db.Numeric(15, 2), default=0)              # Sum of |negative amounts|
+    transaction_count = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<PeriodTotal {self.period_start:%Y-%m} {self.account_name} {self.business_category}>'
@@ -0,0 +1,51 @@
+from datetime import datetime
+from database import db
+
+class ReceiptOcrResult(db.Model):
+    """
+    OCR output of one receipt file, keyed by the SHA-256 of its content - maintained by services.receipt_ocr
+    Re-uploading the same file reuses the stored result instead of running Tesseract again
+    """
+    __tablename__ = 'receipt_ocr_results'
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    status = db.Column(db.String(20), nullable=False, default='QUEUED')  # "QUEUED", "RUNNING", "DONE", "FAILED"
+    file_path = db.Column(db.String(500))                               # Last uploaded copy of the file
+    claimed_by = db.Column(db.String(100))                              # host:pid of the worker running the job
+    claimed_at = db.Column(db.DateTime)                                 # Lease start; expired leases are claimed again
+
+    # Extracted fields
+    text = db.Column(db.Text)
+    invoice_number = db.Column(db.String(50))
+    amount = db.Column(db.Numeric(15, 2))
+    receipt_date = db.Column(db.Date)
+    vendor = db.Column(db.String(200))
+    confidence = db.Column(db.Float)                                    # Lowest extraction confidence among the kept fields
+
+    # Purchase the receipt was matched to (services.receipt_matcher)
+    bank_transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transactions.id'), index=True)
+    match_score = db.Column(db.Float)
+
+    error = db.Column(db.Text)
+    ocr_seconds = db.Column(db.Float)                                   # Preprocessing + Tesseract time in the worker
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'content_hash': self.content_hash,
+            'status': self.status,
+            'invoice_number': self.invoice_number,
+            'amount': float(self.amount) if self.amount is not None else None,
+            'receipt_date': self.receipt_date.isoformat() if self.receipt_date else None,
+            'vendor': self.vendor,
+            'confidence': self.confidence,
+            'bank_transaction_id': self.bank_transaction_id,
+            'match_score': self.match_score,
+            'error': self.error,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ReceiptOcrResult {self.content_hash[:12]} {self.status}>'
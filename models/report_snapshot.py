@@ -0,0 +1,26 @@
+from datetime import datetime
+from database import db
+
+class ReportSnapshot(db.Model):
+    """
+    Prerendered report for a closed period - maintained by services.report_snapshots
+    A snapshot is served only while its fingerprint matches the period's source data
+    """
+    __tablename__ = 'report_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('report', 'period_start', 'period_end', name='uq_report_snapshots_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    report = db.Column(db.String(50), nullable=False)      # "dashboard-summary", "tax-summary", "aging-payable", ...
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of the period's source row counts/sums/timestamps
+    payload = db.Column(db.Text, nullable=False)            # Report JSON as returned by the API
+    xlsx = db.Column(db.LargeBinary)                        # Optional workbook of the report rows
+    render_seconds = db.Column(db.Float)                    # Time the live computation took
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReportSnapshot {self.report} {self.period_start}..{self.period_end}>'
@@ -38,6 +38,7 @@ class Transaction(db.Model):
     receipt_path = db.Column(db.String(255))
     invoice_path = db.Column(db.String(255))
     contract_path = db.Column(db.String(255))
+    receipt_hash = db.Column(db.String(64), index=True)  # SHA-256 of the receipt file (receipt_ocr_results.content_hash)
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
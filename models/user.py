@@ -15,6 +15,10 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Prerender Report Snapshots for AcidTech Cash Flow Application
+Renders month-end report snapshots for the last closed months (the same
+job the background SnapshotWorker runs); suitable for a cron entry
+
+Usage:
+    python prerender_reports.py [months] [report ...]
+"""
+
+import os
+import sys
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def prerender_reports(months, reports):
+    from app import create_app
+    from services.report_snapshots import get_snapshot_store
+
+    app = create_app()
+
+    with app.app_context():
+        stats = get_snapshot_store().prerender_closed_periods(months, reports or None)
+        print(f"✅ Report snapshots for the last {months} closed months")
+        print(f"   rendered: {stats['rendered']}, already current: {stats['current']}, failed: {stats['failed']}")
+
+
+if __name__ == '__main__':
+    prerender_reports(int(sys.argv[1]) if len(sys.argv) > 1 else 12, sys.argv[2:])
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Rebuild the Entity Analytics Cube for AcidTech Cash Flow Application
+Recomputes every cube cell from the bank and ledger rows; run as a deploy
+step after migrations/add_entity_cube_state.sql (or any bulk import) so
+reports read the cube instead of falling back to the source rows
+
+Usage:
+    python rebuild_entity_cube.py
+"""
+
+import os
+import sys
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def rebuild_entity_cube():
+    from app import create_app
+    from services.entity_cube import EntityCube
+
+    app = create_app()
+
+    with app.app_context():
+        cells = EntityCube().rebuild()
+        print(f"✅ Entity cube rebuilt: {cells} cells")
+
+
+if __name__ == '__main__':
+    rebuild_entity_cube()
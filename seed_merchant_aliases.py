@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Seed the Merchant Alias Dictionary for AcidTech Cash Flow Application
+Builds merchant_aliases from a bank export that has a clean MERCHANT column
+
+Usage:
+    python seed_merchant_aliases.py [path/to/export.csv]
+
+Defaults to the bundled "Acid Tech Revenue-4717-Carga1.csv" export.
+"""
+
+import os
+import sys
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Acid Tech Revenue-4717-Carga1.csv')
+
+
+def seed_merchant_aliases(csv_path):
+    from app import create_app
+    from database import db
+    from services.merchant_normalizer import get_merchant_normalizer
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+
+        normalizer = get_merchant_normalizer()
+        stats = normalizer.seed_from_csv(csv_path)
+        print(f"✅ Merchant aliases seeded from {os.path.basename(csv_path)}")
+        print(f"   created: {stats['created']}, updated: {stats['updated']}, manual kept: {stats['skipped']}")
+
+
+if __name__ == '__main__':
+    seed_merchant_aliases(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV)
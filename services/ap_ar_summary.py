@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Accounts Payable / Receivable KPI Service
+
+Computes the AP and AR index page KPIs for both ledgers in a single
+conditional-aggregation query and caches the result by data version.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+from datetime import date
+from typing import Dict, Optional
+
+from sqlalchemy import and_, case, func
+
+from database import db
+from models.transaction import Transaction
+from services.data_version import VersionedCache
+
+LEDGER_TYPES = ('payable', 'receivable')
+
+_kpi_cache = VersionedCache(max_age=30, name='ap_ar_kpis')
+
+
+def _empty_kpis() -> Dict:
+    return {
+        'total_outstanding': 0,
+        'total_ytd': 0,
+        'paid_count': 0,
+        'year_count': 0,
+        'pending_count': 0
+    }
+
+
+def _query_ap_ar_kpis(year: int) -> Dict[str, Dict]:
+    """Run the combined KPI query for both ledgers"""
+
+    in_year = and_(
+        Transaction.due_date >= date(year, 1, 1),
+        Transaction.due_date <= date(year, 12, 31)
+    )
+    pending = Transaction.status == 'pending'
+
+    rows = db.session.query(
+        Transaction.type,
+        func.sum(case((pending, Transaction.amount), else_=0)).label('total_outstanding'),
+        func.sum(case((in_year, Transaction.amount), else_=0)).label('total_ytd'),
+        func.sum(case((and_(in_year, Transaction.status == 'paid'), 1), else_=0)).label('paid_count'),
+        func.sum(case((in_year, 1), else_=0)).label('year_count'),
+        func.sum(case((pending, 1), else_=0)).label('pending_count')
+    ).filter(
+        Transaction.type.in_(LEDGER_TYPES)
+    ).group_by(Transaction.type).all()
+
+    kpis = {ledger: _empty_kpis() for ledger in LEDGER_TYPES}
+    for row in rows:
+        kpis[row.type] = {
+            'total_outstanding': row.total_outstanding or 0,
+            'total_ytd': row.total_ytd or 0,
+            'paid_count': int(row.paid_count or 0),
+            'year_count': int(row.year_count or 0),
+            'pending_count': int(row.pending_count or 0)
+        }
+
+    return kpis
+
+
+def get_ap_ar_kpis(year: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    Get AP and AR KPIs in one round trip
+
+    Args:
+        year: Due-date year used for the YTD figures (defaults to current year)
+
+    Returns:
+        Dict keyed by ledger type ('payable', 'receivable') with
+        total_outstanding, total_ytd, paid_count, year_count and pending_count
+    """
+
+    if year is None:
+        year = date.today().year
+
+    return _kpi_cache.get_or_compute(
+        ('ap_ar_kpis', year),
+        (Transaction.__tablename__,),
+        lambda: _query_ap_ar_kpis(year)
+    )
@@ -12,11 +12,12 @@ Date: 2025-08-08
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import func, and_, or_
-from calendar import monthrange
+from sqlalchemy import func, and_, or_, case
 
 from database import db
 from models.bank_transaction import BankTransaction
+from services.credit_card_cycles import cycle_info
+from services.period_close import period_totals
 
 class CashFlowCalculator:
     """
@@ -76,38 +77,39 @@ class CashFlowCalculator:
         if not end_date:
             end_date = date.today()
         
-        # Base query with date filters
-        base_query = BankTransaction.query.filter(
-            BankTransaction.transaction_date >= start_date,
-            BankTransaction.transaction_date <= end_date,
-            BankTransaction.is_classified == True
-        )
+        summary = self.get_period_summary(start_date, end_date)
+        summary.update(self.get_live_summary(start_date, end_date))
+        return summary
+
+    def get_period_summary(self, start_date: date, end_date: date) -> Dict:
+        """
+        Dashboard sections computed only from bank transactions dated in the
+        period: KPIs and account summaries (what closed-month snapshots store)
+        
+        Returns:
+            Dict with period, kpis and account_summaries
+        """
         
+        # Category totals: frozen rows for closed months, live grouping for the rest
+        inflow = {}
+        outflow = {}
+        for row in period_totals(start_date, end_date):
+            category = row['business_category']
+            inflow[category] = inflow.get(category, Decimal('0')) + row['inflow']
+            outflow[category] = outflow.get(category, Decimal('0')) + row['outflow']
+
+        def net(category):
+            return round(inflow.get(category, Decimal('0')) - outflow.get(category, Decimal('0')), 2)
+
+        def gross(category):
+            return round(inflow.get(category, Decimal('0')) + outflow.get(category, Decimal('0')), 2)
+
         # Calculate primary KPIs
-        revenue_total = base_query.filter(
-            BankTransaction.business_category == 'REVENUE'
-        ).with_entities(func.sum(BankTransaction.amount)).scalar()
-        revenue_total = Decimal(str(revenue_total)) if revenue_total else Decimal('0')
-        
-        operating_expenses = base_query.filter(
-            BankTransaction.business_category == 'OPERATING_EXPENSE'
-        ).with_entities(func.sum(func.abs(BankTransaction.amount))).scalar()
-        operating_expenses = Decimal(str(operating_expenses)) if operating_expenses else Decimal('0')
-        
-        payroll_expenses = base_query.filter(
-            BankTransaction.business_category == 'PAYROLL_EXPENSE'
-        ).with_entities(func.sum(func.abs(BankTransaction.amount))).scalar()
-        payroll_expenses = Decimal(str(payroll_expenses)) if payroll_expenses else Decimal('0')
-        
-        tax_payments = base_query.filter(
-            BankTransaction.business_category == 'TAX_PAYMENT'
-        ).with_entities(func.sum(func.abs(BankTransaction.amount))).scalar()
-        tax_payments = Decimal(str(tax_payments)) if tax_payments else Decimal('0')
-        
-        bank_fees = base_query.filter(
-            BankTransaction.business_category == 'BANK_FEE'
-        ).with_entities(func.sum(func.abs(BankTransaction.amount))).scalar()
-        bank_fees = Decimal(str(bank_fees)) if bank_fees else Decimal('0')
+        revenue_total = net('REVENUE')
+        operating_expenses = gross('OPERATING_EXPENSE')
+        payroll_expenses = gross('PAYROLL_EXPENSE')
+        tax_payments = gross('TAX_PAYMENT')
+        bank_fees = gross('BANK_FEE')
         
         # Calculate net cash flow
         total_expenses = operating_expenses + payroll_expenses + tax_payments + bank_fees
@@ -124,15 +126,6 @@ class CashFlowCalculator:
         expense_ratio = float(total_expenses / revenue_total * 100) if revenue_total > 0 else 0
         profit_margin = float(net_cash_flow / revenue_total * 100) if revenue_total > 0 else 0
         
-        # Get transfer reconciliation status
-        transfer_reconciliation = self.get_transfer_reconciliation()
-        
-        # Get classification status
-        classification_status = BankTransaction.get_classification_summary()
-        
-        # Get credit card summary
-        credit_card_summary = self.get_credit_card_summary()
-        
         return {
             'period': {
                 'start_date': start_date.isoformat(),
@@ -150,10 +143,24 @@ class CashFlowCalculator:
                 'expense_ratio': round(expense_ratio, 1),
                 'profit_margin': round(profit_margin, 1)
             },
-            'account_summaries': account_summaries,
-            'transfer_reconciliation': transfer_reconciliation,
-            'classification_status': classification_status,
-            'credit_card_summary': credit_card_summary,
+            'account_summaries': account_summaries
+        }
+
+    def get_live_summary(self, start_date: date, end_date: date) -> Dict:
+        """
+        Dashboard sections that read data outside the period (all-time
+        transfer and classification status, credit card cycles that start
+        before it); always computed live
+        
+        Returns:
+            Dict with transfer_reconciliation, classification_status,
+            credit_card_summary and last_updated
+        """
+        
+        return {
+            'transfer_reconciliation': self.get_transfer_reconciliation(),
+            'classification_status': BankTransaction.get_classification_summary(),
+            'credit_card_summary': self.get_credit_card_summary(start_date, end_date),
             'last_updated': datetime.utcnow().isoformat()
         }
 
@@ -188,46 +195,34 @@ class CashFlowCalculator:
             BankTransaction.is_classified == True
         )
         
-        total_transactions = account_query.count()
+        totals = period_totals(start_date, end_date, account_name)
+        total_transactions = sum(row['transaction_count'] for row in totals)
         
         # Get totals by flow direction
-        positive_total = account_query.filter(
-            BankTransaction.amount > 0
-        ).with_entities(func.sum(BankTransaction.amount)).scalar()
-        positive_total = Decimal(str(positive_total)) if positive_total else Decimal('0')
-        
-        negative_total = account_query.filter(
-            BankTransaction.amount < 0
-        ).with_entities(func.sum(func.abs(BankTransaction.amount))).scalar()
-        negative_total = Decimal(str(negative_total)) if negative_total else Decimal('0')
+        positive_total = round(sum((row['inflow'] for row in totals), Decimal('0')), 2)
+        negative_total = round(sum((row['outflow'] for row in totals), Decimal('0')), 2)
         
         net_total = positive_total - negative_total
         
         # Get breakdown by business category
+        category_sums = {}
+        for row in totals:
+            if row['business_category']:
+                entry = category_sums.setdefault(row['business_category'], [Decimal('0'), 0])
+                entry[0] += row['inflow'] - row['outflow']
+                entry[1] += row['transaction_count']
+        
         category_breakdown = {}
-        categories = account_query.with_entities(
-            BankTransaction.business_category
-        ).distinct().all()
-        
-        for (category,) in categories:
-            if category:
-                category_total = account_query.filter(
-                    BankTransaction.business_category == category
-                ).with_entities(func.sum(BankTransaction.amount)).scalar()
-                category_total = Decimal(str(category_total)) if category_total else Decimal('0')
-                
-                category_count = account_query.filter(
-                    BankTransaction.business_category == category
-                ).count()
-                
-                category_breakdown[category] = {
-                    'total': float(category_total),
-                    'count': category_count,
-                    'average': float(category_total / category_count) if category_count > 0 else 0
-                }
+        for category, (category_total, category_count) in category_sums.items():
+            category_total = round(category_total, 2)
+            category_breakdown[category] = {
+                'total': float(category_total),
+                'count': category_count,
+                'average': float(category_total / category_count) if category_count > 0 else 0
+            }
         
         # Monthly breakdown
-        monthly_data = self._get_monthly_breakdown(account_name, start_date, end_date)
+        monthly_data = self._get_monthly_breakdown(account_name, start_date, end_date, totals)
         
         # Recent transactions
         recent_transactions = account_query.order_by(
@@ -309,76 +304,88 @@ class CashFlowCalculator:
             'status': 'RECONCILED' if reconciliation_ratio > 95 else 'NEEDS_REVIEW'
         }
 
-    def get_credit_card_summary(self) -> Dict:
+    def get_credit_card_summary(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                history_cycles: int = 12) -> Dict:
         """
         Get Capital One credit card summary with cycle information
         
+        One conditional-aggregation query grouped by credit_card_cycle_date;
+        the current cycle and the history come from the same result set.
+        
+        Args:
+            start_date: Optional start date (rounded down to its cycle cut)
+            end_date: Optional end date (last cycle cut included)
+            history_cycles: Cycles to include when no start_date is given
+            
         Returns:
             Dict with credit card metrics
         """
         
-        # Get all Capital One transactions
-        cc_transactions = BankTransaction.query.filter(
+        current_cycle_cut = cycle_info(date.today())['cycle_cut_date']
+        if start_date:
+            first_cycle = cycle_info(start_date)['cycle_cut_date']
+        else:
+            first_cycle = current_cycle_cut
+            for _ in range(history_cycles - 1):
+                first_cycle = cycle_info(first_cycle - timedelta(days=1))['cycle_cut_date']
+        
+        purchase = BankTransaction.amount < 0
+        query = db.session.query(
+            BankTransaction.credit_card_cycle_date,
+            func.count(BankTransaction.id).label('transactions'),
+            func.sum(case((purchase, -BankTransaction.amount), else_=0)).label('purchases'),
+            func.sum(case((purchase, 1), else_=0)).label('purchase_count'),
+            func.sum(case((BankTransaction.amount > 0, BankTransaction.amount), else_=0)).label('payments'),
+            func.sum(case((BankTransaction.amount > 0, 1), else_=0)).label('payment_count'),
+            func.sum(case((purchase & (BankTransaction.receipt_status == 'REQUIRED'), 1), else_=0)).label('required'),
+            func.sum(case((purchase & (BankTransaction.receipt_status == 'RECEIVED'), 1), else_=0)).label('received')
+        ).filter(
             BankTransaction.is_credit_card_transaction == True,
-            BankTransaction.is_classified == True
-        ).all()
+            BankTransaction.is_classified == True,
+            BankTransaction.credit_card_cycle_date >= first_cycle
+        )
+        if end_date:
+            query = query.filter(BankTransaction.credit_card_cycle_date <= end_date)
+        
+        cycles = query.group_by(
+            BankTransaction.credit_card_cycle_date
+        ).order_by(BankTransaction.credit_card_cycle_date.desc()).all()
         
-        if not cc_transactions:
+        if not cycles:
             return {
                 'total_transactions': 0,
                 'message': 'No credit card transactions found'
             }
         
-        # Separate purchases and payments
-        purchases = [t for t in cc_transactions if t.amount < 0]
-        payments = [t for t in cc_transactions if t.amount > 0]
-        
-        total_purchases = sum(abs(float(t.amount)) for t in purchases)
-        total_payments = sum(float(t.amount) for t in payments)
-        
-        # Current cycle information (based on day 11 cutoff)
-        today = date.today()
-        current_cycle_cut = date(today.year, today.month, 11)
-        if today.day < 11:
-            # Still in previous month's cycle
-            if today.month == 1:
-                current_cycle_cut = date(today.year - 1, 12, 11)
-            else:
-                current_cycle_cut = date(today.year, today.month - 1, 11)
-        
-        # Get transactions in current cycle
-        current_cycle_transactions = [
-            t for t in cc_transactions 
-            if t.transaction_date >= current_cycle_cut
-        ]
-        
-        current_cycle_purchases = sum(
-            abs(float(t.amount)) for t in current_cycle_transactions if t.amount < 0
-        )
-        
-        # Count transactions needing receipts
-        receipts_required = len([
-            t for t in purchases 
-            if t.receipt_status == 'REQUIRED'
-        ])
-        
-        receipts_received = len([
-            t for t in purchases 
-            if t.receipt_status == 'RECEIVED'
-        ])
+        total_purchases = sum(float(c.purchases or 0) for c in cycles)
+        total_payments = sum(float(c.payments or 0) for c in cycles)
+        receipts_required = sum(int(c.required or 0) for c in cycles)
+        receipts_received = sum(int(c.received or 0) for c in cycles)
+        current = next((c for c in cycles if c.credit_card_cycle_date == current_cycle_cut), None)
         
         return {
-            'total_transactions': len(cc_transactions),
+            'period': {
+                'first_cycle_cut': first_cycle.isoformat(),
+                'end_date': end_date.isoformat() if end_date else None
+            },
+            'total_transactions': sum(c.transactions for c in cycles),
             'total_purchases': total_purchases,
             'total_payments': total_payments,
             'net_balance_change': total_payments - total_purchases,
-            'purchase_count': len(purchases),
-            'payment_count': len(payments),
+            'purchase_count': sum(int(c.purchase_count or 0) for c in cycles),
+            'payment_count': sum(int(c.payment_count or 0) for c in cycles),
             'current_cycle': {
                 'cycle_cut_date': current_cycle_cut.isoformat(),
-                'purchases_this_cycle': current_cycle_purchases,
-                'transactions_this_cycle': len(current_cycle_transactions)
+                'purchases_this_cycle': float(current.purchases or 0) if current else 0.0,
+                'transactions_this_cycle': current.transactions if current else 0
             },
+            'cycles': [{
+                'cycle_cut_date': c.credit_card_cycle_date.isoformat() if c.credit_card_cycle_date else None,
+                'transactions': c.transactions,
+                'purchases': float(c.purchases or 0),
+                'payments': float(c.payments or 0),
+                'receipts_required': int(c.required or 0)
+            } for c in cycles],
             'receipts': {
                 'required': receipts_required,
                 'received': receipts_received,
@@ -387,8 +394,19 @@ class CashFlowCalculator:
             }
         }
 
-    def _get_monthly_breakdown(self, account_name: str, start_date: date, end_date: date) -> Dict:
-        """Get monthly breakdown for an account"""
+    def _get_monthly_breakdown(self, account_name: str, start_date: date, end_date: date,
+                               totals: Optional[List[Dict]] = None) -> Dict:
+        """Get monthly breakdown for an account (from period_totals rows when given)"""
+        
+        if totals is None:
+            totals = period_totals(start_date, end_date, account_name)
+        
+        by_month = {}
+        for row in totals:
+            entry = by_month.setdefault(row['month'], [Decimal('0'), Decimal('0'), 0])
+            entry[0] += row['inflow']
+            entry[1] += row['outflow']
+            entry[2] += row['transaction_count']
         
         monthly_data = {}
         
@@ -397,29 +415,9 @@ class CashFlowCalculator:
         end_month = end_date.replace(day=1)
         
         while current_date <= end_month:
-            # Get last day of current month
-            last_day = monthrange(current_date.year, current_date.month)[1]
-            month_end = current_date.replace(day=last_day)
-            
-            # Query for this month
-            month_query = BankTransaction.query.filter(
-                BankTransaction.account_name == account_name,
-                BankTransaction.transaction_date >= current_date,
-                BankTransaction.transaction_date <= month_end,
-                BankTransaction.is_classified == True
-            )
-            
-            positive_total = month_query.filter(
-                BankTransaction.amount > 0
-            ).with_entities(func.sum(BankTransaction.amount)).scalar()
-            positive_total = Decimal(str(positive_total)) if positive_total else Decimal('0')
-            
-            negative_total = month_query.filter(
-                BankTransaction.amount < 0
-            ).with_entities(func.sum(func.abs(BankTransaction.amount))).scalar()
-            negative_total = Decimal(str(negative_total)) if negative_total else Decimal('0')
-            
-            transaction_count = month_query.count()
+            inflow, outflow, transaction_count = by_month.get(current_date, (Decimal('0'), Decimal('0'), 0))
+            positive_total = round(inflow, 2)
+            negative_total = round(outflow, 2)
             
             month_key = current_date.strftime('%Y-%m')
             monthly_data[month_key] = {
@@ -451,47 +449,53 @@ class CashFlowCalculator:
         if not end_date:
             end_date = date.today()
         
-        # Get all tax deductible transactions
-        tax_deductible = BankTransaction.query.filter(
+        # One pass in the database: totals per (tax category, receipt status)
+        rows = db.session.query(
+            BankTransaction.tax_category,
+            BankTransaction.receipt_status,
+            func.count(BankTransaction.id).label('count'),
+            func.sum(func.abs(BankTransaction.amount)).label('total')
+        ).filter(
             BankTransaction.is_tax_deductible == True,
             BankTransaction.transaction_date >= start_date,
             BankTransaction.transaction_date <= end_date,
             BankTransaction.is_classified == True
+        ).group_by(
+            BankTransaction.tax_category,
+            BankTransaction.receipt_status
         ).all()
         
-        # Calculate totals by tax category
+        # Fold receipt statuses into totals by tax category
         category_totals = {}
-        for transaction in tax_deductible:
-            category = transaction.tax_category or 'UNCATEGORIZED'
-            if category not in category_totals:
-                category_totals[category] = {
-                    'total': 0,
-                    'count': 0,
-                    'receipts_required': 0,
-                    'receipts_received': 0
-                }
-            
-            category_totals[category]['total'] += abs(float(transaction.amount))
-            category_totals[category]['count'] += 1
+        status_counts = {}
+        for row in rows:
+            category = row.tax_category or 'UNCATEGORIZED'
+            totals = category_totals.setdefault(category, {
+                'total': 0,
+                'count': 0,
+                'receipts_required': 0,
+                'receipts_received': 0
+            })
+            totals['total'] += float(row.total or 0)
+            totals['count'] += row.count
             
-            if transaction.receipt_status == 'REQUIRED':
-                category_totals[category]['receipts_required'] += 1
-            elif transaction.receipt_status == 'RECEIVED':
-                category_totals[category]['receipts_received'] += 1
-        
-        total_deductible = sum(abs(float(t.amount)) for t in tax_deductible)
+            if row.receipt_status == 'REQUIRED':
+                totals['receipts_required'] += row.count
+            elif row.receipt_status == 'RECEIVED':
+                totals['receipts_received'] += row.count
+            status_counts[row.receipt_status] = status_counts.get(row.receipt_status, 0) + row.count
         
         return {
             'period': {
                 'start_date': start_date.isoformat(),
                 'end_date': end_date.isoformat()
             },
-            'total_deductible': total_deductible,
-            'transaction_count': len(tax_deductible),
+            'total_deductible': sum(totals['total'] for totals in category_totals.values()),
+            'transaction_count': sum(totals['count'] for totals in category_totals.values()),
             'category_breakdown': category_totals,
             'receipt_compliance': {
-                'total_requiring_receipts': len([t for t in tax_deductible if t.receipt_status == 'REQUIRED']),
-                'receipts_received': len([t for t in tax_deductible if t.receipt_status == 'RECEIVED']),
-                'receipts_pending': len([t for t in tax_deductible if t.receipt_status == 'REQUIRED'])
+                'total_requiring_receipts': status_counts.get('REQUIRED', 0),
+                'receipts_received': status_counts.get('RECEIVED', 0),
+                'receipts_pending': status_counts.get('REQUIRED', 0)
             }
-        }
\ No newline at end of file
+        }
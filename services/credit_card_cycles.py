@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Credit Card Statement Cycles
+
+Single home for statement cycle arithmetic. A card's cycle is defined by
+its cut day (Capital One cuts on the 11th) and the number of days from
+the cut to the payment due date. A transaction belongs to the cycle that
+opened on the most recent cut on or before its date.
+
+Three forms of the same rule:
+- cycle_info(): one date, returns a dict (model/classifier use)
+- cycle_dates(): an array of dates in one vectorized NumPy pass
+- cycle_cut_expression(): a SQL expression, so cycle grouping happens in
+  the database (compiled per dialect for SQLite, SQL Server and PostgreSQL)
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from sqlalchemy import Date, case, func, literal, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from database import db
+from models.bank_transaction import BankTransaction
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class CycleConfig:
+    """
+    Statement cycle definition for one card
+    """
+
+    __slots__ = ('name', 'cut_day', 'due_offset_days')
+
+    def __init__(self, name: str, cut_day: int = 11, due_offset_days: int = 25):
+        # Days 29-31 do not exist in every month; keep cuts unambiguous
+        if not 1 <= cut_day <= 28:
+            raise ValueError(f'cut_day must be between 1 and 28, got {cut_day}')
+        self.name = name
+        self.cut_day = cut_day
+        self.due_offset_days = due_offset_days
+
+    def __repr__(self):
+        return f'<CycleConfig {self.name} cut={self.cut_day} due=+{self.due_offset_days}d>'
+
+
+# Cards by the substring that identifies their bank account_name
+CARD_CYCLES = {
+    'Capital One': CycleConfig('Capital One', cut_day=11, due_offset_days=25),
+}
+DEFAULT_CARD = 'Capital One'
+
+
+def get_cycle_config(account_name: Optional[str] = None) -> CycleConfig:
+    """Cycle configuration for a card account (the default card when not recognised)"""
+    for key, config in CARD_CYCLES.items():
+        if account_name and key in account_name:
+            return config
+    return CARD_CYCLES[DEFAULT_CARD]
+
+
+def _add_months(day: date, months: int, cut_day: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, cut_day)
+
+
+def cycle_info(transaction_date: date, config: Optional[CycleConfig] = None) -> Dict:
+    """
+    Statement cycle of a single transaction
+
+    Args:
+        transaction_date: Transaction date
+        config: Card cycle configuration (default card when omitted)
+
+    Returns:
+        Dict with cycle_cut_date, due_date, next_cycle_cut and days_until_due
+    """
+    config = config or CARD_CYCLES[DEFAULT_CARD]
+    cycle_cut = _add_months(transaction_date, 0 if transaction_date.day >= config.cut_day else -1, config.cut_day)
+    due_date = cycle_cut + timedelta(days=config.due_offset_days)
+    return {
+        'cycle_cut_date': cycle_cut,
+        'due_date': due_date,
+        'next_cycle_cut': _add_months(cycle_cut, 1, config.cut_day),
+        'days_until_due': max((due_date - transaction_date).days, 0)
+    }
+
+
+def cycle_dates(dates: Iterable, config: Optional[CycleConfig] = None) -> Dict[str, 'np.ndarray']:
+    """
+    Statement cycles of many dates in one vectorized pass
+
+    Args:
+        dates: Dates (datetime.date, ISO strings or a datetime64 array)
+        config: Card cycle configuration (default card when omitted)
+
+    Returns:
+        Dict of datetime64[D] arrays cycle_cut_date, due_date and
+        next_cycle_cut, plus an int array days_until_due
+    """
+    import numpy as np
+
+    config = config or CARD_CYCLES[DEFAULT_CARD]
+    days = np.asarray(dates, dtype='datetime64[D]')
+    months = days.astype('datetime64[M]')
+    day_of_month = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+
+    cut_months = months - (day_of_month < config.cut_day).astype(np.int64)
+    offset = np.timedelta64(config.cut_day - 1, 'D')
+    cycle_cut = cut_months.astype('datetime64[D]') + offset
+    due_date = cycle_cut + np.timedelta64(config.due_offset_days, 'D')
+    return {
+        'cycle_cut_date': cycle_cut,
+        'due_date': due_date,
+        'next_cycle_cut': (cut_months + 1).astype('datetime64[D]') + offset,
+        'days_until_due': np.maximum((due_date - days).astype(np.int64), 0)
+    }
+
+
+class CycleCut(FunctionElement):
+    """SQL cycle cut date of a date column; see cycle_cut_expression()"""
+
+    type = Date()
+    name = 'cycle_cut'
+    # The cut day is rendered inline, so statements must not share a cached compilation
+    inherit_cache = False
+
+
+def _cycle_cut_parts(element, compiler, **kw):
+    column, cut_day = list(element.clauses)
+    return compiler.process(column, **kw), int(cut_day.value)
+
+
+@compiles(CycleCut, 'sqlite')
+def _compile_cycle_cut_sqlite(element, compiler, **kw):
+    column, cut_day = _cycle_cut_parts(element, compiler, **kw)
+    return (f"CASE WHEN CAST(strftime('%d', {column}) AS INTEGER) >= {cut_day} "
+            f"THEN date({column}, 'start of month', '+{cut_day - 1} days') "
+            f"ELSE date({column}, 'start of month', '-1 month', '+{cut_day - 1} days') END")
+
+
+@compiles(CycleCut, 'mssql')
+def _compile_cycle_cut_mssql(element, compiler, **kw):
+    # SQL Server / Azure SQL: no date_trunc, INTERVAL or date + integer
+    column, cut_day = _cycle_cut_parts(element, compiler, **kw)
+    cut = f"DATEFROMPARTS(YEAR({column}), MONTH({column}), {cut_day})"
+    return (f"CASE WHEN DAY({column}) >= {cut_day} "
+            f"THEN {cut} "
+            f"ELSE DATEADD(month, -1, {cut}) END")
+
+
+@compiles(CycleCut)
+def _compile_cycle_cut_default(element, compiler, **kw):
+    # PostgreSQL and other dialects with date_trunc/EXTRACT and date + integer
+    column, cut_day = _cycle_cut_parts(element, compiler, **kw)
+    return (f"CASE WHEN EXTRACT(DAY FROM {column}) >= {cut_day} "
+            f"THEN CAST(date_trunc('month', {column}) AS DATE) + {cut_day - 1} "
+            f"ELSE CAST(date_trunc('month', {column}) - INTERVAL '1 month' AS DATE) + {cut_day - 1} END")
+
+
+def cycle_cut_expression(column, config: Optional[CycleConfig] = None) -> CycleCut:
+    """
+    SQL expression for the cycle cut date of a date column
+
+    Usage: group_by(cycle_cut_expression(BankTransaction.transaction_date))
+    """
+    config = config or CARD_CYCLES[DEFAULT_CARD]
+    return CycleCut(column, literal(config.cut_day))
+
+
+def card_filter(config: CycleConfig):
+    """Rows belonging to a card account (mirrors BankTransaction.is_capital_one)"""
+    return or_(BankTransaction.account_name.contains(config.name, autoescape=True),
+               BankTransaction.is_credit_card_transaction == True)
+
+
+def statement_summary(account_name: Optional[str] = None, start_date: Optional[date] = None,
+                      end_date: Optional[date] = None) -> List[Dict]:
+    """
+    Per-cycle statement summary for a card, newest cycle first
+
+    One GROUP BY over the cycle cut expression; cycles are derived from
+    transaction_date, so unclassified rows are included too.
+
+    Args:
+        account_name: Card account (default card when omitted)
+        start_date: Optional first transaction date
+        end_date: Optional last transaction date
+
+    Returns:
+        List of dicts with cycle dates, purchases, payments and receipt counts
+    """
+    config = get_cycle_config(account_name)
+    cycle_cut = cycle_cut_expression(BankTransaction.transaction_date, config).label('cycle_cut')
+    purchase = BankTransaction.amount < 0
+
+    query = db.session.query(
+        cycle_cut,
+        func.count(BankTransaction.id).label('transaction_count'),
+        func.sum(case((purchase, -BankTransaction.amount), else_=0)).label('purchases'),
+        func.sum(case((purchase, 1), else_=0)).label('purchase_count'),
+        func.sum(case((BankTransaction.amount > 0, BankTransaction.amount), else_=0)).label('payments'),
+        func.sum(case((BankTransaction.amount > 0, 1), else_=0)).label('payment_count'),
+        func.sum(case((purchase & (BankTransaction.receipt_status == 'REQUIRED'), 1), else_=0)).label('pending'),
+        func.sum(case((purchase & (BankTransaction.receipt_status == 'RECEIVED'), 1), else_=0)).label('received')
+    ).filter(card_filter(config))
+    if start_date:
+        query = query.filter(BankTransaction.transaction_date >= start_date)
+    if end_date:
+        query = query.filter(BankTransaction.transaction_date <= end_date)
+
+    statements = []
+    for row in query.group_by(cycle_cut).order_by(cycle_cut.desc()):
+        info = cycle_info(row.cycle_cut, config)
+        purchases = float(row.purchases or 0)
+        payments = float(row.payments or 0)
+        statements.append({
+            'cycle_cut_date': info['cycle_cut_date'].isoformat(),
+            'next_cycle_cut': info['next_cycle_cut'].isoformat(),
+            'due_date': info['due_date'].isoformat(),
+            'transaction_count': row.transaction_count,
+            'purchases': purchases,
+            'purchase_count': int(row.purchase_count or 0),
+            'payments': payments,
+            'payment_count': int(row.payment_count or 0),
+            'net_balance_change': payments - purchases,
+            'receipts_pending': int(row.pending or 0),
+            'receipts_received': int(row.received or 0)
+        })
+    return statements
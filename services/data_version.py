@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Data Version Tracking
+
+Keeps a per-table version counter that is bumped whenever rows of that
+table are committed through the ORM (unit-of-work flushes as well as bulk
+UPDATE/DELETE statements). Read-heavy services use the versions as cache
+keys so a cached aggregate is reused until the underlying data changes.
+
+Versions live in process memory, so each gunicorn worker tracks its own
+writes. VersionedCache entries also expire after ``max_age`` seconds to
+bound staleness for writes made by other workers.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from services.metrics import CACHE_REQUESTS
+
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+_PENDING_KEY = 'data_version_pending_tables'
+
+
+def bump(*tables: str) -> None:
+    """Increment the version of the given tables"""
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+def get_version(*tables: str) -> Tuple[int, ...]:
+    """Current version tuple for the given tables"""
+    return tuple(_versions.get(table, 0) for table in tables)
+
+
+def _pending(session) -> set:
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    pending = _pending(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            pending.add(table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        _pending(orm_execute_state.session).add(mapper.local_table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_tables(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        bump(*pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_tables(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+class VersionedCache:
+    """
+    Small in-process cache whose entries are invalidated by table versions
+    """
+
+    def __init__(self, max_age: float = 30.0, name: str = 'default'):
+        self.max_age = max_age
+        self.name = name            # Label of the cache hit/miss metric
+        self._entries: Dict[Hashable, Tuple[Tuple[int, ...], float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, tables: Iterable[str],
+                       loader: Callable[[], Any], max_age: Optional[float] = None) -> Any:
+        """
+        Return the cached value for ``key`` or compute it with ``loader``
+
+        Args:
+            key: Cache key (must be hashable)
+            tables: Tables whose versions the value depends on
+            loader: Zero-argument callable producing the value
+            max_age: Optional override of the cache-wide expiry in seconds
+
+        Returns:
+            The cached or freshly computed value
+        """
+        version = get_version(*tables)
+        ttl = self.max_age if max_age is None else max_age
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and now - entry[1] < ttl:
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache=self.name, result='hit')
+                return entry[2]
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result='miss')
+
+        value = loader()
+
+        with self._lock:
+            self._entries[key] = (version, now, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
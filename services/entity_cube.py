@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Entity Analytics Cube Service
+
+Maintains the entity_monthly_totals cube (sum/count/min/max per entity,
+account, month and flow direction) over:
+- Transaction.vendor_customer (AR/AP ledger, partitioned by due_date month)
+- BankTransaction.merchant_name (bank accounts, partitioned by transaction_date month)
+
+The cube is kept current incrementally: every ORM flush or bulk
+UPDATE/DELETE that touches a tracked row recomputes only the (source,
+account, month) partitions it affected, inside the same database
+transaction. Writes that cannot be mapped to partitions mark the cube
+stale in entity_cube_state, in the same transaction, so every worker
+sees it. While the cube is stale (or was never built, e.g. right after
+the migration) readers aggregate the source rows directly instead of
+returning cells known to be wrong, and a full rebuild runs in a
+background job, never inside a report request. Deployments run
+rebuild_entity_cube.py after the migration so the cube is current before
+traffic arrives. Top-N lookups aggregate the cube cells (or source rows)
+for a filter and pick the leaders with a heap.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import heapq
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.entity_cube import EntityCubeState, EntityMonthlyTotal
+from models.transaction import Transaction
+from services.read_routing import reporting_reads
+
+logger = logging.getLogger(__name__)
+
+SOURCE_BANK = 'BANK'
+SOURCE_LEDGER = 'LEDGER'
+
+# Pseudo flow for entity_totals/top_n: IN minus OUT, i.e. the signed sum(amount)
+FLOW_NET = 'NET'
+
+RANKING_KEYS = ('total_amount', 'transaction_count', 'avg_amount', 'max_amount')
+
+# Columns whose changes move a row between cube cells or change its measures
+_TRACKED_ATTRIBUTES = {
+    BankTransaction: ('account_name', 'transaction_date', 'amount', 'merchant_name', 'description'),
+    Transaction: ('type', 'due_date', 'amount', 'vendor_customer'),
+}
+
+_ENTITY_MAX_LENGTH = 200
+_INSERT_BATCH_SIZE = 1000
+_ID_BATCH_SIZE = 500
+
+_STATE_ID = 1
+
+_table_available: Dict[str, bool] = {}
+_rebuild_lock = threading.Lock()
+
+
+def month_start(value: date) -> date:
+    """First day of the month containing value"""
+    return value.replace(day=1)
+
+
+def next_month(value: date) -> date:
+    """First day of the month after value"""
+    if value.month == 12:
+        return date(value.year + 1, 1, 1)
+    return date(value.year, value.month + 1, 1)
+
+
+def bank_entity_name(merchant_name: Optional[str], description: Optional[str]) -> str:
+    """Entity key for a bank transaction (clean merchant name, else description prefix)"""
+    name = (merchant_name or '').strip() or (description or '')[:30].strip()
+    return (name or 'Unknown')[:_ENTITY_MAX_LENGTH]
+
+
+def _ledger_entity_name(vendor_customer: Optional[str]) -> str:
+    return ((vendor_customer or '').strip() or 'Unknown')[:_ENTITY_MAX_LENGTH]
+
+
+def _aggregate(items: Iterable[Tuple[str, str, str, Decimal, date]]) -> Dict[Tuple, Dict]:
+    """
+    Fold (source, account, entity, amount, date) items into cube cells
+
+    Returns:
+        Dict keyed by (source, account, entity, month, flow) with the cell measures
+    """
+    cells = {}
+    for source, account, entity, amount, txn_date in items:
+        if amount is None or txn_date is None:
+            continue
+        amount = Decimal(str(amount))
+        flow = 'IN' if amount >= 0 else 'OUT'
+        magnitude = abs(amount)
+        key = (source, account, entity, month_start(txn_date), flow)
+
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = {
+                'total_amount': magnitude,
+                'transaction_count': 1,
+                'min_amount': magnitude,
+                'max_amount': magnitude,
+                'last_date': txn_date
+            }
+        else:
+            cell['total_amount'] += magnitude
+            cell['transaction_count'] += 1
+            if magnitude < cell['min_amount']:
+                cell['min_amount'] = magnitude
+            if magnitude > cell['max_amount']:
+                cell['max_amount'] = magnitude
+            if txn_date > cell['last_date']:
+                cell['last_date'] = txn_date
+    return cells
+
+
+def _insert_cells(connection, cells: Dict[Tuple, Dict]) -> None:
+    cube = EntityMonthlyTotal.__table__
+    rows = []
+    for (source, account, entity, month, flow), measures in cells.items():
+        rows.append({
+            'source': source,
+            'account': account,
+            'entity': entity,
+            'month': month,
+            'flow': flow,
+            **measures
+        })
+        if len(rows) >= _INSERT_BATCH_SIZE:
+            connection.execute(cube.insert(), rows)
+            rows = []
+    if rows:
+        connection.execute(cube.insert(), rows)
+
+
+def _bank_items(connection, account: Optional[str] = None,
+                start: Optional[date] = None, end: Optional[date] = None):
+    table = BankTransaction.__table__
+    query = select(table.c.account_name, table.c.merchant_name, table.c.description,
+                   table.c.amount, table.c.transaction_date)
+    if account is not None:
+        query = query.where(table.c.account_name == account)
+    if start is not None:
+        query = query.where(table.c.transaction_date >= start)
+    if end is not None:
+        query = query.where(table.c.transaction_date < end)
+
+    result = connection.execution_options(yield_per=5000).execute(query)
+    for account_name, merchant_name, description, amount, txn_date in result:
+        yield (SOURCE_BANK, account_name, bank_entity_name(merchant_name, description), amount, txn_date)
+
+
+def _ledger_items(connection, account: Optional[str] = None,
+                  start: Optional[date] = None, end: Optional[date] = None):
+    table = Transaction.__table__
+    query = select(table.c.type, table.c.vendor_customer, table.c.amount, table.c.due_date)
+    if account is not None:
+        query = query.where(table.c.type == account)
+    if start is not None:
+        query = query.where(table.c.due_date >= start)
+    if end is not None:
+        query = query.where(table.c.due_date < end)
+
+    result = connection.execution_options(yield_per=5000).execute(query)
+    for ledger_type, vendor_customer, amount, due_date in result:
+        yield (SOURCE_LEDGER, ledger_type, _ledger_entity_name(vendor_customer), amount, due_date)
+
+
+def refresh_partitions(connection, partitions: Set[Tuple[str, str, date]]) -> None:
+    """
+    Recompute the cube cells of the given (source, account, month) partitions
+
+    Args:
+        connection: Connection inside the transaction that changed the data
+        partitions: Partitions to rebuild
+    """
+    cube = EntityMonthlyTotal.__table__
+    for source, account, month in partitions:
+        start, end = month, next_month(month)
+        if source == SOURCE_BANK:
+            items = _bank_items(connection, account, start, end)
+        else:
+            items = _ledger_items(connection, account, start, end)
+        cells = _aggregate(items)
+
+        connection.execute(cube.delete().where(
+            cube.c.source == source,
+            cube.c.account == account,
+            cube.c.month == month
+        ))
+        _insert_cells(connection, cells)
+
+
+def _cube_table_available(connection) -> bool:
+    url = str(connection.engine.url)
+    if url not in _table_available:
+        inspector = inspect(connection)
+        _table_available[url] = all(inspector.has_table(model.__tablename__)
+                                    for model in (EntityMonthlyTotal, EntityCubeState))
+    return _table_available[url]
+
+
+def _mark_stale(connection) -> None:
+    """Record a write the cube could not follow (in the writer's transaction, visible to every worker)"""
+    state = EntityCubeState.__table__
+    connection.execute(state.update().where(state.c.id == _STATE_ID).values(generation=state.c.generation + 1))
+
+
+def _partition_columns(model):
+    table = model.__table__
+    if model is BankTransaction:
+        return SOURCE_BANK, table.c.account_name, table.c.transaction_date
+    return SOURCE_LEDGER, table.c.type, table.c.due_date
+
+
+def _partition_of(model, values: Dict) -> Optional[Tuple[str, str, date]]:
+    if model is BankTransaction:
+        account, txn_date, source = values.get('account_name'), values.get('transaction_date'), SOURCE_BANK
+    else:
+        account, txn_date, source = values.get('type'), values.get('due_date'), SOURCE_LEDGER
+    if account is None or txn_date is None:
+        return None
+    return (source, account, month_start(txn_date))
+
+
+def _touched_partitions(session) -> Tuple[Set[Tuple[str, str, date]], bool]:
+    """Partitions affected by the pending flush, and whether some rows could not be mapped to one"""
+    partitions = set()
+    unmapped = False
+
+    def add(model, values):
+        nonlocal unmapped
+        partition = _partition_of(model, values)
+        if partition is None:
+            unmapped = True
+        else:
+            partitions.add(partition)
+
+    for obj in list(session.new) + list(session.deleted):
+        model = type(obj)
+        if model in _TRACKED_ATTRIBUTES:
+            add(model, inspect(obj).dict)
+
+    for obj in session.dirty:
+        model = type(obj)
+        if model not in _TRACKED_ATTRIBUTES:
+            continue
+        state = inspect(obj)
+        histories = {name: state.attrs[name].history for name in _TRACKED_ATTRIBUTES[model]}
+        if not any(history.has_changes() for history in histories.values()):
+            continue
+
+        current = dict(state.dict)
+        previous = dict(current)
+        for name, history in histories.items():
+            if history.deleted:
+                previous[name] = history.deleted[0]
+        add(model, current)
+        add(model, previous)
+
+    return partitions, unmapped
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_cube_after_flush(session, flush_context):
+    partitions, unmapped = _touched_partitions(session)
+    if not (partitions or unmapped):
+        return
+    connection = session.connection()
+    if not _cube_table_available(connection):
+        return
+    if unmapped:
+        _mark_stale(connection)
+    if partitions:
+        refresh_partitions(connection, partitions)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _maintain_cube_on_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    # Callers that refresh the affected partitions themselves opt out
+    if orm_execute_state.execution_options.get('entity_cube_maintained'):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in _TRACKED_ATTRIBUTES:
+        return
+    connection = orm_execute_state.session.connection()
+    if not _cube_table_available(connection):
+        return
+    if isinstance(orm_execute_state.parameters, (list, tuple)):
+        # Bulk UPDATE by primary key: the rows are only known to the parameter sets
+        _mark_stale(connection)
+        return
+    source, account_column, date_column = _partition_columns(mapper.class_)
+    id_column = mapper.class_.__table__.c.id
+
+    # Partitions the matched rows belong to before the statement ...
+    query = select(id_column, account_column, date_column)
+    if orm_execute_state.statement.whereclause is not None:
+        query = query.where(orm_execute_state.statement.whereclause)
+    rows = connection.execute(query, orm_execute_state.parameters or {}).all()
+    partitions = {(source, account, month_start(txn_date)) for _, account, txn_date in rows
+                  if account is not None and txn_date is not None}
+
+    result = orm_execute_state.invoke_statement()
+
+    # ... and, for an UPDATE, the ones they may have moved to
+    if orm_execute_state.is_update:
+        ids = [row[0] for row in rows]
+        for offset in range(0, len(ids), _ID_BATCH_SIZE):
+            moved = connection.execute(
+                select(account_column, date_column).where(id_column.in_(ids[offset:offset + _ID_BATCH_SIZE])).distinct()
+            )
+            partitions.update((source, account, month_start(txn_date)) for account, txn_date in moved
+                              if account is not None and txn_date is not None)
+    if partitions:
+        refresh_partitions(connection, partitions)
+    return result
+
+
+def _run_rebuild(app) -> None:
+    try:
+        with app.app_context():
+            try:
+                EntityCube().rebuild()
+            except Exception as e:
+                # The cube stays stale; the next reader schedules another attempt
+                logger.error(f"Entity cube rebuild failed: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+    finally:
+        _rebuild_lock.release()
+
+
+def schedule_rebuild(app) -> bool:
+    """
+    Start a full cube rebuild in a background thread
+
+    Args:
+        app: Flask application the job runs in
+
+    Returns:
+        False when a rebuild is already running in this process
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=_run_rebuild, args=(app,), name='entity-cube-rebuild', daemon=True).start()
+    return True
+
+
+class EntityCube:
+    """
+    Read and rebuild API for the entity analytics cube
+    """
+
+    def rebuild(self) -> int:
+        """
+        Recompute the whole cube from Transaction and BankTransaction
+
+        The cube is marked current as of the generation read at the start, so
+        a write that marks it stale while this runs leaves it stale.
+
+        Returns:
+            Number of cube cells written
+        """
+        connection = db.session.connection()
+        state = EntityCubeState.__table__
+        generation = connection.execute(select(state.c.generation).where(state.c.id == _STATE_ID)).scalar()
+        if generation is None:
+            generation = 0
+            connection.execute(state.insert().values(id=_STATE_ID, generation=generation, built_generation=-1))
+
+        cells = _aggregate(_bank_items(connection))
+        cells.update(_aggregate(_ledger_items(connection)))
+
+        connection.execute(EntityMonthlyTotal.__table__.delete())
+        _insert_cells(connection, cells)
+        connection.execute(state.update().where(state.c.id == _STATE_ID).values(
+            built_generation=generation, built_at=datetime.utcnow()))
+        db.session.commit()
+
+        logger.info(f"Entity cube rebuilt with {len(cells)} cells")
+        return len(cells)
+
+    def refresh_for_bank_transactions(self, transaction_ids: List[int]) -> None:
+        """Recompute the partitions holding the given bank transactions (after bulk UPDATEs)"""
+        if not transaction_ids:
+            return
+        rows = db.session.query(
+            BankTransaction.account_name, BankTransaction.transaction_date
+        ).filter(BankTransaction.id.in_(transaction_ids)).distinct().all()
+        partitions = {(SOURCE_BANK, account, month_start(txn_date)) for account, txn_date in rows}
+        refresh_partitions(db.session.connection(), partitions)
+        db.session.commit()
+
+    @staticmethod
+    def is_current() -> bool:
+        """Whether the cube has been built and no write since has gone unfollowed (read on the primary)"""
+        with reporting_reads(False):
+            if not _cube_table_available(db.session.connection()):
+                return False
+            state = db.session.get(EntityCubeState, _STATE_ID, populate_existing=True)
+            return state is not None and state.built_generation == state.generation
+
+    def ensure_built(self) -> bool:
+        """
+        Schedule a background rebuild unless the cube is current
+
+        Returns:
+            True when the cube can be read; otherwise callers aggregate the source rows
+        """
+        if self.is_current():
+            return True
+        schedule_rebuild(current_app._get_current_object())
+        return False
+
+    def entity_totals(self, source: str, account: Optional[str] = None, flow: Optional[str] = None,
+                      start_month: Optional[date] = None, end_month: Optional[date] = None) -> List[Dict]:
+        """
+        Aggregate cube cells per entity for a filter
+
+        Args:
+            source: SOURCE_BANK or SOURCE_LEDGER
+            account: Optional bank account name or ledger type
+            flow: Optional "IN"/"OUT" direction, or FLOW_NET for net totals
+            start_month: Optional first month (inclusive)
+            end_month: Optional last month (inclusive)
+
+        Returns:
+            List of dicts with entity, total_amount, transaction_count,
+            avg_amount, min_amount, max_amount and last_date
+        """
+        if not self.ensure_built():
+            start = month_start(start_month) if start_month is not None else None
+            stop = next_month(month_start(end_month)) if end_month is not None else None
+            return list(self._source_totals(source, account, flow, start, stop).values())
+
+        total = EntityMonthlyTotal.total_amount
+        if flow == FLOW_NET:
+            total = case((EntityMonthlyTotal.flow == 'OUT', -EntityMonthlyTotal.total_amount), else_=total)
+        query = db.session.query(
+            EntityMonthlyTotal.entity,
+            func.sum(total).label('total_amount'),
+            func.sum(EntityMonthlyTotal.transaction_count).label('transaction_count'),
+            func.min(EntityMonthlyTotal.min_amount).label('min_amount'),
+            func.max(EntityMonthlyTotal.max_amount).label('max_amount'),
+            func.max(EntityMonthlyTotal.last_date).label('last_date')
+        ).filter(EntityMonthlyTotal.source == source)
+
+        if account is not None:
+            query = query.filter(EntityMonthlyTotal.account == account)
+        if flow is not None and flow != FLOW_NET:
+            query = query.filter(EntityMonthlyTotal.flow == flow)
+        if start_month is not None:
+            query = query.filter(EntityMonthlyTotal.month >= month_start(start_month))
+        if end_month is not None:
+            query = query.filter(EntityMonthlyTotal.month <= month_start(end_month))
+
+        results = []
+        for row in query.group_by(EntityMonthlyTotal.entity).all():
+            results.append(self._totals(row.entity, row.total_amount, row.transaction_count,
+                                        row.min_amount, row.max_amount, row.last_date))
+        return results
+
+    def entity_totals_between(self, source: str, start: date, end: date, account: Optional[str] = None,
+                              flow: Optional[str] = None) -> List[Dict]:
+        """
+        Per-entity totals for the exact date range start..end (inclusive)
+
+        Whole months come from the cube; the partial months at either edge are
+        aggregated from the source rows, so the range is never widened to
+        month boundaries.
+        """
+        stop = end + timedelta(days=1)
+        first_full = start if start.day == 1 else next_month(start)
+        last_full = month_start(stop)
+
+        if first_full < last_full:
+            totals = {item['entity']: item for item in self.entity_totals(
+                source, account, flow, first_full, last_full - timedelta(days=1))}
+            edges = [(start, first_full), (last_full, stop)]
+        else:
+            totals = {}
+            edges = [(start, stop)]
+
+        for edge_start, edge_stop in edges:
+            if edge_start < edge_stop:
+                self._merge_cells(totals, self._source_cells(source, account, edge_start, edge_stop), flow)
+        return list(totals.values())
+
+    @staticmethod
+    def _source_cells(source: str, account: Optional[str], start: Optional[date], stop: Optional[date]) -> Dict:
+        items = _bank_items if source == SOURCE_BANK else _ledger_items
+        return _aggregate(items(db.session.connection(), account, start, stop))
+
+    def _source_totals(self, source: str, account: Optional[str], flow: Optional[str],
+                       start: Optional[date], stop: Optional[date]) -> Dict[str, Dict]:
+        """Per-entity totals aggregated from the source rows dated start (inclusive) .. stop (exclusive)"""
+        totals: Dict[str, Dict] = {}
+        self._merge_cells(totals, self._source_cells(source, account, start, stop), flow)
+        return totals
+
+    def _merge_cells(self, totals: Dict[str, Dict], cells: Dict[Tuple, Dict], flow: Optional[str]) -> None:
+        """Add aggregated cells into per-entity totals, filtered and signed for a flow"""
+        for (_, _, entity, _, cell_flow), cell in cells.items():
+            if flow not in (None, FLOW_NET) and cell_flow != flow:
+                continue
+            amount = cell['total_amount']
+            if flow == FLOW_NET and cell_flow == 'OUT':
+                amount = -amount
+            current = totals.get(entity)
+            if current is None:
+                totals[entity] = self._totals(entity, amount, cell['transaction_count'], cell['min_amount'],
+                                              cell['max_amount'], cell['last_date'])
+                continue
+            last_dates = [d for d in (current['last_date'], cell['last_date']) if d is not None]
+            totals[entity] = self._totals(
+                entity, Decimal(str(current['total_amount'])) + amount,
+                current['transaction_count'] + cell['transaction_count'],
+                min(Decimal(str(current['min_amount'])), cell['min_amount']),
+                max(Decimal(str(current['max_amount'])), cell['max_amount']),
+                max(last_dates) if last_dates else None)
+
+    @staticmethod
+    def _totals(entity, total_amount, transaction_count, min_amount, max_amount, last_date) -> Dict:
+        total = float(total_amount or 0)
+        count = int(transaction_count or 0)
+        return {
+            'entity': entity,
+            'total_amount': total,
+            'transaction_count': count,
+            'avg_amount': total / count if count else 0,
+            'min_amount': float(min_amount or 0),
+            'max_amount': float(max_amount or 0),
+            'last_date': last_date
+        }
+
+    def top_n(self, n: int, source: str, account: Optional[str] = None, flow: Optional[str] = None,
+              start_month: Optional[date] = None, end_month: Optional[date] = None,
+              key: str = 'total_amount') -> List[Dict]:
+        """
+        Top-N entities for a filter, ranked by one of RANKING_KEYS
+
+        Returns:
+            Up to n entity dicts (see entity_totals), largest first
+        """
+        if key not in RANKING_KEYS:
+            raise ValueError(f'Unknown ranking key: {key}')
+
+        totals = self.entity_totals(source, account, flow, start_month, end_month)
+        return heapq.nlargest(n, totals, key=lambda item: item[key])
+
+    def top_n_between(self, n: int, source: str, start: date, end: date, account: Optional[str] = None,
+                      flow: Optional[str] = None, key: str = 'total_amount') -> List[Dict]:
+        """Top-N entities for the exact date range start..end (see entity_totals_between)"""
+        if key not in RANKING_KEYS:
+            raise ValueError(f'Unknown ranking key: {key}')
+
+        totals = self.entity_totals_between(source, start, end, account, flow)
+        return heapq.nlargest(n, totals, key=lambda item: item[key])
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Merchant Name Normalizer
+
+Resolves raw bank descriptors ("Memo Credit : NORTHERN & CO LL    ACH Pmt",
+"ACH Credit PAYMNT     OVINTIV 0896, CCD") to one canonical merchant name
+("Northern & Co LLC", "Ovintiv") so merchant aggregations do not fragment.
+
+Resolution order:
+- Exact lookup of the normalized descriptor in the merchant_aliases dictionary
+- Fuzzy lookup through a character-trigram inverted index (Dice similarity)
+
+The dictionary is loaded once per process and reloaded when merchant_aliases
+changes (see services.data_version). Each load builds a new immutable
+AliasIndex (dictionary, trigram postings and its own LRU cache of resolved
+descriptors) and swaps it in with a single assignment, so a lookup running
+during a reload sees either the old index or the new one, never a mix.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import csv
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models.merchant_alias import MerchantAlias
+from services.data_version import get_version
+from services.metrics import record_import
+
+logger = logging.getLogger(__name__)
+
+# MERCHANT values in bank exports that are not real counterparties
+PLACEHOLDER_MERCHANTS = {
+    'Unknown', 'Unknown Vendor', 'Not determined', 'Internal Transfer',
+    'Internal Payroll', 'Customer Payment', 'Bank'
+}
+
+# Descriptions that never name a counterparty
+_NON_COUNTERPARTY = re.compile(
+    r'^\s*(?:Transfer\b|Online Transfer\b|Check\b|RD Checking Deposit|POD\b|Wire Transfer Fee)',
+    re.IGNORECASE
+)
+
+# Bank descriptor layouts, each capturing the counterparty field
+_COUNTERPARTY_PATTERNS = [
+    re.compile(r'^Memo Credit\s*:\s*(.+?)(?:\s{2,}|$)', re.IGNORECASE),      # Memo Credit : NAME    ACH ...
+    re.compile(r'^ACH (?:Credit|Debit) .{10} (.+?)(?:,|$)', re.IGNORECASE),   # ACH Credit <entry desc> NAME, CCD ...
+    re.compile(r'^Wire Transfer (?:Debit|Credit)\b[^,]*,\s*([^,]+)', re.IGNORECASE),  # Wire Transfer Debit ..., NAME, ...
+]
+
+
+def extract_descriptor(text: str) -> Optional[str]:
+    """
+    Extract the counterparty part of a bank description
+
+    Args:
+        text: Full bank description or an already extracted merchant string
+
+    Returns:
+        Counterparty text, or None for transfers, deposits and other
+        descriptions without a counterparty
+    """
+    if not text or _NON_COUNTERPARTY.match(text):
+        return None
+
+    for pattern in _COUNTERPARTY_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return match.group(1).strip()
+
+    return text.strip()
+
+
+def normalize_key(text: str) -> str:
+    """
+    Normalize a descriptor for dictionary lookup
+
+    Uppercases, drops punctuation, standalone numbers and reference digits
+    glued to a name ("MATADOR881359374" -> "MATADOR").
+    """
+    text = re.sub(r'(?<=[A-Z])\d{3,}\b', ' ', text.upper())
+    tokens = [token for token in re.split(r'[^A-Z0-9]+', text) if token and not token.isdigit()]
+    return ' '.join(tokens)
+
+
+def trigrams(key: str) -> set:
+    """Character trigrams of a normalized key, padded to weight word starts"""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AliasIndex:
+    """
+    Immutable alias dictionary with its trigram index and lookup cache
+    """
+
+    __slots__ = ('aliases', 'keys', 'gram_counts', 'postings', 'threshold', 'resolve')
+
+    def __init__(self, rows: Iterable[Tuple[str, str]], threshold: float, cache_size: int):
+        aliases = {}
+        for alias_key, canonical_name in rows:
+            aliases[alias_key] = canonical_name
+        # Canonical names always resolve to themselves
+        for canonical_name in set(aliases.values()):
+            aliases.setdefault(normalize_key(canonical_name), canonical_name)
+
+        keys = tuple(key for key in aliases if key)
+        postings = defaultdict(list)
+        gram_counts = []
+        for index, key in enumerate(keys):
+            grams = trigrams(key)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(index)
+
+        self.aliases = MappingProxyType(aliases)
+        self.keys = keys
+        self.gram_counts = tuple(gram_counts)
+        self.postings = MappingProxyType({gram: tuple(indexes) for gram, indexes in postings.items()})
+        self.threshold = threshold
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve_uncached)
+
+    def best_match(self, key: str) -> Optional[str]:
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            for index in self.postings.get(gram, ()):
+                shared[index] += 1
+
+        best_index, best_score = None, self.threshold
+        for index, count in shared.items():
+            score = 2.0 * count / (len(grams) + self.gram_counts[index])
+            if score >= best_score:
+                best_index, best_score = index, score
+
+        return self.aliases[self.keys[best_index]] if best_index is not None else None
+
+    def _resolve_uncached(self, text: str) -> Optional[str]:
+        descriptor = extract_descriptor(text)
+        if not descriptor:
+            return None
+
+        key = normalize_key(descriptor)
+        if not key:
+            return None
+
+        return self.aliases.get(key) or self.best_match(key)
+
+
+class MerchantNormalizer:
+    """
+    Canonical merchant name lookup backed by the merchant_aliases table
+    """
+
+    def __init__(self, threshold: float = 0.6, cache_size: int = 4096, max_age: float = 300.0):
+        """
+        Args:
+            threshold: Minimum trigram Dice similarity for a fuzzy match
+            cache_size: Number of descriptors kept in the LRU cache
+            max_age: Seconds before the dictionary is reloaded even without
+                     a local write (picks up aliases added by other workers)
+        """
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._index = AliasIndex((), threshold, cache_size)
+        self._loaded_version: Optional[Tuple[int, ...]] = None
+        self._loaded_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Dictionary loading
+    # ------------------------------------------------------------------
+
+    def reload(self) -> None:
+        """Reload the alias dictionary from the database (with an empty lookup cache)"""
+        version = get_version(MerchantAlias.__tablename__)
+        try:
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(MerchantAlias.alias_key, MerchantAlias.canonical_name)
+                ).all()
+        except SQLAlchemyError as e:
+            logger.warning(f"Merchant aliases unavailable, using an empty dictionary: {e}")
+            rows = []
+
+        index = AliasIndex(rows, self.threshold, self.cache_size)
+        with self._lock:
+            self._index = index
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self) -> None:
+        if (self._loaded_version != get_version(MerchantAlias.__tablename__)
+                or time.monotonic() - self._loaded_at > self.max_age):
+            self.reload()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def resolve(self, text: Optional[str]) -> Optional[str]:
+        """
+        Resolve a bank description or raw merchant string to a canonical name
+
+        Args:
+            text: Bank description or extracted merchant string
+
+        Returns:
+            Canonical merchant name, or None when nothing matches
+        """
+        if not text:
+            return None
+
+        self._ensure_loaded()
+        return self._index.resolve(text)
+
+    def cache_info(self):
+        """LRU cache statistics of the current index (hits, misses, maxsize, currsize)"""
+        return self._index.resolve.cache_info()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def add_alias(self, descriptor: str, canonical_name: str, source: str = 'MANUAL') -> MerchantAlias:
+        """
+        Add or update an alias in the current session (caller commits)
+
+        Args:
+            descriptor: Bank description or merchant string to map
+            canonical_name: Canonical merchant name
+            source: Alias origin ("MANUAL", "IMPORTED")
+
+        Returns:
+            The MerchantAlias row
+        """
+        key = normalize_key(extract_descriptor(descriptor) or descriptor)
+        alias = MerchantAlias.query.filter_by(alias_key=key).first()
+        if alias is None:
+            alias = MerchantAlias(alias_key=key, canonical_name=canonical_name, source=source, occurrences=0)
+            db.session.add(alias)
+        else:
+            alias.canonical_name = canonical_name
+            alias.source = source
+        return alias
+
+    def import_aliases(self, votes: Dict[str, Counter]) -> Dict:
+        """
+        Persist alias votes, mapping each key to its most frequent merchant
+
+        Manual aliases are never overwritten by imported ones.
+
+        Args:
+            votes: Normalized key -> Counter of canonical names
+
+        Returns:
+            Dict with created/updated/skipped counts
+        """
+        existing = {alias.alias_key: alias for alias in MerchantAlias.query.all()}
+        stats = {'created': 0, 'updated': 0, 'skipped': 0}
+
+        for key, counter in votes.items():
+            canonical_name, occurrences = counter.most_common(1)[0]
+            alias = existing.get(key)
+            if alias is None:
+                db.session.add(MerchantAlias(
+                    alias_key=key,
+                    canonical_name=canonical_name,
+                    source='IMPORTED',
+                    occurrences=occurrences
+                ))
+                stats['created'] += 1
+            elif alias.source == 'MANUAL':
+                stats['skipped'] += 1
+            else:
+                alias.canonical_name = canonical_name
+                alias.occurrences = occurrences
+                stats['updated'] += 1
+
+        db.session.commit()
+        return stats
+
+    def seed_from_csv(self, csv_path: str, description_column: str = 'DESCRIPTION',
+                      merchant_column: str = 'MERCHANT') -> Dict:
+        """
+        Build the alias dictionary from a bank export with a clean merchant column
+
+        Args:
+            csv_path: Path to the CSV export
+            description_column: Column with the raw bank description
+            merchant_column: Column with the clean merchant name
+
+        Returns:
+            Dict with created/updated/skipped counts
+        """
+        votes = defaultdict(Counter)
+        started = time.perf_counter()
+        rows = 0
+
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                rows += 1
+                row = {(k or '').strip(): (v or '').strip() for k, v in row.items()}
+                merchant = row.get(merchant_column)
+                if not merchant or merchant in PLACEHOLDER_MERCHANTS:
+                    continue
+
+                descriptor = extract_descriptor(row.get(description_column, ''))
+                keys = {normalize_key(merchant)}
+                if descriptor:
+                    keys.add(normalize_key(descriptor))
+                for key in keys:
+                    if key:
+                        votes[key][merchant] += 1
+
+        stats = self.import_aliases(votes)
+        record_import('merchant_aliases_csv', rows, time.perf_counter() - started)
+        return stats
+
+
+_normalizer: Optional[MerchantNormalizer] = None
+_normalizer_lock = threading.Lock()
+
+
+def get_merchant_normalizer() -> MerchantNormalizer:
+    """Process-wide normalizer shared by classifier instances"""
+    global _normalizer
+    if _normalizer is None:
+        with _normalizer_lock:
+            if _normalizer is None:
+                _normalizer = MerchantNormalizer()
+    return _normalizer
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - In-Process Metrics
+
+Counters and histograms rendered in the Prometheus text exposition format
+(no client library or external service needed).
+
+Recording is cheap enough to leave on in production: every thread writes
+into its own shard (a plain dict), so the hot path takes no lock; shards
+are only merged when /metrics is scraped. With METRICS_MULTIPROC_DIR set,
+each gunicorn worker also writes its merged totals to that directory
+(throttled) so any worker can answer a scrape for all of them.
+
+Standard metrics:
+- acidtech_http_request_duration_seconds / acidtech_http_requests_total
+- acidtech_classified_transactions_total / acidtech_classification_batch_seconds
+- acidtech_import_rows_total / acidtech_import_duration_seconds
+- acidtech_cache_requests_total (VersionedCache hits and misses)
+- acidtech_db_checkout_seconds (wait for a pooled DB connection)
+
+Gauges sampled at scrape time (e.g. DB pool usage) are added with
+register_collector().
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+BATCH_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_shards: List[Dict] = []
+_shards_lock = threading.Lock()
+_local = threading.local()
+_metrics: Dict[str, 'Metric'] = {}
+_collectors: List[Callable[[], Iterable[Tuple]]] = []
+
+
+def _shard() -> Dict:
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = {}
+        with _shards_lock:
+            _shards.append(shard)
+        _local.shard = shard
+    return shard
+
+
+class Metric:
+    """Base class: a named family of label combinations"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        if name in _metrics:
+            raise ValueError(f'Metric {name} is already registered')
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return (self.name,) + tuple(str(labels[label]) for label in self.labelnames)
+
+
+class Counter(Metric):
+    """Monotonic counter"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = _shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Bucketed distribution (cumulative buckets rendered on scrape)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        shard = _shard()
+        key = self._key(labels)
+        # [count per bucket (+Inf last)..., sum]
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager observing the block's duration in seconds"""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def register_collector(collector: Callable[[], Iterable[Tuple]]) -> None:
+    """
+    Add a callback sampled on every scrape
+
+    The callback yields (name, type, help, [(labels dict, value), ...]).
+    """
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def collect() -> Dict[Tuple, object]:
+    """Merge every thread's shard of this process"""
+    with _shards_lock:
+        shards = list(_shards)
+
+    merged: Dict[Tuple, object] = {}
+    for shard in shards:
+        for key, value in shard.copy().items():
+            if isinstance(value, list):
+                total = merged.get(key)
+                value = list(value)
+                merged[key] = value if total is None else [a + b for a, b in zip(total, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def reset() -> None:
+    """Drop every recorded value of this process (e.g. in a freshly forked worker)"""
+    with _shards_lock:
+        for shard in _shards:
+            shard.clear()
+
+
+def _merge_into(merged: Dict[Tuple, object], other: Dict[Tuple, object]) -> None:
+    for key, value in other.items():
+        total = merged.get(key)
+        if total is None:
+            merged[key] = value
+        elif isinstance(value, list):
+            merged[key] = [a + b for a, b in zip(total, value)]
+        else:
+            merged[key] = total + value
+
+
+class MultiprocessStore:
+    """
+    Per-worker metric files in a shared directory (for gunicorn workers)
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 10.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def flush(self, force: bool = False) -> None:
+        """Write this worker's totals (at most once per flush_interval)"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        path = self._path(os.getpid())
+        payload = [[list(key), value] for key, value in collect().items()]
+        try:
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(payload, f)
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            logger.warning(f'Could not write metrics file {path}: {e}')
+
+    def collect_all(self) -> Dict[Tuple, object]:
+        """This worker's live totals plus every other worker's last flush"""
+        merged = collect()
+        own = self._path(os.getpid())
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    _merge_into(merged, {tuple(key): value for key, value in json.load(f)})
+            except (OSError, ValueError) as e:
+                logger.warning(f'Skipping unreadable metrics file {path}: {e}')
+        return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(values: Optional[Dict[Tuple, object]] = None) -> str:
+    """
+    Prometheus text exposition (format 0.0.4) of every metric and collector
+
+    Args:
+        values: Merged metric values (this process' shards when omitted)
+
+    Returns:
+        Exposition text
+    """
+    values = collect() if values is None else values
+    by_metric: Dict[str, List[Tuple]] = {}
+    for key, value in values.items():
+        by_metric.setdefault(key[0], []).append((key[1:], value))
+
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labelvalues, value in sorted(by_metric.get(name, ())):
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{_labels(metric.labelnames, labelvalues)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                le = ('le', _number(bound) if bound == float('inf') else repr(float(bound)))
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, labelvalues, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric.labelnames, labelvalues)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(metric.labelnames, labelvalues)} {cumulative}')
+
+    for collector in _collectors:
+        try:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(tuple(labels), tuple(str(v) for v in labels.values()))} '
+                                 f'{_number(value)}')
+        except Exception as e:
+            logger.warning(f'Metrics collector {getattr(collector, "__name__", collector)} failed: {e}')
+
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_LATENCY = Histogram('acidtech_http_request_duration_seconds', 'Request latency by endpoint',
+                            ('endpoint', 'method'))
+REQUESTS = Counter('acidtech_http_requests_total', 'Requests by endpoint and status', ('endpoint', 'method', 'status'))
+CLASSIFIED = Counter('acidtech_classified_transactions_total', 'Transactions run through the classifier',
+                     ('job', 'outcome'))
+CLASSIFICATION_SECONDS = Histogram('acidtech_classification_batch_seconds', 'Duration of classification runs',
+                                   ('job',), buckets=BATCH_BUCKETS)
+IMPORT_ROWS = Counter('acidtech_import_rows_total', 'Rows read by importers', ('source',))
+IMPORT_SECONDS = Histogram('acidtech_import_duration_seconds', 'Duration of import runs', ('source',),
+                           buckets=BATCH_BUCKETS)
+CACHE_REQUESTS = Counter('acidtech_cache_requests_total', 'In-process cache lookups', ('cache', 'result'))
+DB_CHECKOUT_SECONDS = Histogram('acidtech_db_checkout_seconds', 'Wait for a connection from the DB pool',
+                                ('dialect',), buckets=CHECKOUT_BUCKETS)
+
+
+def record_classification(job: str, classified: int, failed: int, seconds: float) -> None:
+    """Count one classification run (throughput = classified_total / batch_seconds_sum)"""
+    CLASSIFIED.inc(classified, job=job, outcome='classified')
+    if failed:
+        CLASSIFIED.inc(failed, job=job, outcome='failed')
+    CLASSIFICATION_SECONDS.observe(seconds, job=job)
+
+
+def record_import(source: str, rows: int, seconds: float) -> None:
+    """Count one import run (rows/sec = import_rows_total / import_duration_seconds_sum)"""
+    IMPORT_ROWS.inc(rows, source=source)
+    IMPORT_SECONDS.observe(seconds, source=source)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Learned Transaction Classifier
+
+Local text classifier trained on manually confirmed classifications
+(classification_method == 'MANUAL'). It predicts the
+(business_category, gl_account_code, tax_category) triple of a bank
+transaction from:
+- Hashed word unigrams/bigrams of the description
+- Account name, amount sign and amount magnitude bucket
+
+The model is a multinomial logistic regression in pure NumPy with a
+temperature fitted on held-out rows so the reported confidence is
+calibrated. Each trained model is saved to its own version directory of
+.npy arrays plus meta.json, published by atomically replacing the CURRENT
+pointer file, and memory-mapped when loaded. It scores transactions in
+fixed-size chunks.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.bank_transaction import BankTransaction
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 16
+CHUNK_SIZE = 4096
+DEFAULT_THRESHOLD = 0.80
+POINTER_FILE = 'CURRENT'    # Name of the published version directory
+KEEP_VERSIONS = 3           # Version directories kept for workers still reading older ones
+
+TARGET_FIELDS = ('business_category', 'gl_account_code', 'tax_category')
+
+_TOKEN = re.compile(r'[A-Za-z][A-Za-z&]+')
+
+# (account_name, description, amount)
+Sample = Tuple[str, str, float]
+
+
+def transaction_sample(transaction: BankTransaction) -> Sample:
+    """Model input for a bank transaction"""
+    return transaction.account_name or '', transaction.description or '', float(transaction.amount or 0)
+
+
+def hashed_features(sample: Sample, n_features: int = N_FEATURES) -> List[int]:
+    """
+    Hashed feature indices of one sample
+
+    crc32 is used instead of hash() so indices are stable across processes.
+    """
+    account, description, amount = sample
+    tokens = [token.upper() for token in _TOKEN.findall(description)]
+    magnitude = int(math.log10(abs(amount) + 1))
+
+    names = [f'acct={account}', f'sign={amount >= 0}', f'mag={magnitude}']
+    names.extend(f'w={token}' for token in tokens)
+    names.extend(f'b={first}_{second}' for first, second in zip(tokens, tokens[1:]))
+
+    mask = n_features - 1
+    return sorted({zlib.crc32(name.encode('utf-8')) & mask for name in names})
+
+
+def _encode(samples: Sequence[Sample], n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode samples as CSR row pointers and feature indices (binary values)"""
+    indptr = [0]
+    indices = []
+    for sample in samples:
+        indices.extend(hashed_features(sample, n_features))
+        indptr.append(len(indices))
+    return np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64)
+
+
+def _logits(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, bias: np.ndarray) -> np.ndarray:
+    # Every sample has at least the account/sign/magnitude features, so no row is empty
+    return np.add.reduceat(weights[indices], indptr[:-1], axis=0) + bias
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _fit(indptr: np.ndarray, indices: np.ndarray, labels: np.ndarray, n_classes: int, n_features: int,
+         epochs: int, learning_rate: float, l2: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Full-batch softmax regression trained with AdaGrad"""
+    n_samples = len(labels)
+    row_lengths = np.diff(indptr)
+    weights = np.zeros((n_features, n_classes), dtype=np.float32)
+    bias = np.zeros(n_classes, dtype=np.float32)
+    weight_acc = np.full_like(weights, 1e-8)
+    bias_acc = np.full_like(bias, 1e-8)
+
+    for _ in range(epochs):
+        gradient = _softmax(_logits(indptr, indices, weights, bias))
+        gradient[np.arange(n_samples), labels] -= 1.0
+        gradient /= n_samples
+
+        weight_grad = np.zeros_like(weights)
+        np.add.at(weight_grad, indices, np.repeat(gradient, row_lengths, axis=0))
+        weight_grad += l2 * weights
+        bias_grad = gradient.sum(axis=0)
+
+        weight_acc += weight_grad ** 2
+        bias_acc += bias_grad ** 2
+        weights -= learning_rate * weight_grad / np.sqrt(weight_acc)
+        bias -= learning_rate * bias_grad / np.sqrt(bias_acc)
+
+    return weights, bias
+
+
+def _fit_temperature(logits: np.ndarray, labels: np.ndarray) -> float:
+    """Temperature minimizing negative log-likelihood on held-out logits"""
+    best_temperature, best_nll = 1.0, float('inf')
+    rows = np.arange(len(labels))
+    for temperature in np.exp(np.linspace(math.log(0.25), math.log(5.0), 41)):
+        probabilities = _softmax(logits / temperature)
+        nll = -np.log(probabilities[rows, labels] + 1e-12).mean()
+        if nll < best_nll:
+            best_temperature, best_nll = float(temperature), nll
+    return best_temperature
+
+
+class TransactionModel:
+    """
+    Trained classifier artifact
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: List[Tuple[Optional[str], ...]],
+                 temperature: float = 1.0, meta: Optional[Dict] = None):
+        self.weights = weights
+        self.bias = bias
+        self.labels = [tuple(label) for label in labels]
+        self.temperature = temperature
+        self.meta = meta or {}
+        self.n_features = weights.shape[0]
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def train(cls, samples: Sequence[Sample], targets: Sequence[Tuple[Optional[str], ...]],
+              n_features: int = N_FEATURES, epochs: int = 60, learning_rate: float = 0.5,
+              l2: float = 1e-4, holdout: float = 0.2, seed: int = 42) -> 'TransactionModel':
+        """
+        Train a model and calibrate its confidence
+
+        Args:
+            samples: (account_name, description, amount) tuples
+            targets: (business_category, gl_account_code, tax_category) per sample
+            n_features: Hash space size (power of two)
+            epochs: AdaGrad iterations
+            learning_rate: AdaGrad step size
+            l2: L2 regularization strength
+            holdout: Share of samples used to fit the temperature
+            seed: Shuffle seed for the holdout split
+
+        Returns:
+            Trained TransactionModel
+        """
+        if not samples:
+            raise ValueError('Cannot train on an empty sample set')
+
+        labels = sorted(set(targets), key=lambda label: tuple(value or '' for value in label))
+        label_index = {label: i for i, label in enumerate(labels)}
+        y = np.asarray([label_index[target] for target in targets], dtype=np.int64)
+
+        order = np.random.default_rng(seed).permutation(len(samples))
+        n_holdout = int(len(samples) * holdout) if len(samples) >= 20 else 0
+        holdout_rows, train_rows = order[:n_holdout], order[n_holdout:]
+
+        temperature = 1.0
+        if n_holdout:
+            indptr, indices = _encode([samples[i] for i in train_rows], n_features)
+            weights, bias = _fit(indptr, indices, y[train_rows], len(labels), n_features, epochs, learning_rate, l2)
+            indptr, indices = _encode([samples[i] for i in holdout_rows], n_features)
+            temperature = _fit_temperature(_logits(indptr, indices, weights, bias), y[holdout_rows])
+
+        # Final fit on every sample, keeping the held-out temperature
+        indptr, indices = _encode(samples, n_features)
+        weights, bias = _fit(indptr, indices, y, len(labels), n_features, epochs, learning_rate, l2)
+
+        meta = {
+            'trained_at': datetime.utcnow().isoformat(),
+            'n_samples': len(samples),
+            'n_holdout': n_holdout,
+        }
+        return cls(weights, bias, labels, temperature, meta)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def predict_batch(self, samples: Sequence[Sample], chunk_size: int = CHUNK_SIZE) -> List[Dict]:
+        """
+        Score samples in chunks
+
+        Args:
+            samples: (account_name, description, amount) tuples
+            chunk_size: Samples encoded and scored per chunk
+
+        Returns:
+            One dict per sample with business_category, gl_account_code,
+            tax_category and calibrated confidence
+        """
+        predictions = []
+        for start in range(0, len(samples), chunk_size):
+            indptr, indices = _encode(samples[start:start + chunk_size], self.n_features)
+            probabilities = _softmax(_logits(indptr, indices, self.weights, self.bias) / self.temperature)
+            best = probabilities.argmax(axis=1)
+            confidence = probabilities[np.arange(len(best)), best]
+            for label_id, score in zip(best.tolist(), confidence.tolist()):
+                prediction = dict(zip(TARGET_FIELDS, self.labels[label_id]))
+                prediction['confidence'] = score
+                predictions.append(prediction)
+        return predictions
+
+    def predict_transactions(self, transactions: Sequence[BankTransaction],
+                             chunk_size: int = CHUNK_SIZE) -> List[Dict]:
+        """Score BankTransaction rows (see predict_batch)"""
+        return self.predict_batch([transaction_sample(t) for t in transactions], chunk_size)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, model_dir: str) -> str:
+        """
+        Write the artifact to a new version directory and publish it
+
+        The version directory is complete before the CURRENT pointer is
+        atomically replaced, and is never modified afterwards, so readers
+        always see one whole model. Older versions beyond KEEP_VERSIONS are
+        removed.
+
+        Returns:
+            The version name
+        """
+        os.makedirs(model_dir, exist_ok=True)
+        version = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}"
+        version_dir = os.path.join(model_dir, version)
+        os.makedirs(version_dir)
+
+        for name, array in (('weights', self.weights), ('bias', self.bias)):
+            np.save(os.path.join(version_dir, f'{name}.npy'), np.ascontiguousarray(array, dtype=np.float32))
+
+        meta = dict(self.meta)
+        meta.update({
+            'labels': [list(label) for label in self.labels],
+            'temperature': self.temperature,
+            'n_features': self.n_features,
+            'target_fields': list(TARGET_FIELDS),
+        })
+        with open(os.path.join(version_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        tmp_path = os.path.join(model_dir, f'{POINTER_FILE}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(model_dir, POINTER_FILE))
+
+        _prune_versions(model_dir, version)
+        return version
+
+    @classmethod
+    def load(cls, model_dir: str, version: Optional[str] = None) -> 'TransactionModel':
+        """Load the published (or given) version, memory-mapping the weight matrix"""
+        version = version or current_version(model_dir)
+        if version is None:
+            raise FileNotFoundError(f'No classifier model published in {model_dir}')
+        version_dir = os.path.join(model_dir, version)
+        with open(os.path.join(version_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        weights = np.load(os.path.join(version_dir, 'weights.npy'), mmap_mode='r')
+        bias = np.load(os.path.join(version_dir, 'bias.npy'))
+        return cls(weights, bias, meta.pop('labels'), meta.pop('temperature', 1.0), meta)
+
+
+def current_version(model_dir: str) -> Optional[str]:
+    """Name of the published model version, or None when nothing has been trained"""
+    try:
+        with open(os.path.join(model_dir, POINTER_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _prune_versions(model_dir: str, keep: str) -> None:
+    versions = sorted(name for name in os.listdir(model_dir)
+                      if os.path.isdir(os.path.join(model_dir, name)))
+    for name in versions[:-KEEP_VERSIONS]:
+        if name != keep:
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
+
+
+def train_from_database(model_dir: str, min_samples: int = 50) -> Dict:
+    """
+    Train on manually confirmed classifications and save the artifact
+
+    Args:
+        model_dir: Directory the artifact is written to
+        min_samples: Minimum number of MANUAL rows required
+
+    Returns:
+        Dict with training statistics
+    """
+    rows = BankTransaction.query.filter(
+        BankTransaction.classification_method == 'MANUAL',
+        BankTransaction.business_category.isnot(None)
+    ).all()
+
+    if len(rows) < min_samples:
+        return {
+            'trained': False,
+            'n_samples': len(rows),
+            'message': f'Need at least {min_samples} manually classified transactions'
+        }
+
+    model = TransactionModel.train(
+        [transaction_sample(t) for t in rows],
+        [tuple(getattr(t, field) for field in TARGET_FIELDS) for t in rows]
+    )
+    model.save(model_dir)
+    _loaded_models.pop(model_dir, None)
+
+    return {
+        'trained': True,
+        'n_samples': len(rows),
+        'n_classes': len(model.labels),
+        'temperature': model.temperature,
+        'model_dir': model_dir
+    }
+
+
+_loaded_models: Dict[str, Tuple[str, TransactionModel]] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_dir: str) -> Optional[TransactionModel]:
+    """
+    Process-wide model for a directory, reloaded when the published version changes
+
+    Returns:
+        TransactionModel, or None when no artifact has been trained yet
+    """
+    version = current_version(model_dir)
+    if version is None:
+        return None
+
+    cached = _loaded_models.get(model_dir)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _models_lock:
+        try:
+            model = TransactionModel.load(model_dir, version)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load classifier model {version} from {model_dir}: {e}")
+            return None
+        _loaded_models[model_dir] = (version, model)
+        return model
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Period Close and Frozen Period Totals
+
+Closing a month freezes the per-account/per-category totals of its
+classified bank transactions into period_totals and makes the month
+read-only:
+
+- a before_flush guard rejects inserts, edits and deletes of bank
+  transactions dated in a closed month with ClosedPeriodError, and bulk
+  UPDATE/DELETE statements touching such rows are rejected the same way.
+  The guard reads closed_periods on every write, never the cache, so a
+  close or reopen committed by another worker applies immediately
+- reopen_period() drops the frozen totals and makes the month editable
+
+period_totals() answers aggregate queries over any date range by reading
+the frozen rows for closed months and grouping live rows only for the
+open remainder, so dashboard cost is bounded by the open window no matter
+how many years of history accumulate.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import logging
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import case, event, extract, func, inspect, not_, or_, select
+from sqlalchemy.orm import Session
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.period_close import ClosedPeriod, PeriodTotal
+from services.data_version import VersionedCache
+
+logger = logging.getLogger(__name__)
+
+_closed_cache = VersionedCache(max_age=60, name='closed_periods')
+
+
+class ClosedPeriodError(ValueError):
+    """Raised when a write touches a bank transaction dated in a closed month"""
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """First and last day of a month"""
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+def _load_closed_months(session: Session) -> FrozenSet[date]:
+    with session.no_autoflush:
+        return frozenset(session.execute(select(ClosedPeriod.period_start)).scalars())
+
+
+def closed_months(session: Optional[Session] = None) -> FrozenSet[date]:
+    """
+    First days of every closed month, for report filters
+
+    Cached by the closed_periods data version, which only the committing
+    worker bumps: other workers may see a close or reopen up to max_age
+    late. Write guards must not use this (see _load_closed_months).
+    """
+    session = session or db.session
+    return _closed_cache.get_or_compute('closed_months', ('closed_periods',),
+                                        lambda: _load_closed_months(session))
+
+
+def _closed_ranges(months: FrozenSet[date]) -> List[Tuple[date, date]]:
+    """Closed months merged into contiguous date ranges"""
+    ranges: List[Tuple[date, date]] = []
+    for start in sorted(months):
+        end = month_bounds(start.year, start.month)[1]
+        if ranges and (start - ranges[-1][1]).days == 1:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def closed_clause(months: Optional[FrozenSet[date]] = None):
+    """SQL filter matching bank transactions dated in a closed month, or None when nothing is closed"""
+    ranges = _closed_ranges(closed_months() if months is None else months)
+    if not ranges:
+        return None
+    return or_(*[BankTransaction.transaction_date.between(start, end) for start, end in ranges])
+
+
+def open_period_clause():
+    """SQL filter excluding bank transactions of closed months, or None when nothing is closed"""
+    clause = closed_clause()
+    return not_(clause) if clause is not None else None
+
+
+def _is_closed(value: Optional[date], months: FrozenSet[date]) -> bool:
+    return value is not None and value.replace(day=1) in months
+
+
+@event.listens_for(Session, 'before_flush')
+def _guard_closed_periods(session, flush_context, instances):
+    touched = [obj for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+               if isinstance(obj, BankTransaction)]
+    if not touched:
+        return
+    months = _load_closed_months(session)
+    if not months:
+        return
+
+    for obj in touched:
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        history = inspect(obj).attrs.transaction_date.history
+        dates = [obj.transaction_date] + list(history.deleted or ())
+        for value in dates:
+            if _is_closed(value, months):
+                raise ClosedPeriodError(
+                    f'{value:%Y-%m} is closed; reopen the period before changing its transactions'
+                )
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _guard_closed_period_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not BankTransaction:
+        return
+    clause = closed_clause(_load_closed_months(orm_execute_state.session))
+    if clause is None:
+        return
+
+    query = select(func.count(BankTransaction.id)).where(clause)
+    if orm_execute_state.statement.whereclause is not None:
+        query = query.where(orm_execute_state.statement.whereclause)
+    if orm_execute_state.session.execute(query).scalar():
+        raise ClosedPeriodError('Statement would change transactions of a closed period; reopen it first')
+
+
+def _live_totals(start: date, end: date, account_name: Optional[str] = None) -> List[Dict]:
+    """Group classified bank transactions of a date range by month, account and category"""
+    year = extract('year', BankTransaction.transaction_date)
+    month = extract('month', BankTransaction.transaction_date)
+    query = db.session.query(
+        year.label('year'),
+        month.label('month'),
+        BankTransaction.account_name,
+        BankTransaction.business_category,
+        func.sum(case((BankTransaction.amount > 0, BankTransaction.amount), else_=0)).label('inflow'),
+        func.sum(case((BankTransaction.amount < 0, -BankTransaction.amount), else_=0)).label('outflow'),
+        func.count(BankTransaction.id).label('transaction_count')
+    ).filter(
+        BankTransaction.transaction_date >= start,
+        BankTransaction.transaction_date <= end,
+        BankTransaction.is_classified == True
+    )
+    if account_name:
+        query = query.filter(BankTransaction.account_name == account_name)
+
+    return [{
+        'month': date(int(row.year), int(row.month), 1),
+        'account_name': row.account_name,
+        'business_category': row.business_category,
+        'inflow': Decimal(str(row.inflow or 0)),
+        'outflow': Decimal(str(row.outflow or 0)),
+        'transaction_count': row.transaction_count
+    } for row in query.group_by(year, month, BankTransaction.account_name, BankTransaction.business_category)]
+
+
+def period_totals(start: date, end: date, account_name: Optional[str] = None) -> List[Dict]:
+    """
+    Per-month, per-account, per-category totals of classified bank transactions
+
+    Closed months fully inside the range come from period_totals; the rest
+    of the range is grouped live.
+
+    Args:
+        start: First transaction date
+        end: Last transaction date
+        account_name: Optional account filter
+
+    Returns:
+        List of dicts with month, account_name, business_category, inflow,
+        outflow and transaction_count
+    """
+    frozen = sorted(m for m in closed_months()
+                    if m >= start and month_bounds(m.year, m.month)[1] <= end)
+
+    rows: List[Dict] = []
+    if frozen:
+        query = PeriodTotal.query.filter(PeriodTotal.period_start.in_(frozen))
+        if account_name:
+            query = query.filter(PeriodTotal.account_name == account_name)
+        rows.extend({
+            'month': total.period_start,
+            'account_name': total.account_name,
+            'business_category': total.business_category,
+            'inflow': Decimal(str(total.inflow or 0)),
+            'outflow': Decimal(str(total.outflow or 0)),
+            'transaction_count': total.transaction_count
+        } for total in query)
+
+    # Live grouping only for the open gaps between frozen months
+    cursor = start
+    for month_start in frozen + [None]:
+        gap_end = end if month_start is None else date.fromordinal(month_start.toordinal() - 1)
+        if cursor <= gap_end:
+            rows.extend(_live_totals(cursor, gap_end, account_name))
+        if month_start is not None:
+            cursor = date.fromordinal(month_bounds(month_start.year, month_start.month)[1].toordinal() + 1)
+    return rows
+
+
+def close_period(year: int, month: int, closed_by: Optional[int] = None, notes: Optional[str] = None) -> ClosedPeriod:
+    """
+    Freeze a finished month's totals and make its bank transactions read-only (commits)
+
+    Returns:
+        The ClosedPeriod
+    """
+    start, end = month_bounds(year, month)
+    if end >= date.today():
+        raise ValueError(f'{start:%Y-%m} has not ended yet')
+    if ClosedPeriod.query.filter_by(period_start=start).first() is not None:
+        raise ValueError(f'{start:%Y-%m} is already closed')
+
+    totals = _live_totals(start, end)
+    for total in totals:
+        db.session.add(PeriodTotal(
+            period_start=start,
+            account_name=total['account_name'],
+            business_category=total['business_category'],
+            inflow=total['inflow'],
+            outflow=total['outflow'],
+            transaction_count=total['transaction_count']
+        ))
+
+    unclassified = db.session.query(func.count(BankTransaction.id)).filter(
+        BankTransaction.transaction_date.between(start, end),
+        or_(BankTransaction.is_classified == False, BankTransaction.is_classified.is_(None))
+    ).scalar()
+    period = ClosedPeriod(
+        period_start=start,
+        period_end=end,
+        transaction_count=sum(total['transaction_count'] for total in totals),
+        unclassified_count=unclassified,
+        notes=notes,
+        closed_by=closed_by
+    )
+    db.session.add(period)
+    db.session.commit()
+
+    if unclassified:
+        logger.warning(f'Closed {start:%Y-%m} with {unclassified} unclassified transactions left out of its totals')
+    return period
+
+
+def reopen_period(year: int, month: int) -> bool:
+    """
+    Drop a month's frozen totals and make it editable again (commits)
+
+    Returns:
+        True when the month was closed
+    """
+    start, _ = month_bounds(year, month)
+    period = ClosedPeriod.query.filter_by(period_start=start).first()
+    if period is None:
+        return False
+    PeriodTotal.query.filter(PeriodTotal.period_start == start).delete(synchronize_session=False)
+    db.session.delete(period)
+    db.session.commit()
+    return True
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Read-Only Session Routing
+
+Sends reporting reads to a read-only engine (a replica of the primary
+database configured as the 'reporting' bind) so heavy report queries do
+not compete with AP/AR writes on the primary:
+
+- only SELECT statements are routed; flushes, bulk UPDATE/DELETE and raw
+  text() statements always go to the primary
+- routing is opt-in per app context: GET requests to the reporting
+  blueprints (READ_REPLICA_BLUEPRINTS) and blocks wrapped in
+  reporting_reads()
+- without a 'reporting' bind, or while the replica fails its health
+  check, everything falls back to the primary
+- once a session has written (flush or bulk UPDATE/DELETE), its reads go
+  to the primary until the transaction ends, and after a commit the rest
+  of the request reads the primary (read-your-writes)
+
+The replica may lag the primary, so only views that tolerate slightly
+stale data should read from it. Code that reads rows it is about to write
+(snapshot renders, cube rebuilds) wraps the read in reporting_reads(False).
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+
+logger = logging.getLogger(__name__)
+
+REPORTING_BIND = 'reporting'
+
+_health_lock = threading.Lock()
+_health = {'checked': 0.0, 'ok': True}
+
+_WROTE_KEY = 'read_routing_wrote'
+
+
+def reading_from_replica() -> bool:
+    """Whether the current app context routes reads to the reporting bind"""
+    return has_app_context() and bool(g.get('reporting_reads'))
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reporting SELECTs to the read-only bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get(_WROTE_KEY) \
+                and isinstance(clause, (Select, CompoundSelect)) and reading_from_replica():
+            engine = self._db.engines.get(REPORTING_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_after_flush(session, flush_context):
+    session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _pin_after_bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _read_own_writes(session):
+    # The replica may not have the commit yet: the rest of the request reads the primary
+    if session.info.pop(_WROTE_KEY, None) and has_app_context():
+        g.reporting_reads = False
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _unpin_after_rollback(session):
+    session.info.pop(_WROTE_KEY, None)
+
+
+def replica_available(engine: Optional[Engine], interval: float = 30.0) -> bool:
+    """
+    Health of the read-only engine, pinged at most once per ``interval`` seconds
+
+    Args:
+        engine: the reporting engine (None when no bind is configured)
+        interval: seconds a health check result is reused
+
+    Returns:
+        True when reads can be routed to the engine
+    """
+    if engine is None:
+        return False
+    now = time.monotonic()
+    if now - _health['checked'] < interval:
+        return _health['ok']
+
+    with _health_lock:
+        if now - _health['checked'] < interval:
+            return _health['ok']
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            ok = True
+        except Exception as e:
+            logger.warning(f"Reporting database unavailable, reading from the primary: {e}")
+            ok = False
+        if ok and not _health['ok']:
+            logger.info('Reporting database is back; routing reporting reads to it')
+        _health.update(checked=time.monotonic(), ok=ok)
+        return ok
+
+
+@contextmanager
+def reporting_reads(enabled: bool = True):
+    """
+    Route the SELECTs of a block (report jobs, exports) to the reporting bind
+
+    Args:
+        enabled: False forces primary reads inside a routed request
+    """
+    previous = g.get('reporting_reads')
+    g.reporting_reads = enabled
+    try:
+        yield
+    finally:
+        g.reporting_reads = previous
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Receipt Field Extraction
+
+Pulls invoice_number / amount / date / vendor out of OCR text. Instead of
+taking the first regex hit per field, every candidate in the text is
+collected and scored:
+
+- keywords on the same line ("Total", "Amount Due", "Invoice No.") and
+  penalties for look-alikes ("Subtotal", "Tax", "Change", "Due Date")
+- position on the receipt (totals sit near the bottom, the invoice date
+  and the vendor near the top)
+- shape of the value (currency sign, cents, a digit in an invoice number)
+
+The best candidate wins and gets a 0..1 confidence that combines its score
+with the margin over the runner-up (a lone candidate gets half the margin
+credit: nothing competed with it, which is not evidence it is right), so
+callers can refuse to write back weak guesses. All patterns are compiled
+once at import.
+
+extract_directory() runs OCR + extraction over a folder of receipts on a
+process pool (batch imports, evaluation against labelled fixtures).
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('invoice_number', 'amount', 'date', 'vendor')
+
+# Score at which the best candidate counts as strong
+STRONG_SCORE = {'invoice_number': 5.0, 'amount': 6.0, 'date': 3.0, 'vendor': 4.0}
+
+# Margin credited to a candidate that has no runner-up
+SOLE_CANDIDATE_MARGIN = 0.5
+
+# --- Amounts ---------------------------------------------------------------
+
+_MONEY = re.compile(
+    r'(?<![\w.,/-])(?P<sign>\$|USD\s?)?\s?(?P<value>\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+\.\d{2}|\d+)(?![\w/-]|[.,]\d)',
+    re.IGNORECASE
+)
+_AMOUNT_KEYWORDS = [
+    (re.compile(r'\b(?:grand\s+total|total\s+due|amount\s+due|balance\s+due|total\s+amount|amount\s+paid|total\s+paid)\b', re.IGNORECASE), 6.0),
+    (re.compile(r'(?<!sub)(?<!sub\s)(?<!sub-)\btotal\b', re.IGNORECASE), 4.0),
+    (re.compile(r'\b(?:amount|balance|charged|pay\s+this)\b', re.IGNORECASE), 2.0),
+    (re.compile(r'\bsub\s?-?total\b', re.IGNORECASE), -3.0),
+    (re.compile(r'\b(?:tax|vat|gst|tip|gratuity|discount|savings|fee)\b', re.IGNORECASE), -3.0),
+    (re.compile(r'\b(?:cash|tendered|change|paid\s+by|rounding)\b', re.IGNORECASE), -4.0),
+    (re.compile(r'\b(?:qty|quantity|@|each|unit|price)\b', re.IGNORECASE), -1.5),
+    (re.compile(r'\b(?:phone|tel|fax|zip|store|register|terminal|acct|account|card|auth|trans)\b|#', re.IGNORECASE), -3.0),
+]
+
+# --- Dates -----------------------------------------------------------------
+
+_MONTHS = {name: number for number, names in enumerate((
+    ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',),
+    ('jun', 'june'), ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'),
+    ('oct', 'october'), ('nov', 'november'), ('dec', 'december')), start=1) for name in names}
+_MONTH_NAME = r'(?P<month_name>' + '|'.join(sorted(_MONTHS, key=len, reverse=True)) + r')\.?'
+
+_DATE_PATTERNS = [
+    re.compile(r'\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b'),                       # 2026-03-15
+    re.compile(r'\b(?P<month>\d{1,2})[/\-.](?P<day>\d{1,2})[/\-.](?P<year>\d{4}|\d{2})\b'),       # 03/15/2026, 3-15-26
+    re.compile(r'\b' + _MONTH_NAME + r'\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})\b', re.IGNORECASE),
+    re.compile(r'\b(?P<day>\d{1,2})(?:st|nd|rd|th)?\s+' + _MONTH_NAME + r',?\s+(?P<year>\d{4})\b', re.IGNORECASE),
+]
+_DATE_KEYWORDS = [
+    (re.compile(r'\b(?:invoice|receipt|transaction|purchase|order|issue[d]?|bill)\s+date\b', re.IGNORECASE), 4.0),
+    (re.compile(r'\bdate\b', re.IGNORECASE), 2.5),
+    (re.compile(r'\b(?:due|expir\w*|exp|valid|return\s+by|ship\w*|delivery|period|through|thru)\b', re.IGNORECASE), -3.0),
+]
+
+# --- Invoice numbers -------------------------------------------------------
+
+_INVOICE_PATTERNS = [
+    (re.compile(r'\binv(?:oice)?\.?\s*(?:no\.?|num(?:ber)?|#|id)?\s*[:#]?\s*(?P<value>[A-Z0-9][A-Z0-9\-/]{2,})', re.IGNORECASE), 4.0),
+    (re.compile(r'\b(?:receipt|order|ref(?:erence)?|document|doc|bill)\.?\s*(?:no\.?|num(?:ber)?|#|id)?\s*[:#]\s*(?P<value>[A-Z0-9][A-Z0-9\-/]{2,})', re.IGNORECASE), 2.5),
+    (re.compile(r'(?:^|\s)#\s*(?P<value>[A-Z0-9][A-Z0-9\-]{2,})', re.IGNORECASE), 1.0),
+]
+_NOT_INVOICE_CONTEXT = re.compile(r'\b(?:phone|tel|fax|store|register|terminal|card|acct|account|auth|approval|lane|cashier|table|seat)\b', re.IGNORECASE)
+_INVOICE_WORDS = re.compile(r'^(?:no|num|number|date|total|amount|for|to|from)$', re.IGNORECASE)
+
+# --- Vendor ----------------------------------------------------------------
+
+_COMPANY_SUFFIX = re.compile(r'\b(?:inc|llc|l\.l\.c|ltd|co|corp|corporation|company|group|gmbh|plc|services|supply|supplies)\b\.?', re.IGNORECASE)
+_NOT_VENDOR = re.compile(
+    r'^(?:receipt|invoice|sales\s+receipt|tax\s+invoice|bill\s+to|ship\s+to|sold\s+to|customer|date|page|thank\s+you|welcome|store\s*#?|tel|phone|fax|www\.|http)\b'
+    r'|\d{3}[\s.\-)]+\d{3}[\s.\-]\d{4}'      # phone number
+    r'|[*xX]{3,}\s?\d{4}\b'                   # masked card number
+    r'|^\d+\s+\w+.*\b(?:st|street|ave|avenue|rd|road|blvd|dr|drive|suite|ste|hwy|way|ln|lane)\b\.?',   # street address
+    re.IGNORECASE
+)
+_MOSTLY_DIGITS = re.compile(r'^[\d\s/\-$.,:#*]+$')
+# Total / amount / subtotal / cash labels and invoice/issue "date" labels; tax, tip, fee and
+# due-date words are left out because they also occur in business names ("Discount Tire")
+_VENDOR_EXCLUDED_KEYWORDS = [pattern for pattern, _ in _AMOUNT_KEYWORDS[:4] + _AMOUNT_KEYWORDS[5:6] + _DATE_KEYWORDS[:2]]
+_INVOICE_LABEL = re.compile(r'\binv(?:oice)?\b\.?\s*(?:no\b\.?|num(?:ber)?\b|#|id\b)', re.IGNORECASE)
+
+
+class Candidate(NamedTuple):
+    value: object
+    score: float
+    line: int
+
+
+def _keyword_score(line: str, keywords) -> float:
+    return sum(weight for pattern, weight in keywords if pattern.search(line))
+
+
+def _confidence(candidates: List[Candidate], strong: float) -> float:
+    """Strength of the best candidate times its margin over the runner-up"""
+    if not candidates or candidates[0].score <= 0:
+        return 0.0
+    best = candidates[0].score
+    strength = min(1.0, best / strong)
+    runner_up = max((c.score for c in candidates[1:] if c.value != candidates[0].value), default=None)
+    if runner_up is None:
+        margin = SOLE_CANDIDATE_MARGIN
+    else:
+        margin = 1.0 - max(0.0, runner_up) / best
+    return round(strength * (0.5 + 0.5 * margin), 3)
+
+
+def _ranked(candidates: List[Candidate]) -> List[Candidate]:
+    # Ties go to the candidate met first
+    return sorted(candidates, key=lambda c: (-c.score, c.line))
+
+
+def amount_candidates(lines: List[str]) -> List[Candidate]:
+    """Scored money amounts; the same value on several lines keeps its best score"""
+    n = max(len(lines), 1)
+    best: Dict[float, Candidate] = {}
+    for index, line in enumerate(lines):
+        scanned = _strip_dates(line)           # 03.15.26 and 2026-03-15 are not amounts
+        if not scanned.strip():
+            continue
+        keywords = _keyword_score(scanned, _AMOUNT_KEYWORDS)
+        matches = list(_MONEY.finditer(scanned))
+        for position, match in enumerate(matches):
+            raw = match.group('value')
+            has_cents = '.' in raw
+            if not match.group('sign') and not has_cents:
+                continue                            # Bare integers are quantities, SKUs and years
+            value = float(raw.replace(',', ''))
+            if value <= 0:
+                continue
+            score = keywords
+            score += 1.0 if match.group('sign') else 0.0
+            score += 0.5 if has_cents else 0.0
+            score += 1.0 * index / n                 # Totals are printed below the items
+            score += 0.5 if position == len(matches) - 1 else 0.0   # Right-most column on the line
+            if value not in best or score > best[value].score:
+                best[value] = Candidate(value, score, index)
+
+    candidates = list(best.values())
+    if candidates:
+        largest = max(c.value for c in candidates)
+        # The total is normally the largest amount that is not cash tendered
+        candidates = [c._replace(score=c.score + 1.0) if c.value == largest and c.score > 0 else c for c in candidates]
+    return _ranked(candidates)
+
+
+def _strip_dates(line: str) -> str:
+    for pattern in _DATE_PATTERNS:
+        line = pattern.sub(' ', line)
+    return line
+
+
+def _to_date(match) -> Optional[date]:
+    groups = match.groupdict()
+    try:
+        year = int(groups['year'])
+        if year < 100:
+            year += 2000
+        month = _MONTHS[groups['month_name'].lower().rstrip('.')] if groups.get('month_name') else int(groups['month'])
+        return date(year, month, int(groups['day']))
+    except (KeyError, ValueError):
+        return None
+
+
+def date_candidates(lines: List[str]) -> List[Candidate]:
+    """Scored calendar dates (US month-first for numeric dates)"""
+    n = max(len(lines), 1)
+    best: Dict[date, Candidate] = {}
+    for index, line in enumerate(lines):
+        keywords = _keyword_score(line, _DATE_KEYWORDS)
+        for pattern in _DATE_PATTERNS:
+            for match in pattern.finditer(line):
+                value = _to_date(match)
+                if value is None or not 1990 <= value.year <= 2100:
+                    continue
+                score = 1.0 + keywords + 1.0 * (1 - index / n)    # The issue date sits in the header
+                if value not in best or score > best[value].score:
+                    best[value] = Candidate(value, score, index)
+    return _ranked(list(best.values()))
+
+
+def invoice_candidates(lines: List[str]) -> List[Candidate]:
+    """Scored invoice / receipt numbers"""
+    n = max(len(lines), 1)
+    best: Dict[str, Candidate] = {}
+    for index, line in enumerate(lines):
+        blocked = _NOT_INVOICE_CONTEXT.search(line)
+        for pattern, weight in _INVOICE_PATTERNS:
+            for match in pattern.finditer(line):
+                value = match.group('value').strip('-/')
+                if len(value) < 3 or _INVOICE_WORDS.match(value) or not any(ch.isdigit() for ch in value):
+                    continue
+                if any(p.fullmatch(value) for p in _DATE_PATTERNS[:2]):
+                    continue
+                score = weight - (3.0 if blocked and weight < 4.0 else 0.0)
+                score += 1.0 if any(ch.isalpha() for ch in value) else 0.0   # INV-1001 over a bare count
+                score += 0.5 * (1 - index / n)
+                if value not in best or score > best[value].score:
+                    best[value] = Candidate(value, score, index)
+    return _ranked(list(best.values()))
+
+
+def _is_field_line(text: str) -> bool:
+    """Whether a line carries an amount, date or invoice number (or their labels) rather than a name"""
+    if any(match.group('sign') or '.' in match.group('value') for match in _MONEY.finditer(text)):
+        return True
+    if any(pattern.search(text) for pattern in _DATE_PATTERNS):
+        return True
+    if any(pattern.search(text) for pattern in _VENDOR_EXCLUDED_KEYWORDS):
+        return True
+    return bool(_INVOICE_LABEL.search(text)) or any(pattern.search(text) for pattern, _ in _INVOICE_PATTERNS)
+
+
+def vendor_candidates(lines: List[str]) -> List[Candidate]:
+    """Scored vendor names among the first lines of the receipt"""
+    candidates = []
+    for index, line in enumerate(lines[:8]):
+        text = line.strip().strip('*=-_ ')
+        if len(text) < 3 or _MOSTLY_DIGITS.match(text) or _NOT_VENDOR.search(text) or _is_field_line(text):
+            continue
+        letters = [ch for ch in text if ch.isalpha()]
+        if len(letters) < 3:
+            continue
+        score = 3.0 - 0.5 * index
+        score += 2.0 if _COMPANY_SUFFIX.search(text) else 0.0
+        score += 0.5 if sum(ch.isupper() for ch in letters) / len(letters) > 0.6 else 0.0
+        score -= 1.0 if ':' in text else 0.0
+        candidates.append(Candidate(text, score, index))
+    return _ranked(candidates)
+
+
+_EXTRACTORS = {
+    'invoice_number': invoice_candidates,
+    'amount': amount_candidates,
+    'date': date_candidates,
+    'vendor': vendor_candidates,
+}
+
+
+def extract_fields(text: str) -> Dict:
+    """
+    Best value and confidence for each receipt field
+
+    Args:
+        text: OCR text of one receipt
+
+    Returns:
+        Dict with invoice_number (str), amount (float), date (ISO string),
+        vendor (str) - None when nothing was found - and confidence, a dict
+        of 0..1 scores per field
+    """
+    lines = (text or '').splitlines()
+    fields: Dict = {'confidence': {}}
+    for field, extract in _EXTRACTORS.items():
+        candidates = extract(lines)
+        value = candidates[0].value if candidates and candidates[0].score > 0 else None
+        if isinstance(value, date):
+            value = value.isoformat()
+        fields[field] = value
+        fields['confidence'][field] = _confidence(candidates, STRONG_SCORE[field]) if value is not None else 0.0
+    return fields
+
+
+def read_receipt(path: str, max_side: int, ocr_func: Optional[Callable] = None) -> Dict:
+    """OCR (or read, for .txt) one receipt and extract its fields; runs in a pool worker"""
+    try:
+        if path.lower().endswith('.txt'):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                text = f.read()
+        else:
+            if ocr_func is None:
+                from utils.ocr_processor import ocr_file as ocr_func
+            text = ocr_func(path, max_side) or ''
+        return {'file': os.path.basename(path), **extract_fields(text), 'error': None}
+    except Exception as e:
+        return {'file': os.path.basename(path), **{field: None for field in FIELDS}, 'confidence': {}, 'error': str(e)}
+
+
+def extract_directory(directory: str, workers: Optional[int] = None, max_side: int = 2000,
+                      ocr_func: Optional[Callable] = None,
+                      extensions=('.txt', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')) -> List[Dict]:
+    """
+    Extract the fields of every receipt in a directory on a process pool
+
+    Args:
+        directory: Folder with receipt images (or .txt OCR output)
+        workers: Pool size (os.cpu_count() when None); 1 runs inline
+        max_side: Longest image side passed to Tesseract
+        ocr_func: Picklable text extractor (path, max_side) -> str
+        extensions: File types to include
+
+    Returns:
+        One extract_fields() dict per file, plus 'file' and 'error', sorted by file name
+    """
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in extensions
+    )
+    if workers == 1 or len(paths) < 2:
+        return [read_receipt(path, max_side, ocr_func) for path in paths]
+
+    import multiprocessing
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        results = list(executor.map(read_receipt, paths, [max_side] * len(paths), [ocr_func] * len(paths),
+                                    chunksize=max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))))
+    logger.info(f"Extracted {len(results)} receipts from {directory}")
+    return results
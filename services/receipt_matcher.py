@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Receipt to Bank Transaction Matching
+
+Links OCR'd receipts (receipt_ocr_results) to the card and Bill Pay
+purchases waiting for one (receipt_status = 'REQUIRED') and flips those
+purchases to 'RECEIVED'.
+
+Matching runs in memory against a sorted index:
+- the candidate purchases of the receipts' date range are loaded once
+  (columns only) and sorted by (amount in cents, day ordinal)
+- each receipt looks up its (cents, date +/- window_days) slice with two
+  binary searches, so a lookup costs O(log n) instead of a scan
+- candidates are scored by date distance and vendor/merchant trigram
+  similarity; a receipt matches when its best score reaches min_score and
+  no other purchase comes close (ambiguous receipts are left for review)
+- pairs are assigned greedily, best score first, so each purchase takes at
+  most one receipt
+
+Purchases of closed periods are never candidates (services.period_close).
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import update
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.receipt_ocr import ReceiptOcrResult
+from services.merchant_normalizer import extract_descriptor, normalize_key, trigrams
+from services.period_close import open_period_clause
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_DAYS = 3
+DEFAULT_MIN_SCORE = 0.5
+AMBIGUITY_MARGIN = 0.1      # Runner-up closer than this to the best candidate -> no automatic match
+
+DATE_WEIGHT = 0.7
+MERCHANT_WEIGHT = 0.3
+
+
+def to_cents(amount) -> int:
+    """Absolute amount in integer cents"""
+    return int((abs(Decimal(str(amount))) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def _name_grams(text: Optional[str]) -> frozenset:
+    key = normalize_key(text or '')
+    return frozenset(trigrams(key)) if key else frozenset()
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Dice similarity of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class TransactionIndex:
+    """
+    Purchases awaiting a receipt, sorted by (cents, day ordinal) for range lookups
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, object, date, Optional[str]]]):
+        """
+        Args:
+            rows: (id, amount, transaction_date, merchant or description) tuples
+        """
+        entries = sorted((to_cents(amount), day.toordinal(), id_, merchant) for id_, amount, day, merchant in rows)
+        self._keys = [(cents, ordinal) for cents, ordinal, _, _ in entries]
+        self._ids = [id_ for _, _, id_, _ in entries]
+        self._merchants = [merchant for _, _, _, merchant in entries]
+        self._grams: Dict[int, frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def load(cls, start: date, end: date) -> 'TransactionIndex':
+        """Index the REQUIRED purchases dated start..end outside closed periods"""
+        query = db.session.query(
+            BankTransaction.id, BankTransaction.amount, BankTransaction.transaction_date,
+            BankTransaction.merchant_name, BankTransaction.description
+        ).filter(
+            BankTransaction.receipt_status == 'REQUIRED',
+            BankTransaction.amount < 0,
+            BankTransaction.transaction_date.between(start, end)
+        )
+        open_clause = open_period_clause()
+        if open_clause is not None:
+            query = query.filter(open_clause)
+        return cls((id_, amount, day, merchant or extract_descriptor(description))
+                   for id_, amount, day, merchant, description in query)
+
+    def candidates(self, cents: int, day: date, window_days: int) -> List[Tuple[int, int, int]]:
+        """
+        Purchases of exactly `cents` dated within window_days of `day`
+
+        Returns:
+            (position, bank transaction id, days apart) tuples
+        """
+        ordinal = day.toordinal()
+        lo = bisect_left(self._keys, (cents, ordinal - window_days))
+        hi = bisect_right(self._keys, (cents, ordinal + window_days))
+        return [(i, self._ids[i], abs(self._keys[i][1] - ordinal)) for i in range(lo, hi)]
+
+    def merchant_grams(self, position: int) -> frozenset:
+        if position not in self._grams:
+            self._grams[position] = _name_grams(self._merchants[position])
+        return self._grams[position]
+
+
+class ReceiptMatcher:
+    """
+    Matches OCR results to purchases and records the links
+    """
+
+    def __init__(self, window_days: int = DEFAULT_WINDOW_DAYS, min_score: float = DEFAULT_MIN_SCORE):
+        """
+        Args:
+            window_days: Days a purchase may post before or after the receipt date
+            min_score: Lowest score (0..1) accepted as a match
+        """
+        self.window_days = window_days
+        self.min_score = min_score
+
+    def score(self, days_apart: int, receipt_grams: frozenset, merchant_grams: frozenset) -> float:
+        closeness = 1.0 - days_apart / (self.window_days + 1)
+        return round(DATE_WEIGHT * closeness + MERCHANT_WEIGHT * similarity(receipt_grams, merchant_grams), 4)
+
+    def pending_receipts(self) -> List[ReceiptOcrResult]:
+        """OCR results with an amount and a date that are not linked to a purchase yet"""
+        return ReceiptOcrResult.query.filter(
+            ReceiptOcrResult.status == 'DONE',
+            ReceiptOcrResult.bank_transaction_id.is_(None),
+            ReceiptOcrResult.amount.isnot(None),
+            ReceiptOcrResult.receipt_date.isnot(None)
+        ).all()
+
+    def find_matches(self, receipts: List[ReceiptOcrResult], index: TransactionIndex) -> Dict:
+        """
+        Choose one purchase per receipt (no database writes)
+
+        Returns:
+            Dict with matches [(receipt, bank transaction id, score)], ambiguous and unmatched receipt lists
+        """
+        pairs = []
+        ambiguous, unmatched = [], []
+        for receipt in receipts:
+            found = index.candidates(to_cents(receipt.amount), receipt.receipt_date, self.window_days)
+            if not found:
+                unmatched.append(receipt)
+                continue
+            grams = _name_grams(receipt.vendor)
+            scored = sorted(((self.score(days, grams, index.merchant_grams(position)), bank_id)
+                             for position, bank_id, days in found), reverse=True)
+            best_score, best_id = scored[0]
+            if best_score < self.min_score:
+                unmatched.append(receipt)
+            elif len(scored) > 1 and best_score - scored[1][0] < AMBIGUITY_MARGIN:
+                ambiguous.append(receipt)
+            else:
+                pairs.append((best_score, receipt.id, receipt, best_id))
+
+        # Best pairs first; a purchase claimed by a stronger receipt is not reused
+        matches, taken = [], set()
+        for score, _, receipt, bank_id in sorted(pairs, key=lambda pair: (-pair[0], pair[1])):
+            if bank_id in taken:
+                ambiguous.append(receipt)
+                continue
+            taken.add(bank_id)
+            matches.append((receipt, bank_id, score))
+        return {'matches': matches, 'ambiguous': ambiguous, 'unmatched': unmatched}
+
+    def match(self, receipts: Optional[List[ReceiptOcrResult]] = None, dry_run: bool = False) -> Dict:
+        """
+        Match receipts to purchases and mark the matched purchases RECEIVED
+
+        Args:
+            receipts: OCR results to match (all pending results when None)
+            dry_run: Report the matches without writing them
+
+        Returns:
+            Dict with receipts, matched, ambiguous, unmatched counts, the
+            matches [{content_hash, bank_transaction_id, score}] and seconds
+        """
+        started = time.perf_counter()
+        if receipts is None:
+            receipts = self.pending_receipts()
+        receipts = [r for r in receipts if r.amount is not None and r.receipt_date is not None
+                    and r.bank_transaction_id is None]
+        if not receipts:
+            return {'receipts': 0, 'matched': 0, 'ambiguous': 0, 'unmatched': 0, 'matches': [], 'seconds': 0.0}
+
+        window = timedelta(days=self.window_days)
+        index = TransactionIndex.load(min(r.receipt_date for r in receipts) - window,
+                                      max(r.receipt_date for r in receipts) + window)
+        outcome = self.find_matches(receipts, index)
+        matches = outcome['matches']
+
+        if matches and not dry_run:
+            db.session.execute(update(ReceiptOcrResult), [
+                {'id': receipt.id, 'bank_transaction_id': bank_id, 'match_score': score}
+                for receipt, bank_id, score in matches
+            ])
+            db.session.execute(
+                update(BankTransaction).where(
+                    BankTransaction.id.in_([bank_id for _, bank_id, _ in matches]),
+                    BankTransaction.receipt_status == 'REQUIRED'
+                ).values(receipt_status='RECEIVED'),
+                # receipt_status is not part of the entity cube
+                execution_options={'synchronize_session': False, 'entity_cube_maintained': True}
+            )
+            db.session.commit()
+
+        seconds = time.perf_counter() - started
+        logger.info(f"Receipt matching: {len(matches)}/{len(receipts)} matched against {len(index)} purchases "
+                    f"in {seconds * 1000:.0f} ms")
+        return {
+            'receipts': len(receipts),
+            'matched': len(matches),
+            'ambiguous': len(outcome['ambiguous']),
+            'unmatched': len(outcome['unmatched']),
+            'matches': [{'content_hash': receipt.content_hash, 'bank_transaction_id': bank_id, 'score': score}
+                        for receipt, bank_id, score in matches],
+            'seconds': round(seconds, 4),
+        }
+
+
+def match_receipts(receipts: Optional[List[ReceiptOcrResult]] = None, dry_run: bool = False) -> Dict:
+    """Run ReceiptMatcher with RECEIPT_MATCH_WINDOW_DAYS / RECEIPT_MATCH_MIN_SCORE from the app config"""
+    from flask import current_app
+    matcher = ReceiptMatcher(current_app.config.get('RECEIPT_MATCH_WINDOW_DAYS', DEFAULT_WINDOW_DAYS),
+                             current_app.config.get('RECEIPT_MATCH_MIN_SCORE', DEFAULT_MIN_SCORE))
+    return matcher.match(receipts, dry_run=dry_run)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Receipt OCR Pipeline
+
+Runs OCR on uploaded AP/AR receipts without holding up the upload request:
+
+- submit() hashes the saved file and returns at once; new content is
+  queued to a bounded process pool (Tesseract is CPU-bound, so threads
+  would serialize on it)
+- pool workers grayscale/downscale the image, run Tesseract and extract
+  invoice_number/amount/date/vendor (services.receipt_extraction); nothing
+  in them touches the database
+- results are stored in receipt_ocr_results keyed by the SHA-256 of the
+  file content, so re-uploading the same receipt (to any transaction) is
+  answered from the table without running OCR again
+- extracted fields are written back to every Transaction linked to the
+  hash, filling only the fields the user left empty; values extracted with
+  less than OCR_MIN_CONFIDENCE are not kept
+- new results are matched to the card/Bill Pay purchase awaiting them
+  (services.receipt_matcher)
+- a worker claims a job (QUEUED -> RUNNING with its host:pid and a lease
+  start, in one conditional UPDATE) before dispatching it, so each job
+  runs in exactly one worker however many try
+- jobs still QUEUED, or RUNNING under a lease older than
+  OCR_CLAIM_TIMEOUT (their worker died), are claimed again when a worker
+  starts (resume_receipt_ocr, called from app.warmup.warm_worker)
+
+The pool is created on first use in each gunicorn worker (never in a
+preloading master) with the 'spawn' start method, which is safe in a
+multi-threaded server process.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models.receipt_ocr import ReceiptOcrResult
+from models.transaction import Transaction
+from services.receipt_extraction import extract_fields
+from services.receipt_matcher import match_receipts
+from utils.ocr_processor import DEFAULT_MAX_SIDE, ocr_file
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif', '.webp'}
+DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%m-%d-%y', '%Y-%m-%d')
+
+STATUS_QUEUED = 'QUEUED'
+STATUS_RUNNING = 'RUNNING'
+STATUS_DONE = 'DONE'
+STATUS_FAILED = 'FAILED'
+
+DEFAULT_CLAIM_TIMEOUT = 600.0  # Seconds before a RUNNING job's worker is presumed dead
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content, read in 1 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_receipt_date(value: Optional[str]) -> Optional[date]:
+    """Receipt date string (US formats first) as a date, None when unparseable"""
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def run_ocr(path: str, max_side: int = DEFAULT_MAX_SIDE, ocr_func: Callable = ocr_file) -> Dict:
+    """
+    OCR and field extraction for one file (runs in a pool worker process)
+
+    Returns:
+        Dict with text, fields (extract_fields, with per-field confidence) and seconds
+    """
+    started = time.perf_counter()
+    text = ocr_func(path, max_side) or ''
+    return {'text': text, 'fields': extract_fields(text), 'seconds': time.perf_counter() - started}
+
+
+def apply_to_transactions(result: ReceiptOcrResult) -> int:
+    """
+    Fill the empty fields of the transactions linked to an OCR result
+
+    Returns:
+        Number of transactions updated
+    """
+    if result.status != STATUS_DONE:
+        return 0
+    updated = 0
+    for transaction in Transaction.query.filter_by(receipt_hash=result.content_hash).all():
+        changed = False
+        if result.invoice_number and not transaction.invoice_number:
+            transaction.invoice_number = result.invoice_number
+            changed = True
+        if result.amount is not None and not transaction.amount:
+            transaction.amount = result.amount
+            changed = True
+        if result.receipt_date and transaction.issue_date is None:
+            transaction.issue_date = result.receipt_date
+            changed = True
+        if result.vendor and not (transaction.vendor_customer or '').strip():
+            transaction.vendor_customer = result.vendor
+            changed = True
+        updated += changed
+    return updated
+
+
+class ReceiptOcrPipeline:
+    """
+    Hash-cached OCR of receipt uploads on a bounded worker pool
+    """
+
+    def __init__(self, app, workers: int = 2, max_side: int = DEFAULT_MAX_SIDE,
+                 executor: Optional[Executor] = None, ocr_func: Callable = ocr_file,
+                 min_confidence: float = 0.5, claim_timeout: float = DEFAULT_CLAIM_TIMEOUT):
+        """
+        Args:
+            app: Flask application (results are stored from pool callbacks)
+            workers: OCR processes
+            max_side: Longest image side passed to Tesseract
+            executor: Executor to use instead of the process pool (tests)
+            ocr_func: Picklable text extractor (path, max_side) -> str
+            min_confidence: Extraction confidence below which a field is discarded
+            claim_timeout: Seconds after which another worker may take over a RUNNING job
+        """
+        self.app = app
+        self.workers = workers
+        self.max_side = max_side
+        self.ocr_func = ocr_func
+        self.min_confidence = min_confidence
+        self.claim_timeout = claim_timeout
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, object] = {}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def submit(self, transaction_id: int, file_path: str, content_hash: Optional[str] = None) -> ReceiptOcrResult:
+        """
+        Link a saved receipt file to a transaction and queue its OCR (returns immediately)
+
+        Args:
+            transaction_id: Transaction the receipt belongs to
+            file_path: Path of the saved upload
+            content_hash: SHA-256 already computed while storing the upload (utils.file_store)
+
+        Returns:
+            The ReceiptOcrResult row (DONE at once when the content was seen before)
+        """
+        content_hash = content_hash or file_hash(file_path)
+        try:
+            result = self._link(transaction_id, file_path, content_hash)
+        except IntegrityError:
+            # A concurrent upload of the same content inserted the row first: link to that one
+            db.session.rollback()
+            result = self._link(transaction_id, file_path, content_hash)
+
+        if result.status == STATUS_QUEUED:
+            self._dispatch(content_hash, file_path)
+        return result
+
+    @staticmethod
+    def _find(content_hash: str) -> Optional[ReceiptOcrResult]:
+        return ReceiptOcrResult.query.filter_by(content_hash=content_hash).first()
+
+    def _link(self, transaction_id: int, file_path: str, content_hash: str) -> ReceiptOcrResult:
+        """Create or reuse the result row for a hash and point the transaction at it (commits)"""
+        result = self._find(content_hash)
+        if result is None:
+            result = ReceiptOcrResult(content_hash=content_hash, status=STATUS_QUEUED)
+            db.session.add(result)
+        elif result.status == STATUS_FAILED:
+            result.status, result.error = STATUS_QUEUED, None
+        result.file_path = file_path
+
+        transaction = db.session.get(Transaction, transaction_id)
+        if transaction is not None:
+            transaction.receipt_hash = content_hash
+        if result.status == STATUS_DONE:
+            apply_to_transactions(result)
+        db.session.commit()
+        return result
+
+    def _claim(self, content_hash: str) -> bool:
+        """
+        Take a job for this worker (commits)
+
+        One conditional UPDATE moves a QUEUED job, or a RUNNING one whose
+        lease expired, to RUNNING under this worker; of several workers
+        trying at once exactly one sees a row updated.
+        """
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(ReceiptOcrResult)
+            .where(ReceiptOcrResult.content_hash == content_hash, self._claimable(now))
+            .values(status=STATUS_RUNNING, claimed_by=self.worker_id, claimed_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.session.commit()
+        return claimed
+
+    def _claimable(self, now: datetime):
+        expired = now - timedelta(seconds=self.claim_timeout)
+        return or_(
+            ReceiptOcrResult.status == STATUS_QUEUED,
+            and_(ReceiptOcrResult.status == STATUS_RUNNING,
+                 or_(ReceiptOcrResult.claimed_at.is_(None), ReceiptOcrResult.claimed_at < expired))
+        )
+
+    def _dispatch(self, content_hash: str, file_path: str) -> bool:
+        """Claim a job and hand it to the pool; False when another worker holds it"""
+        if not self._claim(content_hash):
+            return False
+        self._run(content_hash, file_path)
+        return True
+
+    def _run(self, content_hash: str, file_path: str) -> None:
+        """Hand a job this worker has claimed to the pool"""
+        if os.path.splitext(file_path)[1].lower() not in IMAGE_EXTENSIONS:
+            self._store(content_hash, None)
+            return
+        executor = self.executor
+        with self._lock:
+            future = executor.submit(run_ocr, file_path, self.max_side, self.ocr_func)
+            self._in_flight[content_hash] = future
+        future.add_done_callback(lambda done: self._store(content_hash, done))
+
+    def _store(self, content_hash: str, future) -> None:
+        """Save a finished OCR job (runs on the pool's result thread)"""
+        with self.app.app_context():
+            try:
+                result = self._find(content_hash)
+                if result is None:
+                    return
+                try:
+                    if future is None:
+                        raise ValueError(f'Unsupported receipt file type: {os.path.basename(result.file_path or "")}')
+                    outcome = future.result()
+                except Exception as e:
+                    result.status, result.error = STATUS_FAILED, str(e)[:2000]
+                    logger.warning(f'OCR failed for receipt {content_hash[:12]}: {e}')
+                else:
+                    fields = self._confident(outcome['fields'])
+                    result.text = outcome['text']
+                    result.invoice_number = (fields.get('invoice_number') or '')[:50] or None
+                    result.amount = self._amount(fields.get('amount'))
+                    result.receipt_date = parse_receipt_date(fields.get('date'))
+                    result.vendor = (fields.get('vendor') or '')[:200] or None
+                    result.confidence = fields['confidence']
+                    result.ocr_seconds = round(outcome['seconds'], 3)
+                    result.status, result.error = STATUS_DONE, None
+                    updated = apply_to_transactions(result)
+                    logger.info(f'OCR receipt {content_hash[:12]}: {result.to_dict()} ({updated} transactions updated)')
+                result.processed_at = datetime.utcnow()
+                result.claimed_by = result.claimed_at = None
+                db.session.commit()
+                if result.status == STATUS_DONE:
+                    self._match(result)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f'Could not store OCR result {content_hash[:12]}: {e}')
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._in_flight.pop(content_hash, None)
+
+    @staticmethod
+    def _match(result: ReceiptOcrResult) -> None:
+        """Link a fresh result to the card/Bill Pay purchase it documents; a miss waits for the next batch run"""
+        try:
+            match_receipts([result])
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f'Receipt matching failed for {result.content_hash[:12]}: {e}')
+
+    def _confident(self, fields: Dict) -> Dict:
+        """Extracted fields with the low-confidence values dropped, plus the lowest kept confidence"""
+        scores = fields.get('confidence') or {}
+        kept = {field: value for field, value in fields.items()
+                if field != 'confidence' and value is not None and scores.get(field, 0.0) >= self.min_confidence}
+        kept['confidence'] = min((scores[field] for field in kept), default=None)
+        return kept
+
+    @staticmethod
+    def _amount(value) -> Optional[Decimal]:
+        if value is None:
+            return None
+        try:
+            return Decimal(str(value)).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            return None
+
+    def resume_pending(self) -> int:
+        """
+        Run the jobs left QUEUED, or RUNNING in a worker that died, that no
+        other worker claims first
+
+        Returns:
+            Number of jobs this worker claimed
+        """
+        pending = db.session.execute(
+            select(ReceiptOcrResult.content_hash, ReceiptOcrResult.file_path).where(
+                self._claimable(datetime.utcnow()), ReceiptOcrResult.file_path.isnot(None)
+            )
+        ).all()
+        db.session.commit()
+        # All claims are committed before the first job starts storing results
+        claimed = [(content_hash, file_path) for content_hash, file_path in pending if self._claim(content_hash)]
+        for content_hash, file_path in claimed:
+            self._run(content_hash, file_path)
+        return len(claimed)
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait for the queued jobs (batch scripts and tests)"""
+        with self._lock:
+            futures = list(self._in_flight.values())
+        wait(futures, timeout=timeout)
+        deadline = time.monotonic() + (timeout or 30)
+        # Callbacks store results right after their future completes
+        while self._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+_pipeline: Optional[ReceiptOcrPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_receipt_pipeline(app=None) -> ReceiptOcrPipeline:
+    """Process-wide pipeline configured from OCR_WORKERS / OCR_MAX_IMAGE_SIDE / OCR_MIN_CONFIDENCE / OCR_CLAIM_TIMEOUT"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                from flask import current_app
+                app = app or current_app._get_current_object()
+                _pipeline = ReceiptOcrPipeline(app, app.config.get('OCR_WORKERS', 2),
+                                               app.config.get('OCR_MAX_IMAGE_SIDE', DEFAULT_MAX_SIDE),
+                                               min_confidence=app.config.get('OCR_MIN_CONFIDENCE', 0.5),
+                                               claim_timeout=app.config.get('OCR_CLAIM_TIMEOUT',
+                                                                            DEFAULT_CLAIM_TIMEOUT))
+    return _pipeline
+
+
+def resume_receipt_ocr(app) -> int:
+    """
+    Claim and run the OCR jobs a previous worker left unfinished (worker start-up)
+
+    Returns:
+        Number of receipts this worker claimed (0 when OCR is disabled)
+    """
+    if not app.config.get('OCR_ENABLED', True):
+        return 0
+    with app.app_context():
+        try:
+            return get_receipt_pipeline(app).resume_pending()
+        finally:
+            db.session.remove()
+
+
+def queue_receipt(transaction_id: int, file_path: str, content_hash: Optional[str] = None) -> Optional[ReceiptOcrResult]:
+    """
+    Queue OCR of an uploaded receipt from a request; never fails the upload
+
+    Returns:
+        The ReceiptOcrResult, or None when OCR is disabled or queuing failed
+    """
+    from flask import current_app
+    if not current_app.config.get('OCR_ENABLED', True):
+        return None
+    try:
+        return get_receipt_pipeline().submit(transaction_id, file_path, content_hash)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Could not queue OCR for transaction {transaction_id}: {e}')
+        return None
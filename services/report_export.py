@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Streaming Report Export
+
+Exports report rows as CSV or XLSX without materialising the result set:
+rows come from a server-side cursor (yield_per) through a generator and
+are written out as they arrive.
+
+Exportable reports (see build_export):
+- account: bank transactions of one account (account detail view)
+- payables / receivables: AP/AR ledger entries
+- aging: open AP or AR items with days past due and aging bucket
+- vendor-analysis: payable totals per vendor (entity cube)
+- tax-deductible: deductible transactions behind the tax summary
+
+- CSV is encoded in small batches and sent as a chunked HTTP response, so
+  the first bytes leave before the query has finished.
+- XLSX is not streamed: the workbook has to be complete before it is a
+  valid file, so the whole query runs and the workbook is saved (openpyxl
+  write-only mode, spilled to disk past XLSX_SPOOL_SIZE) before the first
+  byte is sent. Memory stays bounded, time to first byte does not; use CSV
+  for large exports.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import csv
+import io
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from flask import Response, stream_with_context
+from sqlalchemy import and_, or_, select
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.transaction import Transaction
+from services.entity_cube import EntityCube, FLOW_NET, SOURCE_LEDGER
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+YIELD_PER = 1000            # Rows fetched per round trip from the server-side cursor
+CSV_BATCH_ROWS = 500        # Rows encoded per response chunk
+XLSX_CHUNK_SIZE = 64 * 1024
+XLSX_SPOOL_SIZE = 8 * 1024 * 1024  # Workbooks larger than this spill to disk
+
+ACCOUNT_HEADERS = (
+    'Date', 'Account', 'Description', 'Amount', 'Type', 'Business Category', 'GL Account',
+    'Merchant', 'Classified', 'Needs Review'
+)
+LEDGER_HEADERS = (
+    'Vendor/Customer', 'Invoice', 'PO', 'Amount', 'Issue Date', 'Due Date', 'Status', 'Category', 'Description'
+)
+AGING_HEADERS = ('Vendor/Customer', 'Invoice', 'Amount', 'Due Date', 'Days Past Due', 'Aging Bucket', 'Status')
+VENDOR_HEADERS = ('Vendor', 'Transactions', 'Total Amount', 'Average Amount', 'Last Date')
+OPEN_LEDGER_STATUSES = ('pending', 'overdue')
+AGING_BUCKETS = ((0, 'Current'), (30, '1-30 days'), (60, '31-60 days'), (90, '61-90 days'))
+
+TAX_DEDUCTIBLE_HEADERS = (
+    'Date', 'Account', 'Description', 'Merchant', 'Amount', 'Tax Category',
+    'Business Category', 'GL Account', 'Receipt Status'
+)
+
+
+def iter_csv(headers: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """
+    Encode rows as CSV, yielding one chunk per CSV_BATCH_ROWS rows
+
+    Args:
+        headers: Column headers
+        rows: Row tuples (consumed lazily)
+
+    Yields:
+        UTF-8 encoded CSV chunks (the first one carries a BOM for Excel)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_BATCH_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_xlsx(headers: Sequence[str], rows: Iterable[Sequence], sheet_title: str = 'Export') -> Iterator[bytes]:
+    """
+    Write rows into a write-only workbook and yield the saved file in chunks
+
+    Nothing is yielded until every row has been written and the workbook
+    saved; only the download of the finished file is chunked.
+
+    Args:
+        headers: Column headers
+        rows: Row tuples (consumed lazily)
+        sheet_title: Worksheet title
+
+    Yields:
+        XLSX file chunks
+    """
+    from openpyxl import Workbook     # Deferred: openpyxl adds ~0.2 s to app startup
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(list(headers))
+    for row in rows:
+        sheet.append(list(row))
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE) as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(XLSX_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def export_response(filename: str, headers: Sequence[str], rows: Iterable[Sequence],
+                    export_format: str = 'csv', sheet_title: Optional[str] = None) -> Response:
+    """
+    Chunked download response for an export
+
+    Args:
+        filename: Download file name without extension
+        headers: Column headers
+        rows: Row tuples, ideally a generator over a server-side cursor
+        export_format: "csv" or "xlsx"
+        sheet_title: XLSX worksheet title (defaults to the file name)
+
+    Returns:
+        Flask streaming Response
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format {export_format!r} (use {' or '.join(EXPORT_FORMATS)})")
+
+    if export_format == 'csv':
+        body, mimetype = iter_csv(headers, rows), CSV_MIMETYPE
+    else:
+        body, mimetype = iter_xlsx(headers, rows, sheet_title or filename), XLSX_MIMETYPE
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _stream(query) -> Iterator[tuple]:
+    for row in db.session.execute(query.execution_options(yield_per=YIELD_PER)):
+        yield tuple(row)
+
+
+def tax_deductible_rows(start_date: date, end_date: date) -> Iterator[tuple]:
+    """
+    Classified tax-deductible bank transactions for the accountant, oldest first
+
+    Args:
+        start_date: First transaction date
+        end_date: Last transaction date
+
+    Yields:
+        Row tuples matching TAX_DEDUCTIBLE_HEADERS
+    """
+    query = select(
+        BankTransaction.transaction_date,
+        BankTransaction.account_name,
+        BankTransaction.description,
+        BankTransaction.merchant_name,
+        BankTransaction.amount,
+        BankTransaction.tax_category,
+        BankTransaction.business_category,
+        BankTransaction.gl_account_code,
+        BankTransaction.receipt_status
+    ).where(
+        BankTransaction.is_tax_deductible == True,
+        BankTransaction.is_classified == True,
+        BankTransaction.transaction_date >= start_date,
+        BankTransaction.transaction_date <= end_date
+    ).order_by(BankTransaction.transaction_date, BankTransaction.id)
+
+    return _stream(query)
+
+
+def account_rows(account_name: str, year: Optional[int] = None, month: Optional[int] = None,
+                 start_date: Optional[date] = None, end_date: Optional[date] = None) -> Iterator[tuple]:
+    """
+    Bank transactions of one account with the account detail view's filters, newest first
+
+    Yields:
+        Row tuples matching ACCOUNT_HEADERS
+    """
+    query = select(
+        BankTransaction.transaction_date,
+        BankTransaction.account_name,
+        BankTransaction.description,
+        BankTransaction.amount,
+        BankTransaction.transaction_type,
+        BankTransaction.business_category,
+        BankTransaction.gl_account_code,
+        BankTransaction.merchant_name,
+        BankTransaction.is_classified,
+        BankTransaction.needs_review
+    ).where(BankTransaction.account_name == account_name)
+
+    if month and not year:
+        raise ValueError('month requires year')
+    if year:
+        # Half-open date range rather than extract(), so the date index is usable
+        period_start = date(year, month or 1, 1)
+        if month:
+            period_end = date(year + month // 12, month % 12 + 1, 1)
+        else:
+            period_end = date(year + 1, 1, 1)
+        query = query.where(BankTransaction.transaction_date >= period_start,
+                            BankTransaction.transaction_date < period_end)
+    if start_date:
+        query = query.where(BankTransaction.transaction_date >= start_date)
+    if end_date:
+        query = query.where(BankTransaction.transaction_date <= end_date)
+    if account_name == 'Revenue 4717':
+        # The account view only lists income for the revenue account
+        query = query.where(BankTransaction.amount > 0)
+
+    return _stream(query.order_by(BankTransaction.transaction_date.desc(), BankTransaction.id.desc()))
+
+
+def ledger_rows(type_: str, status: Optional[str] = None) -> Iterator[tuple]:
+    """
+    AP ("payable") or AR ("receivable") ledger entries by due date
+
+    Yields:
+        Row tuples matching LEDGER_HEADERS
+    """
+    query = select(
+        Transaction.vendor_customer,
+        Transaction.invoice_number,
+        Transaction.po_number,
+        Transaction.amount,
+        Transaction.issue_date,
+        Transaction.due_date,
+        Transaction.status,
+        Transaction.category,
+        Transaction.description
+    ).where(Transaction.type == type_)
+    if status and status != 'all':
+        query = query.where(Transaction.status == status)
+    return _stream(query.order_by(Transaction.due_date, Transaction.id))
+
+
+def aging_bucket(days_past_due: int) -> str:
+    """Aging bucket label for a number of days past due"""
+    for limit, label in AGING_BUCKETS:
+        if days_past_due <= limit:
+            return label
+    return '90+ days'
+
+
+def aging_rows(type_: str, as_of: Optional[date] = None) -> Iterator[tuple]:
+    """
+    Open AP or AR items with their aging bucket, oldest due date first
+
+    Yields:
+        Row tuples matching AGING_HEADERS
+    """
+    as_of = as_of or date.today()
+    query = select(
+        Transaction.vendor_customer,
+        Transaction.invoice_number,
+        Transaction.amount,
+        Transaction.due_date,
+        Transaction.status
+    ).where(
+        Transaction.type == type_,
+        Transaction.status.in_(OPEN_LEDGER_STATUSES)
+    ).order_by(Transaction.due_date, Transaction.id)
+
+    for vendor, invoice, amount, due_date, status in _stream(query):
+        days = (as_of - (due_date or as_of)).days
+        yield vendor, invoice, amount, due_date, max(days, 0), aging_bucket(days), status
+
+
+def issued_by(as_of: date):
+    """SQL filter for AP/AR items that existed at the end of ``as_of`` (created_at when issue_date is unset)"""
+    return or_(
+        Transaction.issue_date <= as_of,
+        and_(Transaction.issue_date.is_(None), Transaction.created_at < as_of + timedelta(days=1))
+    )
+
+
+def aging_rows_as_of(type_: str, as_of: date) -> Iterator[tuple]:
+    """
+    AP or AR items that were open at the end of a past day, oldest due date first
+
+    Unlike aging_rows (which reads today's status) an item counts when it
+    was issued by ``as_of`` and not paid by then; its status is the one it
+    had that day. Cancelled items and paid items without a paid_date are
+    left out, as when they were cancelled or paid is unknown.
+
+    Yields:
+        Row tuples matching AGING_HEADERS
+    """
+    query = select(
+        Transaction.vendor_customer,
+        Transaction.invoice_number,
+        Transaction.amount,
+        Transaction.due_date
+    ).where(
+        Transaction.type == type_,
+        issued_by(as_of),
+        or_(Transaction.status.in_(OPEN_LEDGER_STATUSES),
+            and_(Transaction.status == 'paid', Transaction.paid_date > as_of))
+    ).order_by(Transaction.due_date, Transaction.id)
+
+    for vendor, invoice, amount, due_date in _stream(query):
+        days = (as_of - (due_date or as_of)).days
+        yield (vendor, invoice, amount, due_date, max(days, 0), aging_bucket(days),
+               'overdue' if days > 0 else 'pending')
+
+
+def vendor_rows(days: int = 365, limit: int = 500) -> Iterator[tuple]:
+    """
+    Payable totals per vendor over the last ``days`` days (from the entity cube)
+
+    Yields:
+        Row tuples matching VENDOR_HEADERS
+    """
+    today = date.today()
+    for vendor in EntityCube().top_n_between(limit, SOURCE_LEDGER, today - timedelta(days=days), today,
+                                             account='payable', flow=FLOW_NET):
+        yield (vendor['entity'], vendor['transaction_count'], vendor['total_amount'],
+               vendor['avg_amount'], vendor['last_date'])
+
+
+def build_export(report: str, args: Dict) -> Tuple[str, Sequence[str], Iterator[tuple]]:
+    """
+    File name, headers and row generator for a named report
+
+    Args:
+        report: Report name (account, payables, receivables, aging,
+                vendor-analysis, tax-deductible)
+        args: Request arguments (dates as YYYY-MM-DD)
+
+    Returns:
+        (file name without extension, headers, rows)
+    """
+    today = date.today()
+
+    if report == 'account':
+        account_name = args.get('account')
+        if not account_name:
+            raise ValueError('account is required')
+        year = int(args['year']) if args.get('year') else None
+        month = int(args['month']) if args.get('month') else None
+        rows = account_rows(account_name, year, month, _parse_date(args.get('start_date')),
+                            _parse_date(args.get('end_date')))
+        return f"account-{account_name.replace(' ', '-').lower()}", ACCOUNT_HEADERS, rows
+
+    if report in ('payables', 'receivables'):
+        return report, LEDGER_HEADERS, ledger_rows(report[:-1], args.get('status'))
+
+    if report == 'aging':
+        type_ = args.get('type', 'receivable')
+        if type_ not in ('payable', 'receivable'):
+            raise ValueError("type must be 'payable' or 'receivable'")
+        return f'aging-{type_}', AGING_HEADERS, aging_rows(type_, today)
+
+    if report == 'vendor-analysis':
+        period = str(args.get('period', '365'))
+        days = int(period) if period.isdigit() else 365
+        return f'vendor-analysis-{days}d', VENDOR_HEADERS, vendor_rows(days)
+
+    if report == 'tax-deductible':
+        start_date = _parse_date(args.get('start_date')) or date(today.year, 1, 1)
+        end_date = _parse_date(args.get('end_date')) or today
+        return (f'tax-deductible-{start_date.isoformat()}-{end_date.isoformat()}', TAX_DEDUCTIBLE_HEADERS,
+                tax_deductible_rows(start_date, end_date))
+
+    raise ValueError(f'Unknown report: {report}')
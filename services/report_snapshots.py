@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Report Snapshots for Closed Periods
+
+Month-end reports for months closed with services.period_close rarely
+change, yet were recomputed on every view. This module prerenders them into a compact
+stored artifact (report JSON plus an optional XLSX of the report rows) in
+report_snapshots, keyed by report and period.
+
+A snapshot is only served while it is current: its fingerprint (row
+count, amount sum, max id and max updated_at of every source table over
+the period) must match the live data. Payloads therefore hold only what
+those sources determine: the dashboard snapshot keeps the month-scoped
+sections (the all-time ones are added live per view) and month-end aging
+is reconstructed as of the month's last day from issue and paid dates. Validated snapshots are kept in a
+VersionedCache, so repeated views in a worker are O(1) until one of the
+source tables is written.
+
+Snapshots are produced by:
+- SnapshotWorker, a background thread started by create_app when
+  REPORT_SNAPSHOT_INTERVAL is set, prerendering the last closed months
+- prerender_reports.py, the same job as a command line script
+- ReportSnapshotStore.get_or_render, lazily on the first view of a closed
+  month; other date ranges are computed live and never stored
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.report_snapshot import ReportSnapshot
+from models.transaction import Transaction
+from services.data_version import VersionedCache
+from services.entity_cube import EntityCube, SOURCE_LEDGER
+from services.period_close import closed_months as closed_period_starts
+from services.read_routing import reporting_reads
+from services.report_export import (
+    AGING_HEADERS, TAX_DEDUCTIBLE_HEADERS, aging_rows_as_of, issued_by, iter_xlsx, tax_deductible_rows
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MONTHS = 12
+
+
+class SnapshotReport:
+    """
+    How to compute one report for a period and which rows it depends on
+    """
+
+    __slots__ = ('name', 'build', 'sources', 'rows')
+
+    def __init__(self, name: str, build: Callable[[date, date], Dict],
+                 sources: Callable[[date, date], List[Tuple]],
+                 rows: Optional[Callable[[date, date], Tuple[Sequence[str], Iterator[tuple]]]] = None):
+        self.name = name
+        self.build = build        # (start, end) -> report dict
+        self.sources = sources    # (start, end) -> [(model, filters...)] fingerprinted for validity
+        self.rows = rows          # (start, end) -> (headers, rows) stored as XLSX, optional
+
+
+def _bank_in_period(start: date, end: date) -> List[Tuple]:
+    return [(BankTransaction, BankTransaction.transaction_date >= start, BankTransaction.transaction_date <= end)]
+
+
+def _payables_in_period(start: date, end: date) -> List[Tuple]:
+    return [(Transaction, Transaction.type == 'payable', Transaction.due_date >= start, Transaction.due_date <= end)]
+
+
+def _ledger_issued_by(type_: str) -> Callable[[date, date], List[Tuple]]:
+    return lambda start, end: [(Transaction, Transaction.type == type_, issued_by(end))]
+
+
+def _dashboard_summary(start: date, end: date) -> Dict:
+    # Month-scoped sections only; the live ones are added per view (see get_live_summary)
+    from services.cash_flow_calculator import CashFlowCalculator
+    return CashFlowCalculator().get_period_summary(start, end)
+
+
+def _tax_summary(start: date, end: date) -> Dict:
+    from services.cash_flow_calculator import CashFlowCalculator
+    return CashFlowCalculator().get_tax_summary(start, end)
+
+
+def _aging_summary(type_: str) -> Callable[[date, date], Dict]:
+    def build(start: date, end: date) -> Dict:
+        buckets: Dict[str, Dict] = {}
+        for row in aging_rows_as_of(type_, end):
+            bucket = buckets.setdefault(row[5], {'amount': 0.0, 'count': 0})
+            bucket['amount'] += float(row[2] or 0)
+            bucket['count'] += 1
+        return {'type': type_, 'as_of': end.isoformat(), 'buckets': buckets}
+    return build
+
+
+def _vendor_summary(start: date, end: date) -> Dict:
+    return {'vendors': EntityCube().top_n(500, SOURCE_LEDGER, account='payable', start_month=start, end_month=end)}
+
+
+REPORTS: Dict[str, SnapshotReport] = {report.name: report for report in (
+    SnapshotReport('dashboard-summary', _dashboard_summary, _bank_in_period),
+    SnapshotReport('tax-summary', _tax_summary, _bank_in_period,
+                   lambda start, end: (TAX_DEDUCTIBLE_HEADERS, tax_deductible_rows(start, end))),
+    SnapshotReport('aging-payable', _aging_summary('payable'), _ledger_issued_by('payable'),
+                   lambda start, end: (AGING_HEADERS, aging_rows_as_of('payable', end))),
+    SnapshotReport('aging-receivable', _aging_summary('receivable'), _ledger_issued_by('receivable'),
+                   lambda start, end: (AGING_HEADERS, aging_rows_as_of('receivable', end))),
+    SnapshotReport('vendor-analysis', _vendor_summary, _payables_in_period),
+)}
+
+
+def month_period(year: int, month: int) -> Tuple[date, date]:
+    """First and last day of a month"""
+    start = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return start, next_month - timedelta(days=1)
+
+
+def is_closed(start: date, end: date) -> bool:
+    """
+    Whether a period is served from snapshots: exactly one calendar month
+    closed with services.period_close. Any other range is computed live and
+    never stored, so read requests cannot add snapshot rows.
+    """
+    if start.day != 1 or month_period(start.year, start.month)[1] != end:
+        return False
+    return start in closed_period_starts()
+
+
+def closed_months(months: int = DEFAULT_MONTHS) -> List[Tuple[date, date]]:
+    """The last ``months`` months closed with services.period_close, newest first"""
+    return [month_period(start.year, start.month)
+            for start in sorted(closed_period_starts(), reverse=True)[:months]]
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class ReportSnapshotStore:
+    """
+    Stores, validates and serves report snapshots
+    """
+
+    def __init__(self, cache_age: float = 300.0):
+        self._cache = VersionedCache(max_age=cache_age, name='report_snapshots')
+
+    def fingerprint(self, report: SnapshotReport, start: date, end: date) -> str:
+        """Hash of the source rows a report reads for a period (one aggregate query per source)"""
+        digest = hashlib.sha256(report.name.encode())
+        for model, *filters in report.sources(start, end):
+            row = db.session.query(
+                func.count(model.id), func.sum(model.amount), func.max(model.id), func.max(model.updated_at)
+            ).filter(*filters).one()
+            digest.update(repr((model.__tablename__,) + tuple(str(value) for value in row)).encode())
+        return digest.hexdigest()
+
+    def _report(self, name: str) -> SnapshotReport:
+        try:
+            return REPORTS[name]
+        except KeyError:
+            raise ValueError(f"Unknown report {name!r} (available: {', '.join(REPORTS)})")
+
+    def _tables(self, report: SnapshotReport, start: date, end: date) -> Tuple[str, ...]:
+        return tuple(sorted({source[0].__tablename__ for source in report.sources(start, end)}))
+
+    def _load_valid(self, report: SnapshotReport, start: date, end: date) -> Optional[Dict]:
+        try:
+            snapshot = ReportSnapshot.query.filter_by(
+                report=report.name, period_start=start, period_end=end
+            ).first()
+            if snapshot is None or snapshot.fingerprint != self.fingerprint(report, start, end):
+                return None
+            return json.loads(snapshot.payload)
+        except SQLAlchemyError as e:
+            logger.warning(f'Could not read report snapshot {report.name} {start}..{end}: {e}')
+            db.session.rollback()
+            return None
+
+    def get(self, name: str, start: date, end: date) -> Optional[Dict]:
+        """
+        Current snapshot payload for a report period
+
+        Returns:
+            Report dict, or None when no snapshot exists or the data changed since
+        """
+        report = self._report(name)
+        payload = self._cache.get_or_compute(
+            ('snapshot', name, start, end), self._tables(report, start, end),
+            lambda: self._load_valid(report, start, end)
+        )
+        return payload
+
+    def render(self, name: str, start: date, end: date) -> ReportSnapshot:
+        """
+        Compute a report and store it as the period's snapshot (commits)
+
+        Reads the primary: the fingerprint, the report and the existing row
+        must all see the data the snapshot is written against.
+
+        Returns:
+            The stored ReportSnapshot
+        """
+        with reporting_reads(False):
+            return self._render(name, start, end)
+
+    def _render(self, name: str, start: date, end: date) -> ReportSnapshot:
+        report = self._report(name)
+        fingerprint = self.fingerprint(report, start, end)
+
+        started = time.perf_counter()
+        payload = json.dumps(report.build(start, end), default=_json_default, separators=(',', ':'))
+        xlsx = None
+        if report.rows is not None:
+            headers, rows = report.rows(start, end)
+            xlsx = b''.join(iter_xlsx(headers, rows, sheet_title=name))
+        elapsed = time.perf_counter() - started
+
+        snapshot = ReportSnapshot.query.filter_by(report=name, period_start=start, period_end=end).first()
+        if snapshot is None:
+            snapshot = ReportSnapshot(report=name, period_start=start, period_end=end)
+            db.session.add(snapshot)
+        snapshot.fingerprint = fingerprint
+        snapshot.payload = payload
+        snapshot.xlsx = xlsx
+        snapshot.render_seconds = elapsed
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process stored the same period first; its row is just as current
+            db.session.rollback()
+            logger.info(f'Report snapshot {name} {start}..{end} was rendered concurrently')
+            return ReportSnapshot.query.filter_by(report=name, period_start=start, period_end=end).one()
+
+        self._cache.clear()
+        logger.info(f'Rendered report snapshot {name} {start}..{end} in {elapsed:.2f}s')
+        return snapshot
+
+    def get_or_render(self, name: str, start: date, end: date) -> Dict:
+        """
+        Snapshot payload for a closed month, rendering it when missing or stale;
+        every other period is computed live and not stored
+
+        Returns:
+            Report dict
+        """
+        if not is_closed(start, end):
+            return self._report(name).build(start, end)
+        payload = self.get(name, start, end)
+        if payload is None:
+            # A lagging replica may miss a current snapshot; check the primary before rendering
+            with reporting_reads(False):
+                payload = self._load_valid(self._report(name), start, end)
+                if payload is None:
+                    payload = json.loads(self._render(name, start, end).payload)
+        return payload
+
+    def xlsx(self, name: str, start: date, end: date) -> Optional[bytes]:
+        """Stored workbook of a current snapshot, if the report has one"""
+        if self.get(name, start, end) is None:
+            return None
+        snapshot = ReportSnapshot.query.filter_by(report=name, period_start=start, period_end=end).first()
+        return snapshot.xlsx if snapshot else None
+
+    def prerender_closed_periods(self, months: int = DEFAULT_MONTHS,
+                                 reports: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Make sure every report has a current snapshot for the last closed months
+        (months closed with services.period_close)
+
+        Returns:
+            Dict with rendered, current and failed counts
+        """
+        stats = {'rendered': 0, 'current': 0, 'failed': 0}
+        for start, end in closed_months(months):
+            for name in reports or REPORTS:
+                try:
+                    if self.get(name, start, end) is not None:
+                        stats['current'] += 1
+                        continue
+                    self.render(name, start, end)
+                    stats['rendered'] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    stats['failed'] += 1
+                    logger.error(f'Failed to prerender {name} {start}..{end}: {e}')
+        return stats
+
+
+_store: Optional[ReportSnapshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> ReportSnapshotStore:
+    """Process-wide snapshot store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReportSnapshotStore()
+    return _store
+
+
+class SnapshotWorker(threading.Thread):
+    """
+    Daemon thread prerendering closed-period snapshots every ``interval`` seconds
+
+    Every gunicorn worker may start one, but only the process holding the
+    exclusive lock on ``lock_file`` renders; the others retry each interval
+    and take over when the holder exits (the OS releases its lock).
+    """
+
+    def __init__(self, app, interval: float, months: int = DEFAULT_MONTHS, lock_file: Optional[str] = None):
+        super().__init__(name='report-snapshot-worker', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.months = months
+        self.lock_file = lock_file
+        self._lock_handle = None
+        self._active = False
+        self._stop_event = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        """Whether this process is the one rendering snapshots"""
+        return self._active
+
+    def _acquire(self) -> bool:
+        if self._active:
+            return True
+        if self.lock_file is not None:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None    # No flock (Windows development server): a single process anyway
+            if fcntl is not None:
+                handle = open(self.lock_file, 'a')
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    return False
+                self._lock_handle = handle
+        self._active = True
+        logger.info(f'Report snapshot worker active in process {os.getpid()}')
+        return True
+
+    def _release(self):
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+        self._active = False
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                if self._acquire():
+                    with self.app.app_context():
+                        try:
+                            stats = get_snapshot_store().prerender_closed_periods(self.months)
+                            logger.info(f'Report snapshots: {stats}')
+                        except Exception as e:
+                            logger.error(f'Report snapshot worker failed: {e}')
+                        finally:
+                            db.session.remove()
+                self._stop_event.wait(self.interval)
+        finally:
+            self._release()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_snapshot_worker(app) -> Optional[SnapshotWorker]:
+    """
+    Start the background worker when REPORT_SNAPSHOT_INTERVAL is set (seconds);
+    REPORT_SNAPSHOT_LOCK_FILE keeps the rendering to one process per host
+    """
+    interval = app.config.get('REPORT_SNAPSHOT_INTERVAL') or 0
+    if interval <= 0:
+        return None
+    worker = SnapshotWorker(app, interval, app.config.get('REPORT_SNAPSHOT_MONTHS', DEFAULT_MONTHS),
+                            app.config.get('REPORT_SNAPSHOT_LOCK_FILE'))
+    worker.start()
+    return worker
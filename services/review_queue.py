@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Classification Review Queue
+
+Ranks transactions awaiting review (unclassified or flagged needs_review)
+by expected impact:
+
+    review_priority = (1 - classification_confidence) * |amount|
+
+and groups them by description signature, so one manual decision can be
+applied to a whole cluster of look-alike transactions at once.
+
+review_priority and description_signature are stored (and indexed) on
+bank_transactions and maintained by mapper events on every ORM insert and
+update. Rows outside the queue have a NULL priority, so the ranking query
+is a plain descending scan of the priority index.
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import re
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, update
+
+from database import db
+from models.bank_transaction import BankTransaction
+from services.entity_cube import EntityCube
+from services.period_close import open_period_clause
+
+# Fields a reviewer may set through a bulk decision
+REVIEWABLE_FIELDS = (
+    'business_category', 'gl_account_code', 'tax_category', 'transaction_subtype',
+    'merchant_name', 'merchant_category', 'is_tax_deductible', 'requires_receipt',
+    'receipt_status', 'review_notes'
+)
+
+SIGNATURE_MAX_TOKENS = 10
+SIGNATURE_MAX_LENGTH = 100
+
+# Account references ("x4717") and words; reference numbers and hashes are dropped
+_SIGNATURE_TOKEN = re.compile(r'X\d{4}(?!\d)|[A-Z][A-Z&]+')
+
+
+def description_signature(description: Optional[str]) -> Optional[str]:
+    """
+    Cluster key for a bank description
+
+    "ACH Credit PAYMNT     OVINTIV 0896, CCD  00516656" and
+    "ACH Credit PAYMNT     OVINTIV 0896, CCD  00506744" share the signature
+    "ACH CREDIT PAYMNT OVINTIV CCD".
+    """
+    if not description:
+        return None
+    tokens = _SIGNATURE_TOKEN.findall(description.upper())[:SIGNATURE_MAX_TOKENS]
+    return ' '.join(tokens)[:SIGNATURE_MAX_LENGTH] or None
+
+
+def review_priority(transaction: BankTransaction) -> Optional[Decimal]:
+    """Expected impact of reviewing a transaction, or None when it is not in the queue"""
+    if transaction.is_classified and not transaction.needs_review:
+        return None
+    confidence = Decimal(str(transaction.classification_confidence or 0))
+    amount = abs(Decimal(str(transaction.amount or 0)))
+    return ((Decimal('1') - confidence) * amount).quantize(Decimal('0.01'))
+
+
+@event.listens_for(BankTransaction, 'before_insert')
+@event.listens_for(BankTransaction, 'before_update')
+def _maintain_review_keys(mapper, connection, target):
+    target.review_priority = review_priority(target)
+    target.description_signature = description_signature(target.description)
+
+
+def _open_periods(query):
+    """Restrict a bank transaction query to open (not closed) periods"""
+    clause = open_period_clause()
+    return query.filter(clause) if clause is not None else query
+
+
+class ReviewQueue:
+    """
+    Ranked, clustered review queue with bulk decisions
+    """
+
+    def ranked(self, limit: int = 50, account_name: Optional[str] = None) -> List[BankTransaction]:
+        """
+        Transactions awaiting review, highest expected impact first
+
+        Args:
+            limit: Maximum number of transactions
+            account_name: Optional account filter
+
+        Returns:
+            List of BankTransaction
+        """
+        query = _open_periods(BankTransaction.query.filter(BankTransaction.review_priority.isnot(None)))
+        if account_name:
+            query = query.filter(BankTransaction.account_name == account_name)
+        return query.order_by(BankTransaction.review_priority.desc()).limit(limit).all()
+
+    def clusters(self, limit: int = 20) -> List[Dict]:
+        """
+        Review queue grouped by description signature, highest total impact first
+
+        Args:
+            limit: Maximum number of clusters
+
+        Returns:
+            List of dicts with signature, transaction_count, impact,
+            total_amount, min_confidence and a sample description
+        """
+        impact = func.sum(BankTransaction.review_priority).label('impact')
+        rows = _open_periods(db.session.query(
+            BankTransaction.description_signature,
+            func.count(BankTransaction.id).label('transaction_count'),
+            impact,
+            func.sum(func.abs(BankTransaction.amount)).label('total_amount'),
+            func.min(BankTransaction.classification_confidence).label('min_confidence'),
+            func.min(BankTransaction.description).label('sample_description'),
+            func.min(BankTransaction.account_name).label('account_name')
+        ).filter(
+            BankTransaction.review_priority.isnot(None)
+        )).group_by(
+            BankTransaction.description_signature
+        ).order_by(impact.desc()).limit(limit).all()
+
+        return [{
+            'signature': row.description_signature,
+            'transaction_count': row.transaction_count,
+            'impact': float(row.impact or 0),
+            'total_amount': float(row.total_amount or 0),
+            'min_confidence': float(row.min_confidence) if row.min_confidence is not None else None,
+            'sample_description': row.sample_description,
+            'account_name': row.account_name
+        } for row in rows]
+
+    def cluster_ids(self, signature: str) -> List[int]:
+        """Ids of queued transactions sharing a description signature"""
+        rows = _open_periods(db.session.query(BankTransaction.id).filter(
+            BankTransaction.description_signature == signature,
+            BankTransaction.review_priority.isnot(None)
+        )).all()
+        return [row.id for row in rows]
+
+    def apply_decision(self, classification: Dict, transaction_ids: Optional[Iterable[int]] = None,
+                       signature: Optional[str] = None) -> Dict:
+        """
+        Apply one manual classification to many transactions in a single UPDATE
+
+        Args:
+            classification: Field values (restricted to REVIEWABLE_FIELDS)
+            transaction_ids: Explicit transaction ids (those in closed periods are skipped)
+            signature: Description signature of a whole cluster
+
+        Returns:
+            Dict with updated count and the affected ids
+        """
+        values = {field: value for field, value in classification.items() if field in REVIEWABLE_FIELDS}
+        if not values:
+            raise ValueError(f"No reviewable fields given (allowed: {', '.join(REVIEWABLE_FIELDS)})")
+
+        ids = set(self.cluster_ids(signature)) if signature else set()
+        explicit = set(int(i) for i in transaction_ids or [])
+        if explicit:
+            rows = _open_periods(db.session.query(BankTransaction.id).filter(BankTransaction.id.in_(explicit)))
+            ids.update(row.id for row in rows)
+        ids = sorted(ids)
+        if not ids:
+            return {'updated': 0, 'transaction_ids': []}
+
+        values.update({
+            'is_classified': True,
+            'needs_review': False,
+            'classification_method': 'MANUAL',
+            'classification_confidence': 1,
+            'review_priority': None,
+            'updated_at': datetime.utcnow()
+        })
+
+        result = db.session.execute(
+            update(BankTransaction).where(BankTransaction.id.in_(ids)).values(**values),
+            execution_options={'synchronize_session': False, 'entity_cube_maintained': True}
+        )
+
+        if 'merchant_name' in values:
+            # Merchant changes move rows between cube cells; refresh just their partitions
+            EntityCube().refresh_for_bank_transactions(ids)
+        else:
+            db.session.commit()
+
+        return {'updated': result.rowcount, 'transaction_ids': ids}
+
+    def backfill(self, batch_size: int = 1000) -> int:
+        """
+        Compute review keys for rows written before the columns existed
+
+        Returns:
+            Number of rows updated
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            batch = BankTransaction.query.filter(
+                BankTransaction.description_signature.is_(None),
+                BankTransaction.id > last_id
+            ).order_by(BankTransaction.id).limit(batch_size).all()
+            if not batch:
+                return updated
+            for transaction in batch:
+                transaction.review_priority = review_priority(transaction)
+                transaction.description_signature = description_signature(transaction.description)
+            db.session.commit()
+            updated += len(batch)
+            last_id = batch[-1].id
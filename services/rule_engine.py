@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+"""
+AcidTech Cash Flow - Declarative Classification Rule Engine
+
+Classification rules are data, not code. A rule set document (JSON, or
+YAML when PyYAML is installed) lists:
+- accounts: how a bank account_name is routed (ordered substring matches)
+  plus account-wide updates such as credit card cycle tracking
+- rules: ordered rules per (account, sign) with regex patterns over the
+  description, the field updates to apply and a confidence
+- unknown_account: what to do when no account matches
+
+Rule sets are stored versioned in classification_rule_sets and compiled
+into a decision table keyed by (account, sign). Evaluation is a dict
+lookup for the account (memoized per account_name) and the bucket, then a
+single fused regex per bucket. The fused regex holds one optional
+lookahead group per rule, in rule order, so one match call reports every
+rule whose patterns hit and the first one wins, exactly like an if/elif
+chain. Rules without patterns are catch-alls.
+
+The active rule set is hot reloaded when classification_rule_sets changes
+(see services.data_version) or after ``max_age`` seconds, so edits made
+by another worker are picked up without a restart.
+
+Every classified row records the rule set version and rule id it was
+classified with. When a rule set changes, reclassification_filter()
+narrows the rows to re-evaluate to those the changed rules can affect:
+rows a changed rule matched before (by rule id) and rows whose description
+signature matches a changed rule's patterns (via the signature index).
+
+Author: AcidTech Development Team
+Date: 2026-10-19
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.classification_rule_set import ClassificationRuleSet
+from services.data_version import get_version
+
+try:
+    import yaml
+except ImportError:  # YAML rule sets are optional
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+SIGNS = ('+', '-')  # "+" is amount > 0, "-" is amount <= 0
+DRY_RUN_SAMPLE_SIZE = 20
+
+_UPDATABLE_FIELDS = set(BankTransaction.__table__.columns.keys()) - {
+    'id', 'created_at', 'created_by', 'rule_set_version', 'classification_rule_id'
+}
+
+# Fields that follow from the business category, with their column defaults. A
+# learned category prediction takes them from the rules setting that category.
+CATEGORY_DERIVED_FIELDS = {
+    'transaction_subtype': None,
+    'is_tax_deductible': False,
+    'requires_receipt': False,
+    'receipt_status': 'NOT_REQUIRED',
+}
+
+_TO_BILL_PAY = [r'Transfer.*CH x4717.*CH x5285', r'Transfer.*4717.*5285', r'Bill Pay', r'TMID:.*5285']
+_TO_PAYROLL = [r'Transfer.*CH x4717.*CH x4709', r'Transfer.*4717.*4709', r'Payroll', r'Salary', r'Hourly']
+
+# Rule set equivalent to the original hard-coded classifier; used until one is saved
+DEFAULT_RULE_SET = {
+    'name': 'AcidTech default rules',
+    'accounts': [
+        {'name': 'Revenue 4717', 'match': ['Revenue 4717']},
+        {'name': 'Bill Pay 5285', 'match': ['Bill Pay', '5285']},
+        {'name': 'Payroll 4079', 'match': ['Payroll', '4079']},
+        {'name': 'Capital One', 'match': ['Capital One'], 'credit_card_cycle': True,
+         'set': {'is_credit_card_transaction': True}},
+    ],
+    'rules': [
+        {'id': 'revenue_deposit', 'account': 'Revenue 4717', 'sign': '+',
+         'set': {'business_category': 'REVENUE', 'transaction_subtype': 'DEPOSIT', 'gl_account_code': '4000',
+                 'is_tax_deductible': False, 'is_classified': True},
+         'confidence': 0.95, 'note': 'Revenue account income - high confidence',
+         'merchant': 'Customer identified: {merchant}'},
+        {'id': 'revenue_transfer_bill_pay', 'account': 'Revenue 4717', 'sign': '-', 'patterns': _TO_BILL_PAY,
+         'set': {'business_category': 'INTERNAL_TRANSFER', 'transaction_subtype': 'TRANSFER_OUT',
+                 'is_internal_transfer': True, 'source_account': 'Revenue 4717', 'target_account': 'Bill Pay 5285',
+                 'gl_account_code': '1100', 'is_classified': True},
+         'confidence': 0.92, 'note': 'Internal transfer to Bill Pay account'},
+        {'id': 'revenue_transfer_payroll', 'account': 'Revenue 4717', 'sign': '-', 'patterns': _TO_PAYROLL,
+         'set': {'business_category': 'INTERNAL_TRANSFER', 'transaction_subtype': 'TRANSFER_OUT',
+                 'is_internal_transfer': True, 'source_account': 'Revenue 4717', 'target_account': 'Payroll 4079',
+                 'gl_account_code': '1100', 'is_classified': True},
+         'confidence': 0.90, 'note': 'Internal transfer to Payroll account'},
+        {'id': 'revenue_tax_payment', 'account': 'Revenue 4717', 'sign': '-', 'patterns': ['TAX', 'IRS'],
+         'set': {'business_category': 'TAX_PAYMENT', 'transaction_subtype': 'TAX', 'gl_account_code': '6300',
+                 'tax_category': 'TAX_PAYMENT', 'is_tax_deductible': True, 'is_classified': True},
+         'confidence': 0.88, 'note': 'Tax payment identified'},
+        {'id': 'revenue_bank_fee', 'account': 'Revenue 4717', 'sign': '-',
+         'set': {'business_category': 'BANK_FEE', 'transaction_subtype': 'FEE', 'gl_account_code': '6100',
+                 'is_classified': True, 'needs_review': True},
+         'confidence': 0.70, 'note': 'Possible bank fee - needs review'},
+        {'id': 'bill_pay_transfer_in', 'account': 'Bill Pay 5285', 'sign': '+',
+         'set': {'business_category': 'INTERNAL_TRANSFER', 'transaction_subtype': 'TRANSFER_IN',
+                 'is_internal_transfer': True, 'source_account': 'Revenue 4717', 'target_account': 'Bill Pay 5285',
+                 'gl_account_code': '1100', 'is_classified': True},
+         'confidence': 0.90, 'note': 'Transfer in from Revenue account'},
+        {'id': 'bill_pay_vendor_payment', 'account': 'Bill Pay 5285', 'sign': '-',
+         'set': {'business_category': 'OPERATING_EXPENSE', 'transaction_subtype': 'VENDOR_PAYMENT',
+                 'gl_account_code': '6000', 'is_tax_deductible': True, 'requires_receipt': True,
+                 'receipt_status': 'REQUIRED', 'is_classified': True},
+         'confidence': 0.85, 'note': 'Vendor payment - receipt required',
+         'merchant': 'Vendor identified: {merchant}'},
+        {'id': 'payroll_transfer_in', 'account': 'Payroll 4079', 'sign': '+',
+         'set': {'business_category': 'INTERNAL_TRANSFER', 'transaction_subtype': 'TRANSFER_IN',
+                 'is_internal_transfer': True, 'source_account': 'Revenue 4717', 'target_account': 'Payroll 4079',
+                 'gl_account_code': '1100', 'is_classified': True},
+         'confidence': 0.90, 'note': 'Transfer in from Revenue account'},
+        {'id': 'payroll_expense', 'account': 'Payroll 4079', 'sign': '-',
+         'set': {'business_category': 'PAYROLL_EXPENSE', 'transaction_subtype': 'PAYROLL', 'gl_account_code': '6200',
+                 'tax_category': 'PAYROLL', 'is_tax_deductible': True, 'is_classified': True},
+         'confidence': 0.88, 'note': 'Payroll expense'},
+        {'id': 'credit_card_payment', 'account': 'Capital One', 'sign': '+',
+         'set': {'business_category': 'CREDIT_CARD_PAYMENT', 'transaction_subtype': 'PAYMENT',
+                 'is_credit_card_payment': True, 'gl_account_code': '2100', 'is_classified': True},
+         'confidence': 0.92, 'note': 'Credit card payment received'},
+        {'id': 'credit_card_purchase', 'account': 'Capital One', 'sign': '-',
+         'set': {'business_category': 'OPERATING_EXPENSE', 'transaction_subtype': 'PURCHASE',
+                 'gl_account_code': '6000', 'is_tax_deductible': True, 'requires_receipt': True,
+                 'receipt_status': 'REQUIRED', 'is_classified': True},
+         'confidence': 0.80, 'note': 'Business expense on credit card - receipt required',
+         'merchant': True},
+    ],
+    'unknown_account': {
+        'set': {'needs_review': True},
+        'confidence': 0.1,
+        'note': 'Unknown account type: {account}'
+    },
+}
+
+
+def reclassifiable_clauses() -> List:
+    """Filters protecting manual classifications from rule-driven reclassification"""
+    return [or_(BankTransaction.classification_method.is_(None), BankTransaction.classification_method != 'MANUAL')]
+
+
+_INLINE_FLAGS = re.compile(r'\?[aiLmsux]+\)')
+
+
+def _fusion_problem(pattern: str) -> Optional[str]:
+    """
+    Why a valid pattern cannot be fused into a bucket regex, or None
+
+    Global inline flags must start the whole expression, named groups clash
+    with the fused rule groups and backreferences would point at a
+    different group once fused.
+    """
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            if not in_class and pattern[index + 1:index + 2] in tuple('123456789'):
+                return 'backreferences are not supported'
+            index += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+            # A leading ] (after an optional ^) is a literal member
+            if pattern[index + 1:index + 2] == '^':
+                index += 1
+            if pattern[index + 1:index + 2] == ']':
+                index += 1
+        elif char == '(' and pattern[index + 1:index + 2] == '?':
+            rest = pattern[index + 2:]
+            if rest.startswith('P=') or rest.startswith('('):
+                return 'backreferences are not supported'
+            if rest.startswith('P<') or (rest.startswith('<') and rest[1:2] not in ('=', '!')):
+                return 'named groups are not supported'
+            if _INLINE_FLAGS.match(pattern, index + 1):
+                return 'inline flags are not supported (rules always match case-insensitively)'
+        index += 1
+    return None
+
+
+class RuleMatch:
+    """
+    Outcome of evaluating one transaction against a rule set
+    """
+
+    __slots__ = ('rule_id', 'account', 'updates', 'confidence', 'note', 'merchant', 'credit_card_cycle', 'version')
+
+    def __init__(self, rule_id, account, updates, confidence, note, merchant, credit_card_cycle, version):
+        self.rule_id = rule_id
+        self.account = account
+        self.updates = updates
+        self.confidence = confidence
+        self.note = note
+        self.merchant = merchant
+        self.credit_card_cycle = credit_card_cycle
+        self.version = version
+
+    def outcome(self) -> Tuple:
+        """Comparable summary of what the match writes (ignores rule ids)"""
+        return (tuple(sorted(self.updates.items())), self.confidence, bool(self.merchant), self.credit_card_cycle)
+
+
+class _Bucket:
+    """Ordered rules for one (account, sign) with their fused regex"""
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        parts = []
+        self.group_names = []
+        for index, rule in enumerate(rules):
+            if rule['patterns']:
+                name = f'r{index}'
+                alternatives = '|'.join(f'(?:{pattern})' for pattern in rule['patterns'])
+                parts.append(f'(?:(?=.*?(?:{alternatives}))(?P<{name}>))?')
+                self.group_names.append(name)
+            else:
+                self.group_names.append(None)
+        self.regex = re.compile(''.join(parts), re.IGNORECASE | re.DOTALL) if parts else None
+
+    def first_match(self, description: str) -> Optional[Dict]:
+        groups = self.regex.match(description).groupdict() if self.regex is not None else {}
+        for rule, name in zip(self.rules, self.group_names):
+            if name is None or groups.get(name) is not None:
+                return rule
+        return None
+
+
+class CompiledRuleSet:
+    """
+    Decision table compiled from a rule set document
+    """
+
+    def __init__(self, definition: Dict, version: Optional[int] = 0):
+        self.version = version
+        self.name = definition.get('name', 'Unnamed rule set')
+        self.accounts = definition.get('accounts') or []
+        self.rules = definition.get('rules') or []
+        self.unknown_account = definition.get('unknown_account') or {'set': {'needs_review': True}, 'confidence': 0.1}
+        self._routes: Dict[str, Optional[Dict]] = {}
+        self._validate()
+
+        self.buckets: Dict[Tuple[str, str], _Bucket] = {}
+        for account in self.accounts:
+            for sign in SIGNS:
+                bucket_rules = [
+                    rule for rule in self.rules
+                    if rule['account'] == account['name'] and rule.get('sign', 'any') in (sign, 'any')
+                ]
+                try:
+                    self.buckets[(account['name'], sign)] = _Bucket(bucket_rules)
+                except re.error as e:
+                    raise ValueError(f"Rules of account {account['name']} ({sign}) do not compile together: {e}")
+
+    def _validate(self) -> None:
+        account_names = set()
+        for account in self.accounts:
+            if not account.get('name') or not account.get('match'):
+                raise ValueError('Every account needs a name and a non-empty match list')
+            account_names.add(account['name'])
+            self._check_fields(account.get('set') or {}, f"account {account['name']}")
+
+        rule_ids = set()
+        for position, rule in enumerate(self.rules):
+            rule_id = rule.setdefault('id', f'rule_{position + 1}')
+            if rule_id in rule_ids:
+                raise ValueError(f'Duplicate rule id: {rule_id}')
+            rule_ids.add(rule_id)
+            if rule.get('account') not in account_names:
+                raise ValueError(f"Rule {rule_id} references unknown account {rule.get('account')!r}")
+            if rule.get('sign', 'any') not in SIGNS + ('any',):
+                raise ValueError(f"Rule {rule_id} has invalid sign {rule.get('sign')!r} (use '+', '-' or 'any')")
+            rule['patterns'] = list(rule.get('patterns') or [])
+            for pattern in rule['patterns']:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f'Rule {rule_id} has an invalid pattern {pattern!r}: {e}')
+                problem = _fusion_problem(pattern)
+                if problem:
+                    raise ValueError(f'Rule {rule_id} has an unsupported pattern {pattern!r}: {problem}')
+            self._check_fields(rule.get('set') or {}, f'rule {rule_id}')
+
+        self._check_fields(self.unknown_account.get('set') or {}, 'unknown_account')
+
+    @staticmethod
+    def _check_fields(updates: Dict, owner: str) -> None:
+        unknown = set(updates) - _UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"{owner} sets unknown fields: {', '.join(sorted(unknown))}")
+
+    def route(self, account_name: str) -> Optional[Dict]:
+        """Account entry for a bank account name (memoized)"""
+        try:
+            return self._routes[account_name]
+        except KeyError:
+            pass
+        account = next((a for a in self.accounts if any(m in account_name for m in a['match'])), None)
+        self._routes[account_name] = account
+        return account
+
+    def evaluate(self, account_name: str, description: str, amount) -> RuleMatch:
+        """
+        Classify one transaction
+
+        Args:
+            account_name: Bank account name
+            description: Transaction description
+            amount: Signed amount
+
+        Returns:
+            RuleMatch (rule_id is None for unknown accounts or when no rule matched)
+        """
+        account = self.route(account_name or '')
+        if account is None:
+            unknown = self.unknown_account
+            return RuleMatch(None, None, dict(unknown.get('set') or {}), unknown.get('confidence', 0.1),
+                             (unknown.get('note') or '').format(account=account_name), False, False, self.version)
+
+        updates = dict(account.get('set') or {})
+        sign = '+' if float(amount or 0) > 0 else '-'
+        rule = self.buckets[(account['name'], sign)].first_match(description or '')
+        if rule is None:
+            updates['needs_review'] = True
+            return RuleMatch(None, account['name'], updates, 0.1, 'No classification rule matched', False,
+                             bool(account.get('credit_card_cycle')), self.version)
+
+        updates.update(rule.get('set') or {})
+        return RuleMatch(rule['id'], account['name'], updates, rule.get('confidence', 0.5), rule.get('note'),
+                         rule.get('merchant', False), bool(account.get('credit_card_cycle')), self.version)
+
+    def category_fields(self, account_name: str, amount, business_category: str) -> Optional[Dict]:
+        """
+        CATEGORY_DERIVED_FIELDS the rules set for a business category
+
+        Rules of the transaction's (account, sign) bucket setting that
+        category are consulted first, then every rule setting it.
+
+        Returns:
+            The fields (unset ones at their column default), or None when no
+            rule sets the category or the rules disagree
+        """
+        def setting(rules):
+            return [rule for rule in rules if (rule.get('set') or {}).get('business_category') == business_category]
+
+        account = self.route(account_name or '')
+        candidates = []
+        if account is not None:
+            sign = '+' if float(amount or 0) > 0 else '-'
+            candidates = setting(self.buckets[(account['name'], sign)].rules)
+        candidates = candidates or setting(self.rules)
+
+        outcomes = {
+            tuple((field, (rule.get('set') or {}).get(field, default))
+                  for field, default in CATEGORY_DERIVED_FIELDS.items())
+            for rule in candidates
+        }
+        return dict(outcomes.pop()) if len(outcomes) == 1 else None
+
+
+def parse_definition(document: Union[str, Dict], format: str = 'json') -> Dict:
+    """
+    Parse a rule set document
+
+    Args:
+        document: JSON/YAML text or an already parsed dict
+        format: "json" or "yaml"
+
+    Returns:
+        Rule set dict
+    """
+    if isinstance(document, dict):
+        return json.loads(json.dumps(document))  # Deep copy; compilation annotates rules in place
+    if format == 'yaml':
+        if yaml is None:
+            raise ValueError('YAML rule sets require PyYAML to be installed')
+        definition = yaml.safe_load(document)
+    elif format == 'json':
+        definition = json.loads(document)
+    else:
+        raise ValueError(f'Unsupported rule set format: {format}')
+    if not isinstance(definition, dict):
+        raise ValueError('A rule set document must be a mapping')
+    return definition
+
+
+def _fingerprint(item: Dict) -> str:
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def _sign_clause(sign: str):
+    return BankTransaction.amount > 0 if sign == '+' else BankTransaction.amount <= 0
+
+
+def _account_clause(account: Dict):
+    # Substring routing as SQL; a superset when an earlier account also matches
+    return or_(*[BankTransaction.account_name.contains(m, autoescape=True) for m in account['match']])
+
+
+def _changed_rules(old: CompiledRuleSet, new: CompiledRuleSet) -> Tuple[set, List[Dict]]:
+    """
+    Accounts and bucket rules that differ between two rule sets
+
+    Returns:
+        (names of accounts whose routing or account-wide updates changed,
+         old and new definitions of every added, removed, edited or
+         reordered rule)
+    """
+    old_accounts = {a['name']: _fingerprint(a) for a in old.accounts}
+    new_accounts = {a['name']: _fingerprint(a) for a in new.accounts}
+    changed_accounts = {name for name in set(old_accounts) | set(new_accounts)
+                        if old_accounts.get(name) != new_accounts.get(name)}
+
+    changed = []
+    for key in set(old.buckets) | set(new.buckets):
+        if key[0] in changed_accounts:
+            continue
+        old_rules = old.buckets[key].rules if key in old.buckets else []
+        new_rules = new.buckets[key].rules if key in new.buckets else []
+        old_by_id = {rule['id']: rule for rule in old_rules}
+        new_by_id = {rule['id']: rule for rule in new_rules}
+
+        # Rules kept in both versions but reordered change precedence too
+        common = [rule['id'] for rule in old_rules if rule['id'] in new_by_id]
+        new_order = [rule['id'] for rule in new_rules if rule['id'] in old_by_id]
+        moved = {a for a, b in zip(common, new_order) if a != b}
+
+        for rule_id in set(old_by_id) | set(new_by_id):
+            before, after = old_by_id.get(rule_id), new_by_id.get(rule_id)
+            if before and after and rule_id not in moved and _fingerprint(before) == _fingerprint(after):
+                continue
+            changed.extend(rule for rule in (before, after) if rule)
+
+    return changed_accounts, changed
+
+
+class RuleEngine:
+    """
+    Loads, hot reloads, stores and dry-runs classification rule sets
+    """
+
+    def __init__(self, max_age: float = 60.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._compiled: Optional[CompiledRuleSet] = None
+        self._loaded_version: Optional[Tuple[int, ...]] = None
+        self._loaded_at = 0.0
+
+    def _load_active_row(self) -> Optional[Tuple[int, str, str]]:
+        try:
+            with db.engine.connect() as connection:
+                return connection.execute(
+                    select(ClassificationRuleSet.version, ClassificationRuleSet.definition,
+                           ClassificationRuleSet.format)
+                    .where(ClassificationRuleSet.is_active.is_(True))
+                    .order_by(ClassificationRuleSet.version.desc())
+                    .limit(1)
+                ).first()
+        except SQLAlchemyError as e:
+            logger.warning(f"Classification rule sets unavailable, using the default rules: {e}")
+            return None
+
+    def active(self) -> CompiledRuleSet:
+        """The active compiled rule set, reloaded when a new version is saved"""
+        table_version = get_version(ClassificationRuleSet.__tablename__)
+        if (self._compiled is not None and self._loaded_version == table_version
+                and time.monotonic() - self._loaded_at <= self.max_age):
+            return self._compiled
+
+        with self._lock:
+            row = self._load_active_row()
+            version = row.version if row else 0
+            if self._compiled is None or self._compiled.version != version:
+                if row:
+                    self._compiled = CompiledRuleSet(parse_definition(row.definition, row.format), row.version)
+                else:
+                    self._compiled = CompiledRuleSet(parse_definition(DEFAULT_RULE_SET), 0)
+                logger.info(f"Classification rules v{version} compiled ({self._compiled.name})")
+            self._loaded_version = table_version
+            self._loaded_at = time.monotonic()
+            return self._compiled
+
+    def evaluate(self, account_name: str, description: str, amount) -> RuleMatch:
+        """Evaluate a transaction against the active rule set"""
+        return self.active().evaluate(account_name, description, amount)
+
+    def load_version(self, version: int) -> CompiledRuleSet:
+        """Compile a stored rule set version (0 is the built-in default)"""
+        if not version:
+            return CompiledRuleSet(parse_definition(DEFAULT_RULE_SET), 0)
+        rule_set = ClassificationRuleSet.query.filter_by(version=version).first()
+        if rule_set is None:
+            raise ValueError(f'Unknown rule set version: {version}')
+        return CompiledRuleSet(parse_definition(rule_set.definition, rule_set.format), rule_set.version)
+
+    def reclassification_filter(self, old: CompiledRuleSet, new: CompiledRuleSet):
+        """
+        SQL filter for the bank transactions a rule set change can reclassify
+
+        Selects rows never classified by a tracked rule set version, every
+        row of accounts whose routing changed, rows a changed rule matched
+        under the old rules, and rows in a changed rule's (account, sign)
+        bucket whose description signature matches its patterns (the whole
+        bucket for a changed catch-all rule).
+
+        Args:
+            old: Rule set the rows were classified with
+            new: Rule set to reclassify with
+
+        Returns:
+            SQLAlchemy clause, or None when the rule sets are equivalent
+        """
+        changed_accounts, changed = _changed_rules(old, new)
+        unknown_changed = _fingerprint(old.unknown_account) != _fingerprint(new.unknown_account)
+        if not changed_accounts and not changed and not unknown_changed:
+            return None
+
+        clauses = [BankTransaction.rule_set_version.is_(None)]
+        if unknown_changed:
+            clauses.append(BankTransaction.classification_rule_id.is_(None))
+
+        for rule_set in (old, new):
+            for account in rule_set.accounts:
+                if account['name'] in changed_accounts:
+                    clauses.append(_account_clause(account))
+
+        accounts = {a['name']: a for a in old.accounts}
+        accounts.update({a['name']: a for a in new.accounts})
+
+        lost_rule_ids = set()
+        patterned = []
+        for rule in changed:
+            lost_rule_ids.add(rule['id'])
+            signs = SIGNS if rule.get('sign', 'any') == 'any' else (rule['sign'],)
+            bucket = and_(_account_clause(accounts[rule['account']]), or_(*[_sign_clause(s) for s in signs]))
+            if not rule['patterns']:
+                clauses.append(bucket)
+            else:
+                patterned.append((re.compile('|'.join(f'(?:{p})' for p in rule['patterns']),
+                                             re.IGNORECASE | re.DOTALL), bucket))
+        if lost_rule_ids:
+            clauses.append(BankTransaction.classification_rule_id.in_(sorted(lost_rule_ids)))
+
+        if patterned:
+            # Match patterns against the distinct signatures (and a sample description of each)
+            signatures = db.session.query(
+                BankTransaction.description_signature, func.min(BankTransaction.description)
+            ).group_by(BankTransaction.description_signature).all()
+            for regex, bucket in patterned:
+                hits = [signature for signature, sample in signatures
+                        if signature and (regex.search(signature) or regex.search(sample or ''))]
+                if hits:
+                    clauses.append(and_(bucket, BankTransaction.description_signature.in_(hits)))
+
+        return or_(*clauses)
+
+    def save_rule_set(self, document: Union[str, Dict], name: Optional[str] = None, format: str = 'json',
+                      created_by: Optional[int] = None, notes: Optional[str] = None) -> ClassificationRuleSet:
+        """
+        Validate, store and activate a new rule set version
+
+        Args:
+            document: Rule set text (JSON/YAML) or dict
+            name: Display name (defaults to the document's name)
+            format: "json" or "yaml"
+            created_by: User id
+            notes: Change description
+
+        Returns:
+            The stored ClassificationRuleSet
+        """
+        definition = parse_definition(document, format)
+        CompiledRuleSet(parse_definition(definition))  # Raises ValueError when invalid
+
+        text = document if isinstance(document, str) else json.dumps(document, indent=2)
+        next_version = (db.session.query(func.max(ClassificationRuleSet.version)).scalar() or 0) + 1
+
+        ClassificationRuleSet.query.filter(ClassificationRuleSet.is_active.is_(True)).update(
+            {'is_active': False}, synchronize_session=False
+        )
+        rule_set = ClassificationRuleSet(
+            version=next_version,
+            name=name or definition.get('name', f'Rule set v{next_version}'),
+            format=format if isinstance(document, str) else 'json',
+            definition=text,
+            is_active=True,
+            notes=notes,
+            created_by=created_by
+        )
+        db.session.add(rule_set)
+        db.session.commit()
+        return rule_set
+
+    def dry_run(self, document: Union[str, Dict], format: str = 'json',
+                rows: Optional[Iterable[Tuple[int, str, str, float]]] = None) -> Dict:
+        """
+        Report what a candidate rule set would change, without writing anything
+
+        Args:
+            document: Candidate rule set text or dict
+            format: "json" or "yaml"
+            rows: Optional (id, account_name, description, amount) rows to
+                  evaluate; defaults to the rows the change can affect
+                  (see reclassification_filter), manual classifications excluded
+
+        Returns:
+            Dict with rows_scanned, rows_changed, per-rule gained/lost counts,
+            rule-to-rule transitions and a sample of changed ids
+        """
+        candidate = CompiledRuleSet(parse_definition(document, format), version=None)
+        current = self.active()
+
+        if rows is None:
+            clause = self.reclassification_filter(current, candidate)
+            query = select(BankTransaction.id, BankTransaction.account_name,
+                           BankTransaction.description, BankTransaction.amount)
+            query = query.where(clause, *reclassifiable_clauses()) if clause is not None else query.where(False)
+            rows = db.session.execute(query.execution_options(yield_per=5000))
+
+        report = {
+            'current_version': current.version,
+            'rows_scanned': 0,
+            'rows_changed': 0,
+            'by_rule': {},
+            'transitions': {},
+            'sample_changed_ids': []
+        }
+
+        for transaction_id, account_name, description, amount in rows:
+            report['rows_scanned'] += 1
+            before = current.evaluate(account_name, description, amount)
+            after = candidate.evaluate(account_name, description, amount)
+            if before.outcome() == after.outcome():
+                continue
+
+            report['rows_changed'] += 1
+            for rule_id, key in ((before.rule_id, 'lost'), (after.rule_id, 'gained')):
+                counts = report['by_rule'].setdefault(rule_id or '(none)', {'gained': 0, 'lost': 0})
+                counts[key] += 1
+            transition = f"{before.rule_id or '(none)'} -> {after.rule_id or '(none)'}"
+            report['transitions'][transition] = report['transitions'].get(transition, 0) + 1
+            if len(report['sample_changed_ids']) < DRY_RUN_SAMPLE_SIZE:
+                report['sample_changed_ids'].append(transaction_id)
+
+        return report
+
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_rule_engine() -> RuleEngine:
+    """Process-wide rule engine shared by classifier instances"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RuleEngine()
+    return _engine
@@ -8,19 +8,35 @@ Provides intelligent classification of bank transactions based on:
 - Amount flow analysis
 - Internal transfer detection
 - Credit card cycle logic (Capital One - cuts day 11)
+- Declarative, versioned rule sets (services/rule_engine.py)
 
 Author: AcidTech Development Team
 Date: 2025-08-08
 """
 
 import re
+import time
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import func
+from flask import current_app, has_app_context
+from sqlalchemy import func, inspect
 
 from database import db
 from models.bank_transaction import BankTransaction
+from services.credit_card_cycles import cycle_info, get_cycle_config
+from services.merchant_normalizer import get_merchant_normalizer
+from services.metrics import record_classification
+from services.period_close import open_period_clause
+from services.rule_engine import RuleMatch, get_rule_engine, reclassifiable_clauses
+
+# Fields whose change makes a rerun count as a reclassification (rule_set_version,
+# confidence and timestamps are rewritten on every run)
+CLASSIFICATION_FIELDS = (
+    'transaction_subtype', 'business_category', 'gl_account_code', 'is_internal_transfer',
+    'source_account', 'target_account', 'merchant_name', 'merchant_category',
+    'is_tax_deductible', 'tax_category', 'requires_receipt', 'needs_review'
+)
 
 class CashFlowClassifier:
     """
@@ -58,31 +74,6 @@ class CashFlowClassifier:
             }
         }
         
-        # Transfer detection patterns (based on actual data analysis)
-        self.transfer_patterns = {
-            'to_bill_pay': [
-                r'Transfer.*CH x4717.*CH x5285',
-                r'Transfer.*4717.*5285',
-                r'Bill Pay',
-                r'TMID:.*5285'
-            ],
-            'to_payroll': [
-                r'Transfer.*CH x4717.*CH x4709', 
-                r'Transfer.*4717.*4709',
-                r'Payroll',
-                r'Salary',
-                r'Hourly'
-            ],
-            'from_revenue': [
-                r'Transfer.*CH x4717',
-                r'Transfer to DDA'
-            ],
-            'internal_transfer': [
-                r'Transfer.*TMID:',
-                r'CH x\d{4}.*CH x\d{4}'
-            ]
-        }
-        
         # Vendor/merchant extraction patterns
         self.vendor_patterns = [
             r'ACH.*?([A-Z][A-Z\s&\.]{10,40}?)[\s]{2,}',  # ACH payments
@@ -91,18 +82,34 @@ class CashFlowClassifier:
             r'^([A-Z][A-Z\s&\.]{10,40})[\s]*\*',  # Starting patterns
         ]
         
+        # Declarative classification rules (hot reloaded from classification_rule_sets)
+        self.rule_engine = get_rule_engine()
+        
+        # Canonical merchant dictionary (shared per process)
+        self.merchant_normalizer = get_merchant_normalizer()
+        
+        # Learned model (None until one has been trained from manual classifications);
+        # imported here so NumPy loads with the first classifier, not at app startup
+        from services.ml_classifier import DEFAULT_THRESHOLD, get_model
+        self.ml_model = None
+        self.ml_threshold = DEFAULT_THRESHOLD
+        if has_app_context():
+            self.ml_model = get_model(current_app.config.get('ML_MODEL_DIR', 'instance/ml_classifier'))
+            self.ml_threshold = current_app.config.get('ML_CONFIDENCE_THRESHOLD', DEFAULT_THRESHOLD)
+        
         # Tax deductible categories
         self.tax_deductible_categories = [
             'business_expense', 'office_supplies', 'travel', 'meals',
             'equipment', 'professional_services', 'utilities', 'rent'
         ]
 
-    def classify_transaction(self, transaction: BankTransaction) -> Dict:
+    def classify_transaction(self, transaction: BankTransaction, prediction: Optional[Dict] = None) -> Dict:
         """
         Classify a single transaction based on account and patterns
         
         Args:
             transaction: BankTransaction instance
+            prediction: Precomputed ML prediction (scored here when omitted)
             
         Returns:
             Dict with classification results
@@ -119,225 +126,61 @@ class CashFlowClassifier:
             'notes': []
         }
         
-        # Route to specific account classifier
-        if 'Revenue 4717' in transaction.account_name:
-            self._classify_revenue_transaction(transaction, result)
-        elif 'Bill Pay' in transaction.account_name or '5285' in transaction.account_name:
-            self._classify_bill_pay_transaction(transaction, result)
-        elif 'Payroll' in transaction.account_name or '4079' in transaction.account_name:
-            self._classify_payroll_transaction(transaction, result)
-        elif 'Capital One' in transaction.account_name:
-            self._classify_capital_one_transaction(transaction, result)
-        else:
-            # Unknown account type
-            result['classification_updates']['needs_review'] = True
-            result['confidence_score'] = 0.1
-            result['notes'].append(f"Unknown account type: {transaction.account_name}")
+        # Evaluate the declarative rule set (account/sign dispatch + one fused regex)
+        match = self.rule_engine.evaluate(transaction.account_name, transaction.description, transaction.amount)
+        self._apply_rule_match(transaction, match, result)
         
         # Apply common enhancements
         self._enhance_classification(transaction, result)
         
+        # Learned model overrides the rules when it is confident enough
+        if self.ml_model is not None:
+            if prediction is None:
+                prediction = self.ml_model.predict_transactions([transaction])[0]
+            self._apply_ml_prediction(transaction, result, prediction)
+        
         return result
 
-    def _classify_revenue_transaction(self, transaction: BankTransaction, result: Dict):
-        """Classify Revenue 4717 transactions"""
-        
-        desc = transaction.description.upper()
-        amount = float(transaction.amount)
-        
-        if amount > 0:
-            # Positive amounts in Revenue = actual revenue
-            result['classification_updates'].update({
-                'business_category': 'REVENUE',
-                'transaction_subtype': 'DEPOSIT',
-                'gl_account_code': '4000',
-                'is_tax_deductible': False,
-                'is_classified': True
-            })
-            result['confidence_score'] = 0.95
-            result['notes'].append("Revenue account income - high confidence")
-            
-            # Extract customer/entity name
-            vendor_name = self._extract_vendor_name(transaction.description)
-            if vendor_name:
-                result['classification_updates']['merchant_name'] = vendor_name
-                result['notes'].append(f"Customer identified: {vendor_name}")
+    def _apply_rule_match(self, transaction: BankTransaction, match: RuleMatch, result: Dict):
+        """Copy a rule engine match into the classification result"""
         
-        else:
-            # Negative amounts in Revenue = transfers or fees
-            
-            # Check for transfer to Bill Pay (5285)
-            if self._matches_patterns(desc, self.transfer_patterns['to_bill_pay']):
-                result['classification_updates'].update({
-                    'business_category': 'INTERNAL_TRANSFER',
-                    'transaction_subtype': 'TRANSFER_OUT',
-                    'is_internal_transfer': True,
-                    'source_account': 'Revenue 4717',
-                    'target_account': 'Bill Pay 5285',
-                    'gl_account_code': '1100',  # Cash transfer
-                    'is_classified': True
-                })
-                result['confidence_score'] = 0.92
-                result['notes'].append("Internal transfer to Bill Pay account")
-            
-            # Check for transfer to Payroll (4079)
-            elif self._matches_patterns(desc, self.transfer_patterns['to_payroll']):
-                result['classification_updates'].update({
-                    'business_category': 'INTERNAL_TRANSFER',
-                    'transaction_subtype': 'TRANSFER_OUT',
-                    'is_internal_transfer': True,
-                    'source_account': 'Revenue 4717',
-                    'target_account': 'Payroll 4079',
-                    'gl_account_code': '1100',  # Cash transfer
-                    'is_classified': True
-                })
-                result['confidence_score'] = 0.90
-                result['notes'].append("Internal transfer to Payroll account")
-            
-            # Check for tax payments
-            elif 'TAX' in desc or 'IRS' in desc:
-                result['classification_updates'].update({
-                    'business_category': 'TAX_PAYMENT',
-                    'transaction_subtype': 'TAX',
-                    'gl_account_code': '6300',
-                    'tax_category': 'TAX_PAYMENT',
-                    'is_tax_deductible': True,
-                    'is_classified': True
-                })
-                result['confidence_score'] = 0.88
-                result['notes'].append("Tax payment identified")
-            
-            else:
-                # Other negative amounts - fees or unknown
-                result['classification_updates'].update({
-                    'business_category': 'BANK_FEE',
-                    'transaction_subtype': 'FEE',
-                    'gl_account_code': '6100',
-                    'is_classified': True,
-                    'needs_review': True  # Flag for manual review
-                })
-                result['confidence_score'] = 0.70
-                result['notes'].append("Possible bank fee - needs review")
-
-    def _classify_bill_pay_transaction(self, transaction: BankTransaction, result: Dict):
-        """Classify Bill Pay 5285 transactions"""
-        
-        desc = transaction.description.upper()
-        amount = float(transaction.amount)
-        
-        if amount > 0:
-            # Positive amounts in Bill Pay = transfers in from Revenue
-            result['classification_updates'].update({
-                'business_category': 'INTERNAL_TRANSFER',
-                'transaction_subtype': 'TRANSFER_IN',
-                'is_internal_transfer': True,
-                'source_account': 'Revenue 4717',
-                'target_account': 'Bill Pay 5285',
-                'gl_account_code': '1100',
-                'is_classified': True
-            })
-            result['confidence_score'] = 0.90
-            result['notes'].append("Transfer in from Revenue account")
+        updates = result['classification_updates']
         
-        else:
-            # Negative amounts in Bill Pay = vendor payments
-            result['classification_updates'].update({
-                'business_category': 'OPERATING_EXPENSE',
-                'transaction_subtype': 'VENDOR_PAYMENT',
-                'gl_account_code': '6000',
-                'is_tax_deductible': True,
-                'requires_receipt': True,
-                'receipt_status': 'REQUIRED',
-                'is_classified': True
+        # Credit card accounts track the statement cycle of every transaction
+        if match.credit_card_cycle:
+            cycle = self._calculate_credit_card_cycle(transaction.transaction_date, transaction.account_name)
+            updates.update({
+                'credit_card_cycle_date': cycle['cycle_cut_date'],
+                'credit_card_due_date': cycle['due_date']
             })
-            result['confidence_score'] = 0.85
-            result['notes'].append("Vendor payment - receipt required")
-            
-            # Extract vendor name
-            vendor_name = self._extract_vendor_name(transaction.description)
+        
+        updates.update(match.updates)
+        updates['rule_set_version'] = match.version
+        updates['classification_rule_id'] = match.rule_id
+        result['confidence_score'] = match.confidence
+        result['rule_id'] = match.rule_id
+        result['rule_set_version'] = match.version
+        if match.note:
+            result['notes'].append(match.note)
+        
+        if match.merchant:
+            vendor_name = self._resolve_merchant_name(transaction.description)
             if vendor_name:
-                result['classification_updates']['merchant_name'] = vendor_name
-                result['notes'].append(f"Vendor identified: {vendor_name}")
+                updates['merchant_name'] = vendor_name
+                if isinstance(match.merchant, str):
+                    result['notes'].append(match.merchant.format(merchant=vendor_name))
 
-    def _classify_payroll_transaction(self, transaction: BankTransaction, result: Dict):
-        """Classify Payroll 4079 transactions"""
-        
-        desc = transaction.description.upper()
-        amount = float(transaction.amount)
-        
-        if amount > 0:
-            # Positive amounts in Payroll = transfers in from Revenue
-            result['classification_updates'].update({
-                'business_category': 'INTERNAL_TRANSFER',
-                'transaction_subtype': 'TRANSFER_IN',
-                'is_internal_transfer': True,
-                'source_account': 'Revenue 4717',
-                'target_account': 'Payroll 4079',
-                'gl_account_code': '1100',
-                'is_classified': True
-            })
-            result['confidence_score'] = 0.90
-            result['notes'].append("Transfer in from Revenue account")
-        
-        else:
-            # Negative amounts in Payroll = payroll expenses
-            result['classification_updates'].update({
-                'business_category': 'PAYROLL_EXPENSE',
-                'transaction_subtype': 'PAYROLL',
-                'gl_account_code': '6200',
-                'tax_category': 'PAYROLL',
-                'is_tax_deductible': True,
-                'is_classified': True
-            })
-            result['confidence_score'] = 0.88
-            result['notes'].append("Payroll expense")
+    def _apply_updates(self, transaction: BankTransaction, result: Dict):
+        """Write a classification result's updates onto the transaction"""
+        for field, value in result['classification_updates'].items():
+            if hasattr(transaction, field):
+                setattr(transaction, field, value)
 
-    def _classify_capital_one_transaction(self, transaction: BankTransaction, result: Dict):
-        """Classify Capital One credit card transactions"""
-        
-        desc = transaction.description.upper()
-        amount = float(transaction.amount)
-        
-        # Mark as credit card transaction and calculate cycle
-        result['classification_updates']['is_credit_card_transaction'] = True
-        
-        # Calculate Capital One cycle (cuts on 11th)
-        cycle_info = self._calculate_credit_card_cycle(transaction.transaction_date)
-        result['classification_updates'].update({
-            'credit_card_cycle_date': cycle_info['cycle_cut_date'],
-            'credit_card_due_date': cycle_info['due_date']
-        })
-        
-        if amount > 0:
-            # Positive amounts in Capital One = payments TO the card
-            result['classification_updates'].update({
-                'business_category': 'CREDIT_CARD_PAYMENT',
-                'transaction_subtype': 'PAYMENT',
-                'is_credit_card_payment': True,
-                'gl_account_code': '2100',  # Credit card liability
-                'is_classified': True
-            })
-            result['confidence_score'] = 0.92
-            result['notes'].append("Credit card payment received")
-        
-        else:
-            # Negative amounts in Capital One = business expenses
-            result['classification_updates'].update({
-                'business_category': 'OPERATING_EXPENSE',
-                'transaction_subtype': 'PURCHASE',
-                'gl_account_code': '6000',
-                'is_tax_deductible': True,  # Most business expenses are
-                'requires_receipt': True,
-                'receipt_status': 'REQUIRED',
-                'is_classified': True
-            })
-            result['confidence_score'] = 0.80
-            result['notes'].append("Business expense on credit card - receipt required")
-            
-            # Extract merchant name
-            vendor_name = self._extract_vendor_name(transaction.description)
-            if vendor_name:
-                result['classification_updates']['merchant_name'] = vendor_name
+    @staticmethod
+    def _classification_changed(transaction: BankTransaction) -> bool:
+        """Whether pending updates change a classification field (not just the rule set bookkeeping)"""
+        state = inspect(transaction)
+        return any(state.attrs[field].history.has_changes() for field in CLASSIFICATION_FIELDS)
 
     def _enhance_classification(self, transaction: BankTransaction, result: Dict):
         """Apply common enhancements to all classifications"""
@@ -354,12 +197,40 @@ class CashFlowClassifier:
         if transfer_ref:
             result['classification_updates']['transfer_reference'] = transfer_ref
 
-    def _matches_patterns(self, text: str, patterns: List[str]) -> bool:
-        """Check if text matches any of the given regex patterns"""
-        for pattern in patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-        return False
+    def _apply_ml_prediction(self, transaction: BankTransaction, result: Dict, prediction: Dict):
+        """
+        Replace the rule-based categories with a confident ML prediction
+
+        Subtype, tax deductibility and receipt requirement are taken from the
+        rules for the predicted category; when the rules do not determine them
+        the rule-based classification is kept.
+        """
+        
+        confidence = prediction['confidence']
+        if confidence < self.ml_threshold:
+            result['notes'].append(f"ML prediction below threshold ({confidence:.2f}), rules kept")
+            return
+        
+        derived = self.rule_engine.active().category_fields(
+            transaction.account_name, transaction.amount, prediction['business_category']
+        )
+        if derived is None:
+            result['notes'].append(
+                f"ML prediction {prediction['business_category']} has no rule-defined flags, rules kept"
+            )
+            return
+        
+        result['classification_updates'].update(derived)
+        result['classification_updates'].update({
+            'business_category': prediction['business_category'],
+            'gl_account_code': prediction['gl_account_code'],
+            'tax_category': prediction['tax_category'],
+            'classification_method': 'ML',
+            'classification_confidence': round(confidence, 2)
+        })
+        result['classification_method'] = 'ML'
+        result['confidence_score'] = confidence
+        result['notes'].append(f"ML prediction: {prediction['business_category']} ({confidence:.2f})")
 
     def _extract_vendor_name(self, description: str) -> Optional[str]:
         """Extract vendor/merchant name from transaction description"""
@@ -377,6 +248,11 @@ class CashFlowClassifier:
         
         return None
 
+    def _resolve_merchant_name(self, description: str) -> Optional[str]:
+        """Canonical merchant name for a description, falling back to the raw extracted vendor"""
+        
+        return self.merchant_normalizer.resolve(description) or self._extract_vendor_name(description)
+
     def _extract_transfer_reference(self, description: str) -> Optional[str]:
         """Extract transfer reference ID from description"""
         
@@ -387,35 +263,9 @@ class CashFlowClassifier:
         
         return None
 
-    def _calculate_credit_card_cycle(self, transaction_date: date) -> Dict:
-        """Calculate Capital One credit card cycle dates (cuts on 11th)"""
-        
-        # Determine cycle cut date for this transaction
-        if transaction_date.day >= 11:
-            # This month's cycle
-            cycle_cut = date(transaction_date.year, transaction_date.month, 11)
-            # Next cycle cut
-            if transaction_date.month == 12:
-                next_cycle = date(transaction_date.year + 1, 1, 11)
-            else:
-                next_cycle = date(transaction_date.year, transaction_date.month + 1, 11)
-        else:
-            # Previous month's cycle
-            if transaction_date.month == 1:
-                cycle_cut = date(transaction_date.year - 1, 12, 11)
-            else:
-                cycle_cut = date(transaction_date.year, transaction_date.month - 1, 11)
-            next_cycle = date(transaction_date.year, transaction_date.month, 11)
-        
-        # Due date is typically ~25 days after cycle cut
-        due_date = cycle_cut + timedelta(days=25)
-        
-        return {
-            'cycle_cut_date': cycle_cut,
-            'due_date': due_date,
-            'next_cycle_cut': next_cycle,
-            'days_until_due': (due_date - transaction_date).days if due_date > transaction_date else 0
-        }
+    def _calculate_credit_card_cycle(self, transaction_date: date, account_name: Optional[str] = None) -> Dict:
+        """Calculate credit card cycle dates (Capital One cuts on 11th)"""
+        return cycle_info(transaction_date, get_cycle_config(account_name))
 
     def classify_all_transactions(self, limit: Optional[int] = None, force_reclassify: bool = False) -> Dict:
         """
@@ -437,6 +287,11 @@ class CashFlowClassifier:
         if not force_reclassify:
             query = query.filter(BankTransaction.is_classified == False)
         
+        # Closed periods are read-only
+        open_clause = open_period_clause()
+        if open_clause is not None:
+            query = query.filter(open_clause)
+        
         if limit:
             query = query.limit(limit)
         
@@ -450,6 +305,11 @@ class CashFlowClassifier:
         
         print(f"📊 Found {len(transactions)} transactions to classify")
         
+        # Score every transaction with the learned model in chunks up front
+        predictions = [None] * len(transactions)
+        if self.ml_model is not None:
+            predictions = self.ml_model.predict_transactions(transactions)
+        
         # Classification statistics
         stats = {
             'total_processed': 0,
@@ -465,20 +325,17 @@ class CashFlowClassifier:
         start_time = datetime.now()
         
         try:
-            for i, transaction in enumerate(transactions, 1):
+            for i, (transaction, prediction) in enumerate(zip(transactions, predictions), 1):
                 try:
                     # Progress indicator
                     if i % 50 == 0:
                         print(f"  Processed {i}/{len(transactions)} transactions...")
                     
                     # Classify transaction
-                    result = self.classify_transaction(transaction)
+                    result = self.classify_transaction(transaction, prediction)
                     
                     # Apply updates to transaction
-                    if result['classification_updates']:
-                        for field, value in result['classification_updates'].items():
-                            if hasattr(transaction, field):
-                                setattr(transaction, field, value)
+                    self._apply_updates(transaction, result)
                     
                     # Update statistics
                     stats['total_processed'] += 1
@@ -519,6 +376,8 @@ class CashFlowClassifier:
         
         end_time = datetime.now()
         stats['processing_time'] = (end_time - start_time).total_seconds()
+        record_classification('classify_all', stats['successful_classifications'],
+                              stats['failed_classifications'], stats['processing_time'])
         
         # Calculate success rate
         if stats['total_processed'] > 0:
@@ -529,4 +388,56 @@ class CashFlowClassifier:
         print(f"🎯 Classification completed in {stats['processing_time']:.2f} seconds")
         print(f"📈 Success rate: {stats['success_rate']:.1f}%")
         
-        return stats
\ No newline at end of file
+        return stats
+
+    def reclassify_for_rule_change(self, previous_version: int, batch_size: int = 1000) -> Dict:
+        """
+        Reclassify only the transactions a rule set change can affect
+
+        Candidates come from RuleEngine.reclassification_filter (rule id and
+        description signature indexes); manual classifications are never touched.
+
+        Args:
+            previous_version: Rule set version active before the change (0 = built-in default)
+            batch_size: Transactions classified per commit
+
+        Returns:
+            Dict with candidate, reclassified and total transaction counts
+        """
+        current = self.rule_engine.active()
+        clause = self.rule_engine.reclassification_filter(
+            self.rule_engine.load_version(previous_version), current
+        )
+        stats = {
+            'previous_version': previous_version,
+            'rule_set_version': current.version,
+            'total_transactions': db.session.query(func.count(BankTransaction.id)).scalar(),
+            'candidates': 0,
+            'reclassified': 0
+        }
+        if clause is None:
+            return stats
+
+        candidates = db.session.query(BankTransaction.id).filter(clause, *reclassifiable_clauses())
+        open_clause = open_period_clause()
+        if open_clause is not None:
+            candidates = candidates.filter(open_clause)
+        ids = [row.id for row in candidates.order_by(BankTransaction.id)]
+        stats['candidates'] = len(ids)
+
+        started = time.perf_counter()
+        for start in range(0, len(ids), batch_size):
+            transactions = BankTransaction.query.filter(
+                BankTransaction.id.in_(ids[start:start + batch_size])
+            ).all()
+            predictions = [None] * len(transactions)
+            if self.ml_model is not None:
+                predictions = self.ml_model.predict_transactions(transactions)
+            for transaction, prediction in zip(transactions, predictions):
+                self._apply_updates(transaction, self.classify_transaction(transaction, prediction))
+                if self._classification_changed(transaction):
+                    stats['reclassified'] += 1
+            db.session.commit()
+
+        record_classification('rule_change', len(ids), 0, time.perf_counter() - started)
+        return stats
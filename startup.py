@@ -104,13 +104,10 @@ def run_gunicorn():
     """Run gunicorn with production-ready settings."""
     logger.info("=== STARTING GUNICORN SERVER ===")
 
-    port = os.environ.get("PORT", "5001")
-
+    # Bind, workers/threads, timeout, preload and worker warm-up live in gunicorn.conf.py
     cmd = [
         "gunicorn",
-        "--bind", f"0.0.0.0:{port}",
-        "--timeout", "600",
-        "wsgi:app",
+        "--config", "gunicorn.conf.py",
     ]
 
     logger.info(f"Gunicorn command: {' '.join(cmd)}")
@@ -0,0 +1,407 @@
+"""
+Unit tests for the transaction classification services
+Runs every service against an in-memory SQLite database
+"""
+
+import unittest
+import sys
+import os
+from datetime import date
+
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import db
+from test_reporting_services import ServiceTestCase
+import services.review_queue  # noqa: F401  (description_signature maintenance, registered by create_app)
+
+SAMPLE_CSV = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Acid Tech Revenue-4717-Carga1.csv'))
+
+
+class TestMerchantNormalizer(ServiceTestCase):
+    """Merchant alias dictionary and fuzzy lookup"""
+
+    def setUp(self):
+        super().setUp()
+        from services.merchant_normalizer import MerchantNormalizer
+        self.normalizer = MerchantNormalizer()
+        self.normalizer.seed_from_csv(SAMPLE_CSV)
+
+    def test_descriptors_resolve_to_canonical_names(self):
+        resolve = self.normalizer.resolve
+        self.assertEqual(resolve('Memo Credit : NORTHERN & CO LL    ACH Pmt      ACH Entry Memo Posted Today'),
+                         'Northern & Co LLC')
+        self.assertEqual(resolve('ACH Credit PAYMNT     OVINTIV 0896, CCD  00516656'), 'Ovintiv')
+        self.assertEqual(resolve('ACH Credit ACH        DIAMONDBACK E&P, CCD  0000701657'), 'Diamondback E&P')
+        self.assertIsNone(resolve('Transfer to DDA : Transfer CH x4717 to CH x5285 TMID:76287b41-a66f-4'))
+
+    def test_fuzzy_match_and_cache(self):
+        self.assertEqual(self.normalizer.resolve('NORTHERN & CO LL'), 'Northern & Co LLC')
+        self.assertEqual(self.normalizer.resolve('XTO ENERGY'), 'XTO Energy Inc.')
+        self.assertIsNone(self.normalizer.resolve('SHELL OIL 1234'))
+
+        self.normalizer.resolve('XTO ENERGY')
+        self.assertGreaterEqual(self.normalizer.cache_info().hits, 1)
+
+    def test_manual_alias_reloads_dictionary(self):
+        self.assertIsNone(self.normalizer.resolve('SHELL OIL 1234'))
+        self.normalizer.add_alias('SHELL OIL 1234', 'Shell')
+        db.session.commit()
+        self.assertEqual(self.normalizer.resolve('SHELL OIL 5678'), 'Shell')
+
+    def test_reload_swaps_the_whole_index(self):
+        self.normalizer.resolve('XTO ENERGY')
+        before = self.normalizer._index
+
+        self.normalizer.add_alias('SHELL OIL 1234', 'Shell')
+        db.session.commit()
+        self.assertEqual(self.normalizer.resolve('SHELL OIL 5678'), 'Shell')
+
+        # A lookup still holding the old index sees the old dictionary only
+        self.assertIsNot(self.normalizer._index, before)
+        self.assertIsNone(before.resolve('SHELL OIL 5678'))
+        self.assertNotIn('shell oil', before.aliases)
+        with self.assertRaises(TypeError):
+            before.aliases['shell oil'] = 'Shell'
+
+    def test_classifier_uses_canonical_merchant(self):
+        from services.transaction_classifier import CashFlowClassifier
+
+        transaction = self.add_bank_transaction(
+            'Revenue 4717', 'Memo Credit : NORTHERN & CO LL    ACH Pmt      ACH Entry Memo Posted Today',
+            10520, date(2025, 8, 5)
+        )
+        db.session.commit()
+
+        classifier = CashFlowClassifier()
+        classifier.merchant_normalizer = self.normalizer
+        result = classifier.classify_transaction(transaction)
+        self.assertEqual(result['classification_updates']['merchant_name'], 'Northern & Co LLC')
+
+
+class TestMlClassifier(ServiceTestCase):
+    """Learned classifier training, artifact round trip and rule fallback"""
+
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        self.model_dir = tempfile.mkdtemp()
+        self.app.config['ML_MODEL_DIR'] = self.model_dir
+        self.app.config['ML_CONFIDENCE_THRESHOLD'] = 0.6
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.model_dir, ignore_errors=True)
+        super().tearDown()
+
+    def add_manual_examples(self):
+        examples = [
+            ('ACH Debit DD         WEBFILE TAX PYMT, CCD  902/79968038', ('TAX', '2200', 'SALES_TAX')),
+            ('ACH Debit PAYMENT    HEALTH CARE SERV, PPD', ('OPERATING_EXPENSE', '6300', 'INSURANCE')),
+        ]
+        for i in range(30):
+            for description, (category, gl_code, tax_category) in examples:
+                self.add_bank_transaction(
+                    'Bill Pay 5285', description, -100 - i, date(2025, 8, 1 + i % 28),
+                    business_category=category, gl_account_code=gl_code, tax_category=tax_category,
+                    classification_method='MANUAL', is_classified=True
+                )
+        db.session.commit()
+
+    def test_train_save_and_memory_map(self):
+        from services.ml_classifier import TransactionModel, train_from_database
+
+        self.add_manual_examples()
+        stats = train_from_database(self.model_dir, min_samples=50)
+        self.assertTrue(stats['trained'])
+        self.assertEqual(stats['n_classes'], 2)
+
+        model = TransactionModel.load(self.model_dir)
+        self.assertIsInstance(model.weights, np.memmap)
+
+        predictions = model.predict_batch(
+            [('Bill Pay 5285', 'ACH Debit DD         WEBFILE TAX PYMT, CCD  1', -250.0)] * 5, chunk_size=2
+        )
+        self.assertEqual(len(predictions), 5)
+        self.assertEqual(predictions[0]['tax_category'], 'SALES_TAX')
+        self.assertGreater(predictions[0]['confidence'], 0.6)
+
+    def test_retraining_publishes_a_new_version(self):
+        import os
+        from services.ml_classifier import KEEP_VERSIONS, current_version, get_model, train_from_database
+
+        self.assertIsNone(get_model(self.model_dir))
+        self.add_manual_examples()
+        train_from_database(self.model_dir, min_samples=50)
+        first_version, first = current_version(self.model_dir), get_model(self.model_dir)
+        self.assertIs(get_model(self.model_dir), first)
+
+        train_from_database(self.model_dir, min_samples=50)
+        second_version = current_version(self.model_dir)
+        self.assertNotEqual(second_version, first_version)
+        self.assertIsNot(get_model(self.model_dir), first)
+        # The earlier version is left untouched for workers still using it
+        self.assertTrue(os.path.exists(os.path.join(self.model_dir, first_version, 'weights.npy')))
+
+        for _ in range(KEEP_VERSIONS):
+            train_from_database(self.model_dir, min_samples=50)
+        versions = [name for name in os.listdir(self.model_dir) if os.path.isdir(os.path.join(self.model_dir, name))]
+        self.assertEqual(len(versions), KEEP_VERSIONS)
+        self.assertIn(current_version(self.model_dir), versions)
+
+    def test_classifier_prefers_confident_model(self):
+        from services.ml_classifier import train_from_database
+        from services.transaction_classifier import CashFlowClassifier
+
+        self.assertIsNone(CashFlowClassifier().ml_model)
+
+        self.add_manual_examples()
+        train_from_database(self.model_dir, min_samples=50)
+        transaction = self.add_bank_transaction(
+            'Bill Pay 5285', 'ACH Debit PAYMENT    HEALTH CARE SERV, PPD', -410, date(2025, 9, 2)
+        )
+        db.session.commit()
+
+        classifier = CashFlowClassifier()
+        result = classifier.classify_transaction(transaction)
+        self.assertEqual(result['classification_method'], 'ML')
+        self.assertEqual(result['classification_updates']['gl_account_code'], '6300')
+
+        classifier.ml_threshold = 1.01
+        result = classifier.classify_transaction(transaction)
+        self.assertEqual(result['classification_updates']['classification_method'], 'RULE_BASED')
+
+    def test_predicted_category_brings_its_rule_flags(self):
+        from services.transaction_classifier import CashFlowClassifier
+
+        purchase = self.add_bank_transaction('Capital One', 'SHELL OIL 123', -40, date(2025, 9, 2))
+        db.session.commit()
+        classifier = CashFlowClassifier()
+        classifier.ml_model = object()  # Predictions are passed in
+
+        prediction = {'business_category': 'CREDIT_CARD_PAYMENT', 'gl_account_code': '2100',
+                      'tax_category': None, 'confidence': 0.95}
+        updates = classifier.classify_transaction(purchase, prediction)['classification_updates']
+        self.assertEqual(updates['classification_method'], 'ML')
+        self.assertEqual(
+            {field: updates[field] for field in ('transaction_subtype', 'is_tax_deductible',
+                                                 'requires_receipt', 'receipt_status')},
+            {'transaction_subtype': 'PAYMENT', 'is_tax_deductible': False,
+             'requires_receipt': False, 'receipt_status': 'NOT_REQUIRED'}
+        )
+
+        # No rule sets the category, so its flags are unknown and the rules win
+        prediction = dict(prediction, business_category='TAX', gl_account_code='2200')
+        updates = classifier.classify_transaction(purchase, prediction)['classification_updates']
+        self.assertEqual((updates['classification_method'], updates['business_category'], updates['receipt_status']),
+                         ('RULE_BASED', 'OPERATING_EXPENSE', 'REQUIRED'))
+
+
+class TestReviewQueue(ServiceTestCase):
+    """Impact-ranked review queue, clusters and bulk decisions"""
+
+    def setUp(self):
+        super().setUp()
+        from services.review_queue import ReviewQueue
+        self.queue = ReviewQueue()
+
+    def test_ranking_and_clusters(self):
+        day = date(2025, 8, 5)
+        self.add_bank_transaction('Revenue 4717', 'ACH Credit PAYMNT     OVINTIV 0896, CCD  00516656', 5000, day)
+        self.add_bank_transaction('Revenue 4717', 'ACH Credit PAYMNT     OVINTIV 0896, CCD  00506744', 3000, day)
+        self.add_bank_transaction('Capital One', 'SHELL OIL 123', -40, day,
+                                  is_classified=True, needs_review=True, classification_confidence=0.5)
+        self.add_bank_transaction('Revenue 4717', 'RD Checking Deposit', 9000, day,
+                                  is_classified=True, classification_confidence=0.95)
+        db.session.commit()
+
+        ranked = self.queue.ranked()
+        self.assertEqual([float(t.review_priority) for t in ranked], [5000.0, 3000.0, 20.0])
+
+        clusters = self.queue.clusters()
+        self.assertEqual(clusters[0]['signature'], 'ACH CREDIT PAYMNT OVINTIV CCD')
+        self.assertEqual(clusters[0]['transaction_count'], 2)
+        self.assertAlmostEqual(clusters[0]['impact'], 8000.0)
+
+    def test_bulk_decision_updates_cluster_and_cube(self):
+        from services.entity_cube import EntityCube, SOURCE_BANK
+
+        day = date(2025, 8, 5)
+        for amount in (5000, 3000):
+            self.add_bank_transaction('Revenue 4717', 'ACH Credit PAYMNT     OVINTIV 0896, CCD  00516656',
+                                      amount, day, merchant_name='OVINTIV')
+        other = self.add_bank_transaction('Revenue 4717', 'ACH Credit AP         ESTANCIA O&G LLC, PPD', 700, day)
+        db.session.commit()
+
+        result = self.queue.apply_decision(
+            {'business_category': 'REVENUE', 'gl_account_code': '4000', 'merchant_name': 'Ovintiv',
+             'is_classified': False},
+            signature='ACH CREDIT PAYMNT OVINTIV CCD'
+        )
+        self.assertEqual(result['updated'], 2)
+
+        self.assertEqual([t.id for t in self.queue.ranked()], [other.id])
+        from models.bank_transaction import BankTransaction
+        reviewed = BankTransaction.query.filter_by(merchant_name='Ovintiv').all()
+        self.assertEqual(len(reviewed), 2)
+        self.assertTrue(all(t.classification_method == 'MANUAL' and t.is_classified for t in reviewed))
+
+        totals = {t['entity']: t['total_amount'] for t in EntityCube().entity_totals(SOURCE_BANK, flow='IN')}
+        self.assertEqual(totals['Ovintiv'], 8000.0)
+        self.assertNotIn('OVINTIV', totals)
+
+        with self.assertRaises(ValueError):
+            self.queue.apply_decision({'is_classified': True}, transaction_ids=[other.id])
+
+
+class TestRuleEngine(ServiceTestCase):
+    """Declarative rule sets, fused-regex dispatch, hot reload and dry runs"""
+
+    def fuel_rule_set(self):
+        import copy
+        from services.rule_engine import DEFAULT_RULE_SET
+
+        definition = copy.deepcopy(DEFAULT_RULE_SET)
+        position = next(i for i, rule in enumerate(definition['rules']) if rule['id'] == 'credit_card_purchase')
+        definition['rules'].insert(position, {
+            'id': 'credit_card_fuel', 'account': 'Capital One', 'sign': '-', 'patterns': [r'\bSHELL\b', 'EXXON'],
+            'set': {'business_category': 'OPERATING_EXPENSE', 'gl_account_code': '6400', 'tax_category': 'VEHICLE',
+                    'is_classified': True},
+            'confidence': 0.9, 'note': 'Fuel purchase'
+        })
+        return definition
+
+    def test_first_matching_rule_wins(self):
+        from services.rule_engine import CompiledRuleSet, DEFAULT_RULE_SET, parse_definition
+
+        rules = CompiledRuleSet(parse_definition(DEFAULT_RULE_SET))
+        # Matches both the Bill Pay transfer and the payroll patterns; the earlier rule wins
+        match = rules.evaluate('Revenue 4717', 'Transfer to DDA Transfer CH x4717 to CH x5285 Payroll', -500)
+        self.assertEqual(match.rule_id, 'revenue_transfer_bill_pay')
+        self.assertEqual(rules.evaluate('Revenue 4717', 'ACH Debit USATAXPYMT IRS, CCD', -90).rule_id,
+                         'revenue_tax_payment')
+        self.assertEqual(rules.evaluate('Revenue 4717', 'Wire Transfer Fee', -15).rule_id, 'revenue_bank_fee')
+        self.assertIsNone(rules.evaluate('Savings 9999', 'Interest', 3).rule_id)
+
+        with self.assertRaises(ValueError):
+            CompiledRuleSet({'accounts': [{'name': 'A', 'match': ['A']}],
+                             'rules': [{'account': 'A', 'set': {'not_a_column': 1}}]})
+
+    def test_patterns_that_cannot_be_fused_are_rejected(self):
+        from services.rule_engine import CompiledRuleSet
+
+        def rule_set(pattern):
+            return {'accounts': [{'name': 'A', 'match': ['A']}],
+                    'rules': [{'account': 'A', 'patterns': ['FEE']}, {'account': 'A', 'patterns': [pattern]}]}
+
+        for pattern in (r'(?i)shell', r'(?P<brand>SHELL)', r'(SHELL) \1', r'(?P<x>A)(?P=x)'):
+            with self.assertRaises(ValueError, msg=pattern):
+                CompiledRuleSet(rule_set(pattern))
+
+        for pattern in (r'(?i:shell)', r'(SHELL|EXXON) \d+', r'[(?i)]', r'\\1', r'(?<!NO )FUEL'):
+            self.assertIsNotNone(CompiledRuleSet(rule_set(pattern)).buckets[('A', '-')].regex, pattern)
+
+    def test_rule_changes_require_admin(self):
+        from flask_login import LoginManager
+        from app.routes.cash_flow import cash_flow_bp
+        from models.user import User
+        from services.rule_engine import DEFAULT_RULE_SET
+
+        self.app.config['SECRET_KEY'] = 'test'
+        LoginManager(self.app).user_loader(lambda user_id: db.session.get(User, int(user_id)))
+        self.app.register_blueprint(cash_flow_bp, url_prefix='/cash-flow')
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(self.user.id)
+
+        payload = {'definition': DEFAULT_RULE_SET}
+        response = client.post('/cash-flow/api/classification/rules', json=payload)
+        self.assertEqual(response.status_code, 403)
+
+        self.user.role = 'admin'
+        db.session.commit()
+        bad = dict(DEFAULT_RULE_SET, rules=[dict(DEFAULT_RULE_SET['rules'][1], patterns=['(?i)bill pay'])])
+        response = client.post('/cash-flow/api/classification/rules', json={'definition': bad})
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/cash-flow/api/classification/rules', json=payload)
+        self.assertEqual((response.status_code, response.get_json()['version']), (200, 1))
+
+    def test_saved_rule_set_is_hot_reloaded(self):
+        from services.rule_engine import RuleEngine
+        from services.transaction_classifier import CashFlowClassifier
+
+        transaction = self.add_bank_transaction('Capital One', 'SHELL OIL 57444', -45, date(2025, 8, 5))
+        db.session.commit()
+
+        classifier = CashFlowClassifier()
+        classifier.rule_engine = RuleEngine()
+        self.assertEqual(classifier.classify_transaction(transaction)['rule_id'], 'credit_card_purchase')
+
+        saved = classifier.rule_engine.save_rule_set(self.fuel_rule_set(), notes='Fuel')
+        self.assertEqual(saved.version, 1)
+
+        result = classifier.classify_transaction(transaction)
+        self.assertEqual(result['rule_id'], 'credit_card_fuel')
+        self.assertEqual(result['rule_set_version'], 1)
+        self.assertEqual(result['classification_updates']['gl_account_code'], '6400')
+        self.assertTrue(result['classification_updates']['is_credit_card_transaction'])
+
+    def test_dry_run_reports_changed_rows(self):
+        from services.rule_engine import RuleEngine
+
+        day = date(2025, 8, 5)
+        self.add_bank_transaction('Capital One', 'SHELL OIL 57444', -45, day)
+        self.add_bank_transaction('Capital One', 'EXXONMOBIL 4471', -60, day)
+        self.add_bank_transaction('Capital One', 'OFFICE DEPOT 1120', -120, day)
+        self.add_bank_transaction('Revenue 4717', 'RD Checking Deposit', 900, day)
+        db.session.commit()
+
+        report = RuleEngine().dry_run(self.fuel_rule_set())
+        self.assertEqual(report['rows_scanned'], 4)
+        self.assertEqual(report['rows_changed'], 2)
+        self.assertEqual(report['by_rule']['credit_card_fuel'], {'gained': 2, 'lost': 0})
+        self.assertEqual(report['transitions'], {'credit_card_purchase -> credit_card_fuel': 2})
+
+    def test_rule_change_reclassifies_only_affected_rows(self):
+        from services.rule_engine import RuleEngine
+        from services.transaction_classifier import CashFlowClassifier
+
+        day = date(2025, 8, 5)
+        shell = self.add_bank_transaction('Capital One', 'SHELL OIL 57444', -45, day)
+        exxon = self.add_bank_transaction('Capital One', 'EXXONMOBIL 4471', -60, day)
+        office = self.add_bank_transaction('Capital One', 'OFFICE DEPOT 1120', -120, day)
+        deposit = self.add_bank_transaction('Revenue 4717', 'RD Checking Deposit', 900, day)
+        db.session.commit()
+
+        classifier = CashFlowClassifier()
+        classifier.rule_engine = RuleEngine()
+        classifier.classify_all_transactions()
+        self.assertEqual(office.rule_set_version, 0)
+        self.assertEqual(office.classification_rule_id, 'credit_card_purchase')
+
+        self.assertEqual(classifier.rule_engine.dry_run(self.fuel_rule_set())['rows_scanned'], 2)
+
+        classifier.rule_engine.save_rule_set(self.fuel_rule_set())
+        stats = classifier.reclassify_for_rule_change(previous_version=0)
+        self.assertEqual((stats['candidates'], stats['reclassified']), (2, 2))
+
+        self.assertEqual([shell.classification_rule_id, exxon.classification_rule_id], ['credit_card_fuel'] * 2)
+        self.assertEqual([shell.rule_set_version, exxon.rule_set_version], [1, 1])
+        self.assertEqual(shell.gl_account_code, '6400')
+        # Rows the change cannot affect keep the version they were classified with
+        self.assertEqual([office.rule_set_version, deposit.rule_set_version], [0, 0])
+
+        # A change that leaves the candidates' classification as it was is not a reclassification
+        rule_set = self.fuel_rule_set()
+        next(rule for rule in rule_set['rules'] if rule['id'] == 'credit_card_fuel')['confidence'] = 0.95
+        classifier.rule_engine.save_rule_set(rule_set)
+        stats = classifier.reclassify_for_rule_change(previous_version=1)
+        self.assertEqual((stats['candidates'], stats['reclassified']), (2, 0))
+        self.assertEqual(shell.rule_set_version, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,460 @@
+"""
+Unit tests for the request instrumentation (SQL profiling, query budgets and metrics)
+Runs against an in-memory SQLite database
+"""
+
+import unittest
+import sys
+import os
+import gc
+import json
+import tempfile
+import threading
+from datetime import date, timedelta
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Blueprint, Flask, jsonify
+from sqlalchemy import create_engine, text
+from database import db
+from models.bank_transaction import BankTransaction
+from models.user import User
+from app.engine import TimedQueuePool, engine_profile, init_read_routing, install_engine_events, pool_sizing
+from app.metrics import init_metrics
+from app.warmup import prepare_for_fork, warm_worker
+from app.profiling import QueryBudgetExceeded, endpoint_stats, init_profiling, profile_queries, query_budget
+from services import metrics, read_routing
+from services.read_routing import reporting_reads
+from benchmarks.run_benchmarks import compare
+from benchmarks.startup_profile import cold_start
+from tests.test_reporting_services import ServiceTestCase
+
+
+class InstrumentedTestCase(ServiceTestCase):
+    """Service test app with SQL profiling installed"""
+
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(SQL_PROFILE_HEADERS=True, SQL_PROFILE_DEBUG_PAGE=True, SQL_QUERY_BUDGET_STRICT=True)
+        init_profiling(self.app)
+        endpoint_stats.clear()
+
+        @self.app.route('/three-queries')
+        @query_budget(3)
+        def three_queries():
+            for _ in range(3):
+                db.session.execute(text('SELECT 1'))
+            return jsonify({'ok': True})
+
+        @self.app.route('/too-many-queries')
+        @query_budget(2)
+        def too_many_queries():
+            for _ in range(3):
+                db.session.execute(text('SELECT 1'))
+            return jsonify({'ok': True})
+
+        self.client = self.app.test_client()
+
+
+class TestSqlProfiling(InstrumentedTestCase):
+    """Per-request query counts, headers and the /debug/perf summary"""
+
+    def test_headers_and_debug_page(self):
+        response = self.client.get('/three-queries')
+        self.assertEqual(response.headers['X-DB-Query-Count'], '3')
+        self.assertIn('db;dur=', response.headers['Server-Timing'])
+
+        perf = self.client.get('/debug/perf?format=json').get_json()
+        self.assertEqual(perf['endpoints'][0]['endpoint'], 'three_queries')
+        self.assertEqual(perf['endpoints'][0]['max_queries'], 3)
+        self.assertTrue(perf['slowest'])
+        self.assertIn(b'three_queries', self.client.get('/debug/perf').data)
+
+    def test_profile_queries_outside_requests(self):
+        db.session.add(BankTransaction(account_name='Revenue 4717', account_type='CHECKING',
+                                       transaction_date=date.today(), description='STRIPE', amount=10,
+                                       transaction_type='CREDIT'))
+        db.session.commit()
+
+        with profile_queries(keep_slowest=2) as profile:
+            BankTransaction.query.count()
+            BankTransaction.query.all()
+            db.session.execute(text('SELECT 1'))
+        self.assertEqual(profile.query_count, 3)
+        self.assertEqual(len(profile.slowest()), 2)
+        self.assertGreaterEqual(profile.slowest()[0]['ms'], profile.slowest()[1]['ms'])
+
+
+class TestQueryBudget(InstrumentedTestCase):
+    """Endpoints over their declared budget fail in strict mode and warn otherwise"""
+
+    def test_strict_budget_raises(self):
+        self.assertEqual(self.client.get('/three-queries').status_code, 200)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/too-many-queries')
+
+    def test_budget_logs_when_not_strict(self):
+        self.app.config['SQL_QUERY_BUDGET_STRICT'] = False
+        with self.assertLogs('app.profiling', level='WARNING') as logs:
+            self.assertEqual(self.client.get('/too-many-queries').status_code, 200)
+        self.assertIn('3 queries (budget 2)', logs.output[0])
+
+    def test_dashboard_endpoints_within_budget(self):
+        from app.routes.cash_flow import cash_flow_bp
+
+        self.app.register_blueprint(cash_flow_bp, url_prefix='/cash-flow')
+        for month in range(1, 4):
+            self.add_bank_transaction('Revenue 4717', 'STRIPE PAYOUT', 1000, date(date.today().year, month, 5),
+                                      is_classified=True, business_category='REVENUE')
+            self.add_bank_transaction('Capital One', 'SHELL OIL', -40, date(date.today().year, month, 12),
+                                      is_classified=True, business_category='OPERATING_EXPENSE',
+                                      is_credit_card_transaction=True)
+        db.session.commit()
+
+        for url in ('/cash-flow/api/dashboard/summary', '/cash-flow/api/dashboard/kpis',
+                    '/cash-flow/api/dashboard/account/Revenue 4717', '/cash-flow/api/dashboard/credit-card',
+                    '/cash-flow/api/dashboard/tax-summary', '/cash-flow/api/dashboard/transfers'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_first_view_of_a_closed_period_within_budget(self):
+        from app.routes.cash_flow import cash_flow_bp
+        from services.period_close import _closed_cache, close_period
+
+        self.app.register_blueprint(cash_flow_bp, url_prefix='/cash-flow')
+        _closed_cache.clear()
+        self.addCleanup(_closed_cache.clear)
+        end = date.today().replace(day=1) - timedelta(days=1)
+        start = end.replace(day=1)
+        for day in (start, date.today()):
+            self.add_bank_transaction('Revenue 4717', 'STRIPE PAYOUT', 1000, day,
+                                      is_classified=True, business_category='REVENUE')
+            self.add_bank_transaction('Capital One', 'SHELL OIL', -40, day,
+                                      is_classified=True, business_category='OPERATING_EXPENSE',
+                                      is_tax_deductible=True, is_credit_card_transaction=True)
+        db.session.commit()
+        close_period(start.year, start.month)
+
+        for report in ('summary', 'tax-summary', 'kpis'):
+            url = f'/cash-flow/api/dashboard/{report}?start_date={start}&end_date={end}'
+            # The first view renders and stores the snapshot; later views read it
+            cold = self.client.get(url)
+            self.assertEqual(cold.status_code, 200, url)
+            warm = self.client.get(url)
+            self.assertLessEqual(int(warm.headers['X-DB-Query-Count']), int(cold.headers['X-DB-Query-Count']))
+
+
+def sample(text_, line_prefix):
+    """Value of the exposition line starting with line_prefix (0 when absent)"""
+    for line in text_.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+class TestMetrics(ServiceTestCase):
+    """Sharded counters/histograms and the /metrics exposition"""
+
+    def test_thread_shards_merge_on_scrape(self):
+        key = ('acidtech_import_rows_total', 'threads')
+        before = metrics.collect().get(key, 0)
+
+        def work():
+            for _ in range(250):
+                metrics.IMPORT_ROWS.inc(2, source='threads')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.collect()[key] - before, 2000)
+
+    def test_histogram_exposition(self):
+        metrics.record_import('histogram-test', 120, 0.3)
+        metrics.record_import('histogram-test', 80, 20.0)
+        text_ = metrics.render()
+
+        prefix = 'acidtech_import_duration_seconds'
+        self.assertIn(f'# TYPE {prefix} histogram', text_)
+        self.assertEqual(sample(text_, f'{prefix}_bucket{{source="histogram-test",le="0.5"}}'), 1)
+        self.assertEqual(sample(text_, f'{prefix}_bucket{{source="histogram-test",le="30.0"}}'), 2)
+        self.assertEqual(sample(text_, f'{prefix}_bucket{{source="histogram-test",le="+Inf"}}'), 2)
+        self.assertEqual(sample(text_, f'{prefix}_sum{{source="histogram-test"}}'), 20.3)
+        self.assertEqual(sample(text_, 'acidtech_import_rows_total{source="histogram-test"}'), 200)
+
+    def test_metrics_endpoint_and_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config.update(METRICS_TOKEN='s3cret', METRICS_MULTIPROC_DIR=directory)
+            init_metrics(self.app)
+
+            @self.app.route('/ping')
+            def ping():
+                return 'pong'
+
+            # Another worker's last flush
+            with open(os.path.join(directory, 'metrics-999999.json'), 'w') as f:
+                json.dump([[['acidtech_http_requests_total', 'ping', 'GET', '200'], 5]], f)
+
+            client = self.app.test_client()
+            client.get('/ping')
+            self.assertEqual(client.get('/metrics').status_code, 401)
+            response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+            self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+            text_ = response.get_data(as_text=True)
+            self.assertEqual(
+                sample(text_, 'acidtech_http_requests_total{endpoint="ping",method="GET",status="200"}'), 6
+            )
+            self.assertIn('acidtech_http_request_duration_seconds_bucket{endpoint="ping",method="GET",le="+Inf"}',
+                          text_)
+
+
+class TestWarmup(InstrumentedTestCase):
+    """Shared state before fork and per-worker synthetic requests"""
+
+    def test_prepare_for_fork_freezes_shared_state(self):
+        try:
+            prepare_for_fork(self.app)
+            self.assertGreater(gc.get_freeze_count(), 0)
+        finally:
+            gc.unfreeze()
+        # The in-memory test database survives (it lives in its single connection)
+        self.assertEqual(User.query.count(), 1)
+
+    def test_warm_worker_requests_are_not_recorded(self):
+        self.app.config['WARMUP_URLS'] = ('/three-queries',)
+        metrics.REQUESTS.inc(endpoint='before-fork', method='GET', status=200)
+        with self.assertLogs('app.warmup', level='INFO') as logs:
+            warm_worker(self.app)
+        self.assertIn('Warm-up GET /three-queries', logs.output[0])
+        self.assertEqual(endpoint_stats.snapshot()['endpoints'], [])
+        self.assertNotIn(('acidtech_http_requests_total', 'before-fork', 'GET', '200'), metrics.collect())
+
+    def test_one_worker_renders_snapshots(self):
+        import time
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config.update(TESTING=False, WARMUP_URLS=(), REPORT_SNAPSHOT_INTERVAL=3600,
+                                   REPORT_SNAPSHOT_LOCK_FILE=os.path.join(directory, 'snapshots.lock'))
+            workers = []
+            for _ in range(3):      # One warm_worker call per forked worker
+                warm_worker(self.app)
+                workers.append(self.app.extensions['report_snapshot_worker'])
+            try:
+                deadline = time.monotonic() + 5
+                while not any(worker.active for worker in workers) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(sum(worker.active for worker in workers), 1)
+            finally:
+                for worker in workers:
+                    worker.stop()
+                    worker.join(5)
+            self.app.config['TESTING'] = True
+
+
+class TestEngineProfile(unittest.TestCase):
+    """Per-dialect engine options and pool sizing"""
+
+    def test_azure_sql_profiles(self):
+        pyodbc = engine_profile('mssql+pyodbc://u:p@server/db?driver=ODBC+Driver+18+for+SQL+Server',
+                                workers=4, threads=2)
+        self.assertTrue(pyodbc['fast_executemany'])
+        self.assertEqual((pyodbc['pool_size'], pyodbc['max_overflow'], pyodbc['pool_recycle']), (3, 2, 1200))
+
+        pymssql = engine_profile('mssql+pymssql://u:p@server/db', workers=4, threads=2)
+        self.assertNotIn('fast_executemany', pymssql)
+        self.assertEqual(pymssql['poolclass'], TimedQueuePool)
+
+    def test_pool_fits_connection_limit(self):
+        self.assertEqual(pool_sizing(workers=4, threads=4), (5, 4))
+        pool_size, max_overflow = pool_sizing(workers=4, threads=4, max_connections=30)
+        self.assertLessEqual(4 * (pool_size + max_overflow), 30)
+        self.assertEqual(pool_sizing(workers=8, threads=4, max_connections=4), (1, 0))
+
+    def test_sqlite_profiles(self):
+        self.assertEqual(engine_profile('sqlite:///:memory:'), {'pool_pre_ping': True})
+
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f'sqlite:///{directory}/dev.db', **engine_profile(f'sqlite:///{directory}/dev.db'))
+            install_engine_events(engine)
+            key = ('acidtech_db_checkout_seconds', 'sqlite')
+            before = sum(metrics.collect().get(key, [0])[:-1])
+            with engine.connect() as connection:
+                self.assertEqual(connection.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+                self.assertEqual(connection.execute(text('PRAGMA synchronous')).scalar(), 1)    # NORMAL
+            self.assertEqual(sum(metrics.collect()[key][:-1]), before + 1)
+            engine.dispose()
+
+
+class TestReadRouting(unittest.TestCase):
+    """Reporting reads go to the 'reporting' bind, writes and other blueprints to the primary"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        read_routing._health.update(checked=0.0, ok=True)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        # init_app registers a metadata per bind on the shared db; later test apps have no 'reporting' bind
+        db.metadatas.pop('reporting', None)
+
+    def make_app(self, reporting_url):
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{self.directory.name}/primary.db',
+                          SQLALCHEMY_BINDS={'reporting': reporting_url}, TESTING=True)
+        db.init_app(app)
+        init_read_routing(app)
+
+        def count_view():
+            return jsonify({'count': BankTransaction.query.count()})
+
+        reports = Blueprint('reports', __name__)
+        reports.add_url_rule('/count', 'count', count_view, methods=['GET', 'POST'])
+        app.register_blueprint(reports, url_prefix='/reports')
+        app.add_url_rule('/count', 'count', count_view)
+        return app
+
+    def add_transaction(self):
+        db.session.add(BankTransaction(account_name='Revenue 4717', account_type='CHECKING',
+                                       transaction_date=date.today(), description='STRIPE', amount=10,
+                                       transaction_type='CREDIT'))
+        db.session.commit()
+
+    def test_reporting_gets_read_from_replica(self):
+        app = self.make_app(f'sqlite:///{self.directory.name}/replica.db')
+        with app.app_context():
+            db.create_all(bind_key=None)
+            db.metadata.create_all(bind=db.engines['reporting'])
+            self.add_transaction()
+            self.add_transaction()
+
+            client = app.test_client()
+            self.assertEqual(client.get('/reports/count').get_json()['count'], 0)
+            self.assertEqual(client.post('/reports/count').get_json()['count'], 2)
+            self.assertEqual(client.get('/count').get_json()['count'], 2)
+
+            with reporting_reads():
+                self.assertEqual(BankTransaction.query.count(), 0)
+                # Flushes go to the primary even while reads are routed
+                self.add_transaction()
+            self.assertEqual(BankTransaction.query.count(), 3)
+            db.session.remove()
+
+    def test_writes_read_the_primary_when_replica_lags(self):
+        from unittest import mock
+        from services.entity_cube import EntityCube
+        from services.report_snapshots import ReportSnapshotStore, closed_months
+        from models.report_snapshot import ReportSnapshot
+
+        from services.period_close import _closed_cache, close_period
+
+        app = self.make_app(f'sqlite:///{self.directory.name}/replica.db')
+        with app.app_context():
+            db.create_all(bind_key=None)
+            # The replica has the schema but none of the rows: it lags the primary
+            db.metadata.create_all(bind=db.engines['reporting'])
+            _closed_cache.clear()
+            last_month = date.today().replace(day=1) - timedelta(days=1)
+            close_period(last_month.year, last_month.month)
+            start, end = closed_months(1)[0]
+            db.session.add(BankTransaction(account_name='Revenue 4717', account_type='CHECKING',
+                                           transaction_date=end + timedelta(days=1), description='STRIPE',
+                                           amount=10, transaction_type='CREDIT'))
+            db.session.commit()
+            EntityCube().rebuild()
+            ReportSnapshotStore().render('dashboard-summary', start, end)
+
+            with reporting_reads():
+                # Current snapshot on the primary: served, not rendered again (no duplicate INSERT)
+                with mock.patch.object(ReportSnapshotStore, '_render') as render:
+                    payload = ReportSnapshotStore().get_or_render('dashboard-summary', start, end)
+                render.assert_not_called()
+                self.assertIsNotNone(payload)
+                with mock.patch.object(EntityCube, 'rebuild') as rebuild:
+                    EntityCube().ensure_built()
+                rebuild.assert_not_called()
+
+                # Re-rendering a stale snapshot updates the primary row instead of inserting another
+                ReportSnapshotStore().render('dashboard-summary', start, end)
+
+                # Pending writes pin the session to the primary until the transaction ends
+                self.assertEqual(BankTransaction.query.count(), 0)
+                db.session.add(BankTransaction(account_name='Revenue 4717', account_type='CHECKING',
+                                               transaction_date=date.today(), description='STRIPE', amount=5,
+                                               transaction_type='CREDIT'))
+                self.assertEqual(BankTransaction.query.count(), 2)
+                db.session.commit()
+                # After the commit the request keeps reading its own writes
+                self.assertEqual(BankTransaction.query.count(), 2)
+
+            self.assertEqual(ReportSnapshot.query.count(), 1)
+            db.session.remove()
+            _closed_cache.clear()
+
+    def test_falls_back_to_primary_when_replica_is_down(self):
+        app = self.make_app(f'sqlite:///{self.directory.name}/missing/replica.db')
+        with app.app_context():
+            db.create_all(bind_key=None)
+            self.add_transaction()
+            with self.assertLogs('services.read_routing', level='WARNING'):
+                self.assertEqual(app.test_client().get('/reports/count').get_json()['count'], 1)
+            db.session.remove()
+
+
+class TestBenchmarkCompare(unittest.TestCase):
+    """Baseline comparison of benchmark runs"""
+
+    def test_regressions_and_improvements(self):
+        baseline = {'results': {
+            'slower': {'median_ms': 100.0, 'queries': 4},
+            'faster': {'median_ms': 100.0, 'queries': 4},
+            'noise': {'median_ms': 1.0, 'queries': 1},
+            'more-queries': {'median_ms': 10.0, 'queries': 2},
+            'broken-page': {'median_ms': 5.0, 'queries': 0, 'status': 500},
+            'dropped': {'median_ms': 5.0, 'queries': 0},
+        }}
+        current = {'results': {
+            'slower': {'median_ms': 150.0, 'queries': 4},
+            'faster': {'median_ms': 50.0, 'queries': 4},
+            'noise': {'median_ms': 2.0, 'queries': 1},
+            'more-queries': {'median_ms': 10.0, 'queries': 3},
+            'broken-page': {'median_ms': 50.0, 'queries': 9, 'status': 500},
+        }}
+        report = compare(baseline, current, threshold=0.2)
+        self.assertEqual([entry['name'] for entry in report['regressions']], ['more-queries', 'slower'])
+        self.assertEqual([entry['name'] for entry in report['improvements']], ['faster'])
+        self.assertEqual(report['missing'], ['dropped'])
+
+    def test_existing_database_is_never_written(self):
+        import sqlite3
+        from benchmarks import run_benchmarks
+
+        with self.assertRaises(SystemExit):
+            run_benchmarks.main(['run', '--database', 'postgresql://bench@localhost/acidtech'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            original = os.path.join(directory, 'app.db')
+            with sqlite3.connect(original) as connection:
+                connection.execute('CREATE TABLE users (id INTEGER PRIMARY KEY)')
+                connection.execute('INSERT INTO users VALUES (1)')
+            url, copy_path = run_benchmarks._benchmark_copy(f'sqlite:///{original}')
+            try:
+                self.assertEqual(url, f'sqlite:///{copy_path}')
+                with sqlite3.connect(copy_path) as connection:
+                    self.assertEqual(connection.execute('SELECT COUNT(*) FROM users').fetchone(), (1,))
+                    connection.execute('DELETE FROM users')
+                with sqlite3.connect(original) as connection:
+                    self.assertEqual(connection.execute('SELECT COUNT(*) FROM users').fetchone(), (1,))
+            finally:
+                os.remove(copy_path)
+
+
+class TestStartup(unittest.TestCase):
+    """Heavy optional dependencies stay out of create_app()"""
+
+    def test_deferred_modules_not_loaded(self):
+        self.assertEqual(cold_start('testing')['deferred_loaded'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,374 @@
+"""
+Unit tests for receipt processing (field extraction, OCR pipeline)
+Runs against an in-memory SQLite database with a text-file stand-in for Tesseract
+"""
+
+import unittest
+import sys
+import os
+import io
+import tempfile
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import db
+from models.bank_transaction import BankTransaction
+from models.receipt_ocr import ReceiptOcrResult
+from models.transaction import Transaction
+from benchmarks.receipt_extraction_eval import FIXTURES, evaluate
+from services import receipt_ocr
+from services.receipt_extraction import extract_directory, extract_fields
+from services.receipt_matcher import ReceiptMatcher, TransactionIndex, to_cents
+from services.receipt_ocr import ReceiptOcrPipeline
+from tests.test_reporting_services import ServiceTestCase
+
+RECEIPT = 'ACME SUPPLY CO\nInvoice # INV-1001\nDate: 03/15/2026\nTotal: $1,234.50\n'
+
+_ocr_calls = []
+_ocr_lock = threading.Lock()
+
+
+def text_ocr(path, max_side):
+    """Tesseract stand-in: the 'image' is a text file holding the receipt text"""
+    with _ocr_lock:
+        _ocr_calls.append(path)
+    with open(path) as f:
+        return f.read()
+
+
+class TestReceiptExtraction(unittest.TestCase):
+    """Candidate scoring and confidence"""
+
+    def test_total_beats_subtotal_tax_and_cash(self):
+        fields = extract_fields(
+            'BLUE BEAN CAFE\n04/02/2026\nSubtotal 8.00\nTax 0.66\nTOTAL 8.66\nCash 20.00\nChange 11.34\n'
+        )
+        self.assertEqual(fields['amount'], 8.66)
+        self.assertEqual(fields['date'], '2026-04-02')
+        self.assertEqual(fields['vendor'], 'BLUE BEAN CAFE')
+        self.assertGreater(fields['confidence']['amount'], 0.5)
+
+    def test_invoice_date_beats_due_date(self):
+        fields = extract_fields('Northern & Co LLC\nDue Date: April 17, 2026\nInvoice No. NC-77\n'
+                                'Invoice Date: March 18, 2026\nAmount Due $2,700.00\n')
+        self.assertEqual(fields['date'], '2026-03-18')
+        self.assertEqual(fields['invoice_number'], 'NC-77')
+        self.assertEqual(fields['amount'], 2700.0)
+
+    def test_ambiguous_amount_has_low_confidence(self):
+        fields = extract_fields('HOLLOW ROCK\n$5.00\n$7.00\n')
+        self.assertLess(fields['confidence']['amount'], 0.5)
+        self.assertEqual(extract_fields('')['confidence']['amount'], 0.0)
+
+    def test_labels_and_amounts_are_not_vendors(self):
+        self.assertIsNone(extract_fields('TOTAL')['vendor'])
+        self.assertIsNone(extract_fields('INV # ---')['vendor'])
+        fields = extract_fields('Subtotal 42.10\nTax 3.47\nTotal 45.57\n')
+        self.assertIsNone(fields['vendor'])
+        self.assertEqual(fields['confidence']['vendor'], 0.0)
+        self.assertEqual(extract_fields('Discount Tire\nTotal $10.00\n')['vendor'], 'Discount Tire')
+
+    def test_lone_candidate_is_not_fully_trusted(self):
+        fields = extract_fields('ACME SUPPLY CO\n')
+        self.assertEqual(fields['vendor'], 'ACME SUPPLY CO')
+        self.assertLess(fields['confidence']['vendor'], 1.0)
+        self.assertLess(extract_fields('Hello there\n')['confidence']['vendor'], 0.6)
+
+    def test_fixture_set(self):
+        report = evaluate(workers=1)
+        for field, stats in report['fields'].items():
+            self.assertGreaterEqual(stats['accuracy'], 0.9, field)
+            self.assertEqual(stats['precision'], 1.0, field)
+
+    def test_directory_batch_on_process_pool(self):
+        inline = extract_directory(FIXTURES, workers=1)
+        pooled = extract_directory(FIXTURES, workers=2)
+        self.assertEqual(len(inline), 15)
+        self.assertEqual(pooled, inline)
+
+
+class ReceiptTestCase(ServiceTestCase):
+    """Service test app with an upload folder and a thread-pool OCR pipeline"""
+
+    def setUp(self):
+        super().setUp()
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir.name
+        self.pipeline = ReceiptOcrPipeline(self.app, executor=ThreadPoolExecutor(2), ocr_func=text_ocr)
+        _ocr_calls.clear()
+
+    def tearDown(self):
+        self.pipeline.shutdown()
+        self.upload_dir.cleanup()
+        super().tearDown()
+
+    def save_receipt(self, name, text=RECEIPT):
+        path = os.path.join(self.upload_dir.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def add_payable(self, **fields):
+        transaction = Transaction(type='payable', vendor_customer=fields.pop('vendor', 'ACME'),
+                                  amount=fields.pop('amount', 0), due_date=date(2026, 4, 15),
+                                  created_by=self.user.id, **fields)
+        db.session.add(transaction)
+        db.session.commit()
+        return transaction
+
+
+class TestReceiptOcrPipeline(ReceiptTestCase):
+    """Queued OCR, content-hash cache and write-back"""
+
+    def test_ocr_fills_empty_fields(self):
+        transaction = self.add_payable(invoice_number='', amount=0)
+        result = self.pipeline.submit(transaction.id, self.save_receipt('acme.png'))
+        self.assertIn(result.status, ('RUNNING', 'DONE'))    # Claimed by this worker at once
+
+        self.pipeline.drain(5)
+        db.session.expire_all()
+        result = ReceiptOcrResult.query.one()
+        self.assertEqual(result.status, 'DONE')
+        self.assertEqual(result.receipt_date, date(2026, 3, 15))
+        transaction = db.session.get(Transaction, transaction.id)
+        self.assertEqual(transaction.invoice_number, 'INV-1001')
+        self.assertEqual(transaction.amount, Decimal('1234.50'))
+        self.assertEqual(transaction.issue_date, date(2026, 3, 15))
+        self.assertEqual(transaction.vendor_customer, 'ACME')     # Entered by the user; kept
+
+    def test_reupload_is_answered_from_cache(self):
+        first = self.add_payable(invoice_number='')
+        self.pipeline.submit(first.id, self.save_receipt('scan-1.png'))
+        self.pipeline.drain(5)
+
+        second = self.add_payable(invoice_number='')
+        result = self.pipeline.submit(second.id, self.save_receipt('scan-2.jpg'))
+        self.assertEqual(result.status, 'DONE')
+        self.assertEqual(len(_ocr_calls), 1)
+        self.assertEqual(db.session.get(Transaction, second.id).invoice_number, 'INV-1001')
+
+    def test_unsupported_file_fails_without_ocr(self):
+        transaction = self.add_payable(invoice_number='')
+        self.pipeline.submit(transaction.id, self.save_receipt('receipt.pdf'))
+        self.pipeline.drain(5)
+        db.session.expire_all()
+        result = ReceiptOcrResult.query.one()
+        self.assertEqual(result.status, 'FAILED')
+        self.assertIn('Unsupported', result.error)
+        self.assertEqual(_ocr_calls, [])
+
+    def test_low_confidence_fields_are_not_written_back(self):
+        transaction = self.add_payable(invoice_number='', amount=0)
+        self.pipeline.submit(transaction.id, self.save_receipt('unclear.png', 'HOLLOW ROCK\n$5.00\n$7.00\n'))
+        self.pipeline.drain(5)
+        db.session.expire_all()
+        result = ReceiptOcrResult.query.one()
+        self.assertEqual(result.status, 'DONE')
+        self.assertIsNone(result.amount)
+        self.assertEqual(db.session.get(Transaction, transaction.id).amount, 0)
+
+    def test_concurrent_upload_of_the_same_content(self):
+        from unittest import mock
+
+        first = self.add_payable(invoice_number='')
+        path = self.save_receipt('scan-1.png')
+        self.pipeline.submit(first.id, path)
+        self.pipeline.drain(5)
+
+        # The other request's row is committed between our lookup and our INSERT
+        second = self.add_payable(invoice_number='')
+        find = ReceiptOcrPipeline._find
+        with mock.patch.object(ReceiptOcrPipeline, '_find', side_effect=[None, find(receipt_ocr.file_hash(path))]):
+            result = self.pipeline.submit(second.id, path)
+        self.assertEqual(result.status, 'DONE')
+        self.assertEqual(ReceiptOcrResult.query.count(), 1)
+        second = db.session.get(Transaction, second.id)
+        self.assertEqual(second.receipt_hash, result.content_hash)
+        self.assertEqual(second.invoice_number, 'INV-1001')
+
+    def test_queued_jobs_resume_on_worker_start(self):
+        transaction = self.add_payable(invoice_number='')
+        path = self.save_receipt('left-over.png')
+        db.session.add(ReceiptOcrResult(content_hash=receipt_ocr.file_hash(path), status='QUEUED', file_path=path))
+        transaction.receipt_hash = receipt_ocr.file_hash(path)
+        db.session.commit()
+
+        receipt_ocr._pipeline = self.pipeline
+        try:
+            self.assertEqual(receipt_ocr.resume_receipt_ocr(self.app), 1)
+            self.pipeline.drain(5)
+        finally:
+            receipt_ocr._pipeline = None
+        db.session.expire_all()
+        self.assertEqual(ReceiptOcrResult.query.one().status, 'DONE')
+        self.assertEqual(db.session.get(Transaction, transaction.id).invoice_number, 'INV-1001')
+
+    def test_each_job_runs_in_one_worker(self):
+        from datetime import datetime, timedelta
+
+        paths = [self.save_receipt(f'left-over-{i}.png', RECEIPT + f'REF {i}\n') for i in range(3)]
+        hashes = [receipt_ocr.file_hash(path) for path in paths]
+        now = datetime.utcnow()
+        db.session.add_all([
+            ReceiptOcrResult(content_hash=hashes[0], status='QUEUED', file_path=paths[0]),
+            # Still running in a live sibling worker
+            ReceiptOcrResult(content_hash=hashes[1], status='RUNNING', file_path=paths[1],
+                             claimed_by='web-1:100', claimed_at=now),
+            # Its worker died long ago
+            ReceiptOcrResult(content_hash=hashes[2], status='RUNNING', file_path=paths[2],
+                             claimed_by='web-1:99', claimed_at=now - timedelta(hours=1)),
+        ])
+        db.session.commit()
+
+        # Drained in turn: the in-memory test database is one connection shared by every thread
+        sibling = ReceiptOcrPipeline(self.app, executor=ThreadPoolExecutor(1), ocr_func=text_ocr)
+        try:
+            self.assertEqual(self.pipeline.resume_pending(), 2)
+            self.pipeline.drain(5)
+            self.assertEqual(sibling.resume_pending(), 0)
+            sibling.drain(5)
+        finally:
+            sibling.shutdown()
+
+        self.assertEqual(len(_ocr_calls), 2)
+        db.session.expire_all()
+        statuses = {row.content_hash: (row.status, row.claimed_by) for row in ReceiptOcrResult.query}
+        self.assertEqual(statuses, {hashes[0]: ('DONE', None), hashes[1]: ('RUNNING', 'web-1:100'),
+                                    hashes[2]: ('DONE', None)})
+
+    def test_process_pool(self):
+        pipeline = ReceiptOcrPipeline(self.app, workers=1, ocr_func=text_ocr)
+        try:
+            transaction = self.add_payable(invoice_number='')
+            pipeline.submit(transaction.id, self.save_receipt('pool.png'))
+            pipeline.drain(60)
+        finally:
+            pipeline.shutdown()
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Transaction, transaction.id).invoice_number, 'INV-1001')
+
+
+class TestReceiptMatching(ReceiptTestCase):
+    """Receipts matched to purchases awaiting a receipt"""
+
+    def add_purchase(self, description, amount, day, merchant=None):
+        return self.add_bank_transaction('Capital One', description, amount, day, account_type='CREDIT_CARD',
+                                         merchant_name=merchant, receipt_status='REQUIRED')
+
+    def add_result(self, vendor, amount, day, content_hash=None):
+        result = ReceiptOcrResult(content_hash=content_hash or f'{vendor}-{amount}-{day}', status='DONE',
+                                  vendor=vendor, amount=Decimal(str(amount)), receipt_date=day)
+        db.session.add(result)
+        return result
+
+    def test_match_marks_purchase_received(self):
+        shell = self.add_purchase('SHELL OIL 57442', -59.97, date(2026, 5, 22), 'Shell')
+        other = self.add_purchase('OFFICE DEPOT #2207', -146.12, date(2026, 5, 22), 'Office Depot')
+        result = self.add_result('SHELL', 59.97, date(2026, 5, 21))
+        self.add_result('BLUE BEAN CAFE', 8.66, date(2026, 5, 21))
+        db.session.commit()
+
+        report = ReceiptMatcher().match()
+        self.assertEqual((report['receipts'], report['matched'], report['unmatched']), (2, 1, 1))
+        db.session.expire_all()
+        self.assertEqual(db.session.get(BankTransaction, shell.id).receipt_status, 'RECEIVED')
+        self.assertEqual(db.session.get(BankTransaction, other.id).receipt_status, 'REQUIRED')
+        self.assertEqual(db.session.get(ReceiptOcrResult, result.id).bank_transaction_id, shell.id)
+        # Linked receipts are not matched again
+        self.assertEqual(ReceiptMatcher().match()['receipts'], 1)
+
+    def test_vendor_breaks_ties_and_look_alikes_stay_unmatched(self):
+        cafe = self.add_purchase('SQ *BLUE BEAN CAFE', -12.00, date(2026, 6, 3), 'Blue Bean Cafe')
+        self.add_purchase('UBER TRIP', -12.00, date(2026, 6, 3), 'Uber')
+        self.add_purchase('STARBUCKS 0412', -9.50, date(2026, 6, 3), 'Starbucks')
+        self.add_purchase('STARBUCKS 0977', -9.50, date(2026, 6, 3), 'Starbucks')
+        self.add_purchase('STAPLES 0019', -30.00, date(2026, 6, 20), 'Staples')
+        self.add_result('BLUE BEAN CAFE', 12.00, date(2026, 6, 3))
+        self.add_result('STARBUCKS', 9.50, date(2026, 6, 3))
+        self.add_result('STAPLES', 30.00, date(2026, 6, 10))        # Outside the window
+        db.session.commit()
+
+        report = ReceiptMatcher(window_days=3).match(dry_run=True)
+        self.assertEqual((report['matched'], report['ambiguous'], report['unmatched']), (1, 1, 1))
+        self.assertEqual(report['matches'][0]['bank_transaction_id'], cafe.id)
+        self.assertEqual(BankTransaction.query.filter_by(receipt_status='RECEIVED').count(), 0)
+
+    def test_ocr_result_is_matched_when_stored(self):
+        purchase = self.add_purchase('ACME SUPPLY CO HOUSTON', -1234.50, date(2026, 3, 16), 'Acme Supply')
+        db.session.commit()
+        transaction = self.add_payable(invoice_number='')
+        self.pipeline.submit(transaction.id, self.save_receipt('acme.png'))
+        self.pipeline.drain(5)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(BankTransaction, purchase.id).receipt_status, 'RECEIVED')
+
+    def test_thousands_of_receipts_in_memory(self):
+        rng = random.Random(7)
+        start = date(2025, 1, 1)
+        rows = [(i, -rng.randint(100, 50000) / 100, start + timedelta(days=rng.randrange(365)),
+                 rng.choice(['Shell', 'Staples', 'Uber', 'Home Depot', 'Office Depot']))
+                for i in range(20000)]
+        receipts = [SimpleNamespace(id=i, amount=Decimal(str(-amount)), receipt_date=day - timedelta(days=1),
+                                    vendor=merchant.upper(), content_hash=str(i))
+                    for i, amount, day, merchant in rows[:5000]]
+
+        started = time.perf_counter()
+        index = TransactionIndex(rows)
+        outcome = ReceiptMatcher().find_matches(receipts, index)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertGreater(len(outcome['matches']), 4500)
+        self.assertTrue(all(receipt.id == bank_id for receipt, bank_id, _ in outcome['matches']))
+        self.assertEqual(to_cents(Decimal('-0.29')), 29)
+
+
+class TestReceiptUploadRoutes(ReceiptTestCase):
+    """AP uploads return immediately and are processed in the background"""
+
+    def test_create_with_receipt(self):
+        from app.routes.accounts_payable import accounts_payable_bp
+
+        self.app.secret_key = 'test'
+        self.app.config['LOGIN_DISABLED'] = True
+        self.app.register_blueprint(accounts_payable_bp, url_prefix='/accounts-payable')
+        receipt_ocr._pipeline = self.pipeline
+        try:
+            client = self.app.test_client()
+            response = client.post('/accounts-payable/create', content_type='multipart/form-data', data={
+                'vendor': 'ACME', 'amount': '1234.50', 'due_date': '2026-04-15', 'description': 'Supplies',
+                'invoice_number': '', 'receipt': (io.BytesIO(RECEIPT.encode()), 'acme.png'),
+            })
+            self.assertEqual(response.status_code, 302)
+
+            self.pipeline.drain(5)
+            transaction = Transaction.query.one()
+            status = client.get(f'/accounts-payable/{transaction.id}/receipt-ocr').get_json()
+            self.assertEqual(status['receipt']['status'], 'DONE')
+            self.assertEqual(status['receipt']['invoice_number'], 'INV-1001')
+            db.session.expire_all()
+            self.assertEqual(db.session.get(Transaction, transaction.id).invoice_number, 'INV-1001')
+        finally:
+            receipt_ocr._pipeline = None
+
+    def test_receipt_ocr_status_requires_login(self):
+        from flask_login import LoginManager
+        from app.routes.accounts_payable import accounts_payable_bp
+
+        LoginManager(self.app).user_loader(lambda user_id: None)
+        self.app.register_blueprint(accounts_payable_bp, url_prefix='/accounts-payable')
+        transaction = self.add_payable()
+        response = self.app.test_client().get(f'/accounts-payable/{transaction.id}/receipt-ocr')
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,729 @@
+"""
+Unit tests for the reporting services
+Runs every service against an in-memory SQLite database
+"""
+
+import unittest
+import sys
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from database import db
+from models.user import User
+from models.transaction import Transaction
+from models.bank_transaction import BankTransaction
+
+
+def create_test_app():
+    """Minimal app bound to an in-memory database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    return app
+
+
+class ServiceTestCase(unittest.TestCase):
+    """Base class creating the schema and a default user"""
+
+    def setUp(self):
+        self.app = create_test_app()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(username='qa', email='qa@acidtech.com', first_name='QA', last_name='User')
+        self.user.set_password('qa-password-1')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_ledger_entry(self, type_, vendor, amount, due_date, status='pending'):
+        entry = Transaction(
+            type=type_,
+            vendor_customer=vendor,
+            amount=amount,
+            due_date=due_date,
+            status=status,
+            created_by=self.user.id
+        )
+        db.session.add(entry)
+        return entry
+
+    def add_bank_transaction(self, account, description, amount, transaction_date, **fields):
+        transaction = BankTransaction(
+            account_name=account,
+            account_type=fields.pop('account_type', 'CHECKING'),
+            transaction_date=transaction_date,
+            description=description,
+            amount=amount,
+            transaction_type='CREDIT' if amount > 0 else 'DEBIT',
+            **fields
+        )
+        db.session.add(transaction)
+        return transaction
+
+
+class TestApArKpis(ServiceTestCase):
+    """AP/AR KPI query"""
+
+    def test_kpis_for_both_ledgers(self):
+        from services.ap_ar_summary import get_ap_ar_kpis
+
+        this_year = date(date.today().year, 6, 15)
+        self.add_ledger_entry('payable', 'Office Rent Corp', 1000, this_year)
+        self.add_ledger_entry('payable', 'City Electric', 250, this_year, status='paid')
+        self.add_ledger_entry('payable', 'Old Vendor', 75, this_year - timedelta(days=400))
+        self.add_ledger_entry('receivable', 'Acme Corporation', 5000, this_year)
+        db.session.commit()
+
+        kpis = get_ap_ar_kpis()
+
+        self.assertEqual(Decimal(kpis['payable']['total_outstanding']), Decimal('1075'))
+        self.assertEqual(Decimal(kpis['payable']['total_ytd']), Decimal('1250'))
+        self.assertEqual(kpis['payable']['paid_count'], 1)
+        self.assertEqual(kpis['payable']['year_count'], 2)
+        self.assertEqual(kpis['payable']['pending_count'], 2)
+        self.assertEqual(kpis['receivable']['pending_count'], 1)
+        self.assertEqual(Decimal(kpis['receivable']['total_outstanding']), Decimal('5000'))
+
+    def test_cache_invalidated_by_commit(self):
+        from services.ap_ar_summary import get_ap_ar_kpis
+
+        self.add_ledger_entry('receivable', 'Acme Corporation', 100, date.today())
+        db.session.commit()
+        self.assertEqual(get_ap_ar_kpis()['receivable']['pending_count'], 1)
+
+        self.add_ledger_entry('receivable', 'Global Industries', 200, date.today())
+        db.session.commit()
+        self.assertEqual(get_ap_ar_kpis()['receivable']['pending_count'], 2)
+
+
+class TestEntityCube(ServiceTestCase):
+    """Entity analytics cube maintenance and top-N"""
+
+    def test_top_n_matches_source_rows(self):
+        from services.entity_cube import EntityCube, SOURCE_BANK, SOURCE_LEDGER
+
+        day = date(2025, 8, 5)
+        self.add_bank_transaction('Revenue 4717', 'Memo Credit : XTO ENERGY', 208376.36, day, merchant_name='XTO Energy Inc.')
+        self.add_bank_transaction('Revenue 4717', 'Memo Credit : XTO ENERGY', 1000, day + timedelta(days=40), merchant_name='XTO Energy Inc.')
+        self.add_bank_transaction('Revenue 4717', 'Memo Credit : NORTHERN & CO', 10520, day, merchant_name='Northern & Co LLC')
+        self.add_bank_transaction('Revenue 4717', 'Transfer to DDA', -150000, day)
+        self.add_ledger_entry('payable', 'Office Rent Corp', 2800, day)
+        self.add_ledger_entry('payable', 'City Electric', 450.75, day)
+        db.session.commit()
+
+        cube = EntityCube()
+        top = cube.top_n(5, SOURCE_BANK, account='Revenue 4717', flow='IN')
+        self.assertEqual([t['entity'] for t in top], ['XTO Energy Inc.', 'Northern & Co LLC'])
+        self.assertAlmostEqual(top[0]['total_amount'], 209376.36, places=2)
+        self.assertEqual(top[0]['transaction_count'], 2)
+        self.assertAlmostEqual(top[0]['min_amount'], 1000)
+        self.assertAlmostEqual(top[0]['max_amount'], 208376.36, places=2)
+
+        vendors = cube.top_n(1, SOURCE_LEDGER, account='payable')
+        self.assertEqual(vendors[0]['entity'], 'Office Rent Corp')
+
+    def test_incremental_update_on_edit_and_delete(self):
+        from services.entity_cube import EntityCube, SOURCE_BANK
+
+        day = date(2025, 8, 5)
+        kept = self.add_bank_transaction('Capital One', 'SHELL OIL 123', -40, day, merchant_name='Shell')
+        moved = self.add_bank_transaction('Capital One', 'SHELL OIL 456', -60, day, merchant_name='Shell')
+        db.session.commit()
+
+        cube = EntityCube()
+        self.assertAlmostEqual(cube.top_n(1, SOURCE_BANK, flow='OUT')[0]['total_amount'], 100)
+
+        moved.merchant_name = 'Exxon'
+        db.session.commit()
+        totals = {t['entity']: t['total_amount'] for t in cube.entity_totals(SOURCE_BANK, flow='OUT')}
+        self.assertEqual(totals, {'Shell': 40.0, 'Exxon': 60.0})
+
+        db.session.delete(kept)
+        db.session.commit()
+        totals = {t['entity']: t['total_amount'] for t in cube.entity_totals(SOURCE_BANK, flow='OUT')}
+        self.assertEqual(totals, {'Exxon': 60.0})
+
+    def test_bulk_update_refreshes_partitions(self):
+        from services.entity_cube import EntityCube, SOURCE_BANK
+
+        day = date(2025, 8, 5)
+        self.add_bank_transaction('Capital One', 'SHELL OIL 123', -40, day, merchant_name='Shell')
+        self.add_bank_transaction('Capital One', 'SHELL OIL 456', -60, day, merchant_name='Shell')
+        db.session.commit()
+
+        BankTransaction.query.filter(BankTransaction.description == 'SHELL OIL 456').update(
+            {'merchant_name': 'Exxon', 'transaction_date': date(2025, 9, 1)}, synchronize_session=False)
+        db.session.commit()
+
+        self.assertTrue(EntityCube.is_current())
+        cube = EntityCube()
+        august = {t['entity']: t['total_amount'] for t in cube.entity_totals(
+            SOURCE_BANK, flow='OUT', start_month=day, end_month=day)}
+        self.assertEqual(august, {'Shell': 40.0})
+        september = cube.entity_totals(SOURCE_BANK, flow='OUT', start_month=date(2025, 9, 1))
+        self.assertEqual([(t['entity'], t['total_amount']) for t in september], [('Exxon', 60.0)])
+
+        BankTransaction.query.filter(BankTransaction.merchant_name == 'Shell').delete(synchronize_session=False)
+        db.session.commit()
+        self.assertEqual([t['entity'] for t in cube.entity_totals(SOURCE_BANK, flow='OUT')], ['Exxon'])
+
+    def test_stale_cube_is_rebuilt_in_a_job(self):
+        from unittest import mock
+        from sqlalchemy import update
+        from services import entity_cube
+        from services.entity_cube import EntityCube, SOURCE_BANK
+
+        shell = self.add_bank_transaction('Capital One', 'SHELL OIL 123', -40, date(2025, 8, 5),
+                                          merchant_name='Shell')
+        db.session.commit()
+        # Bulk update by primary key: the cube cannot follow it and still holds Shell
+        db.session.execute(update(BankTransaction), [{'id': shell.id, 'merchant_name': 'Exxon'}])
+        db.session.commit()
+        self.assertFalse(EntityCube.is_current())
+
+        with mock.patch.object(EntityCube, 'rebuild') as rebuild, \
+                mock.patch.object(entity_cube, 'schedule_rebuild') as schedule:
+            totals = EntityCube().entity_totals(SOURCE_BANK, flow='OUT', start_month=date(2025, 8, 1))
+        rebuild.assert_not_called()
+        schedule.assert_called_once()
+        # Served from the source rows while the cube is stale, not from the outdated cells
+        self.assertEqual([(t['entity'], t['total_amount']) for t in totals], [('Exxon', 40.0)])
+
+        EntityCube().rebuild()
+        self.assertTrue(EntityCube.is_current())
+        with mock.patch.object(entity_cube, 'schedule_rebuild') as schedule:
+            totals = EntityCube().entity_totals(SOURCE_BANK, flow='OUT')
+        schedule.assert_not_called()
+        self.assertEqual([t['entity'] for t in totals], ['Exxon'])
+
+    def test_cube_staleness_is_shared_between_workers(self):
+        from unittest import mock
+        from sqlalchemy import text
+        from services import entity_cube
+        from services.entity_cube import EntityCube, SOURCE_LEDGER
+
+        self.add_ledger_entry('payable', 'Office Rent Corp', 2800, date(2025, 7, 10))
+        db.session.commit()
+        # Another worker (or a deployment that skipped the rebuild) left the cube stale
+        db.session.execute(text('UPDATE entity_cube_state SET generation = generation + 1'))
+        db.session.execute(text('DELETE FROM entity_monthly_totals'))
+        db.session.commit()
+
+        with mock.patch.object(entity_cube, 'schedule_rebuild') as schedule:
+            totals = EntityCube().entity_totals(SOURCE_LEDGER, account='payable')
+        schedule.assert_called_once()
+        self.assertEqual([(t['entity'], t['total_amount']) for t in totals], [('Office Rent Corp', 2800.0)])
+
+    def test_net_totals_for_an_exact_range(self):
+        from services.entity_cube import EntityCube, FLOW_NET, SOURCE_LEDGER
+
+        self.add_ledger_entry('payable', 'Office Rent Corp', 2800, date(2025, 7, 10))
+        self.add_ledger_entry('payable', 'Office Rent Corp', 2800, date(2025, 8, 10))
+        self.add_ledger_entry('payable', 'Office Rent Corp', -300, date(2025, 8, 20))
+        self.add_ledger_entry('payable', 'City Electric', 450.75, date(2025, 9, 2))
+        self.add_ledger_entry('payable', 'City Electric', 999, date(2025, 9, 20))
+        db.session.commit()
+
+        cube = EntityCube()
+        net = cube.top_n(5, SOURCE_LEDGER, account='payable', flow=FLOW_NET)
+        self.assertEqual([(t['entity'], t['total_amount']) for t in net],
+                         [('Office Rent Corp', 5300.0), ('City Electric', 1449.75)])
+
+        # July 15 .. September 10: neither edge month is widened to its boundary
+        ranged = cube.top_n_between(5, SOURCE_LEDGER, date(2025, 7, 15), date(2025, 9, 10),
+                                    account='payable', flow=FLOW_NET)
+        self.assertEqual([(t['entity'], t['total_amount'], t['transaction_count']) for t in ranged],
+                         [('Office Rent Corp', 2500.0, 2), ('City Electric', 450.75, 1)])
+        inside = cube.top_n_between(5, SOURCE_LEDGER, date(2025, 9, 1), date(2025, 9, 10), account='payable')
+        self.assertEqual([(t['entity'], t['total_amount']) for t in inside], [('City Electric', 450.75)])
+
+
+
+class TestCreditCardCycles(ServiceTestCase):
+    """Scalar, vectorized and SQL forms of the statement cycle agree"""
+
+    def test_scalar_vector_and_sql_forms_agree(self):
+        from services.credit_card_cycles import cycle_cut_expression, cycle_dates, cycle_info
+
+        days = [date(2024, 12, 31) + timedelta(days=n) for n in range(0, 400, 3)]
+        vector = cycle_dates(days)
+        for i, day in enumerate(days):
+            info = cycle_info(day)
+            self.assertEqual(vector['cycle_cut_date'][i].item(), info['cycle_cut_date'])
+            self.assertEqual(vector['due_date'][i].item(), info['due_date'])
+            self.assertEqual(vector['next_cycle_cut'][i].item(), info['next_cycle_cut'])
+            self.assertEqual(int(vector['days_until_due'][i]), info['days_until_due'])
+
+        self.assertEqual(cycle_info(date(2025, 1, 10))['cycle_cut_date'], date(2024, 12, 11))
+        self.assertEqual(cycle_info(date(2025, 1, 11))['next_cycle_cut'], date(2025, 2, 11))
+
+        for day in days:
+            self.add_bank_transaction('Capital One', 'PURCHASE', -1, day)
+        db.session.commit()
+        rows = db.session.query(
+            BankTransaction.transaction_date, cycle_cut_expression(BankTransaction.transaction_date)
+        ).all()
+        for transaction_date, cycle_cut in rows:
+            self.assertEqual(cycle_cut, cycle_info(transaction_date)['cycle_cut_date'])
+
+    def test_sql_server_compilation(self):
+        from sqlalchemy.dialects import mssql
+        from services.credit_card_cycles import cycle_cut_expression
+
+        sql = str(cycle_cut_expression(BankTransaction.transaction_date).compile(dialect=mssql.dialect()))
+        self.assertIn('DATEFROMPARTS(YEAR(bank_transactions.transaction_date), '
+                      'MONTH(bank_transactions.transaction_date), 11)', sql)
+        self.assertIn('DATEADD(month, -1, ', sql)
+        for postgres_only in ('date_trunc', 'INTERVAL', 'EXTRACT'):
+            self.assertNotIn(postgres_only, sql)
+
+    def test_statement_summary_per_cycle(self):
+        from services.credit_card_cycles import statement_summary
+
+        self.add_bank_transaction('Capital One', 'SHELL OIL', -40, date(2025, 7, 10), receipt_status='REQUIRED')
+        self.add_bank_transaction('Capital One', 'OFFICE DEPOT', -60, date(2025, 7, 11), receipt_status='REQUIRED')
+        self.add_bank_transaction('Capital One', 'STAPLES', -25, date(2025, 8, 10), receipt_status='RECEIVED')
+        self.add_bank_transaction('Capital One', 'PAYMENT THANK YOU', 500, date(2025, 7, 20))
+        self.add_bank_transaction('Revenue 4717', 'RD Checking Deposit', 900, date(2025, 7, 20))
+        db.session.commit()
+
+        statements = statement_summary()
+        self.assertEqual([s['cycle_cut_date'] for s in statements], ['2025-07-11', '2025-06-11'])
+        july = statements[0]
+        self.assertEqual((july['purchases'], july['payments'], july['transaction_count']), (85.0, 500.0, 3))
+        self.assertEqual((july['receipts_pending'], july['receipts_received']), (1, 1))
+        self.assertEqual(july['due_date'], '2025-08-05')
+
+        self.assertEqual(len(statement_summary(start_date=date(2025, 7, 11))), 1)
+
+    def test_credit_card_summary_by_cycle(self):
+        from services.cash_flow_calculator import CashFlowCalculator
+        from services.credit_card_cycles import cycle_info
+
+        def card(amount, day, **fields):
+            info = cycle_info(day)
+            return self.add_bank_transaction('Capital One', 'CARD', amount, day, is_credit_card_transaction=True,
+                                             is_classified=True, credit_card_cycle_date=info['cycle_cut_date'],
+                                             **fields)
+
+        today = date.today()
+        current_cut = cycle_info(today)['cycle_cut_date']
+        card(-30, current_cut, receipt_status='REQUIRED')
+        card(-20, current_cut - timedelta(days=1), receipt_status='RECEIVED')
+        card(100, current_cut - timedelta(days=2))
+        card(-999, current_cut - timedelta(days=3 * 365))  # Outside the default 12-cycle window
+        db.session.commit()
+
+        summary = CashFlowCalculator().get_credit_card_summary()
+        self.assertEqual(summary['total_transactions'], 3)
+        self.assertEqual((summary['total_purchases'], summary['total_payments']), (50.0, 100.0))
+        self.assertEqual(summary['current_cycle']['purchases_this_cycle'], 30.0)
+        self.assertEqual(len(summary['cycles']), 2)
+        self.assertEqual((summary['receipts']['required'], summary['receipts']['received']), (1, 1))
+
+        everything = CashFlowCalculator().get_credit_card_summary(start_date=current_cut - timedelta(days=4 * 365))
+        self.assertEqual(everything['total_purchases'], 1049.0)
+
+    def test_credit_card_summary_rejects_malformed_dates(self):
+        from app.routes.cash_flow import cash_flow_bp
+
+        self.app.register_blueprint(cash_flow_bp, url_prefix='/cash-flow')
+        client = self.app.test_client()
+        for query in ('start_date=2025-13-01', 'end_date=yesterday'):
+            response = client.get(f'/cash-flow/api/dashboard/credit-card?{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.get_json()['success'])
+        self.assertEqual(client.get('/cash-flow/api/dashboard/credit-card?start_date=2025-01-01').status_code, 200)
+
+
+
+class TestTaxSummary(ServiceTestCase):
+    """Grouped tax summary and the streaming deductible-transactions export"""
+
+    def setUp(self):
+        super().setUp()
+        day = date(2025, 3, 5)
+        deductible = dict(is_tax_deductible=True, is_classified=True)
+        self.add_bank_transaction('Capital One', 'SHELL OIL', -40, day, tax_category='VEHICLE',
+                                  receipt_status='REQUIRED', **deductible)
+        self.add_bank_transaction('Capital One', 'EXXON', -60, day, tax_category='VEHICLE',
+                                  receipt_status='RECEIVED', **deductible)
+        self.add_bank_transaction('Payroll 4079', 'ADP PAYROLL', -1000, day, tax_category='PAYROLL', **deductible)
+        self.add_bank_transaction('Capital One', 'NETFLIX', -15, day, is_classified=True)
+        db.session.commit()
+
+    def test_summary_by_category_and_receipt_status(self):
+        from services.cash_flow_calculator import CashFlowCalculator
+
+        summary = CashFlowCalculator().get_tax_summary(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual((summary['total_deductible'], summary['transaction_count']), (1100.0, 3))
+        self.assertEqual(summary['category_breakdown']['VEHICLE'],
+                         {'total': 100.0, 'count': 2, 'receipts_required': 1, 'receipts_received': 1})
+        self.assertEqual(summary['receipt_compliance'],
+                         {'total_requiring_receipts': 1, 'receipts_received': 1, 'receipts_pending': 1})
+
+    def test_export_streams_csv_and_xlsx(self):
+        import csv
+        import io
+        from openpyxl import load_workbook
+        from services.report_export import TAX_DEDUCTIBLE_HEADERS, iter_csv, iter_xlsx, tax_deductible_rows
+
+        period = (date(2025, 1, 1), date(2025, 12, 31))
+        text = b''.join(iter_csv(TAX_DEDUCTIBLE_HEADERS, tax_deductible_rows(*period))).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], list(TAX_DEDUCTIBLE_HEADERS))
+        self.assertEqual(sorted(row[2] for row in rows[1:]), ['ADP PAYROLL', 'EXXON', 'SHELL OIL'])
+
+        workbook = load_workbook(io.BytesIO(b''.join(iter_xlsx(TAX_DEDUCTIBLE_HEADERS,
+                                                               tax_deductible_rows(*period)))))
+        self.assertEqual(workbook.active.max_row, 4)
+
+
+
+class TestReportExport(ServiceTestCase):
+    """Named report exports stream the same rows the views show"""
+
+    def test_tax_export_requires_login(self):
+        from flask_login import LoginManager
+        from app.routes.cash_flow import cash_flow_bp
+
+        LoginManager(self.app).user_loader(lambda user_id: None)
+        self.app.register_blueprint(cash_flow_bp, url_prefix='/cash-flow')
+        response = self.app.test_client().get('/cash-flow/api/dashboard/tax-summary/export')
+        self.assertEqual(response.status_code, 401)
+
+    def test_account_and_ledger_exports(self):
+        import csv
+        import io
+        from services.report_export import ACCOUNT_HEADERS, build_export, iter_csv
+
+        self.add_bank_transaction('Revenue 4717', 'RD Checking Deposit', 900, date(2025, 7, 1))
+        self.add_bank_transaction('Revenue 4717', 'Wire Transfer Fee', -15, date(2025, 7, 2))
+        self.add_bank_transaction('Revenue 4717', 'ACH Credit XTO', 500, date(2024, 7, 3))
+        today = date.today()
+        self.add_ledger_entry('payable', 'Acme Supply', 100, today)
+        self.add_ledger_entry('payable', 'Bolt Co', 200, today - timedelta(days=45))
+        self.add_ledger_entry('payable', 'Paid Vendor', 300, today - timedelta(days=45), status='paid')
+        db.session.commit()
+
+        filename, headers, rows = build_export('account', {'account': 'Revenue 4717', 'year': '2025'})
+        self.assertEqual((filename, headers), ('account-revenue-4717', ACCOUNT_HEADERS))
+        lines = list(csv.reader(io.StringIO(b''.join(iter_csv(headers, rows)).decode('utf-8-sig'))))
+        self.assertEqual([line[2] for line in lines[1:]], ['RD Checking Deposit'])  # Income only, 2025 only
+
+        _, _, rows = build_export('payables', {'status': 'pending'})
+        self.assertEqual(sorted(row[0] for row in rows), ['Acme Supply', 'Bolt Co'])
+
+        _, _, rows = build_export('aging', {'type': 'payable'})
+        self.assertEqual([(row[0], row[4], row[5]) for row in rows],
+                         [('Bolt Co', 45, '31-60 days'), ('Acme Supply', 0, 'Current')])
+
+        with self.assertRaises(ValueError):
+            build_export('unknown', {})
+
+    def test_account_export_filters_by_date_range(self):
+        from services.report_export import build_export
+
+        for day in (date(2024, 12, 31), date(2025, 1, 1), date(2025, 12, 31), date(2026, 1, 1)):
+            self.add_bank_transaction('Revenue 4717', f'Deposit {day}', 100, day)
+        db.session.commit()
+
+        def exported(args):
+            _, _, rows = build_export('account', dict(args, account='Revenue 4717'))
+            return sorted(row[0] for row in rows)
+
+        self.assertEqual(exported({'year': '2025'}), [date(2025, 1, 1), date(2025, 12, 31)])
+        self.assertEqual(exported({'year': '2025', 'month': '12'}), [date(2025, 12, 31)])
+        self.assertEqual(exported({'year': '2026', 'month': '1'}), [date(2026, 1, 1)])
+        with self.assertRaises(ValueError):
+            exported({'month': '12'})
+
+
+
+class TestReportSnapshots(ServiceTestCase):
+    """Closed-month snapshots are served until their month's data changes"""
+
+    def setUp(self):
+        super().setUp()
+        self.month_end = date.today().replace(day=1) - timedelta(days=1)
+        self.month_start = self.month_end.replace(day=1)
+
+    def tearDown(self):
+        from services.period_close import _closed_cache
+        _closed_cache.clear()
+        super().tearDown()
+
+    def close(self, start=None):
+        from services.period_close import close_period
+        start = start or self.month_start
+        close_period(start.year, start.month)
+
+    def test_snapshot_invalidated_by_changes_in_its_period(self):
+        from services.period_close import reopen_period
+        from services.report_snapshots import ReportSnapshotStore, closed_months
+
+        start, end = self.month_start, self.month_end
+        deductible = dict(is_tax_deductible=True, is_classified=True, tax_category='VEHICLE')
+        fuel = self.add_bank_transaction('Capital One', 'SHELL OIL', -40, start, **deductible)
+        later = self.add_bank_transaction('Capital One', 'EXXON', -60, end + timedelta(days=1), **deductible)
+        db.session.commit()
+        self.close()
+        self.assertEqual(closed_months(), [(start, end)])
+
+        store = ReportSnapshotStore()
+        self.assertIsNone(store.get('tax-summary', start, end))
+        payload = store.get_or_render('tax-summary', start, end)
+        self.assertEqual(payload['total_deductible'], 40.0)
+        self.assertEqual(store.get('tax-summary', start, end), payload)
+        self.assertTrue(store.xlsx('tax-summary', start, end).startswith(b'PK'))
+
+        # Writes outside the period keep the snapshot current
+        later.amount = -70
+        db.session.commit()
+        self.assertEqual(store.get('tax-summary', start, end), payload)
+
+        reopen_period(start.year, start.month)
+        fuel.amount = -45
+        db.session.commit()
+        self.close()
+        self.assertIsNone(store.get('tax-summary', start, end))
+        self.assertEqual(store.get_or_render('tax-summary', start, end)['total_deductible'], 45.0)
+
+    def test_month_end_aging_is_reconstructed(self):
+        from services.report_snapshots import ReportSnapshotStore
+
+        start, end = self.month_start, self.month_end
+        issued = start - timedelta(days=20)
+        open_then = self.add_ledger_entry('payable', 'Paid Later', 100, start, status='paid')
+        open_then.issue_date, open_then.paid_date = issued, end + timedelta(days=3)
+        paid_then = self.add_ledger_entry('payable', 'Paid In Month', 200, start, status='paid')
+        paid_then.issue_date, paid_then.paid_date = issued, end - timedelta(days=1)
+        still_open = self.add_ledger_entry('payable', 'Still Open', 300, end + timedelta(days=10))
+        still_open.issue_date = issued
+        self.add_ledger_entry('payable', 'Issued Later', 400, end + timedelta(days=30))  # created today
+        db.session.commit()
+        self.close()
+
+        store = ReportSnapshotStore()
+        payload = store.get_or_render('aging-payable', start, end)
+        self.assertEqual(payload['buckets'], {
+            '1-30 days': {'amount': 100.0, 'count': 1},   # Due on the 1st, 27-30 days late at month end
+            'Current': {'amount': 300.0, 'count': 1},
+        })
+
+        # Items issued after the month do not invalidate its aging
+        self.add_ledger_entry('payable', 'Another Later', 50, date.today())
+        db.session.commit()
+        self.assertEqual(store.get('aging-payable', start, end), payload)
+
+    def test_dashboard_snapshot_keeps_only_month_sections(self):
+        from services.report_snapshots import ReportSnapshotStore
+
+        self.add_bank_transaction('Revenue 4717', 'STRIPE PAYOUT', 500, self.month_start,
+                                  business_category='REVENUE', is_classified=True)
+        db.session.commit()
+        self.close()
+
+        payload = ReportSnapshotStore().get_or_render('dashboard-summary', self.month_start, self.month_end)
+        self.assertEqual(set(payload), {'period', 'kpis', 'account_summaries'})
+        self.assertEqual(payload['kpis']['revenue_total'], 500.0)
+
+    def test_only_closed_months_are_stored(self):
+        from models.report_snapshot import ReportSnapshot
+        from services.report_snapshots import ReportSnapshotStore, is_closed
+
+        deductible = dict(is_tax_deductible=True, is_classified=True, tax_category='VEHICLE')
+        self.add_bank_transaction('Capital One', 'SHELL OIL', -40, self.month_start, **deductible)
+        db.session.commit()
+        store = ReportSnapshotStore()
+
+        # Ended but not closed: computed live
+        self.assertFalse(is_closed(self.month_start, self.month_end))
+        self.assertEqual(store.get_or_render('tax-summary', self.month_start, self.month_end)['total_deductible'], 40.0)
+        self.close()
+        # Arbitrary ranges inside or around a closed month are computed live too
+        for start, end in ((self.month_start, self.month_end - timedelta(days=1)),
+                           (self.month_start - timedelta(days=30), self.month_end)):
+            self.assertFalse(is_closed(start, end))
+            self.assertEqual(store.get_or_render('tax-summary', start, end)['total_deductible'], 40.0)
+        self.assertEqual(ReportSnapshot.query.count(), 0)
+
+        self.assertTrue(is_closed(self.month_start, self.month_end))
+        store.get_or_render('tax-summary', self.month_start, self.month_end)
+        self.assertEqual(ReportSnapshot.query.count(), 1)
+
+    def test_prerender_closed_periods(self):
+        from services.report_snapshots import REPORTS, ReportSnapshotStore
+
+        self.add_ledger_entry('payable', 'Acme Supply', 100, date.today() - timedelta(days=40))
+        db.session.commit()
+        self.close()
+        self.close((self.month_start - timedelta(days=1)).replace(day=1))
+
+        store = ReportSnapshotStore()
+        self.assertEqual(store.prerender_closed_periods(3), {'rendered': 2 * len(REPORTS), 'current': 0, 'failed': 0})
+        self.assertEqual(store.prerender_closed_periods(3), {'rendered': 0, 'current': 2 * len(REPORTS), 'failed': 0})
+
+    def test_one_worker_renders(self):
+        import tempfile
+        from services.report_snapshots import SnapshotWorker
+
+        with tempfile.TemporaryDirectory() as directory:
+            lock_file = os.path.join(directory, 'snapshots.lock')
+            first, second = (SnapshotWorker(self.app, 60, lock_file=lock_file) for _ in range(2))
+            self.assertTrue(first._acquire())
+            self.assertFalse(second._acquire())
+            self.assertFalse(second.active)
+            # The holder exits: the next worker takes over
+            first._release()
+            self.assertTrue(second._acquire())
+            second._release()
+
+
+class TestPeriodClose(ServiceTestCase):
+    """Closed months are read-only and reported from their frozen totals"""
+
+    def setUp(self):
+        super().setUp()
+        self.month_end = date.today().replace(day=1) - timedelta(days=1)
+        self.month_start = self.month_end.replace(day=1)
+        classified = dict(is_classified=True)
+        self.sale = self.add_bank_transaction('Revenue 4717', 'STRIPE PAYOUT', 1000, self.month_start,
+                                              business_category='REVENUE', **classified)
+        self.add_bank_transaction('Revenue 4717', 'REFUND', -100, self.month_end,
+                                  business_category='REVENUE', **classified)
+        self.add_bank_transaction('Bill Pay 5285', 'ACME SUPPLY', -250, self.month_end,
+                                  business_category='OPERATING_EXPENSE', **classified)
+        self.add_bank_transaction('Bill Pay 5285', 'UNKNOWN', -5, self.month_end)
+        self.add_bank_transaction('Revenue 4717', 'STRIPE PAYOUT', 400, date.today(),
+                                  business_category='REVENUE', **classified)
+        db.session.commit()
+
+    def tearDown(self):
+        from services.period_close import _closed_cache
+        _closed_cache.clear()
+        super().tearDown()
+
+    def close(self):
+        from services.period_close import close_period
+        return close_period(self.month_start.year, self.month_start.month, closed_by=self.user.id)
+
+    def summaries(self):
+        from services.cash_flow_calculator import CashFlowCalculator
+        calculator = CashFlowCalculator()
+        dashboard = calculator.get_dashboard_summary(self.month_start, date.today())
+        account = calculator.get_account_summary('Revenue 4717', self.month_start, date.today())
+        return dashboard['kpis'], {key: account[key] for key in ('totals', 'category_breakdown', 'monthly_data')}
+
+    def test_close_freezes_totals(self):
+        from models.period_close import PeriodTotal
+        from sqlalchemy import text
+
+        before = self.summaries()
+        period = self.close()
+        self.assertEqual((period.transaction_count, period.unclassified_count), (3, 1))
+        self.assertEqual(PeriodTotal.query.count(), 2)
+        self.assertEqual(self.summaries(), before)
+
+        kpis, account = before
+        self.assertEqual(kpis['revenue_total'], 1300.0)
+        self.assertEqual(kpis['operating_expenses'], 250.0)
+        self.assertEqual(account['totals']['transaction_count'], 3)
+
+        # Reports read the frozen totals, not the closed month's rows
+        db.session.execute(text('UPDATE bank_transactions SET amount = 5000 WHERE id = :id'), {'id': self.sale.id})
+        db.session.commit()
+        self.assertEqual(self.summaries()[0]['revenue_total'], 1300.0)
+
+    def test_closed_period_is_read_only(self):
+        from services.period_close import ClosedPeriodError, close_period, reopen_period
+
+        self.close()
+        self.sale.amount = 900
+        self.assertRaises(ClosedPeriodError, db.session.commit)
+        db.session.rollback()
+
+        db.session.delete(self.sale)
+        self.assertRaises(ClosedPeriodError, db.session.commit)
+        db.session.rollback()
+
+        self.add_bank_transaction('Revenue 4717', 'LATE ENTRY', 10, self.month_end)
+        self.assertRaises(ClosedPeriodError, db.session.commit)
+        db.session.rollback()
+
+        with self.assertRaises(ClosedPeriodError):
+            BankTransaction.query.filter(BankTransaction.amount > 0).update(
+                {'needs_review': True}, synchronize_session=False
+            )
+        db.session.rollback()
+        self.assertRaises(ValueError, close_period, date.today().year, date.today().month)
+
+        self.assertTrue(reopen_period(self.month_start.year, self.month_start.month))
+        self.sale.amount = 900
+        db.session.commit()
+        self.assertEqual(self.summaries()[0]['revenue_total'], 1200.0)
+
+    def test_guard_sees_closes_from_other_workers(self):
+        from sqlalchemy import text
+        from services.period_close import ClosedPeriodError, closed_months
+
+        # Warm this worker's cache, then close and reopen the month behind its back
+        self.assertEqual(closed_months(), frozenset())
+        db.session.execute(text('INSERT INTO closed_periods (period_start, period_end) VALUES (:start, :end)'),
+                           {'start': self.month_start, 'end': self.month_end})
+        db.session.commit()
+
+        self.sale.amount = 900
+        self.assertRaises(ClosedPeriodError, db.session.commit)
+        db.session.rollback()
+        with self.assertRaises(ClosedPeriodError):
+            BankTransaction.query.filter(BankTransaction.amount > 0).update(
+                {'needs_review': True}, synchronize_session=False
+            )
+        db.session.rollback()
+
+        db.session.execute(text('DELETE FROM closed_periods'))
+        db.session.commit()
+        self.sale.amount = 900
+        db.session.commit()
+
+    def test_totals_stay_decimal(self):
+        from services.period_close import period_totals
+
+        live = period_totals(self.month_start, self.month_end)
+        self.close()
+        frozen = period_totals(self.month_start, self.month_end)
+        for rows in (live, frozen):
+            self.assertTrue(all(isinstance(row['inflow'], Decimal) and isinstance(row['outflow'], Decimal)
+                                for row in rows))
+        self.assertEqual(sum(row['inflow'] for row in frozen), Decimal('1000.00'))
+
+    def test_review_queue_skips_closed_periods(self):
+        from services.review_queue import ReviewQueue
+
+        queue = ReviewQueue()
+        unknown = BankTransaction.query.filter_by(description='UNKNOWN').one()
+        self.assertEqual([t.id for t in queue.ranked()], [unknown.id])
+        self.close()
+
+        self.assertEqual(queue.ranked(), [])
+        self.assertEqual(queue.clusters(), [])
+        result = queue.apply_decision({'business_category': 'BANK_FEE'}, transaction_ids=[unknown.id],
+                                      signature='UNKNOWN')
+        self.assertEqual(result, {'updated': 0, 'transaction_ids': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
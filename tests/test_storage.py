@@ -0,0 +1,332 @@
+"""
+Unit tests for upload storage (content-addressed store, Azure blob transfers)
+Runs against temporary directories; no Azure account needed
+"""
+
+import unittest
+import sys
+import os
+import io
+import hashlib
+import shutil
+import tempfile
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+from utils.azure_storage import AzureStorage
+from utils.file_store import ContentStore, LocalStorage, StorageBackend, content_key, get_content_store
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO recording how many bytes were read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class FolderBackend(StorageBackend):
+    """Remote-style backend (no local paths) kept in a directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key.replace('/', '__'))
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put_file(self, file_path, key, move=False):
+        if self.exists(key):
+            return False
+        shutil.copyfile(file_path, self._path(key))
+        return True
+
+    def get_file(self, key, download_path):
+        if not self.exists(key):
+            return False
+        shutil.copyfile(self._path(key), download_path)
+        return True
+
+    def delete(self, key):
+        os.remove(self._path(key))
+        return True
+
+    def list_keys(self, prefix=''):
+        return (name.replace('__', '/') for name in sorted(os.listdir(self.root)) if name.replace('__', '/').startswith(prefix))
+
+
+class StorageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, 'uploads')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class TestContentStore(StorageTestCase):
+    """Content addressing, dedup and streaming hash on the local backend"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = ContentStore(LocalStorage(self.root), os.path.join(self.root, '.staging'))
+
+    def test_same_name_different_content(self):
+        first = self.store.save_stream(io.BytesIO(b'first receipt'), 'receipt.PNG')
+        second = self.store.save_stream(io.BytesIO(b'second receipt'), 'receipt.PNG')
+
+        digest = hashlib.sha256(b'first receipt').hexdigest()
+        self.assertEqual(first.content_hash, digest)
+        self.assertEqual(first.key, f'{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertNotEqual(first.key, second.key)
+        with open(first.path, 'rb') as f:
+            self.assertEqual(f.read(), b'first receipt')
+        self.assertEqual(sorted(self.store.keys()), sorted([first.key, second.key]))
+
+    def test_duplicate_content_is_stored_once(self):
+        stream = CountingStream(b'x' * (3 * 1024 * 1024 + 5))
+        first = self.store.save_stream(stream, 'scan.jpg')
+        self.assertEqual(stream.bytes_read, first.size)     # One pass over the upload
+        again = self.store.save_stream(io.BytesIO(b'x' * (3 * 1024 * 1024 + 5)), 'copy.jpg')
+
+        self.assertFalse(first.deduplicated)
+        self.assertTrue(again.deduplicated)
+        self.assertEqual(again.key, first.key)
+        self.assertEqual(list(self.store.keys()), [first.key])
+        self.assertEqual(os.listdir(os.path.join(self.root, '.staging')), [])
+
+    def test_import_file_hardlinks(self):
+        legacy = os.path.join(self.root, 'invoice.pdf')
+        with open(legacy, 'wb') as f:
+            f.write(b'%PDF legacy upload')
+        stored = self.store.import_file(legacy)
+        self.assertTrue(os.path.samefile(stored.path, legacy))
+        self.assertTrue(self.store.import_file(legacy).deduplicated)
+
+    def test_keys_stay_under_the_root(self):
+        with self.assertRaises(ValueError):
+            self.store.backend.local_path('../outside.txt')
+        self.assertEqual(content_key('abcdef', '.PDF'), 'ab/cd/abcdef.pdf')
+
+
+class TestRemoteBackend(StorageTestCase):
+    """Backends without local paths keep a local copy for OCR"""
+
+    def test_upload_and_download_copy(self):
+        remote = os.path.join(self.directory.name, 'remote')
+        os.makedirs(remote)
+        store = ContentStore(FolderBackend(remote), os.path.join(self.root, '.staging'))
+
+        stored = store.save_stream(io.BytesIO(b'remote receipt'), 'r.png')
+        self.assertTrue(store.backend.exists(stored.key))
+        with open(stored.path, 'rb') as f:
+            self.assertEqual(f.read(), b'remote receipt')
+
+        os.remove(stored.path)
+        path = store.local_path(stored.key)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'remote receipt')
+        self.assertTrue(store.save_stream(io.BytesIO(b'remote receipt'), 'r.png').deduplicated)
+
+    def test_cache_is_trimmed_least_recently_used_first(self):
+        remote = os.path.join(self.directory.name, 'remote')
+        os.makedirs(remote)
+        store = ContentStore(FolderBackend(remote), os.path.join(self.root, '.staging'),
+                             cache_max_bytes=2500, cache_min_age=0)
+
+        keys = []
+        for i in range(3):
+            keys.append(store.save_stream(io.BytesIO(bytes([i]) * 1000), f'{i}.png').key)
+            os.utime(store._cache_path(keys[-1]), (1000 + i, 1000 + i))
+        # The third upload went over the limit: the oldest copy was dropped
+        self.assertFalse(os.path.exists(store._cache_path(keys[0])))
+        self.assertEqual(store.evict_cache(), 0)
+
+        # Evicted copies come back from the backend; the copy just read is kept over older ones
+        store.local_path(keys[1])
+        with open(store.local_path(keys[0]), 'rb') as f:
+            self.assertEqual(f.read(), bytes([0]) * 1000)
+        self.assertTrue(os.path.exists(store._cache_path(keys[1])))
+        self.assertFalse(os.path.exists(store._cache_path(keys[2])))
+
+        # Recent copies may still be read by OCR
+        store.cache_min_age = 3600
+        store.local_path(keys[2])
+        self.assertEqual(store.evict_cache(), 0)
+
+
+class TestAzureStorage(StorageTestCase):
+    """AzureStorage against the local blob service stand-in"""
+
+    def setUp(self):
+        super().setUp()
+        self.app = Flask(__name__)
+        self.app.config.update(AZURE_STORAGE_LOCAL_ROOT=os.path.join(self.directory.name, 'blobs'),
+                               AZURE_STORAGE_CONTAINER='uploads', AZURE_STORAGE_BLOCK_SIZE=4096,
+                               AZURE_STORAGE_TRANSFER_WORKERS=4, AZURE_STORAGE_PAGE_SIZE=10,
+                               UPLOAD_FOLDER=self.root, FILE_STORAGE_BACKEND='azure')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.storage = AzureStorage()
+        self.stats = self.storage.blob_service_client.stats
+
+    def tearDown(self):
+        self.app_context.pop()
+        super().tearDown()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_chunked_upload_and_download(self):
+        data = os.urandom(10 * 1024)
+        self.assertTrue(self.storage.upload_file(self.write('big.bin', data), 'uploads', 'a/big.bin'))
+        self.assertEqual(self.stats['blocks_uploaded'], 3)
+
+        target = os.path.join(self.directory.name, 'copy.bin')
+        self.assertTrue(self.storage.download_file('uploads', 'a/big.bin', target))
+        self.assertEqual(self.stats['chunks_downloaded'], 3)
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        missing = os.path.join(self.directory.name, 'missing.bin')
+        self.assertFalse(self.storage.download_file('uploads', 'nope.bin', missing))
+        self.assertFalse(os.path.exists(missing) or os.path.exists(missing + '.part'))
+        self.assertFalse(self.storage.delete_blob('uploads', 'nope.bin'))
+
+    def test_listing_is_paged_lazily(self):
+        for i in range(25):
+            self.storage.upload_file(self.write(f'f{i}.txt', b'x'), 'uploads', f'receipts/{i:02d}.txt')
+        self.storage.upload_file(self.write('other.txt', b'x'), 'uploads', 'other/1.txt')
+
+        names = self.storage.list_blobs('uploads', prefix='receipts/')
+        first = [next(names) for _ in range(5)]
+        self.assertEqual(first[0], 'receipts/00.txt')
+        self.assertEqual(self.stats['pages_listed'], 1)
+        self.assertEqual(len(first) + len(list(names)), 25)
+        self.assertEqual(self.stats['pages_listed'], 3)
+        self.assertEqual(list(self.storage.list_keys('other/')), ['other/1.txt'])
+
+    def test_batch_transfers(self):
+        files = [(self.write(f'batch{i}.bin', bytes([i]) * 5000), f'batch/{i}.bin') for i in range(12)]
+        self.assertEqual(self.storage.upload_files(files), {blob: True for _, blob in files})
+
+        targets = [(blob, os.path.join(self.directory.name, f'out{i}.bin')) for i, (_, blob) in enumerate(files)]
+        targets.append(('batch/missing.bin', os.path.join(self.directory.name, 'out-missing.bin')))
+        results = self.storage.download_files(targets)
+        self.assertFalse(results.pop('batch/missing.bin'))
+        self.assertTrue(all(results.values()))
+        with open(targets[7][1], 'rb') as f:
+            self.assertEqual(f.read(), bytes([7]) * 5000)
+
+    def test_content_store_on_blob_storage(self):
+        store = get_content_store(self.app)
+        stored = store.save_stream(io.BytesIO(b'receipt on blob storage'), 'r.png')
+        self.assertTrue(store.backend.exists(stored.key))
+        self.assertTrue(store.save_stream(io.BytesIO(b'receipt on blob storage'), 'r.png').deduplicated)
+        self.assertEqual(list(store.keys()), [stored.key])
+
+    def test_blob_storage_without_a_service_fails_at_startup(self):
+        app = Flask(__name__)
+        app.config.update(UPLOAD_FOLDER=self.root, FILE_STORAGE_BACKEND='azure')
+        with self.assertRaisesRegex(ValueError, 'AZURE_STORAGE_CONNECTION_STRING'):
+            get_content_store(app)
+        self.assertNotIn('content_store', app.extensions)
+
+    def test_backends_implement_the_whole_interface(self):
+        class NoListing(StorageBackend):
+            def exists(self, key):
+                return False
+
+        with self.assertRaises(TypeError):
+            NoListing()
+        with self.assertRaises(TypeError):
+            StorageBackend()
+
+
+class TestUploadRoutes(StorageTestCase):
+    """AP uploads go through the content store"""
+
+    def make_app(self, **config):
+        from database import db
+        from models.user import User
+        from app.routes.accounts_payable import accounts_payable_bp
+
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', TESTING=True, SECRET_KEY='test',
+                          UPLOAD_FOLDER=self.root, OCR_ENABLED=False, LOGIN_DISABLED=True, **config)
+        db.init_app(app)
+        app.register_blueprint(accounts_payable_bp, url_prefix='/accounts-payable')
+        with app.app_context():
+            db.create_all()
+            user = User(username='qa', email='qa@acidtech.com', first_name='QA', last_name='User')
+            user.set_password('qa-password-1')
+            db.session.add(user)
+            db.session.commit()
+        return app
+
+    def upload(self, client, content):
+        return client.post('/accounts-payable/create', content_type='multipart/form-data', data={
+            'vendor': 'ACME', 'amount': '10', 'due_date': '2026-04-15', 'description': '',
+            'invoice_number': '', 'receipt': (io.BytesIO(content), 'receipt.jpg'),
+        })
+
+    def test_same_named_uploads_do_not_overwrite(self):
+        from database import db
+        from models.transaction import Transaction
+
+        app = self.make_app()
+        with app.app_context():
+            client = app.test_client()
+            for content in (b'january receipt', b'february receipt'):
+                self.assertEqual(self.upload(client, content).status_code, 302)
+
+            paths = [t.receipt_path for t in Transaction.query.order_by(Transaction.id)]
+            self.assertEqual(len(set(paths)), 2)
+            store = get_content_store(app)
+            with open(store.local_path(paths[0]), 'rb') as f:
+                self.assertEqual(f.read(), b'january receipt')
+            db.session.remove()
+            db.drop_all()
+
+    def test_receipt_link_on_blob_storage(self):
+        from database import db
+        from models.transaction import Transaction
+
+        app = self.make_app(FILE_STORAGE_BACKEND='azure', AZURE_STORAGE_CONTAINER='uploads',
+                            AZURE_STORAGE_LOCAL_ROOT=os.path.join(self.directory.name, 'blobs'))
+        with app.app_context():
+            client = app.test_client()
+            self.upload(client, b'receipt on blob storage')
+            transaction = Transaction.query.one()
+            # Nothing under UPLOAD_FOLDER/<key>: the old static link would be a 404
+            self.assertFalse(os.path.exists(os.path.join(self.root, transaction.receipt_path)))
+
+            shutil.rmtree(os.path.join(self.root, '.staging', 'cache'))
+            response = client.get(f'/accounts-payable/{transaction.id}/receipt')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, b'receipt on blob storage')
+            response.close()
+
+            transaction.receipt_path = 'missing.jpg'
+            db.session.commit()
+            self.assertEqual(client.get(f'/accounts-payable/{transaction.id}/receipt').status_code, 404)
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Train the Local Transaction Classifier for AcidTech Cash Flow Application
+Fits the ML classifier on manually confirmed classifications and writes
+the model artifact to ML_MODEL_DIR
+
+Usage:
+    python train_classifier.py [min_samples]
+"""
+
+import os
+import sys
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def train_classifier(min_samples):
+    from flask import current_app
+    from app import create_app
+    from services.ml_classifier import train_from_database
+
+    app = create_app()
+
+    with app.app_context():
+        stats = train_from_database(current_app.config['ML_MODEL_DIR'], min_samples=min_samples)
+        if not stats['trained']:
+            print(f"⚠️  {stats['message']} (found {stats['n_samples']})")
+            return
+
+        print(f"✅ Model trained on {stats['n_samples']} transactions ({stats['n_classes']} classes)")
+        print(f"   temperature: {stats['temperature']:.2f}")
+        print(f"   saved to: {stats['model_dir']}")
+
+
+if __name__ == '__main__':
+    train_classifier(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
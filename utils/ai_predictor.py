@@ -1,6 +1,7 @@
 from datetime import datetime, date, timedelta
 from models.transaction import Transaction
 from database import db
+from services.entity_cube import EntityCube, FLOW_NET, SOURCE_LEDGER
 import json
 
 class CashFlowPredictor:
@@ -178,47 +179,30 @@ class CashFlowPredictor:
     
     def get_vendor_customer_insights(self):
         """Analyze vendor and customer payment patterns"""
+        cube = EntityCube()
         
         # Get top customers by revenue
-        top_customers = db.session.query(
-            Transaction.vendor_customer,
-            db.func.sum(Transaction.amount).label('total_amount'),
-            db.func.count(Transaction.id).label('transaction_count'),
-            db.func.avg(Transaction.amount).label('avg_amount')
-        ).filter(
-            Transaction.type == 'receivable'
-        ).group_by(Transaction.vendor_customer).order_by(
-            db.func.sum(Transaction.amount).desc()
-        ).limit(5).all()
+        top_customers = cube.top_n(5, SOURCE_LEDGER, account='receivable', flow=FLOW_NET)
         
         # Get top vendors by spending
-        top_vendors = db.session.query(
-            Transaction.vendor_customer,
-            db.func.sum(Transaction.amount).label('total_amount'),
-            db.func.count(Transaction.id).label('transaction_count'),
-            db.func.avg(Transaction.amount).label('avg_amount')
-        ).filter(
-            Transaction.type == 'payable'
-        ).group_by(Transaction.vendor_customer).order_by(
-            db.func.sum(Transaction.amount).desc()
-        ).limit(5).all()
+        top_vendors = cube.top_n(5, SOURCE_LEDGER, account='payable', flow=FLOW_NET)
         
         return {
             'top_customers': [
                 {
-                    'name': customer.vendor_customer,
-                    'total_amount': round(float(customer.total_amount), 2),
-                    'transaction_count': customer.transaction_count,
-                    'avg_amount': round(float(customer.avg_amount), 2)
+                    'name': customer['entity'],
+                    'total_amount': round(customer['total_amount'], 2),
+                    'transaction_count': customer['transaction_count'],
+                    'avg_amount': round(customer['avg_amount'], 2)
                 }
                 for customer in top_customers
             ],
             'top_vendors': [
                 {
-                    'name': vendor.vendor_customer,
-                    'total_amount': round(float(vendor.total_amount), 2),
-                    'transaction_count': vendor.transaction_count,
-                    'avg_amount': round(float(vendor.avg_amount), 2)
+                    'name': vendor['entity'],
+                    'total_amount': round(vendor['total_amount'], 2),
+                    'transaction_count': vendor['transaction_count'],
+                    'avg_amount': round(vendor['avg_amount'], 2)
                 }
                 for vendor in top_vendors
             ]
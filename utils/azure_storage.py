@@ -1,13 +1,55 @@
-from azure.storage.blob import BlobServiceClient
-from azure.core.exceptions import ResourceNotFoundError
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 
-class AzureStorage:
-    def __init__(self):
-        self.connection_string = current_app.config.get('AZURE_STORAGE_CONNECTION_STRING')
-        if self.connection_string:
-            self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+from utils.file_store import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def _not_found_errors():
+    """Missing-blob exceptions of the SDK and of the local stand-in"""
+    from utils.local_blob_service import BlobNotFoundError
+    try:
+        from azure.core.exceptions import ResourceNotFoundError
+    except ImportError:
+        return (BlobNotFoundError,)
+    return (ResourceNotFoundError, BlobNotFoundError)
+
+
+class AzureStorage(StorageBackend):
+    def __init__(self, container_name=None, blob_service_client=None):
+        config = current_app.config
+        # Container used by the StorageBackend methods (content store keys)
+        self.container_name = container_name or config.get('AZURE_STORAGE_CONTAINER', 'uploads')
+        # Files are streamed in blocks of block_size, max_concurrency blocks in flight per file;
+        # batch transfers run transfer_workers files at a time
+        self.block_size = config.get('AZURE_STORAGE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+        self.max_concurrency = config.get('AZURE_STORAGE_MAX_CONCURRENCY', 4)
+        self.transfer_workers = config.get('AZURE_STORAGE_TRANSFER_WORKERS', 8)
+        self.page_size = config.get('AZURE_STORAGE_PAGE_SIZE', 1000)
+        self.connection_string = config.get('AZURE_STORAGE_CONNECTION_STRING')
+        if blob_service_client is not None:
+            self.blob_service_client = blob_service_client
+        elif self.connection_string:
+            # The Azure SDK is imported on first use so app startup does not pay for it
+            from azure.storage.blob import BlobServiceClient
+            self.blob_service_client = BlobServiceClient.from_connection_string(
+                self.connection_string,
+                max_block_size=self.block_size,
+                max_single_put_size=self.block_size,
+                max_chunk_get_size=self.block_size,
+                max_single_get_size=self.block_size
+            )
+        elif config.get('AZURE_STORAGE_LOCAL_ROOT'):
+            # Development without an Azure account: same client API over a local folder
+            from utils.local_blob_service import LocalBlobServiceClient
+            self.blob_service_client = LocalBlobServiceClient(
+                config['AZURE_STORAGE_LOCAL_ROOT'], max_block_size=self.block_size, max_chunk_get_size=self.block_size
+            )
         else:
             self.blob_service_client = None
     
@@ -17,65 +59,144 @@ class AzureStorage:
         
         try:
             blob_client = self.blob_service_client.get_blob_client(
-                container=container_name, 
+                container=container_name,
                 blob=blob_name
             )
             
+            # The SDK reads the file block by block; it is never loaded whole
             with open(file_path, 'rb') as data:
-                blob_client.upload_blob(data, overwrite=True)
+                blob_client.upload_blob(data, overwrite=True, length=os.path.getsize(file_path),
+                                        max_concurrency=self.max_concurrency)
             
             return True
         except Exception as e:
-            current_app.logger.error(f"Error uploading to Azure Storage: {e}")
+            logger.error(f"Error uploading to Azure Storage: {e}")
             return False
     
     def download_file(self, container_name, blob_name, download_path):
         if not self.blob_service_client:
             return False
+        not_found = _not_found_errors()
         
+        partial_path = f"{download_path}.part"
         try:
             blob_client = self.blob_service_client.get_blob_client(
-                container=container_name, 
+                container=container_name,
                 blob=blob_name
             )
             
-            with open(download_path, 'wb') as download_file:
-                download_file.write(blob_client.download_blob().readall())
+            # Chunks are written as they arrive; a failed transfer never leaves a truncated file
+            downloader = blob_client.download_blob(max_concurrency=self.max_concurrency)
+            with open(partial_path, 'wb') as download_file:
+                downloader.readinto(download_file)
+            os.replace(partial_path, download_path)
             
             return True
-        except ResourceNotFoundError:
-            current_app.logger.error(f"Blob {blob_name} not found in container {container_name}")
+        except not_found:
+            logger.error(f"Blob {blob_name} not found in container {container_name}")
             return False
         except Exception as e:
-            current_app.logger.error(f"Error downloading from Azure Storage: {e}")
+            logger.error(f"Error downloading from Azure Storage: {e}")
             return False
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
     
-    def list_blobs(self, container_name):
+    def list_blobs(self, container_name, prefix=None, page_size=None):
+        """Blob names, fetched one page at a time as the caller iterates"""
         if not self.blob_service_client:
-            return []
+            return
         
         try:
             container_client = self.blob_service_client.get_container_client(container_name)
-            blob_list = container_client.list_blobs()
-            return [blob.name for blob in blob_list]
+            pages = container_client.list_blobs(
+                name_starts_with=prefix,
+                results_per_page=page_size or self.page_size
+            ).by_page()
+            for page in pages:
+                for blob in page:
+                    yield blob.name
         except Exception as e:
-            current_app.logger.error(f"Error listing blobs: {e}")
-            return []
+            logger.error(f"Error listing blobs: {e}")
     
     def delete_blob(self, container_name, blob_name):
         if not self.blob_service_client:
             return False
+        not_found = _not_found_errors()
         
         try:
             blob_client = self.blob_service_client.get_blob_client(
-                container=container_name, 
+                container=container_name,
                 blob=blob_name
             )
             blob_client.delete_blob()
             return True
-        except ResourceNotFoundError:
-            current_app.logger.error(f"Blob {blob_name} not found in container {container_name}")
+        except not_found:
+            logger.error(f"Blob {blob_name} not found in container {container_name}")
             return False
         except Exception as e:
-            current_app.logger.error(f"Error deleting blob: {e}")
-            return False
\ No newline at end of file
+            logger.error(f"Error deleting blob: {e}")
+            return False
+    
+    # Batch transfers on a thread pool (network-bound, so threads overlap the waits)
+    
+    def _run_batch(self, func, jobs):
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.transfer_workers, len(jobs))) as executor:
+            return list(executor.map(lambda job: func(*job), jobs))
+    
+    def upload_files(self, files, container_name=None):
+        """
+        Upload many files concurrently
+        
+        Args:
+            files: (file_path, blob_name) pairs
+            container_name: Target container (self.container_name when None)
+        
+        Returns:
+            Dict blob_name -> True/False
+        """
+        container_name = container_name or self.container_name
+        files = list(files)
+        results = self._run_batch(self.upload_file, [(path, container_name, blob) for path, blob in files])
+        return {blob: ok for (_, blob), ok in zip(files, results)}
+    
+    def download_files(self, blobs, container_name=None):
+        """
+        Download many blobs concurrently
+        
+        Args:
+            blobs: (blob_name, download_path) pairs
+            container_name: Source container (self.container_name when None)
+        
+        Returns:
+            Dict blob_name -> True/False
+        """
+        container_name = container_name or self.container_name
+        blobs = list(blobs)
+        results = self._run_batch(self.download_file, [(container_name, blob, path) for blob, path in blobs])
+        return {blob: ok for (blob, _), ok in zip(blobs, results)}
+    
+    # StorageBackend interface (utils.file_store) on self.container_name
+    
+    def exists(self, key):
+        if not self.blob_service_client:
+            return False
+        return self.blob_service_client.get_blob_client(container=self.container_name, blob=key).exists()
+    
+    def put_file(self, file_path, key, move=False):
+        if self.exists(key):
+            return False
+        if not self.upload_file(file_path, self.container_name, key):
+            raise IOError(f"Could not upload {key} to container {self.container_name}")
+        return True
+    
+    def get_file(self, key, download_path):
+        return self.download_file(self.container_name, key, download_path)
+    
+    def delete(self, key):
+        return self.delete_blob(self.container_name, key)
+    
+    def list_keys(self, prefix=''):
+        return self.list_blobs(self.container_name, prefix=prefix or None)
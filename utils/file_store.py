@@ -0,0 +1,308 @@
+import abc
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import IO, Iterator, NamedTuple, Optional
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+STAGING_DIR = '.staging'
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_MIN_AGE = 15 * 60     # Seconds a cached copy is kept regardless of size (OCR may still be reading it)
+
+
+def content_key(content_hash, extension=''):
+    """Storage key of a content hash: two levels of sha256 shards, original extension kept"""
+    return f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension.lower()}'
+
+
+class StoredFile(NamedTuple):
+    key: str                # Backend key (also the path under UPLOAD_FOLDER for the local backend)
+    content_hash: str       # SHA-256 of the content
+    size: int
+    path: str               # Local copy usable by OCR
+    filename: str           # Name the file was uploaded with
+    deduplicated: bool      # Content was already stored
+
+
+class StorageBackend(abc.ABC):
+    """
+    Key/file interface implemented by LocalStorage and utils.azure_storage.AzureStorage
+    """
+
+    @abc.abstractmethod
+    def exists(self, key):
+        """Whether content is stored under key"""
+
+    @abc.abstractmethod
+    def put_file(self, file_path, key, move=False):
+        """Store a local file under key (no-op when the key exists); move may consume file_path"""
+
+    @abc.abstractmethod
+    def get_file(self, key, download_path):
+        """Copy the content of key to a local path; returns False when the key does not exist"""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Remove key; returns False when it did not exist"""
+
+    @abc.abstractmethod
+    def list_keys(self, prefix=''):
+        """Iterate over the stored keys starting with prefix"""
+
+    def local_path(self, key):
+        """Path of key on local disk, or None when the backend is remote"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """
+    Files under a root directory; identical content is hardlinked instead of copied
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, STAGING_DIR), exist_ok=True)
+
+    def local_path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.commonpath([path, os.path.normpath(self.root)]) != os.path.normpath(self.root):
+            raise ValueError(f'Key outside the storage root: {key}')
+        return path
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def put_file(self, file_path, key, move=False):
+        target = self.local_path(key)
+        if os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if move:
+            os.replace(file_path, target)
+            return True
+        staged = os.path.join(self.root, STAGING_DIR, f'{uuid.uuid4().hex}.tmp')
+        try:
+            os.link(file_path, staged)               # Same filesystem: no bytes copied
+        except OSError:
+            shutil.copyfile(file_path, staged)
+        # Atomic publish; a concurrent writer of the same content wins harmlessly
+        os.replace(staged, target)
+        return True
+
+    def get_file(self, key, download_path):
+        source = self.local_path(key)
+        if not os.path.exists(source):
+            return False
+        shutil.copyfile(source, download_path)
+        return True
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list_keys(self, prefix=''):
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = sorted(d for d in subdirs if d != STAGING_DIR)
+            for name in sorted(files):
+                key = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    yield key
+
+
+class ContentStore:
+    """
+    Content-addressed uploads: files are keyed by the SHA-256 of their content,
+    so same-named uploads never overwrite each other and duplicates are stored once
+    """
+
+    def __init__(self, backend, staging_dir, cache_max_bytes=CACHE_MAX_BYTES, cache_min_age=CACHE_MIN_AGE):
+        """
+        Args:
+            backend: StorageBackend holding the files
+            staging_dir: Local directory for uploads in flight and copies of remote files
+            cache_max_bytes: Size the local copies of remote files are trimmed to (least recently used first)
+            cache_min_age: Seconds a local copy is never evicted for
+        """
+        self.backend = backend
+        self.staging_dir = staging_dir
+        self.cache_dir = os.path.join(staging_dir, 'cache')
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_min_age = cache_min_age
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def save_stream(self, stream: IO[bytes], filename='') -> StoredFile:
+        """
+        Store an upload, hashing it while it is written to staging (a single read of the stream)
+
+        Args:
+            stream: Readable binary stream (werkzeug FileStorage.stream, open file)
+            filename: Original file name; only its extension is kept in the key
+
+        Returns:
+            StoredFile of the stored (or already present) content
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self.staging_dir, suffix='.upload', delete=False) as staged:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                staged.write(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+        key = content_key(content_hash, os.path.splitext(secure_filename(filename or ''))[1])
+        try:
+            stored = self.backend.put_file(staged.name, key, move=True)
+            path = self.backend.local_path(key) or self._cache(staged.name, key)
+        finally:
+            if os.path.exists(staged.name):
+                os.remove(staged.name)
+        return StoredFile(key, content_hash, size, path, filename, not stored)
+
+    def save_upload(self, file) -> StoredFile:
+        """Store a werkzeug FileStorage from request.files"""
+        return self.save_stream(file.stream, file.filename)
+
+    def import_file(self, file_path) -> StoredFile:
+        """Add an existing local file (hardlinked by the local backend, the source is left in place)"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        key = content_key(content_hash, os.path.splitext(file_path)[1])
+        stored = self.backend.put_file(file_path, key)
+        path = self.backend.local_path(key) or file_path
+        return StoredFile(key, content_hash, os.path.getsize(file_path), path,
+                          os.path.basename(file_path), not stored)
+
+    def local_path(self, key) -> Optional[str]:
+        """Local path of a stored key, downloading remote content into the staging cache"""
+        path = self.backend.local_path(key)
+        if path is not None:
+            return path if os.path.exists(path) else None
+        cached = self._cache_path(key)
+        if os.path.exists(cached):
+            os.utime(cached)        # Recently used: evicted last
+            return cached
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        partial = f'{cached}.{os.getpid()}.part'
+        if not self.backend.get_file(key, partial):
+            return None
+        os.replace(partial, cached)
+        self.evict_cache()
+        return cached
+
+    def _cache_path(self, key):
+        cached = os.path.normpath(os.path.join(self.cache_dir, key))
+        if os.path.commonpath([cached, os.path.normpath(self.cache_dir)]) != os.path.normpath(self.cache_dir):
+            raise ValueError(f'Key outside the cache: {key}')
+        return cached
+
+    def _cache(self, staged_path, key):
+        """Keep the staged upload as the local copy of a remote key"""
+        cached = self._cache_path(key)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        if os.path.exists(staged_path):
+            os.replace(staged_path, cached)
+        self.evict_cache()
+        return cached
+
+    def evict_cache(self) -> int:
+        """
+        Trim the local copies of remote files to cache_max_bytes, least recently used first;
+        copies younger than cache_min_age are kept (the content stays in the backend)
+
+        Returns:
+            Number of files removed
+        """
+        entries = []
+        total = 0
+        for directory, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.cache_max_bytes:
+            return 0
+
+        removed = 0
+        cutoff = time.time() - self.cache_min_age
+        for mtime, size, path in sorted(entries):
+            if total <= self.cache_max_bytes or mtime > cutoff:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        if removed:
+            logger.info(f'Evicted {removed} cached files from {self.cache_dir}')
+        return removed
+
+    def keys(self, prefix='') -> Iterator[str]:
+        return self.backend.list_keys(prefix)
+
+
+def get_content_store(app=None) -> ContentStore:
+    """
+    Content store of the app (FILE_STORAGE_BACKEND 'local' under UPLOAD_FOLDER, or 'azure')
+
+    Raises:
+        ValueError: FILE_STORAGE_BACKEND is 'azure' without a blob service to reach
+    """
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('content_store')
+    if store is None:
+        upload_folder = app.config['UPLOAD_FOLDER']
+        if app.config.get('FILE_STORAGE_BACKEND', 'local') == 'azure':
+            from utils.azure_storage import AzureStorage
+            with app.app_context():
+                backend = AzureStorage(app.config.get('AZURE_STORAGE_CONTAINER', 'uploads'))
+            if backend.blob_service_client is None:
+                raise ValueError("FILE_STORAGE_BACKEND is 'azure' but neither AZURE_STORAGE_CONNECTION_STRING "
+                                 "nor AZURE_STORAGE_LOCAL_ROOT is set")
+        else:
+            backend = LocalStorage(upload_folder)
+        store = app.extensions.setdefault('content_store', ContentStore(
+            backend, os.path.join(upload_folder, STAGING_DIR),
+            cache_max_bytes=app.config.get('FILE_CACHE_MAX_BYTES', CACHE_MAX_BYTES)
+        ))
+    return store
+
+
+def stored_file_response(key):
+    """
+    send_file response for a stored key (404 when it is missing), so links work
+    whatever the backend; files saved under UPLOAD_FOLDER before the content
+    store are served from there
+    """
+    from flask import abort, send_file
+
+    path = None
+    try:
+        path = get_content_store().local_path(key)
+        if path is None:
+            legacy = LocalStorage(current_app.config['UPLOAD_FOLDER']).local_path(key)
+            path = legacy if os.path.isfile(legacy) else None
+    except ValueError:
+        pass
+    if path is None:
+        abort(404)
+    return send_file(path, download_name=os.path.basename(key))
@@ -0,0 +1,156 @@
+import os
+import threading
+import uuid
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class BlobNotFoundError(FileNotFoundError):
+    """Raised where the Azure SDK raises ResourceNotFoundError"""
+
+
+class _Blob:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+class LocalBlobServiceClient:
+    """
+    Filesystem stand-in for azure.storage.blob.BlobServiceClient
+
+    Implements the subset used by utils.azure_storage.AzureStorage (blob and
+    container clients, chunked upload/download, paged listing) with one
+    directory per container, so AzureStorage runs unchanged in development
+    and tests without an Azure account. Transfer counters (blocks, chunks,
+    pages) are kept in self.stats.
+    """
+
+    def __init__(self, root, max_block_size=DEFAULT_BLOCK_SIZE, max_chunk_get_size=DEFAULT_BLOCK_SIZE):
+        self.root = root
+        self.max_block_size = max_block_size
+        self.max_chunk_get_size = max_chunk_get_size
+        self.stats = {'blocks_uploaded': 0, 'chunks_downloaded': 0, 'pages_listed': 0}
+        self._stats_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def count(self, name, increment=1):
+        with self._stats_lock:
+            self.stats[name] += increment
+
+    def get_blob_client(self, container, blob):
+        return LocalBlobClient(self, container, blob)
+
+    def get_container_client(self, container):
+        return LocalContainerClient(self, container)
+
+
+class LocalContainerClient:
+    def __init__(self, service, container):
+        self.service = service
+        self.container = container
+        self.path = os.path.join(service.root, container)
+
+    def list_blobs(self, name_starts_with=None, results_per_page=None):
+        return LocalItemPaged(self, name_starts_with or '', results_per_page or 5000)
+
+    def _names(self, prefix):
+        for directory, subdirs, files in os.walk(self.path):
+            subdirs.sort()
+            for name in sorted(files):
+                if name.endswith('.part'):
+                    continue
+                blob = os.path.relpath(os.path.join(directory, name), self.path).replace(os.sep, '/')
+                if blob.startswith(prefix):
+                    yield _Blob(blob, os.path.getsize(os.path.join(directory, name)))
+
+
+class LocalItemPaged:
+    """Lazy listing: iterating yields blobs, by_page() yields pages of results_per_page"""
+
+    def __init__(self, container_client, prefix, page_size):
+        self.container_client = container_client
+        self.prefix = prefix
+        self.page_size = page_size
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+    def by_page(self):
+        page = []
+        for blob in self.container_client._names(self.prefix):
+            page.append(blob)
+            if len(page) == self.page_size:
+                self.container_client.service.count('pages_listed')
+                yield iter(page)
+                page = []
+        if page:
+            self.container_client.service.count('pages_listed')
+            yield iter(page)
+
+
+class LocalBlobClient:
+    def __init__(self, service, container, blob):
+        self.service = service
+        self.container = container
+        self.blob_name = blob
+        self.path = os.path.join(service.root, container, *blob.split('/'))
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def upload_blob(self, data, overwrite=False, length=None, max_concurrency=1, **kwargs):
+        if self.exists() and not overwrite:
+            raise FileExistsError(f'Blob {self.blob_name} already exists')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Staged blocks are committed together, as with Put Block / Put Block List
+        staged = f'{self.path}.{uuid.uuid4().hex}.part'
+        with open(staged, 'wb') as f:
+            if isinstance(data, (bytes, bytearray)):
+                data = memoryview(data)
+                for start in range(0, len(data), self.service.max_block_size):
+                    f.write(data[start:start + self.service.max_block_size])
+                    self.service.count('blocks_uploaded')
+            else:
+                for block in iter(lambda: data.read(self.service.max_block_size), b''):
+                    f.write(block)
+                    self.service.count('blocks_uploaded')
+        os.replace(staged, self.path)
+        return {'name': self.blob_name}
+
+    def download_blob(self, max_concurrency=1, **kwargs):
+        if not self.exists():
+            raise BlobNotFoundError(f'Blob {self.blob_name} not found in container {self.container}')
+        return LocalStorageStreamDownloader(self)
+
+    def delete_blob(self, **kwargs):
+        if not self.exists():
+            raise BlobNotFoundError(f'Blob {self.blob_name} not found in container {self.container}')
+        os.remove(self.path)
+
+
+class LocalStorageStreamDownloader:
+    """Chunked reader with the StorageStreamDownloader methods AzureStorage uses"""
+
+    def __init__(self, blob_client):
+        self.blob_client = blob_client
+        self.size = os.path.getsize(blob_client.path)
+
+    def chunks(self):
+        service = self.blob_client.service
+        with open(self.blob_client.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(service.max_chunk_get_size), b''):
+                service.count('chunks_downloaded')
+                yield chunk
+
+    def readinto(self, stream):
+        written = 0
+        for chunk in self.chunks():
+            stream.write(chunk)
+            written += len(chunk)
+        return written
+
+    def readall(self):
+        return b''.join(self.chunks())
+